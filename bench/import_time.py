@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+#   Copyright (c) 2010-2016, MIT Probabilistic Computing Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+
+"""Benchmark the cost of `import bayeslite` in a fresh process.
+
+Times, over several fresh interpreters, importing bayeslite alone,
+opening a BayesDB, and opening a BayesDB and then loading the
+builtin crosscat metamodel, which is imported lazily on first use.
+Also lists which heavy dependencies the bare import pulled in.  Run
+from the top of the source tree after building:
+
+    ./pythenv.sh python bench/import_time.py [ntrials]
+"""
+
+import os
+import subprocess
+import sys
+
+HEAVY = ('cgpm', 'crosscat', 'jsonschema', 'pkg_resources', 'requests',
+    'scipy', 'sklearn')
+
+CASES = [
+    ('import', 'import bayeslite'),
+    ('open', 'import bayeslite; bayeslite.bayesdb_open()'),
+    ('crosscat', "import bayeslite; bayeslite.bayesdb_open()"
+        ".metamodels['crosscat']"),
+]
+
+TEMPLATE = '''
+import time
+t0 = time.time()
+%s
+t1 = time.time()
+import sys
+print t1 - t0
+print ' '.join(m for m in %r if sys.modules.get(m) is not None)
+'''
+
+def run(code):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(p for p in sys.path if p)
+    env.pop('BAYESDB_VERSION_CHECK', None)
+    output = subprocess.check_output(
+        [sys.executable, '-c', TEMPLATE % (code, HEAVY)], env=env)
+    lines = output.splitlines()
+    return float(lines[0]), lines[1].split() if len(lines) > 1 else []
+
+def main(ntrials):
+    for name, code in CASES:
+        timings = []
+        for _i in xrange(ntrials):
+            seconds, modules = run(code)
+            timings.append(seconds)
+        timings.sort()
+        print '%-10s min %.3fs  median %.3fs  heavy modules: %s' % \
+            (name, timings[0], timings[len(timings) // 2],
+                ' '.join(modules) or '(none)')
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+#   Copyright (c) 2010-2016, MIT Probabilistic Computing Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+
+"""Benchmark BQL scanning and parsing throughput.
+
+Scans and parses every BQL string that tests/test_parse.py parses,
+with the regular-expression scanner and with the Plex reference
+scanner, and reports the cost of constructing the Plex lexicon.  Run
+from the top of the source tree after building:
+
+    ./pythenv.sh python bench/parse.py [repetitions]
+"""
+
+import ast
+import os
+import StringIO
+import sys
+import time
+
+import bayeslite.parse as parse
+import bayeslite.scan as scan
+
+from bayeslite.exception import BQLParseError
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_parse_strings():
+    pathname = os.path.join(root, 'tests', 'test_parse.py')
+    with open(pathname, 'rb') as f:
+        tree = ast.parse(f.read(), pathname)
+    strings = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call) and \
+           getattr(node.func, 'id', None) == 'parse_bql_string' and \
+           len(node.args) == 1 and isinstance(node.args[0], ast.Str):
+            strings.append(node.args[0].s)
+    return strings
+
+def scan_all(scanner_class, strings):
+    for string in strings:
+        scanner = scanner_class(StringIO.StringIO(string), '(string)')
+        while scanner.read()[0] != 0:
+            pass
+
+def parse_all(strings):
+    for string in strings:
+        try:
+            list(parse.parse_bql_string(string))
+        except BQLParseError:
+            pass
+
+def timed(thunk, repetitions):
+    t0 = time.time()
+    for _i in xrange(repetitions):
+        thunk()
+    return time.time() - t0
+
+def main(repetitions):
+    strings = test_parse_strings()
+    nbytes = sum(len(s) for s in strings) * repetitions
+    nstrings = len(strings) * repetitions
+    print '%d strings, %d bytes, %d repetitions' % \
+        (len(strings), nbytes // repetitions, repetitions)
+
+    t0 = time.time()
+    scan.BQLPlexScanner._lexicon()
+    print 'Plex lexicon construction: %.3fs' % (time.time() - t0,)
+
+    for name, thunk in [
+        ('scan (re)', lambda: scan_all(scan.BQLScanner, strings)),
+        ('scan (Plex)', lambda: scan_all(scan.BQLPlexScanner, strings)),
+        ('parse', lambda: parse_all(strings)),
+    ]:
+        seconds = timed(thunk, repetitions)
+        print '%-12s %.3fs  %8.1f us/string  %8.2f MB/s' % \
+            (name, seconds, 1e6*seconds/nstrings, nbytes/seconds/1e6)
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
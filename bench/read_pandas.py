@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+#   Copyright (c) 2010-2016, MIT Probabilistic Computing Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+
+"""Benchmark bulk import of a pandas dataframe.
+
+Compares bayesdb_read_pandas_df with the row-at-a-time insertion it
+replaced.  Run from the top of the source tree after building:
+
+    ./pythenv.sh python bench/read_pandas.py [nrows]
+"""
+
+import sys
+import time
+
+import numpy
+import pandas
+
+from bayeslite import bayesdb_open
+from bayeslite.read_pandas import bayesdb_read_pandas_df
+
+def make_df(nrows, seed=0):
+    rng = numpy.random.RandomState(seed)
+    x = rng.normal(size=nrows)
+    x[rng.uniform(size=nrows) < 0.1] = numpy.nan
+    return pandas.DataFrame({
+        'x': x,
+        'n': rng.randint(0, 100, size=nrows),
+        'c': rng.choice(['red', 'green', 'blue', None], size=nrows),
+    })
+
+def read_rowwise(bdb, table, df):
+    bdb.sql_execute('CREATE TABLE %s(x NUMERIC, n NUMERIC, c NUMERIC)'
+        % (table,))
+    sql = 'INSERT INTO %s (_rowid_, x, n, c) VALUES (?,?,?,?)' % (table,)
+    with bdb.savepoint():
+        for key, i in zip(df.index.astype('int64'), df.index):
+            bdb.sql_execute(sql, (key,) + tuple(df.ix[i]))
+
+def read_chunked(bdb, table, df):
+    bayesdb_read_pandas_df(bdb, table, df, create=True)
+
+def timed(name, read, df):
+    with bayesdb_open(':memory:') as bdb:
+        start = time.time()
+        read(bdb, 't', df)
+        elapsed = time.time() - start
+        count = bdb.execute('SELECT COUNT(*) FROM t').fetchvalue()
+    assert count == len(df.index)
+    print '%-10s %8d rows %8.3f s %10.0f rows/s' % \
+        (name, count, elapsed, count / elapsed)
+
+def main(argv):
+    nrows = int(argv[1]) if len(argv) > 1 else 100000
+    df = make_df(nrows)
+    df = df[['x', 'n', 'c']]
+    timed('rowwise', read_rowwise, df)
+    timed('chunked', read_chunked, df)
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+
+#   Copyright (c) 2010-2016, MIT Probabilistic Computing Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+
+"""Benchmark ingestion, analysis, and the BQL query families.
+
+For each dataset -- a synthetic table of configurable rows, columns,
+and statistical types, and the bundled tests/satellites.csv and
+tests/dha.csv -- time the stages of a typical session:
+
+    import      read the CSV file into a new table
+    guess       guess a population schema for the table
+    initialize  create a Crosscat generator and initialize models
+    analyze     analyze the models, one iteration at a time
+    pairwise    ESTIMATE DEPENDENCE PROBABILITY FROM PAIRWISE VARIABLES
+    infer       INFER EXPLICIT PREDICT of one variable
+    simulate    SIMULATE all variables
+    probability ESTIMATE PROBABILITY OF one variable
+    predprob    ESTIMATE PREDICTIVE PROBABILITY OF one variable
+
+Each dataset runs in a fresh child process, so its memory does not
+pollute the next; after each stage we record the child's peak
+resident set size so far.  Results are written as JSON, and may be
+compared against an earlier run.  Run from the top of the source
+tree after building, or with `make bench`:
+
+    ./pythenv.sh python bench/suite.py -o after.json --compare before.json
+"""
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+
+import bayeslite
+
+from bayeslite.guess import bayesdb_guess_population
+from bayeslite.sqlite3_util import sqlite3_quote_name
+from bayeslite.util import cursor_value
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATASETS = {
+    'satellites': os.path.join(root, 'tests', 'satellites.csv'),
+    'dha': os.path.join(root, 'tests', 'dha.csv'),
+}
+NULL_VALUES = ('', 'NaN', 'N/A', 'none', 'None')
+STAGES = ('import', 'guess', 'initialize', 'analyze', 'pairwise', 'infer',
+    'simulate', 'probability', 'predprob')
+
+def peak_rss_kb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes; OS X reports bytes.
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+def make_synthetic(pathname, nrows, ncols, stattypes, seed):
+    """Write a synthetic CSV table with latent cluster structure.
+
+    Column j has statistical type ``stattypes[j % len(stattypes)]``.
+    Each row belongs to one of three latent clusters, and every
+    column depends on the cluster, so there is some structure for
+    the models to find.
+    """
+    prng = random.Random(seed)
+    names = ['c%d' % (j,) for j in xrange(ncols)]
+    kinds = [stattypes[j % len(stattypes)] for j in xrange(ncols)]
+    with open(pathname, 'wb') as f:
+        writer = csv.writer(f)
+        writer.writerow(names)
+        for _i in xrange(nrows):
+            z = prng.randrange(3)
+            row = []
+            for kind in kinds:
+                if prng.random() < 0.05:
+                    row.append('')
+                elif kind == 'numerical':
+                    row.append('%.6g' % (prng.gauss(5*z, 1),))
+                elif kind == 'categorical':
+                    k = z if prng.random() < 0.8 else prng.randrange(6)
+                    row.append('v%d' % (k,))
+                else:
+                    raise ValueError('Unknown synthetic stattype: %r' %
+                        (kind,))
+            writer.writerow(row)
+    return dict(zip(names, kinds))
+
+class Stages(object):
+    def __init__(self):
+        self.results = {}
+
+    def time(self, stage, thunk):
+        t0 = time.time()
+        thunk()
+        t1 = time.time()
+        self.results[stage] = {
+            'seconds': t1 - t0,
+            'peak_rss_kb': peak_rss_kb(),
+        }
+        return self.results[stage]
+
+def run_dataset(name, pathname, args):
+    stages = Stages()
+    seed = struct.pack('<QQQQ', 0, 0, 0, args.seed)
+    with bayeslite.bayesdb_open(seed=seed) as bdb:
+        stages.time('import', lambda: bayeslite.bayesdb_read_csv_file(
+            bdb, 't', pathname, header=True, create=True))
+        columns = [d[0] for d in
+            bdb.sql_execute('SELECT * FROM t LIMIT 1').description]
+        with bdb.savepoint():
+            for column in columns:
+                qc = sqlite3_quote_name(column)
+                bdb.sql_execute('UPDATE t SET %s = NULL WHERE %s IN (%s)' %
+                    (qc, qc, ','.join('?' for _ in NULL_VALUES)), NULL_VALUES)
+        stages.time('guess', lambda: bayesdb_guess_population(
+            bdb, 'p', 't', null_values=set(NULL_VALUES)))
+        variables = bdb.sql_execute('''
+            SELECT v.name, v.stattype
+                FROM bayesdb_variable AS v, bayesdb_population AS p
+                WHERE v.population_id = p.id AND p.name = 'p'
+                ORDER BY v.colno ASC
+        ''').fetchall()
+        numerical = [v for v, st in variables if st == 'numerical']
+        target = numerical[0] if numerical else variables[0][0]
+        qt = sqlite3_quote_name(target)
+        value = cursor_value(bdb.sql_execute(
+            'SELECT %s FROM t WHERE %s IS NOT NULL LIMIT 1' % (qt, qt)))
+
+        def initialize():
+            bdb.execute('CREATE GENERATOR g FOR p USING crosscat()')
+            bdb.execute('INITIALIZE %d MODELS FOR g' % (args.models,))
+        stages.time('initialize', initialize)
+
+        iterations = []
+        def analyze():
+            for _i in xrange(args.iterations):
+                t0 = time.time()
+                bdb.execute('ANALYZE g FOR 1 ITERATION WAIT')
+                iterations.append(time.time() - t0)
+        result = stages.time('analyze', analyze)
+        result['iterations'] = iterations
+        result['seconds_per_iteration'] = \
+            sum(iterations) / max(1, len(iterations))
+
+        def query(bql, bindings=()):
+            return lambda: bdb.execute(bql, bindings).fetchall()
+        stages.time('pairwise', query('''
+            ESTIMATE DEPENDENCE PROBABILITY FROM PAIRWISE VARIABLES OF p
+        '''))
+        stages.time('infer', query('''
+            INFER EXPLICIT PREDICT %s AS prediction CONFIDENCE confidence
+                FROM p LIMIT %d
+        ''' % (qt, args.query_rows)))
+        stages.time('simulate', query('SIMULATE %s FROM p LIMIT %d' %
+            (', '.join(sqlite3_quote_name(v) for v, _st in variables),
+                args.simulate_rows)))
+        stages.time('probability', query('''
+            ESTIMATE PROBABILITY OF %s = ? BY p
+        ''' % (qt,), (value,)))
+        stages.time('predprob', query('''
+            ESTIMATE PREDICTIVE PROBABILITY OF %s FROM p LIMIT %d
+        ''' % (qt, args.query_rows)))
+        nrows = cursor_value(bdb.sql_execute('SELECT COUNT(*) FROM t'))
+    return {
+        'rows': nrows,
+        'columns': len(columns),
+        'variables': dict(variables),
+        'stages': stages.results,
+    }
+
+def child(conn, name, args):
+    try:
+        if name == 'synthetic':
+            tmpdir = tempfile.mkdtemp(prefix='bayeslite-bench')
+            try:
+                pathname = os.path.join(tmpdir, 'synthetic.csv')
+                make_synthetic(pathname, args.rows, args.columns,
+                    args.stattypes.split(','), args.seed)
+                result = run_dataset(name, pathname, args)
+            finally:
+                shutil.rmtree(tmpdir)
+        else:
+            result = run_dataset(name, DATASETS[name], args)
+        conn.send(('ok', result))
+    except Exception as e:
+        conn.send(('error', '%s: %s' % (type(e).__name__, e)))
+    finally:
+        conn.close()
+
+def run_isolated(name, args):
+    parent_conn, child_conn = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=child,
+        args=(child_conn, name, args))
+    process.start()
+    child_conn.close()
+    status, result = parent_conn.recv()
+    process.join()
+    if status != 'ok':
+        raise RuntimeError('Benchmark %s failed: %s' % (name, result))
+    return result
+
+def git_commit():
+    try:
+        with open(os.devnull, 'wb') as devnull:
+            return subprocess.check_output(
+                ['git', 'rev-parse', 'HEAD'], cwd=root, stderr=devnull
+            ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def report(results, baseline=None):
+    for name, dataset in sorted(results['datasets'].iteritems()):
+        print '%s: %d rows x %d columns' % \
+            (name, dataset['rows'], dataset['columns'])
+        old = None
+        if baseline is not None:
+            old = baseline['datasets'].get(name, {}).get('stages')
+        for stage in STAGES:
+            if stage not in dataset['stages']:
+                continue
+            new = dataset['stages'][stage]
+            line = '  %-12s %10.3fs %10d KB' % \
+                (stage, new['seconds'], new['peak_rss_kb'])
+            if old is not None and stage in old:
+                ratio = new['seconds'] / max(old[stage]['seconds'], 1e-9)
+                line += '  (%.2fx of %.3fs)' % (ratio, old[stage]['seconds'])
+            print line
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-o', '--output', metavar='FILE',
+        help='write results as JSON to FILE')
+    parser.add_argument('--compare', metavar='FILE',
+        help='compare timings against earlier JSON results in FILE')
+    parser.add_argument('--dataset', action='append',
+        choices=['synthetic'] + sorted(DATASETS),
+        help='dataset to benchmark (default: all); may be repeated')
+    parser.add_argument('--rows', type=int, default=1000,
+        help='rows in the synthetic table')
+    parser.add_argument('--columns', type=int, default=10,
+        help='columns in the synthetic table')
+    parser.add_argument('--stattypes', default='numerical,categorical',
+        help='comma-separated stattypes cycled over synthetic columns')
+    parser.add_argument('--models', type=int, default=4,
+        help='models to initialize')
+    parser.add_argument('--iterations', type=int, default=3,
+        help='analysis iterations to time')
+    parser.add_argument('--query-rows', type=int, default=100,
+        help='rows for INFER and PREDICTIVE PROBABILITY')
+    parser.add_argument('--simulate-rows', type=int, default=100,
+        help='rows to SIMULATE')
+    parser.add_argument('--seed', type=int, default=0,
+        help='seed for the synthetic data and the BayesDB')
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.compare is not None:
+        with open(args.compare, 'rb') as f:
+            baseline = json.load(f)
+
+    results = {
+        'commit': git_commit(),
+        'version': bayeslite.__version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': time.time(),
+        'parameters': dict(vars(args)),
+        'datasets': {},
+    }
+    for name in args.dataset or ['synthetic'] + sorted(DATASETS):
+        results['datasets'][name] = run_isolated(name, args)
+
+    report(results, baseline)
+    if args.output is not None:
+        with open(args.output, 'wb') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
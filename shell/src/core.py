@@ -17,6 +17,7 @@
 import StringIO
 import apsw
 import cmd
+import time
 import traceback
 import sys
 
@@ -56,6 +57,8 @@ class Shell(cmd.Cmd):
         self._traced = False
         self._sql_traced = False
         self._hooked_filenames = set([])
+        self._limit = None
+        self._timer = False
 
         self._python_globals = {'bayeslite': bayeslite}
 
@@ -69,11 +72,13 @@ class Shell(cmd.Cmd):
         self._installcmd('guess', self.dot_guess)
         self._installcmd('help', self.dot_help)
         self._installcmd('hook', self.dot_hook)
+        self._installcmd('limit', self.dot_limit)
         self._installcmd('open', self.dot_open)
         self._installcmd('pythexec', self.dot_pythexec)
         self._installcmd('python', self.dot_python)
         self._installcmd('read', self.dot_read)
         self._installcmd('sql', self.dot_sql)
+        self._installcmd('timer', self.dot_timer)
         self._installcmd('trace', self.dot_trace)
         self._installcmd('untrace', self.dot_untrace)
 
@@ -132,6 +137,7 @@ class Shell(cmd.Cmd):
             try:
                 first = True
                 for phrase in parse.parse_bql_string(string):
+                    start = time.time()
                     cursor = bql.execute_phrase(self._bdb, phrase)
                     with txn.bayesdb_caching(self._bdb):
                         # Separate the output tables by a blank line.
@@ -139,8 +145,10 @@ class Shell(cmd.Cmd):
                             first = False
                         else:
                             self.stdout.write('\n')
+                        nrows = 0
                         if cursor is not None:
-                            pretty.pp_cursor(self.stdout, cursor)
+                            nrows = self._pp_cursor(cursor)
+                    self._report_time(start, nrows)
             except (bayeslite.BayesDBException, bayeslite.BQLParseError) as e:
                 self.stdout.write('%s\n' % (e,))
             except Exception:
@@ -149,6 +157,19 @@ class Shell(cmd.Cmd):
             self.prompt = self.bql_prompt
         return False
 
+    def _pp_cursor(self, cursor):
+        return pretty.pp_cursor(self.stdout, cursor, limit=self._limit)
+
+    def _report_time(self, start, nrows):
+        if not self._timer:
+            return
+        elapsed = time.time() - start
+        self.stdout.write('Run time: %.3f s, %d %s' %
+            (elapsed, nrows, 'row' if nrows == 1 else 'rows'))
+        if 0 < nrows and 0 < elapsed:
+            self.stdout.write(' (%.1f rows/s)' % (nrows/elapsed,))
+        self.stdout.write('\n')
+
     def dot_help(self, line):
         '''show help for commands
         [<cmd> ...]
@@ -331,13 +352,60 @@ class Shell(cmd.Cmd):
         Execute a SQL query on the underlying SQLite database.
         '''
         try:
-            pretty.pp_cursor(self.stdout, self._bdb.sql_execute(line))
+            start = time.time()
+            nrows = self._pp_cursor(self._bdb.sql_execute(line))
+            self._report_time(start, nrows)
         except apsw.Error as e:
             self.stdout.write('%s\n' % (e,))
         except Exception as e:
             self.stdout.write(traceback.format_exc())
         return False
 
+    def dot_limit(self, line):
+        '''limit rows printed per query
+        [<n>|off]
+
+        Print at most <n> rows of each query's results, and stop
+        reading the query's results there.  With `off', print all
+        rows.  With no argument, show the current limit.
+        '''
+        tokens = line.split()
+        if len(tokens) == 0:
+            if self._limit is None:
+                self.stdout.write('limit off\n')
+            else:
+                self.stdout.write('limit %d\n' % (self._limit,))
+            return
+        if len(tokens) == 1:
+            if casefold(tokens[0]) == 'off':
+                self._limit = None
+                return
+            try:
+                limit = int(tokens[0])
+            except ValueError:
+                pass
+            else:
+                if 0 <= limit:
+                    self._limit = limit
+                    return
+        self.stdout.write('Usage: .limit <n>\n')
+        self.stdout.write('       .limit off\n')
+
+    def dot_timer(self, line):
+        '''report query run times
+        on|off
+
+        After each query, report the time taken to execute it and
+        print its results, with the number of rows printed and the
+        rate in rows per second.
+        '''
+        tokens = line.split()
+        if len(tokens) == 1 and casefold(tokens[0]) in ('on', 'off'):
+            self._timer = casefold(tokens[0]) == 'on'
+        else:
+            self.stdout.write('Usage: .timer on\n')
+            self.stdout.write('       .timer off\n')
+
     def dot_open(self, line):
         '''close existing database and open new one
         <pathname>|-m
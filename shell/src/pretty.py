@@ -14,15 +14,54 @@
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
 
-def pp_cursor(out, cursor):
+import itertools
+
+# Number of rows read before printing anything, from which to compute
+# column widths for the rest of a streamed table.
+PAGE_SIZE = 100
+
+def pp_cursor(out, cursor, limit=None, page_size=None):
+    """Print the rows of `cursor` to `out` as a table.
+
+    Column widths are computed from the first `page_size` rows, which
+    are printed as soon as they have been read; the remaining rows are
+    streamed one at a time with the same widths, so that a large
+    result starts printing promptly and is never held in memory.
+    Values wider than their column in later rows are printed in full,
+    misaligning that row only.
+
+    If `limit` is not None, print at most `limit` rows, and a note if
+    the cursor had more.  Return the number of rows printed.
+    """
     if not cursor.description:
-        return
+        return 0
+    if page_size is None:
+        page_size = PAGE_SIZE
     labels = [d[0] for d in cursor.description]
-    table = cursor.fetchall()
-    pp_list(out, table, labels)
+    rows = iter(cursor)
+    if limit is not None:
+        # Read one past the limit to learn whether we truncated.
+        rows = itertools.islice(rows, limit + 1)
+    page = list(itertools.islice(rows, page_size))
+    colwidths = _pp_colwidths(page, labels)
+    _pp_header(out, labels, colwidths)
+    count = 0
+    for row in itertools.chain(page, rows):
+        if limit is not None and count == limit:
+            out.write('... (output limited to %d rows)\n' % (limit,))
+            break
+        _pp_row(out, row, colwidths)
+        count += 1
+    return count
 
 def pp_list(out, table, labels):
     assert 0 < len(labels)
+    colwidths = _pp_colwidths(table, labels)
+    _pp_header(out, labels, colwidths)
+    for row in table:
+        _pp_row(out, row, colwidths)
+
+def _pp_colwidths(table, labels):
     # XXX Consider quotation/escapes.
     colwidths = [len(label) for label in labels]
     for row in table:
@@ -30,6 +69,9 @@ def pp_list(out, table, labels):
             # XXX Consider quotation/escapes.
             # XXX Combining characters?
             colwidths[colno] = max(colwidths[colno], len(unicode(v)))
+    return colwidths
+
+def _pp_header(out, labels, colwidths):
     first = True
     for colno, label in enumerate(labels):
         if first:
@@ -48,13 +90,14 @@ def pp_list(out, table, labels):
         # XXX Quote/escape.
         out.write('%s' % ('-' * colwidths[colno]))
     out.write('\n')
-    for row in table:
-        first = True
-        for colno, v in enumerate(row):
-            if first:
-                first = False
-            else:
-                out.write(' | ')
-            # XXX Quote/escape.
-            out.write('%*s' % (colwidths[colno], unicode(v)))
-        out.write('\n')
+
+def _pp_row(out, row, colwidths):
+    first = True
+    for colno, v in enumerate(row):
+        if first:
+            first = False
+        else:
+            out.write(' | ')
+        # XXX Quote/escape.
+        out.write('%*s' % (colwidths[colno], unicode(v)))
+    out.write('\n')
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+#   Copyright (c) 2010-2016, MIT Probabilistic Computing Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import argparse
+
+import bayeslite
+from bayeslite.metamodels.crosscat import CrosscatMetamodel
+from bayeslite.server import bayesdb_serve
+from bayeslite.server import parse_address
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('bdbpath', type=str,
+                        help="bayesdb database file")
+    parser.add_argument('address', type=str,
+                        help="Unix socket path, or host:port to listen on")
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help="Max number of jobs (processes) useable.")
+    parser.add_argument('-s', '--seed', type=int, default=None,
+                        help="Random seed for the default generator.")
+    parser.add_argument('-t', '--busy-timeout', type=int, default=None,
+                        help="Milliseconds to wait for the write lock.")
+
+    args = parser.parse_args(argv)
+    return args
+
+
+def run(stdin, stdout, stderr, argv):
+    args = parse_args(argv[1:])
+    bdb = bayeslite.bayesdb_open(pathname=args.bdbpath,
+        builtin_metamodels=False, threaded=True,
+        busy_timeout=args.busy_timeout)
+
+    if args.jobs != 1:
+        import crosscat.MultiprocessingEngine as ccme
+        jobs = args.jobs if args.jobs > 0 else None
+        crosscat = ccme.MultiprocessingEngine(seed=args.seed, cpu_count=jobs)
+    else:
+        import crosscat.LocalEngine as ccle
+        crosscat = ccle.LocalEngine(seed=args.seed)
+    metamodel = CrosscatMetamodel(crosscat)
+    bayeslite.bayesdb_register_metamodel(bdb, metamodel)
+    server = bayesdb_serve(bdb, parse_address(args.address))
+    stdout.write('Serving %s on %s\n' % (args.bdbpath, args.address))
+    stdout.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        bdb.close()
+    return 0
+
+
+def main():
+    import sys
+    sys.exit(run(sys.stdin, sys.stdout, sys.stderr, sys.argv))
+
+if __name__ == '__main__':
+    main()
@@ -58,3 +58,69 @@ def test_pretty_unicomb():
         u'     Zorb |   2 | zorblaxian kibble\n' \
         u'     Zörb |  42 | zörblǎxïǎn kïbble\n' \
         u'     Zörb |  87 |    zørblaxian ﻛِبّﻞ\n'
+
+class _Cursor(object):
+    def __init__(self, labels, rows):
+        self.description = [(label,) for label in labels]
+        self._rows = rows
+    def __iter__(self):
+        return iter(self._rows)
+
+def test_pretty_cursor():
+    labels = ['name', 'age', 'favourite food']
+    table = [
+        ['Spot', 3, 'kibble'],
+        ['Skruffles', 2, 'kibble'],
+        ['Zorb', 2, 'zorblaxian kibble'],
+    ]
+    out_list = StringIO.StringIO()
+    pretty.pp_list(out_list, table, labels)
+    out_cursor = StringIO.StringIO()
+    assert pretty.pp_cursor(out_cursor, _Cursor(labels, table)) == 3
+    assert out_cursor.getvalue() == out_list.getvalue()
+
+def test_pretty_cursor_page():
+    # Widths come from the first page only; later rows overflow.
+    table = [[1], [22], [333]]
+    out = StringIO.StringIO()
+    assert pretty.pp_cursor(out, _Cursor(['x'], table), page_size=2) == 3
+    assert out.getvalue() == \
+        u' x\n' \
+        u'--\n' \
+        u' 1\n' \
+        u'22\n' \
+        u'333\n'
+
+def test_pretty_cursor_streams():
+    # The first page is printed before the rest of the cursor is read.
+    out = StringIO.StringIO()
+    def rows():
+        for i in xrange(10):
+            if i == 3:
+                assert out.getvalue().endswith(u'2\n')
+            yield [i]
+    assert pretty.pp_cursor(out, _Cursor(['x'], rows()), page_size=3) == 10
+
+def test_pretty_cursor_limit():
+    nread = [0]
+    def rows():
+        for i in xrange(1000):
+            nread[0] += 1
+            yield [i]
+    out = StringIO.StringIO()
+    assert pretty.pp_cursor(out, _Cursor(['x'], rows()), limit=2) == 2
+    assert out.getvalue() == \
+        u'x\n' \
+        u'-\n' \
+        u'0\n' \
+        u'1\n' \
+        u'... (output limited to 2 rows)\n'
+    assert nread[0] == 3
+    out = StringIO.StringIO()
+    assert pretty.pp_cursor(out, _Cursor(['x'], [[0], [1]]), limit=2) == 2
+    assert out.getvalue() == u'x\n-\n0\n1\n'
+
+def test_pretty_cursor_empty():
+    out = StringIO.StringIO()
+    assert pretty.pp_cursor(out, _Cursor(['x'], [])) == 0
+    assert out.getvalue() == u'x\n-\n'
@@ -168,11 +168,13 @@ def test_help_returns_list_of_commands(spawnbdb):
         '    .guess    guess population schema',
         '     .help    show help for commands',
         '     .hook    add custom commands from a python source file',
+        '    .limit    limit rows printed per query',
         '     .open    close existing database and open new one',
         ' .pythexec    execute a Python statement',
         '   .python    evaluate a Python expression',
         '     .read    read a file of shell commands',
         '      .sql    execute a SQL query',
+        '    .timer    report query run times',
         '    .trace    trace queries',
         '  .untrace    untrace queries',
         "Type `.help <cmd>' for help on the command <cmd>.",
@@ -392,12 +394,14 @@ def test_hook(spawnbdb):
         '    .guess    guess population schema',
         '     .help    show help for commands',
         '     .hook    add custom commands from a python source file',
+        '    .limit    limit rows printed per query',
         '   .myhook    myhook help string',
         '     .open    close existing database and open new one',
         ' .pythexec    execute a Python statement',
         '   .python    evaluate a Python expression',
         '     .read    read a file of shell commands',
         '      .sql    execute a SQL query',
+        '    .timer    report query run times',
         '    .trace    trace queries',
         '  .untrace    untrace queries',
         "Type `.help <cmd>' for help on the command <cmd>."
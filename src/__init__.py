@@ -52,16 +52,19 @@ You can also execute normal SQL on a BayesDB handle `bdb` with the
 (BQL does not yet support ``CREATE TABLE`` and ``INSERT`` directly, so
 you must use :meth:`~BayesDB.sql_execute` for those.)
 
-When imported, the :mod:`bayeslite` module will notify the MIT
-Probabilistic Computing Project over the internet of the software
-version you are using, and warn if it is out-of-date.  To disable
-this, set the environment variable ``BAYESDB_DISABLE_VERSION_CHECK``
-before import, such as with::
+Importing the :mod:`bayeslite` module does not contact the network.
+To have it notify the MIT Probabilistic Computing Project of the
+software version you are using, and warn if it is out-of-date, set
+the environment variable ``BAYESDB_VERSION_CHECK`` before import,
+such as with::
 
     import os
-    os.environ['BAYESDB_DISABLE_VERSION_CHECK'] = '1'
+    os.environ['BAYESDB_VERSION_CHECK'] = '1'
     import bayeslite
 
+The check then runs in the background without delaying the import.
+Setting ``BAYESDB_DISABLE_VERSION_CHECK`` disables it regardless.
+
 If you would like to analyze your own data with BayesDB, please
 contact bayesdb@mit.edu to participate in our research project.
 """
@@ -74,6 +77,7 @@ from bayeslite.exception import BayesDBException
 from bayeslite.exception import BQLError
 from bayeslite.metamodel import IBayesDBMetamodel
 from bayeslite.metamodel import bayesdb_builtin_metamodel
+from bayeslite.metamodel import bayesdb_builtin_metamodel_factory
 from bayeslite.metamodel import bayesdb_deregister_metamodel
 from bayeslite.metamodel import bayesdb_register_metamodel
 from bayeslite.parse import BQLParseError
@@ -111,21 +115,26 @@ __all__ = [
     'IBayesDBTracer',
 ]
 
-# Register crosscat as a builtin metamodel.
-from bayeslite.metamodels.crosscat import CrosscatMetamodel
-from crosscat.LocalEngine import LocalEngine as CrosscatLocalEngine
-bayesdb_builtin_metamodel(CrosscatMetamodel(CrosscatLocalEngine(seed=0)))
+# Register crosscat and cgpm as builtin metamodels.  Their modules and
+# dependencies are imported only when a BayesDB first uses them.
+def _crosscat_metamodel():
+    from bayeslite.metamodels.crosscat import CrosscatMetamodel
+    from crosscat.LocalEngine import LocalEngine as CrosscatLocalEngine
+    return CrosscatMetamodel(CrosscatLocalEngine(seed=0))
+bayesdb_builtin_metamodel_factory('crosscat', _crosscat_metamodel)
 
-# Register cgpm as a builtin metamodel.
-from bayeslite.metamodels.cgpm_metamodel import CGPM_Metamodel
-bayesdb_builtin_metamodel(CGPM_Metamodel({}, multiprocess=True))
+def _cgpm_metamodel():
+    from bayeslite.metamodels.cgpm_metamodel import CGPM_Metamodel
+    return CGPM_Metamodel({}, multiprocess=True)
+bayesdb_builtin_metamodel_factory('cgpm', _cgpm_metamodel)
 
-import bayeslite.remote
 import os
-if not 'BAYESDB_DISABLE_VERSION_CHECK' in os.environ:
-    bayeslite.remote.version_check()
+if 'BAYESDB_VERSION_CHECK' in os.environ and \
+        'BAYESDB_DISABLE_VERSION_CHECK' not in os.environ:
+    import bayeslite.remote
+    bayeslite.remote.version_check_async()
 
 # Notebooks should contain comment lines documenting this behavior and
 # offering a solution, like so:
-# Please keep BayesDB up to date. To disable remote version checking:
-# import os; os.environ['BAYESDB_DISABLE_VERSION_CHECK'] = '1'
+# Please keep BayesDB up to date. To check for new versions:
+# import os; os.environ['BAYESDB_VERSION_CHECK'] = '1'
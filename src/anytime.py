@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+
+#   Copyright (c) 2010-2016, MIT Probabilistic Computing Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""Anytime estimation of weighted means over models.
+
+A quantity such as mutual information or a probability density is
+estimated in BayesDB by a weighted mean over the models of all
+generators of a population.  An anytime estimate visits the models in
+random order, drawing a batch of Monte Carlo samples from each in
+turn -- or, for quantities a model computes exactly, a single value
+-- and keeps a running estimate with its standard error.  It stops
+when a time limit passes, when the standard error reaches a target,
+or when a limit on the number of samples is reached, whichever comes
+first.
+"""
+
+import math
+import time
+
+# Samples drawn from each model on the first pass.  Each later pass
+# doubles it, up to MAX_BATCH_SAMPLES, so the overhead per call into a
+# model stays small relative to the sampling as the estimate is
+# refined, while each call still returns promptly enough to honour
+# the time limit.
+BATCH_SAMPLES = 10
+MAX_BATCH_SAMPLES = 1000
+
+# Limit on the total number of samples when neither a time limit nor
+# a sample limit is given, so that an unattainable error target does
+# not run forever.
+MAX_SAMPLES = 100000
+
+class AnytimeMean(object):
+    """Running weighted mean of per-model estimates, with standard error.
+
+    Each model has a weight, given in log space, and an unknown value,
+    of which we observe either one exact value or batches of Monte
+    Carlo samples, each batch summarized by its mean.  The estimate is
+    the weighted mean, over the models seen so far, of each model's
+    mean.  Its variance has two parts: the Monte Carlo variance of
+    each model's mean, estimated from the spread of its batches; and,
+    while not all models have been seen, the variance of a ratio
+    estimator over a random subset of the models.
+    """
+
+    def __init__(self, nmodels):
+        self.nmodels = nmodels
+        # key -> [log weight, samples, sum, sum of squares, batches, exact]
+        self._models = {}
+
+    def add(self, key, logweight, value, nsamples=1, exact=False):
+        """Add the mean `value` of a batch of `nsamples` from a model."""
+        model = self._models.get(key)
+        if model is None:
+            model = self._models[key] = [logweight, 0, 0., 0., 0, exact]
+        model[1] += nsamples
+        model[2] += nsamples * value
+        model[3] += nsamples * value * value
+        model[4] += 1
+
+    def __len__(self):
+        return len(self._models)
+
+    def _weights(self):
+        models = self._models.values()
+        maxlogweight = max(model[0] for model in models)
+        weights = [math.exp(model[0] - maxlogweight) for model in models]
+        total = sum(weights)
+        return [(w/total, model) for w, model in zip(weights, models)]
+
+    def value(self):
+        """Current estimate, or None if no models have been seen."""
+        if not self._models:
+            return None
+        return sum(w * model[2]/model[1] for w, model in self._weights())
+
+    def stderr(self):
+        """Standard error of the current estimate, or None if unknown."""
+        k = len(self._models)
+        if k == 0:
+            return None
+        weights = self._weights()
+        theta = sum(w * model[2]/model[1] for w, model in weights)
+        variance = 0.
+        for w, (_logweight, n, total, sumsq, batches, exact) in weights:
+            if exact:
+                continue
+            if batches < 2:
+                return None
+            mean = total/n
+            spread = max(0., sumsq - n*mean*mean) / (batches - 1)
+            variance += w*w * spread/n
+        if k < self.nmodels:
+            if k < 2:
+                return None
+            deviation = sum(w*w * (model[2]/model[1] - theta)**2
+                for w, model in weights)
+            variance += (1 - float(k)/self.nmodels) * k/(k - 1.) * deviation
+        return math.sqrt(variance)
+
+def anytime_estimate(units, sample, seconds=None, error=None,
+        max_samples=None, exact=False, batch_samples=None):
+    """Estimate a weighted mean over `units` within the given limits.
+
+    `units` is a list of models in the order to visit them, normally
+    shuffled.  ``sample(unit, n)`` returns ``(logweight, value)``: the
+    log weight of the model, and the mean of `n` Monte Carlo samples
+    of the quantity under it -- or, if `exact` is true, its exact
+    value, in which case `n` is always 1 and each model is visited
+    once.  If `batch_samples` is given, `n` is always that many
+    instead of a batch that grows with each pass over the models.
+
+    Stop after `seconds`, once the standard error is at most `error`,
+    or after `max_samples` samples in total.  Return a dict with the
+    estimate ``value``, its ``stderr``, the ``samples`` drawn, the
+    ``models`` visited, the elapsed ``seconds``, and why it
+    ``stopped``: ``time``, ``error``, ``samples``, or ``complete``.
+    """
+    if seconds is None and max_samples is None:
+        max_samples = MAX_SAMPLES
+    start = time.time()
+    mean = AnytimeMean(len(units))
+    nsamples = 0
+    batch = BATCH_SAMPLES
+    stopped = None if units else 'complete'
+    while stopped is None:
+        for unit in units:
+            n = 1 if exact else batch_samples or batch
+            if max_samples is not None:
+                n = min(n, max_samples - nsamples)
+            logweight, value = sample(unit, n)
+            mean.add(unit, logweight, value, n, exact)
+            nsamples += n
+            stopped = _stopped(mean, nsamples, start, seconds, error,
+                max_samples)
+            if stopped is not None:
+                break
+        else:
+            if exact:
+                stopped = 'complete'
+        batch = min(2*batch, MAX_BATCH_SAMPLES)
+    return {
+        'value': mean.value(),
+        'stderr': mean.stderr(),
+        'samples': nsamples,
+        'models': len(mean),
+        'seconds': time.time() - start,
+        'stopped': stopped,
+    }
+
+def _stopped(mean, nsamples, start, seconds, error, max_samples):
+    if max_samples is not None and max_samples <= nsamples:
+        return 'samples'
+    if error is not None:
+        stderr = mean.stderr()
+        if stderr is not None and stderr <= error:
+            return 'error'
+    if seconds is not None and start + seconds <= time.time():
+        return 'time'
+    return None
@@ -148,9 +148,15 @@ AnalyzeModels = namedtuple('AnalyzeModels', [
     'seconds',
     'ckpt_iterations',
     'ckpt_seconds',
+    'converge',                 # Converge or None
     'wait',
     'program',
 ])
+# ANALYZE ... UNTIL CONVERGED [WINDOW <n>] [TOLERANCE <x>]
+Converge = namedtuple('Converge', [
+    'window',                   # int or None, number of checkpoints
+    'tolerance',                # float or None, relative change
+])
 DropModels = namedtuple('DropModels', [
     'generator',
     'modelnos',
@@ -160,6 +166,7 @@ Simulate = namedtuple('Simulate', [
     'columns',
     'population',
     'generator',
+    'modelnos',                 # [int], TopModels, or None (all models)
     'constraints',              # [(XXX name, Exp*)]
     'nsamples',                 # Exp* or None
     'accuracy',                 # int or None
@@ -171,6 +178,11 @@ SimulateModels = namedtuple('SimulateModels', [
     'generator',
 ])
 
+# USING TOP <count> MODELS: the best-scoring models of each generator.
+TopModels = namedtuple('TopModels', [
+    'count',                    # int
+])
+
 def is_query(phrase):
     if isinstance(phrase, Select):
         return True
@@ -194,6 +206,11 @@ def is_query(phrase):
         return True
     return False
 
+Explain = namedtuple('Explain', [
+    'query',                    # query phrase
+    'plan',                     # true for EXPLAIN QUERY PLAN
+])
+
 Select = namedtuple('Select', [
     'quantifier',               # SELQUANT_*
     'columns',                  # [SelCol*]
@@ -209,6 +226,7 @@ Estimate = namedtuple('Estimate', [
     'columns',                  # [SelCol*]
     'population',               # XXX name
     'generator',                # XXX name
+    'modelnos',                 # [int], TopModels, or None (all models)
     'condition',                # Exp* or None (unconditional)
     'grouping',                 # Grouping or None
     'order',                    # [Ord] or None (unordered)
@@ -220,6 +238,7 @@ EstBy = namedtuple('EstBy', [
     'columns',                  # [(Exp*, XXX name)]
     'population',               # XXX name
     'generator',                # XXX name
+    'modelnos',                 # [int], TopModels, or None (all models)
 ])
 
 SELQUANT_DISTINCT = 'distinct'
@@ -260,6 +279,7 @@ InferAuto = namedtuple('InferAuto', [
     'nsamples',                 # Exp* or None
     'population',               # XXX name
     'generator',                # XXX name
+    'modelnos',                 # [int], TopModels, or None (all models)
     'condition',                # Exp* or None (unconditional)
     'grouping',                 # Grouping or None
     'order',                    # [Ord] or None (unordered)
@@ -270,6 +290,7 @@ InferExplicit = namedtuple('InferExplicit', [
     'columns',                  # [SelCol* or PredCol]
     'population',               # XXX name
     'generator',                # XXX name
+    'modelnos',                 # [int], TopModels, or None (all models)
     'condition',                # Exp* or None (unconditional)
     'grouping',                 # Grouping or None
     'order',                    # [Ord] or None (unordered)
@@ -286,6 +307,7 @@ EstCols = namedtuple('EstCols', [
     'columns',                  # [SelCol*]
     'population',               # XXX name
     'generator',                # XXX name
+    'modelnos',                 # [int], TopModels, or None (all models)
     'condition',                # Exp* or None (unconditional)
     'order',                    # [Ord] or None (unordered)
     'limit',                    # Lim or None (unlimited),
@@ -296,6 +318,7 @@ EstPairCols = namedtuple('EstPairCols', [
     'population',               # XXX name
     'subcolumns',               # ColList* or None
     'generator',                # XXX name
+    'modelnos',                 # [int], TopModels, or None (all models)
     'condition',                # Exp* or None (unconditional)
     'order',                    # [Ord] or None (unordered)
     'limit',                    # Lim or None (unlimited),
@@ -305,6 +328,7 @@ EstPairRow = namedtuple('EstPairRow', [
     'columns',                  # [SelCol*]
     'population',               # XXX name
     'generator',                # XXX name
+    'modelnos',                 # [int], TopModels, or None (all models)
     'condition',                # Exp* or None (unconditional)
     'order',                    # [Ord] or None (unordered)
     'limit',                    # Lim or None (unlimited),
@@ -388,14 +412,14 @@ OP_NEGATE = 'NEGATE'
 OP_PLUSID = 'PLUSID'
 
 ExpBQLPredProb = namedtuple('ExpBQLPredProb', ['column'])
-ExpBQLProb = namedtuple('ExpBQLProb', ['targets', 'constraints'])
+ExpBQLProb = namedtuple('ExpBQLProb', ['targets', 'constraints', 'budget'])
 ExpBQLProbFn = namedtuple('ExpBQLProbFn', ['value', 'constraints'])
 ExpBQLSim = namedtuple('ExpBQLSim', [
     'ofcondition', 'tocondition', 'column_lists'
 ])
 ExpBQLDepProb = namedtuple('ExpBQLDepProb', ['column0', 'column1'])
 ExpBQLMutInf = namedtuple('ExpBQLMutInf', [
-    'columns0', 'columns1', 'constraints', 'nsamples'
+    'columns0', 'columns1', 'constraints', 'nsamples', 'budget'
 ])
 ExpBQLCorrel = namedtuple('ExpBQLCorrel', ['column0', 'column1'])
 ExpBQLCorrelPval = namedtuple('ExpBQLCorrelPval', ['column0', 'column1'])
@@ -404,6 +428,12 @@ ExpBQLPredict = namedtuple('ExpBQLPredict', [
 ])
 ExpBQLPredictConf = namedtuple('ExpBQLPredictConf', ['column', 'nsamples'])
 
+# Limits for anytime estimation of PROBABILITY OF and MUTUAL INFORMATION.
+Budget = namedtuple('Budget', [
+    'seconds',                  # Exp* or None
+    'error',                    # Exp* or None, maximum standard error
+])
+
 def is_bql(exp):
     if isinstance(exp, ExpBQLPredProb):
         return True
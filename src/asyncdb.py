@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+
+#   Copyright (c) 2010-2016, MIT Probabilistic Computing Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""Non-blocking execution of BQL queries on worker threads.
+
+Python 2 has no asyncio, so :class:`AsyncBayesDB` exposes the same
+shape with threads: :meth:`AsyncBayesDB.execute` returns at once with
+an :class:`AsyncQuery`, whose results arrive in batches as a worker
+thread steps the query.  An event loop can be woken with
+:meth:`AsyncQuery.add_done_callback` instead of blocking on it.
+"""
+
+import Queue
+import threading
+import time
+
+from bayeslite.bayesdb import ThreadedBayesDB
+from bayeslite.exception import BayesDBException
+
+# Number of rows in each batch of results.
+ASYNC_BATCH_ROWS = 1024
+
+# Number of batches a worker may get ahead of the consumer.
+ASYNC_QUEUE_BATCHES = 4
+
+# Seconds between checks for cancellation while waiting on a queue.
+ASYNC_POLL_SECONDS = 0.05
+
+class AsyncBayesDB(object):
+    """Executor of BQL queries on a pool of worker threads.
+
+    With more than one worker, `bdb` must be a threaded BayesDB, from
+    ``bayesdb_open(pathname, threaded=True)``, so that each worker
+    has its own connection.  With a single worker, any BayesDB will
+    do, provided nothing else uses it meanwhile.
+
+    An instance is a context manager that shuts down its workers on
+    exit, but does not close `bdb`.
+    """
+
+    def __init__(self, bdb, nworkers=None):
+        if nworkers is None:
+            nworkers = 4 if isinstance(bdb, ThreadedBayesDB) else 1
+        if nworkers < 1:
+            raise ValueError('Need at least one worker: %r' % (nworkers,))
+        if nworkers > 1 and not isinstance(bdb, ThreadedBayesDB):
+            raise ValueError('Multiple workers need a threaded BayesDB!')
+        self.bdb = bdb
+        self._jobs = Queue.Queue()
+        self._workers = [threading.Thread(target=self._work)
+            for _i in range(nworkers)]
+        for worker in self._workers:
+            worker.daemon = True
+            worker.start()
+
+    def __enter__(self):
+        return self
+    def __exit__(self, *_exc_info):
+        self.close()
+
+    def execute(self, string, bindings=None, timeout=None,
+            batch_size=None):
+        """Start executing a BQL query and return an :class:`AsyncQuery`.
+
+        If `timeout` is not `None`, the query is interrupted and fails
+        with :exc:`BayesDBQueryTimeout` if it has not finished within
+        `timeout` seconds.
+        """
+        if batch_size is None:
+            batch_size = ASYNC_BATCH_ROWS
+        if batch_size < 1:
+            raise ValueError('Batch size must be positive: %r' %
+                (batch_size,))
+        query = AsyncQuery(self.bdb, string, bindings, batch_size)
+        if timeout is not None:
+            query._deadline = time.time() + timeout
+            timer = threading.Timer(timeout, query._expire)
+            timer.daemon = True
+            query._timer = timer
+            timer.start()
+        self._jobs.put(query)
+        return query
+
+    def close(self):
+        """Cancel queries not yet started and stop the workers."""
+        while True:
+            try:
+                query = self._jobs.get_nowait()
+            except Queue.Empty:
+                break
+            if query is not None:
+                query.cancel()
+                query._finish()
+        for _worker in self._workers:
+            self._jobs.put(None)
+        for worker in self._workers:
+            worker.join()
+
+    def _work(self):
+        while True:
+            query = self._jobs.get()
+            if query is None:
+                return
+            query._run()
+
+class AsyncQuery(object):
+    """A BQL query running on a worker thread of an :class:`AsyncBayesDB`.
+
+    Iterate over :meth:`batches` to consume results as they arrive,
+    or call :meth:`result` to wait for all of them.
+    """
+
+    def __init__(self, bdb, string, bindings, batch_size):
+        self._bdb = bdb
+        self._string = string
+        self._bindings = bindings
+        self._batch_size = batch_size
+        self._batches = Queue.Queue(ASYNC_QUEUE_BATCHES)
+        self._lock = threading.Lock()
+        self._connection = None
+        self._cancelled = None  # exception to fail with if cancelled
+        self._deadline = None
+        self._timer = None
+        self._done = threading.Event()
+        self._callbacks = []
+        self._description = None
+        self._error = None
+
+    @property
+    def description(self):
+        """Column description of the results, once the query is ready."""
+        return self._description
+
+    def cancel(self):
+        """Interrupt the query.  Return false if it had already finished."""
+        return self._stop(BayesDBQueryCancelled(self._bdb,
+            'Query cancelled: %r' % (self._string,)))
+
+    def _expire(self):
+        self._stop(BayesDBQueryTimeout(self._bdb,
+            'Query timed out: %r' % (self._string,)))
+
+    def _stop(self, exception):
+        with self._lock:
+            if self._done.is_set() or self._cancelled is not None:
+                return False
+            self._cancelled = exception
+            if self._connection is not None:
+                self._connection.interrupt()
+        return True
+
+    def done(self):
+        return self._done.is_set()
+
+    def add_done_callback(self, callback):
+        """Call ``callback(query)`` when the query finishes or fails.
+
+        The callback runs on the worker thread, or immediately if the
+        query is already done.
+        """
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def batches(self, timeout=None):
+        """Yield lists of result rows as the worker produces them.
+
+        Raise the query's exception, if it fails, after the batches
+        produced before the failure.  If `timeout` is not `None`,
+        give up waiting for a batch after that many seconds with
+        :exc:`BayesDBQueryTimeout`, without cancelling the query.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            try:
+                batch = self._batches.get(timeout=ASYNC_POLL_SECONDS)
+            except Queue.Empty:
+                if self._done.is_set() and self._batches.empty():
+                    break
+                if deadline is not None and time.time() > deadline:
+                    raise BayesDBQueryTimeout(self._bdb,
+                        'Timed out waiting for results: %r' %
+                        (self._string,))
+                continue
+            yield batch
+            if deadline is not None:
+                deadline = time.time() + timeout
+        if self._error is not None:
+            raise self._error
+
+    def result(self, timeout=None):
+        """Wait for the query to finish and return a list of all rows."""
+        rows = []
+        for batch in self.batches(timeout=timeout):
+            rows.extend(batch)
+        return rows
+
+    def _run(self):
+        try:
+            with self._lock:
+                if self._cancelled is not None:
+                    raise self._cancelled
+                self._connection = self._bdb._sqlite3
+            cursor = self._bdb.execute(self._string, self._bindings)
+            self._description = cursor.description
+            while True:
+                batch = cursor.fetchmany(self._batch_size)
+                if self._cancelled is not None:
+                    raise self._cancelled
+                if not batch:
+                    break
+                self._put(batch)
+        except Exception as e:
+            # An interrupted statement fails with apsw.InterruptError;
+            # report why it was interrupted instead.
+            self._error = self._cancelled or e
+        finally:
+            self._finish()
+
+    def _finish(self):
+        with self._lock:
+            self._connection = None
+            if self._timer is not None:
+                self._timer.cancel()
+            if self._error is None and self._cancelled is not None:
+                self._error = self._cancelled
+            self._done.set()
+            callbacks = self._callbacks
+            self._callbacks = []
+        for callback in callbacks:
+            callback(self)
+
+    def _put(self, batch):
+        # Block while the consumer is behind, unless cancelled.
+        while True:
+            if self._cancelled is not None:
+                raise self._cancelled
+            try:
+                self._batches.put(batch, timeout=ASYNC_POLL_SECONDS)
+                return
+            except Queue.Full:
+                pass
+
+class BayesDBQueryCancelled(BayesDBException):
+    """A query was cancelled before it finished."""
+
+    pass
+
+class BayesDBQueryTimeout(BayesDBQueryCancelled):
+    """A query did not finish within its timeout."""
+
+    pass
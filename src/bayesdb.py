@@ -19,11 +19,14 @@ import contextlib
 import numpy.random
 import random
 import struct
+import threading
 
 import bayeslite.bql as bql
 import bayeslite.bqlfn as bqlfn
+import bayeslite.executor as executor
 import bayeslite.metamodel as metamodel
 import bayeslite.parse as parse
+import bayeslite.profiler as profiler
 import bayeslite.schema as schema
 import bayeslite.txn as txn
 import bayeslite.weakprng as weakprng
@@ -33,7 +36,8 @@ from bayeslite.util import cursor_value
 bayesdb_open_cookie = 0xed63e2c26d621a5b5146a334849d43f0
 
 def bayesdb_open(pathname=None, builtin_metamodels=None, seed=None,
-        version=None, compatible=None):
+        version=None, compatible=None, threaded=None, busy_timeout=None,
+        executor=None, shards=None, share_models=None):
     """Open the BayesDB in the file at `pathname`.
 
     If there is no file at `pathname`, it is automatically created.
@@ -49,11 +53,49 @@ def bayesdb_open(pathname=None, builtin_metamodels=None, seed=None,
     bayeslite cannot read it.  If `compatible` is `True`,
     `bayesdb_open` will not incompatibly change the format of the
     database (but some newer bayesdb features may not work).
+
+    If `threaded` is true, return a :class:`ThreadedBayesDB`, which
+    may be used from several threads at once.  It requires a file at
+    `pathname`, which is switched to write-ahead logging.
+    `busy_timeout` is the number of milliseconds for a thread to wait
+    on another thread's write lock before failing.
+
+    If `share_models` is true, the metamodels deserialize each model
+    once and share it among all transactions and threads until it is
+    next written, rather than once per transaction in each thread; see
+    :func:`~bayeslite.txn.bayesdb_share_models`.  Only writes through
+    the returned BayesDB are noticed, so nothing else may write the
+    file while it is open.  Concurrent queries on a threaded BayesDB
+    scale with the number of threads only if it shares its models.
+
+    `executor` is a :class:`~bayeslite.executor.BayesDBExecutor` for
+    evaluating the generators of a population, which defaults to a
+    :class:`~bayeslite.executor.SerialExecutor`.  A concurrent
+    executor such as :class:`~bayeslite.executor.ThreadExecutor`
+    requires `threaded`.
+
+    If `shards` is greater than one, ``CREATE TABLE ... AS`` an
+    ``ESTIMATE`` or ``INFER`` query over a population splits the
+    population's table into that many ranges of rows, evaluated in as
+    many worker processes; see :mod:`bayeslite.shard`.
     """
     if builtin_metamodels is None:
         builtin_metamodels = True
-    bdb = BayesDB(bayesdb_open_cookie, pathname=pathname, seed=seed,
-        version=version, compatible=compatible)
+    if threaded:
+        bdb = ThreadedBayesDB(bayesdb_open_cookie, pathname=pathname,
+            seed=seed, version=version, compatible=compatible,
+            busy_timeout=busy_timeout)
+    elif busy_timeout is not None:
+        raise ValueError('Busy timeout is only for threaded BayesDBs!')
+    else:
+        bdb = BayesDB(bayesdb_open_cookie, pathname=pathname, seed=seed,
+            version=version, compatible=compatible)
+    if executor is not None:
+        bdb.executor = executor
+    if shards is not None:
+        bdb.shards = shards
+    if share_models:
+        txn.bayesdb_share_models(bdb)
     if builtin_metamodels:
         metamodel.bayesdb_register_builtin_metamodels(bdb)
     return bdb
@@ -70,6 +112,10 @@ class BayesDB(object):
             ...
     """
 
+    # Whether other threads may use the database while one is
+    # executing a query.
+    _threaded = False
+
     def __init__(self, cookie, pathname=None, seed=None, version=None,
             compatible=None):
         if cookie != bayesdb_open_cookie:
@@ -77,12 +123,15 @@ class BayesDB(object):
         if pathname is None:
             pathname = ":memory:"
         self.pathname = pathname
-        self._sqlite3 = apsw.Connection(pathname)
+        self._sqlite3 = self._connect()
         self._txn_depth = 0     # managed in txn.py
         self._cache = None      # managed in txn.py
-        self.metamodels = {}
+        self._shared_models = None      # managed in txn.py
+        self._udf_depth = 0     # managed in bqlfn.py
+        self.metamodels = metamodel.BayesDBMetamodels(self)
         self.tracer = None
         self.sql_tracer = None
+        self.profiler = None
         self.temptable = 0
         self.qid = 0
         if seed is None:
@@ -92,6 +141,10 @@ class BayesDB(object):
         self._py_prng = random.Random(pyrseed)
         nprseed = [self._prng.weakrandom32() for _ in range(4)]
         self._np_prng = numpy.random.RandomState(nprseed)
+        self._split = threading.local()     # managed in executor.py
+        self._query_memo = threading.local()    # managed in bqlfn.py
+        self._executor = executor.SerialExecutor()
+        self.shards = 1
         schema.bayesdb_install_schema(self, version=version,
             compatible=compatible)
         bqlfn.bayesdb_install_bql(self._sqlite3, self)
@@ -106,9 +159,34 @@ class BayesDB(object):
     def __exit__(self, *_exc_info):
         self.close()
 
+    def _connect(self):
+        return apsw.Connection(self.pathname)
+
+    def _connect_readonly(self):
+        connection = apsw.Connection(self.pathname,
+            flags=apsw.SQLITE_OPEN_READONLY)
+        bqlfn.bayesdb_install_bql(connection, self)
+        return connection
+
+    def _reopen_readonly(self):
+        # In a forked worker process, switch to a fresh read-only
+        # connection with no transaction in progress.  Return the
+        # inherited connection state, which the caller must keep
+        # alive: closing it in the child would disturb the parent.
+        inherited = (self._sqlite3, self._txn_depth, self._cache)
+        self._sqlite3 = self._connect_readonly()
+        self._txn_depth = 0
+        self._cache = None
+        self._udf_depth = 0
+        # Another thread of the parent may have held the shared
+        # models' lock when we forked.
+        self._shared_models = None
+        return inherited
+
     def close(self):
         """Close the database.  Further use is not allowed."""
         assert self._txn_depth == 0, "pending BayesDB transactions"
+        self._executor.close()
         self._sqlite3.close()
         self._sqlite3 = None
 
@@ -120,7 +198,8 @@ class BayesDB(object):
         initialized from the seed supplied to :func:`bayesdb_open`.
         Use it to conserve reproducibility of results.
         """
-        return self._py_prng
+        prngs = getattr(self._split, 'prngs', None)
+        return self._py_prng if prngs is None else prngs[0]
 
     @property
     def np_prng(self):
@@ -130,7 +209,40 @@ class BayesDB(object):
         initialized from the seed supplied to :func:`bayesdb_open`.
         Use it to conserve reproducibility of results.
         """
-        return self._np_prng
+        prngs = getattr(self._split, 'prngs', None)
+        return self._np_prng if prngs is None else prngs[1]
+
+    @contextlib.contextmanager
+    def _split_prngs(self, seed):
+        # Replace, in this thread, the pseudorandom number generators
+        # by ones seeded with the 32-byte `seed`.
+        prng = weakprng.weakprng(seed)
+        py_prng = random.Random(prng.weakrandom32())
+        np_prng = numpy.random.RandomState(
+            [prng.weakrandom32() for _ in range(4)])
+        saved = getattr(self._split, 'prngs', None)
+        self._split.prngs = (py_prng, np_prng)
+        try:
+            yield
+        finally:
+            self._split.prngs = saved
+
+    @property
+    def executor(self):
+        """The :class:`~bayeslite.executor.BayesDBExecutor` for generators.
+
+        Model estimators, predictions, and simulations over a
+        population with several generators evaluate the generators
+        with it.  Assign a :class:`~bayeslite.executor.ThreadExecutor`
+        to evaluate them concurrently, which requires a BayesDB opened
+        with ``threaded=True``.
+        """
+        return self._executor
+    @executor.setter
+    def executor(self, executor):
+        if executor.concurrent and not self._threaded:
+            raise ValueError('Concurrent executor needs a threaded BayesDB!')
+        self._executor = executor
 
     @property
     def cache(self):
@@ -169,6 +281,30 @@ class BayesDB(object):
         assert self.tracer == tracer
         self.tracer = None
 
+    @contextlib.contextmanager
+    def profile(self):
+        """Profile the queries executed in the context.
+
+        Yields a :class:`~bayeslite.profiler.BayesDBProfile`, which
+        aggregates, for each BQL query executed until the context is
+        exited and in total, the calls and time spent in ``bql_*`` SQL
+        functions, metamodel methods, and SQL statements, and lookups
+        of metamodel caches, along with the rows produced by each
+        query.  Example::
+
+            with bdb.profile() as profile:
+                bdb.execute('ESTIMATE ...').fetchall()
+            json.dump(profile.as_dict(), sys.stdout)
+
+        Only one profile can be in progress at a time.
+        """
+        assert self.profiler is None
+        self.profiler = profiler.BayesDBProfile()
+        try:
+            yield self.profiler
+        finally:
+            self.profiler = None
+
     def sql_trace(self, tracer):
         """Trace execution of SQL queries.
 
@@ -215,6 +351,12 @@ class BayesDB(object):
         """
         if bindings is None:
             bindings = ()
+        if self.profiler is not None:
+            return self.profiler.execute(self._execute_traced, string,
+                bindings)
+        return self._execute_traced(string, bindings)
+
+    def _execute_traced(self, string, bindings):
         return self._maybe_trace(
             self.tracer, self._do_execute, string, bindings)
 
@@ -285,8 +427,38 @@ class BayesDB(object):
             self.sql_tracer, self._do_sql_execute, string, bindings)
 
     def _do_sql_execute(self, string, bindings):
+        if self._udf_depth == 0:
+            # A new top-level query starts with nothing remembered.
+            bqlfn.bayesdb_clear_query_memo(self)
         cursor = self._sqlite3.cursor()
-        cursor.execute(string, bindings)
+        if self.profiler is None:
+            cursor.execute(string, bindings)
+        else:
+            cursor = self.profiler.execute_sql(cursor.execute, string,
+                bindings)
+        return bql.BayesDBCursor(self, cursor)
+
+    def sql_executemany(self, string, seq_of_bindings):
+        """Execute a SQL query repeatedly on the underlying SQLite database.
+
+        The argument `string` is parsed into a single SQL query as for
+        :meth:`~BayesDB.sql_execute`.  It is prepared once and then
+        executed once for each sequence or dictionary of bindings in
+        the sequence `seq_of_bindings`.
+
+        The query is traced once, with the whole sequence of bindings.
+        """
+        return self._maybe_trace(
+            self.sql_tracer, self._do_sql_executemany, string,
+            seq_of_bindings)
+
+    def _do_sql_executemany(self, string, seq_of_bindings):
+        cursor = self._sqlite3.cursor()
+        if self.profiler is None:
+            cursor.executemany(string, seq_of_bindings)
+        else:
+            cursor = self.profiler.execute_sql(cursor.executemany, string,
+                seq_of_bindings)
         return bql.BayesDBCursor(self, cursor)
 
     @contextlib.contextmanager
@@ -354,7 +526,7 @@ class BayesDB(object):
                 database. All prior transactions would be lost.""")
         assert self._txn_depth == 0, "pending BayesDB transactions"
         self._sqlite3.close()
-        self._sqlite3 = apsw.Connection(self.pathname)
+        self._sqlite3 = self._connect()
 
     def changes(self):
         """Return the number of changes of the last INSERT, DELETE, or UPDATE.
@@ -364,6 +536,206 @@ class BayesDB(object):
         """
         return self._sqlite3.changes()
 
+class ThreadedBayesDB(BayesDB):
+    """A BayesDB that may be used from several threads at once.
+
+    Do not create ThreadedBayesDB instances directly; use
+    :func:`bayesdb_open` with ``threaded=True`` instead.
+
+    Each thread gets its own connection to the database file, leased
+    from a pool on first use and returned when the thread exits, and
+    its own transaction depth and cache.  Queries in different threads
+    thus run concurrently.  The database is put in write-ahead logging
+    mode, so readers do not block the writer or each other; SQLite
+    still admits only one writer at a time, and a thread that cannot
+    get the write lock within `busy_timeout` milliseconds fails with
+    :exc:`apsw.BusyError`.
+
+    Metamodel instances, tracers, and the pseudorandom number
+    generators are shared by all threads.  The models themselves are
+    not, unless it is opened with ``share_models=True``: otherwise
+    each thread deserializes every model it consults in each of its
+    transactions, which costs concurrent queries most of what the
+    threads gain.
+    """
+
+    _threaded = True
+
+    def __init__(self, cookie, pathname=None, busy_timeout=None, **kwargs):
+        if pathname is None or pathname == ':memory:':
+            raise ValueError('Threaded BayesDB requires a database file!')
+        if busy_timeout is None:
+            busy_timeout = 5000
+        self._busy_timeout = busy_timeout
+        self._state = ThreadState()
+        self._pool = ConnectionPool(self._connect)
+        self._counter_lock = threading.Lock()
+        super(ThreadedBayesDB, self).__init__(cookie, pathname=pathname,
+            **kwargs)
+        self.sql_execute('PRAGMA journal_mode = WAL').fetchall()
+
+    def _connect(self):
+        connection = apsw.Connection(self.pathname)
+        connection.setbusytimeout(self._busy_timeout)
+        # The constructor installs the BQL functions in the first
+        # connection once the schema is ready.
+        if self._pool.nconnections() > 0:
+            bqlfn.bayesdb_install_bql(connection, self)
+        return connection
+
+    @property
+    def _sqlite3(self):
+        return self._pool.connection()
+    @_sqlite3.setter
+    def _sqlite3(self, connection):
+        self._pool.adopt(connection)
+
+    @property
+    def _txn_depth(self):
+        return self._state.txn_depth
+    @_txn_depth.setter
+    def _txn_depth(self, depth):
+        self._state.txn_depth = depth
+
+    @property
+    def _cache(self):
+        return self._state.cache
+    @_cache.setter
+    def _cache(self, cache):
+        self._state.cache = cache
+
+    @property
+    def _udf_depth(self):
+        return self._state.udf_depth
+    @_udf_depth.setter
+    def _udf_depth(self, depth):
+        self._state.udf_depth = depth
+
+    def close(self):
+        """Close the database and all threads' connections to it."""
+        assert self._txn_depth == 0, "pending BayesDB transactions"
+        self._executor.close()
+        self._pool.close()
+
+    def _connect_readonly(self):
+        connection = super(ThreadedBayesDB, self)._connect_readonly()
+        connection.setbusytimeout(self._busy_timeout)
+        return connection
+
+    def _reopen_readonly(self):
+        inherited = (self._pool, self._state)
+        self._pool = ConnectionPool(self._connect_readonly)
+        self._state = ThreadState()
+        self._shared_models = None
+        return inherited
+
+    def reconnect(self):
+        """Replace this thread's connection with a fresh one."""
+        assert self._txn_depth == 0, "pending BayesDB transactions"
+        self._pool.discard()
+
+    def temp_table_name(self):
+        with self._counter_lock:
+            return super(ThreadedBayesDB, self).temp_table_name()
+
+    def _qid(self):
+        with self._counter_lock:
+            return super(ThreadedBayesDB, self)._qid()
+
+class ThreadState(threading.local):
+    """Transaction and query state of a :class:`ThreadedBayesDB`."""
+
+    def __init__(self):
+        self.txn_depth = 0
+        self.cache = None
+        self.udf_depth = 0
+
+class ConnectionPool(object):
+    """Pool of SQLite connections leased one per thread.
+
+    A thread's lease is held in thread-local storage, so the
+    connection goes back to the pool when the thread exits.
+    """
+
+    def __init__(self, connect):
+        self._connect = connect
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._connections = []
+        self._free = []
+        self._closed = False
+
+    def nconnections(self):
+        with self._lock:
+            return len(self._connections)
+
+    def connection(self):
+        lease = getattr(self._local, 'lease', None)
+        if lease is not None:
+            return lease.connection
+        with self._lock:
+            if self._closed:
+                return None
+            connection = self._free.pop() if self._free else None
+        if connection is None:
+            connection = self._connect()
+            with self._lock:
+                self._connections.append(connection)
+        self._local.lease = ConnectionLease(self, connection)
+        return connection
+
+    def adopt(self, connection):
+        assert getattr(self._local, 'lease', None) is None
+        with self._lock:
+            self._connections.append(connection)
+        self._local.lease = ConnectionLease(self, connection)
+
+    def release(self, connection):
+        # A thread that exited in the middle of a transaction leaves
+        # its connection unfit for reuse.
+        reusable = connection.getautocommit()
+        with self._lock:
+            if self._closed:
+                return
+            if reusable:
+                self._free.append(connection)
+            else:
+                self._connections.remove(connection)
+        if not reusable:
+            connection.close()
+
+    def discard(self):
+        lease = getattr(self._local, 'lease', None)
+        if lease is None:
+            return
+        connection = lease.connection
+        lease.connection = None
+        del self._local.lease
+        with self._lock:
+            self._connections.remove(connection)
+        connection.close()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            connections = self._connections
+            self._connections = []
+            self._free = []
+        if hasattr(self._local, 'lease'):
+            self._local.lease.connection = None
+            del self._local.lease
+        for connection in connections:
+            connection.close()
+
+class ConnectionLease(object):
+    def __init__(self, pool, connection):
+        self._pool = pool
+        self.connection = connection
+
+    def __del__(self):
+        if self.connection is not None:
+            self._pool.release(self.connection)
+
 class IBayesDBTracer(object):
     """BayesDB articulated tracing interface.
 
@@ -500,6 +872,43 @@ class TracingCursor(object):
             self._tracer.error(self._qid, e)
             raise
 
+    def fetch_columns(self):
+        return self._fetch_to_end(self._cursor.fetch_columns)
+
+    def fetch_numpy(self, dtype_map=None):
+        return self._fetch_to_end(self._cursor.fetch_numpy,
+            dtype_map=dtype_map)
+
+    def fetch_numpy_chunks(self, size=None, dtype_map=None):
+        chunks = self._cursor.fetch_numpy_chunks(size=size,
+            dtype_map=dtype_map)
+        while True:
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                self._tracer.finished(self._qid)
+                return
+            except Exception as e:
+                self._tracer.error(self._qid, e)
+                raise
+            yield chunk
+
+    def fetch_dataframe(self, dtype_map=None):
+        return self._fetch_to_end(self._cursor.fetch_dataframe,
+            dtype_map=dtype_map)
+
+    def _fetch_to_end(self, fetch, *args, **kwargs):
+        try:
+            ans = fetch(*args, **kwargs)
+            self._tracer.finished(self._qid)
+            return ans
+        except Exception as e:
+            self._tracer.error(self._qid, e)
+            raise
+
+    def column_names(self):
+        return [d[0] for d in self.description]
+
     @property
     def connection(self):
         return self._cursor.connection
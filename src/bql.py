@@ -26,16 +26,20 @@ language) are executed directly.
 import itertools
 
 import apsw
+import numpy
 
 import bayeslite.ast as ast
 import bayeslite.bqlfn as bqlfn
 import bayeslite.compiler as compiler
 import bayeslite.core as core
+import bayeslite.explain as explain
 import bayeslite.guess as guess
+import bayeslite.shard as shard
 import bayeslite.txn as txn
 
 from bayeslite.exception import BQLError
 from bayeslite.guess import bayesdb_guess_stattypes
+from bayeslite.guess import table_all_distinct
 from bayeslite.read_csv import bayesdb_read_csv_file
 from bayeslite.schema import bayesdb_schema_required
 from bayeslite.sqlite3_util import sqlite3_quote_name
@@ -45,6 +49,7 @@ from bayeslite.util import cursor_value
 
 def execute_phrase(bdb, phrase, bindings=()):
     """Execute the BQL AST phrase `phrase` and return a cursor of results."""
+    bqlfn.bayesdb_clear_query_memo(bdb)
     if isinstance(phrase, ast.Parametrized):
         n_numpar = phrase.n_numpar
         nampar_map = phrase.nampar_map
@@ -66,6 +71,33 @@ def execute_phrase(bdb, phrase, bindings=()):
         return execute_wound(bdb, winders, unwinders, out.getvalue(),
             out.getbindings())
 
+    if isinstance(phrase, ast.Explain):
+        if isinstance(phrase.query, ast.Simulate):
+            # Compiling SIMULATE does the simulation, so don't.
+            if phrase.plan:
+                raise BQLError(bdb, 'No query plan for SIMULATE')
+            with bdb.savepoint():
+                costs = explain.bayesdb_explain_cost(bdb, phrase.query)
+            rows = [('query', 'simulated into a temporary table', None)]
+            rows += [('cost', description, count)
+                for description, count in costs]
+            return literal_cursor(bdb, ['step', 'detail', 'cost'], rows)
+        out = compiler.Output(n_numpar, nampar_map, bindings)
+        with bdb.savepoint():
+            compiler.compile_query(bdb, phrase.query, out)
+            costs = explain.bayesdb_explain_cost(bdb, phrase.query)
+        winders, unwinders = out.getwindings()
+        if phrase.plan:
+            return execute_wound(bdb, winders, unwinders,
+                'EXPLAIN QUERY PLAN %s' % (out.getvalue(),),
+                out.getbindings())
+        rows = [('winder', sql, None) for sql, _bindings in winders]
+        rows.append(('query', out.getvalue(), None))
+        rows += [('unwinder', sql, None) for sql, _bindings in unwinders]
+        rows += [('cost', description, count)
+            for description, count in costs]
+        return literal_cursor(bdb, ['step', 'detail', 'cost'], rows)
+
     if isinstance(phrase, ast.Begin):
         txn.bayesdb_begin_transaction(bdb)
         return empty_cursor(bdb)
@@ -80,6 +112,7 @@ def execute_phrase(bdb, phrase, bindings=()):
 
     if isinstance(phrase, ast.CreateTabAs):
         assert ast.is_query(phrase.query)
+        sharded = shard.bayesdb_shardable(bdb, phrase.query)
         with bdb.savepoint():
             if core.bayesdb_has_table(bdb, phrase.name):
                 if phrase.ifnotexists:
@@ -88,6 +121,10 @@ def execute_phrase(bdb, phrase, bindings=()):
                     raise BQLError(bdb,
                         'Name already defined as table: %s' %
                         (repr(phrase.name),))
+            if sharded:
+                shard.bayesdb_create_table_sharded(bdb, phrase, n_numpar,
+                    nampar_map, bindings)
+                return empty_cursor(bdb)
             out = compiler.Output(n_numpar, nampar_map, bindings)
             qt = sqlite3_quote_name(phrase.name)
             temp = 'TEMP ' if phrase.temp else ''
@@ -242,8 +279,8 @@ def execute_phrase(bdb, phrase, bindings=()):
             qtt = sqlite3_quote_name(temptable)
             cursor = bdb.sql_execute('SELECT * FROM %s' % (qt,))
             column_names = [d[0] for d in cursor.description]
-            rows = cursor.fetchall()
-            stattypes = bayesdb_guess_stattypes(column_names, rows)
+            stattypes = bayesdb_guess_stattypes(column_names, cursor,
+                all_distinct=table_all_distinct(bdb, phrase.table))
             out.winder('''
                 CREATE TEMP TABLE %s (column TEXT, stattype TEXT, reason TEXT)
             ''' % (qtt), ())
@@ -318,9 +355,9 @@ def execute_phrase(bdb, phrase, bindings=()):
                     if cmd.stattype is None:
                         cursor = bdb.sql_execute(
                             'SELECT %s FROM %s' % (qc, qt))
-                        rows = cursor.fetchall()
                         [stattype, reason] = bayesdb_guess_stattypes(
-                            [cmd.name], rows)[0]
+                            [cmd.name], cursor,
+                            all_distinct=table_all_distinct(bdb, table))[0]
                         # Fail if trying to model a key.
                         if stattype == 'key':
                             raise BQLError(bdb,
@@ -621,15 +658,41 @@ def execute_phrase(bdb, phrase, bindings=()):
                 (phrase.generator,))
         generator_id = core.bayesdb_get_generator(bdb, None, phrase.generator)
         metamodel = core.bayesdb_generator_metamodel(bdb, generator_id)
+        kwargs = {}
+        if phrase.converge is not None:
+            window, tolerance = phrase.converge
+            if window is not None and window < 1:
+                raise BQLError(bdb, 'Convergence window must be positive: %r'
+                    % (window,))
+            if tolerance is not None and tolerance < 0:
+                raise BQLError(bdb, 'Convergence tolerance must be'
+                    ' nonnegative: %r' % (tolerance,))
+            # Pass it only if given, for metamodels that predate it.
+            kwargs['converge'] = (window, tolerance)
         # XXX Should allow parameters for iterations and ckpt/iter.
-        metamodel.analyze_models(bdb, generator_id,
+        converged = metamodel.analyze_models(bdb, generator_id,
             modelnos=phrase.modelnos,
             iterations=phrase.iterations,
             max_seconds=phrase.seconds,
             ckpt_iterations=phrase.ckpt_iterations,
             ckpt_seconds=phrase.ckpt_seconds,
-            program=phrase.program)
-        return empty_cursor(bdb)
+            program=phrase.program,
+            **kwargs)
+        if phrase.converge is None:
+            return empty_cursor(bdb)
+        # Report where each model stopped, and whether it converged.
+        sql = '''
+            SELECT modelno, iterations FROM bayesdb_generator_model
+                WHERE generator_id = ?
+                ORDER BY modelno
+        '''
+        rows = [(modelno, iterations, int(modelno in converged))
+            for modelno, iterations in bdb.sql_execute(sql, (generator_id,))
+            if phrase.modelnos is None or modelno in phrase.modelnos]
+        if len(rows) == 0:
+            return empty_cursor(bdb)
+        return literal_cursor(bdb, ['modelno', 'iterations', 'converged'],
+            rows)
 
     if isinstance(phrase, ast.DropModels):
         with bdb.savepoint():
@@ -724,10 +787,10 @@ def _create_population(bdb, phrase):
         qt = sqlite3_quote_name(phrase.table)
         qcns = ','.join(map(sqlite3_quote_name, pop_guess))
         cursor = bdb.sql_execute('SELECT %s FROM %s' % (qcns, qt))
-        rows = cursor.fetchall()
         # XXX This function returns a stattype called `key`, which we will add
         # to the pop_ignore_vars.
-        pop_guess_stattypes = bayesdb_guess_stattypes(pop_guess, rows)
+        pop_guess_stattypes = bayesdb_guess_stattypes(pop_guess, cursor,
+            all_distinct=table_all_distinct(bdb, phrase.table))
         pop_guess_vars = zip(pop_guess, [st[0] for st in pop_guess_stattypes])
         migrate = [(col, st) for col, st in pop_guess_vars if st=='key']
         for col, st in migrate:
@@ -875,6 +938,9 @@ def simulate_models_rows(bdb, simulation):
             raise BQLError(bdb,
                 'PROBABILITY OF simulation still unsupported.')
         elif isinstance(phrase, ast.ExpBQLMutInf):
+            if phrase.budget is not None:
+                raise BQLError(bdb,
+                    'MUTUAL INFORMATION simulation has no time or error limit.')
             colnos0 = [retrieve_variable(c) for c in phrase.columns0]
             colnos1 = [retrieve_variable(c) for c in phrase.columns1]
             constraint_args = ()
@@ -886,8 +952,8 @@ def simulate_models_rows(bdb, simulation):
             nsamples = phrase.nsamples and retrieve_literal(phrase.nsamples)
             # One mi_list per generator of the population.
             mi_lists = bqlfn._bql_column_mutual_information(
-                bdb, population_id, generator_id, colnos0, colnos1, nsamples,
-                *constraint_args)
+                bdb, population_id, generator_id, None, colnos0, colnos1,
+                nsamples, *constraint_args)
             return list(itertools.chain.from_iterable(mi_lists))
         else:
             raise BQLError(bdb,
@@ -902,6 +968,14 @@ def simulate_models_rows(bdb, simulation):
 def empty_cursor(bdb):
     return None
 
+def literal_cursor(bdb, names, rows):
+    assert 0 < len(rows)
+    first = 'SELECT %s' % (', '.join('? AS %s' % (sqlite3_quote_name(name),)
+        for name in names),)
+    rest = 'SELECT %s' % (', '.join('?' for _name in names),)
+    sql = ' UNION ALL '.join([first] + [rest] * (len(rows) - 1))
+    return bdb.sql_execute(sql, [value for row in rows for value in row])
+
 def execute_wound(bdb, winders, unwinders, sql, bindings):
     if len(winders) == 0 and len(unwinders) == 0:
         return bdb.sql_execute(sql, bindings)
@@ -934,17 +1008,84 @@ class BayesDBCursor(object):
     def __iter__(self):
         return self
     def next(self):
-        return self._cursor.next()
+        try:
+            return self._cursor.next()
+        except StopIteration:
+            if self._bdb._udf_depth == 0:
+                bqlfn.bayesdb_clear_query_memo(self._bdb)
+            raise
     def fetchone(self):
         return self._cursor.fetchone()
     def fetchvalue(self):
         return cursor_value(self)
     def fetchmany(self, size=1):
         with txn.bayesdb_caching(self._bdb):
-            return self._cursor.fetchmany(size=size)
+            return self._fetch_chunk(size)
     def fetchall(self):
         with txn.bayesdb_caching(self._bdb):
             return self._cursor.fetchall()
+    def fetch_columns(self):
+        """Fetch all remaining rows as a list of columns.
+
+        Each column is a list of values, in the order of
+        :attr:`description`.
+        """
+        columns = [[] for _d in self._description]
+        with txn.bayesdb_caching(self._bdb):
+            while True:
+                chunk = self._fetch_chunk(FETCH_CHUNK_ROWS)
+                if not chunk:
+                    break
+                for column, values in zip(columns, zip(*chunk)):
+                    column.extend(values)
+        return columns
+    def fetch_numpy(self, dtype_map=None):
+        """Fetch all remaining rows as a list of numpy arrays.
+
+        `dtype_map` maps column names, case-insensitively, to numpy
+        dtypes.  NULL becomes NaN in a float column.  Other columns
+        are given a numeric dtype if all their values are numbers, or
+        else dtype object.
+        """
+        chunks = list(self.fetch_numpy_chunks(dtype_map=dtype_map))
+        if not chunks:
+            dtypes = _column_dtypes(dtype_map, self.column_names())
+            return [_column_array((), dtype) for dtype in dtypes]
+        return [numpy.concatenate(arrays) for arrays in zip(*chunks)]
+    def fetch_numpy_chunks(self, size=None, dtype_map=None):
+        """Yield the remaining rows as lists of numpy arrays.
+
+        Each chunk has one array per column of up to `size` rows,
+        typed as in :meth:`fetch_numpy`.  Only one chunk of rows is
+        held in memory at a time.
+        """
+        if size is None:
+            size = FETCH_CHUNK_ROWS
+        if size < 1:
+            raise ValueError('Chunk size must be positive: %r' % (size,))
+        dtypes = _column_dtypes(dtype_map, self.column_names())
+        while True:
+            with txn.bayesdb_caching(self._bdb):
+                chunk = self._fetch_chunk(size)
+            if not chunk:
+                return
+            yield [_column_array(values, dtype)
+                for values, dtype in zip(zip(*chunk), dtypes)]
+    def fetch_dataframe(self, dtype_map=None):
+        """Fetch all remaining rows as a pandas DataFrame.
+
+        Columns are named and typed as in :meth:`fetch_numpy`.
+        """
+        import pandas
+        arrays = self.fetch_numpy(dtype_map=dtype_map)
+        df = pandas.DataFrame(dict(enumerate(arrays)),
+            columns=range(len(arrays)))
+        df.columns = self.column_names()
+        return df
+    def column_names(self):
+        return [d[0] for d in self._description]
+    def _fetch_chunk(self, size):
+        return list(itertools.islice(self._cursor, size))
     @property
     def connection(self):
         return self._bdb
@@ -955,6 +1096,27 @@ class BayesDBCursor(object):
     def description(self):
         return self._description
 
+# Number of rows fetched at a time by the columnar fetch methods.
+FETCH_CHUNK_ROWS = 4096
+
+def _column_dtypes(dtype_map, names):
+    if dtype_map is None:
+        return [None] * len(names)
+    folded = dict((casefold(name), dtype)
+        for name, dtype in dtype_map.iteritems())
+    return [folded.get(casefold(name)) for name in names]
+
+def _column_array(values, dtype):
+    if dtype is not None:
+        return numpy.array(values, dtype=dtype)
+    array = numpy.array(values)
+    if array.dtype.kind in 'biuf' and len(array) > 0:
+        return array
+    # Strings, blobs, NULLs, and mixtures stay as Python objects.
+    array = numpy.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
 class WoundCursor(BayesDBCursor):
     def __init__(self, bdb, cursor, unwinders):
         self._unwinders = unwinders
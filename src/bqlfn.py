@@ -18,7 +18,9 @@ import json
 import math
 import numpy
 
+import bayeslite.anytime as anytime
 import bayeslite.core as core
+import bayeslite.executor as executor
 import bayeslite.stats as stats
 
 from bayeslite.exception import BQLError
@@ -32,20 +34,52 @@ from bayeslite.util import casefold
 
 def bayesdb_install_bql(db, cookie):
     def function(name, nargs, fn):
-        db.createscalarfunction(name, (lambda *args: fn(cookie, *args)), nargs)
+        def call(*args):
+            # Count nesting so that tracers can tell SQL queries issued
+            # while computing a function from the caller's own.
+            cookie._udf_depth += 1
+            try:
+                profiler = cookie.profiler
+                if profiler is None:
+                    return fn(cookie, *args)
+                with profiler.timing('udfs', name):
+                    return fn(cookie, *args)
+            finally:
+                cookie._udf_depth -= 1
+        db.createscalarfunction(name, call, nargs)
+    def model_function(name, nargs, fn, fn_using_models):
+        # A query with USING MODELS calls name_using_models, which
+        # takes the selected models after the generator id.
+        function(name, nargs, fn)
+        function(name + "_using_models", nargs if nargs < 0 else nargs + 1,
+            fn_using_models)
     function("bql_column_correlation", 4, bql_column_correlation)
     function("bql_column_correlation_pvalue", 4, bql_column_correlation_pvalue)
-    function("bql_column_dependence_probability", 4,
-        bql_column_dependence_probability)
-    function("bql_column_mutual_information", -1, bql_column_mutual_information)
-    function("bql_column_value_probability", -1, bql_column_value_probability)
-    function("bql_row_similarity", -1, bql_row_similarity)
-    function("bql_row_column_predictive_probability", 4,
-        bql_row_column_predictive_probability)
-    function("bql_predict", 6, bql_predict)
-    function("bql_predict_confidence", 5, bql_predict_confidence)
+    model_function("bql_column_dependence_probability", 4,
+        bql_column_dependence_probability,
+        bql_column_dependence_probability_using_models)
+    model_function("bql_column_mutual_information", -1,
+        bql_column_mutual_information,
+        bql_column_mutual_information_using_models)
+    model_function("bql_column_mutual_information_anytime", -1,
+        bql_column_mutual_information_anytime,
+        bql_column_mutual_information_anytime_using_models)
+    model_function("bql_column_value_probability", -1,
+        bql_column_value_probability,
+        bql_column_value_probability_using_models)
+    model_function("bql_row_similarity", -1, bql_row_similarity,
+        bql_row_similarity_using_models)
+    model_function("bql_row_column_predictive_probability", -1,
+        bql_row_column_predictive_probability,
+        bql_row_column_predictive_probability_using_models)
+    model_function("bql_predict", -1, bql_predict, bql_predict_using_models)
+    model_function("bql_predict_confidence", -1, bql_predict_confidence,
+        bql_predict_confidence_using_models)
     function("bql_json_get", 2, bql_json_get)
-    function("bql_pdf_joint", -1, bql_pdf_joint)
+    model_function("bql_pdf_joint", -1, bql_pdf_joint,
+        bql_pdf_joint_using_models)
+    model_function("bql_pdf_joint_anytime", -1, bql_pdf_joint_anytime,
+        bql_pdf_joint_anytime_using_models)
 
 ### BayesDB column functions
 
@@ -285,23 +319,39 @@ define_correlation('categorical', 'nominal', correlation_cramerphi)
 # Two-column function:  DEPENDENCE PROBABILITY [OF <col0> WITH <col1>]
 def bql_column_dependence_probability(
         bdb, population_id, generator_id, colno0, colno1):
+    return bql_column_dependence_probability_using_models(
+        bdb, population_id, generator_id, None, colno0, colno1)
+
+def bql_column_dependence_probability_using_models(
+        bdb, population_id, generator_id, modelnos, colno0, colno1):
+    modelnos = _json_modelnos(modelnos)
     def generator_depprob(generator_id):
         metamodel = core.bayesdb_generator_metamodel(bdb, generator_id)
         return metamodel.column_dependence_probability(
-            bdb, generator_id, None, colno0, colno1)
+            bdb, generator_id, _modelno(modelnos, generator_id),
+            colno0, colno1)
     generator_ids = _retrieve_generator_ids(bdb, population_id, generator_id)
-    depprobs = map(generator_depprob, generator_ids)
+    depprobs = executor.bayesdb_map_generators(bdb, generator_depprob,
+        generator_ids)
     return stats.arithmetic_mean(depprobs)
 
 # Two-column function:  MUTUAL INFORMATION [OF <col0> WITH <col1>]
 def bql_column_mutual_information(
         bdb, population_id, generator_id, colnos0, colnos1,
         numsamples, *constraint_args):
+    return bql_column_mutual_information_using_models(
+        bdb, population_id, generator_id, None, colnos0, colnos1,
+        numsamples, *constraint_args)
+
+def bql_column_mutual_information_using_models(
+        bdb, population_id, generator_id, modelnos, colnos0, colnos1,
+        numsamples, *constraint_args):
+    modelnos = _json_modelnos(modelnos)
     colnos0 = json.loads(colnos0)
     colnos1 = json.loads(colnos1)
     mutinfs = _bql_column_mutual_information(
-        bdb, population_id, generator_id, colnos0, colnos1, numsamples,
-        *constraint_args)
+        bdb, population_id, generator_id, modelnos, colnos0, colnos1,
+        numsamples, *constraint_args)
     # XXX This integral of the CMI returned by each model of all generators in
     # in the population is wrong! At least, it does not directly correspond to
     # any meaningful probabilistic quantity, other than literally the mean CMI
@@ -309,24 +359,66 @@ def bql_column_mutual_information(
     return stats.arithmetic_mean([stats.arithmetic_mean(m) for m in mutinfs])
 
 def _bql_column_mutual_information(
-        bdb, population_id, generator_id, colnos0, colnos1, numsamples,
-        *constraint_args):
-    if len(constraint_args) % 2 == 1:
-        raise ValueError('Odd constraint arguments: %s.' % (constraint_args))
-    constraints = zip(constraint_args[::2], constraint_args[1::2]) \
-        if constraint_args else None
+        bdb, population_id, generator_id, modelnos, colnos0, colnos1,
+        numsamples, *constraint_args):
+    constraints = _mutinf_constraints(constraint_args)
     def generator_mutinf(generator_id):
         metamodel = core.bayesdb_generator_metamodel(bdb, generator_id)
         return metamodel.column_mutual_information(
-            bdb, generator_id, None, colnos0, colnos1,
+            bdb, generator_id, _modelno(modelnos, generator_id),
+            colnos0, colnos1,
             constraints=constraints, numsamples=numsamples)
     generator_ids = _retrieve_generator_ids(bdb, population_id, generator_id)
-    mutinfs = map(generator_mutinf, generator_ids)
+    mutinfs = executor.bayesdb_map_generators(bdb, generator_mutinf,
+        generator_ids)
     return mutinfs
 
+def _mutinf_constraints(constraint_args):
+    if len(constraint_args) % 2 == 1:
+        raise ValueError('Odd constraint arguments: %s.' % (constraint_args))
+    return zip(constraint_args[::2], constraint_args[1::2]) \
+        if constraint_args else None
+
+# Two-column function:  MUTUAL INFORMATION [OF <col0> WITH <col1>]
+#   FOR <seconds> SECONDS MAX ERROR <error>
+def bql_column_mutual_information_anytime(
+        bdb, population_id, generator_id, colnos0, colnos1,
+        numsamples, seconds, error, *constraint_args):
+    return bql_column_mutual_information_anytime_using_models(
+        bdb, population_id, generator_id, None, colnos0, colnos1,
+        numsamples, seconds, error, *constraint_args)
+
+def bql_column_mutual_information_anytime_using_models(
+        bdb, population_id, generator_id, modelnos, colnos0, colnos1,
+        numsamples, seconds, error, *constraint_args):
+    modelnos = _json_modelnos(modelnos)
+    colnos0 = json.loads(colnos0)
+    colnos1 = json.loads(colnos1)
+    constraints = _mutinf_constraints(constraint_args)
+    _check_anytime_limits(bdb, seconds, error)
+    def sample(unit, n):
+        generator_id, modelno, logweight = unit
+        metamodel = core.bayesdb_generator_metamodel(bdb, generator_id)
+        mi = metamodel.column_mutual_information(
+            bdb, generator_id, modelno, colnos0, colnos1,
+            constraints=constraints, numsamples=n)
+        if isinstance(mi, (list, tuple)):
+            mi = stats.arithmetic_mean(mi)
+        return logweight, mi
+    units = _anytime_models(bdb, population_id, generator_id, modelnos)
+    result = anytime.anytime_estimate(units, sample, seconds=seconds,
+        error=error, batch_samples=numsamples)
+    _anytime_report(bdb, 'MUTUAL INFORMATION', result)
+    return result['value']
+
 # One-column function:  PROBABILITY OF <col>=<value> GIVEN <constraints>
 def bql_column_value_probability(bdb, population_id, generator_id, colno,
         value, *constraint_args):
+    return bql_column_value_probability_using_models(bdb, population_id,
+        generator_id, None, colno, value, *constraint_args)
+
+def bql_column_value_probability_using_models(bdb, population_id,
+        generator_id, modelnos, colno, value, *constraint_args):
     constraints = []
     i = 0
     while i < len(constraint_args):
@@ -338,13 +430,55 @@ def bql_column_value_probability(bdb, population_id, generator_id, colno,
         constraints.append((constraint_colno, constraint_value))
         i += 2
     targets = [(colno, value)]
-    logp = _bql_logpdf(bdb, population_id, generator_id, targets, constraints)
+    logp = _bql_logpdf(bdb, population_id, generator_id,
+        _json_modelnos(modelnos), targets, constraints)
     return ieee_exp(logp)
 
 # XXX This is silly.  We should return log densities, not densities.
 # This is Github issue #360:
 # https://github.com/probcomp/bayeslite/issues/360
 def bql_pdf_joint(bdb, population_id, generator_id, *args):
+    return bql_pdf_joint_using_models(bdb, population_id, generator_id, None,
+        *args)
+
+def bql_pdf_joint_using_models(bdb, population_id, generator_id, modelnos,
+        *args):
+    targets, constraints = _pdf_joint_args(args)
+    logp = _bql_logpdf(bdb, population_id, generator_id,
+        _json_modelnos(modelnos), targets, constraints)
+    return ieee_exp(logp)
+
+# Constant:  PROBABILITY OF ... FOR <seconds> SECONDS MAX ERROR <error>
+def bql_pdf_joint_anytime(bdb, population_id, generator_id, seconds, error,
+        *args):
+    return bql_pdf_joint_anytime_using_models(bdb, population_id,
+        generator_id, None, seconds, error, *args)
+
+def bql_pdf_joint_anytime_using_models(bdb, population_id, generator_id,
+        modelnos, seconds, error, *args):
+    modelnos = _json_modelnos(modelnos)
+    targets, constraints = _pdf_joint_args(args)
+    _check_anytime_limits(bdb, seconds, error)
+    rowid, constraints = _retrieve_rowid_constraints(
+        bdb, population_id, constraints)
+    # Weigh each model by the likelihood of the constraints, as in
+    # _bql_logpdf, and estimate the weighted mean of the density.
+    def sample(unit, _n):
+        generator_id, modelno, logweight = unit
+        metamodel = core.bayesdb_generator_metamodel(bdb, generator_id)
+        logp = metamodel.logpdf_joint(
+            bdb, generator_id, rowid, targets, constraints, modelno)
+        if constraints:
+            logweight += metamodel.logpdf_joint(
+                bdb, generator_id, rowid, constraints, [], modelno)
+        return logweight, ieee_exp(logp)
+    units = _anytime_models(bdb, population_id, generator_id, modelnos)
+    result = anytime.anytime_estimate(units, sample, seconds=seconds,
+        error=error, exact=True)
+    _anytime_report(bdb, 'PROBABILITY DENSITY', result)
+    return result['value']
+
+def _pdf_joint_args(args):
     i = 0
     targets = []
     while i < len(args):
@@ -366,10 +500,10 @@ def bql_pdf_joint(bdb, population_id, generator_id, *args):
         c_value = args[i + 1]
         constraints.append((c_colno, c_value))
         i += 2
-    logp = _bql_logpdf(bdb, population_id, generator_id, targets, constraints)
-    return ieee_exp(logp)
+    return targets, constraints
 
-def _bql_logpdf(bdb, population_id, generator_id, targets, constraints):
+def _bql_logpdf(bdb, population_id, generator_id, modelnos, targets,
+        constraints):
     # P(T | C) = \sum_M P(T, M | C)
     # = \sum_M P(T | C, M) P(M | C)
     # = \sum_M P(T | C, M) P(M) P(C | M) / P(C)
@@ -381,30 +515,50 @@ def _bql_logpdf(bdb, population_id, generator_id, targets, constraints):
     # generator uniformly; eventually, we ought to allow the user to
     # specify a prior weight (XXX and update some kind of posterior
     # weight?).
+    queries = _conditioned_queries(bdb, population_id, generator_id,
+        modelnos, constraints)
+    def generator_logpdf(query):
+        # Return loglikelihood(M) and logpdf(M) together.
+        return query.loglikelihood(), query.logpdf(targets)
+    results = executor.bayesdb_map_generators(bdb, generator_logpdf, queries)
+    loglikelihoods = [loglikelihood for loglikelihood, _logpdf in results]
+    logpdfs = [logpdf for _loglikelihood, logpdf in results]
+    return logavgexp_weighted(loglikelihoods, logpdfs)
+
+def _conditioned_queries(bdb, population_id, generator_id, modelnos,
+        constraints):
+    # Condition each generator on the constraints.  A query evaluating
+    # many targets under the same constraints, one after another --
+    # say, PROBABILITY DENSITY OF x = t.v GIVEN (y = 3) over a grid of
+    # t.v -- conditions only once, for the first.
+    key = (population_id, generator_id, modelnos, constraints)
+    memo = bdb._query_memo
+    entry = getattr(memo, 'conditioned', None)
+    if entry is not None and entry[0] == key:
+        return entry[1]
     rowid, constraints = _retrieve_rowid_constraints(
         bdb, population_id, constraints)
-    def logpdf(generator_id, metamodel):
-        return metamodel.logpdf_joint(
-            bdb, generator_id, rowid, targets, constraints, None)
-    def loglikelihood(generator_id, metamodel):
-        if not constraints:
-            return 0
-        return metamodel.logpdf_joint(
-            bdb, generator_id, rowid, constraints, [], None)
-    generator_ids = _retrieve_generator_ids(bdb, population_id, generator_id)
-    metamodels = [
-        core.bayesdb_generator_metamodel(bdb, g)
-        for g in generator_ids
-    ]
-    loglikelihoods = map(loglikelihood, generator_ids, metamodels)
-    logpdfs = map(logpdf, generator_ids, metamodels)
-    return logavgexp_weighted(loglikelihoods, logpdfs)
+    queries = []
+    for generator_id_ in _retrieve_generator_ids(bdb, population_id,
+            generator_id):
+        metamodel = core.bayesdb_generator_metamodel(bdb, generator_id_)
+        queries.append(metamodel.condition(bdb, generator_id_, rowid,
+            constraints, _modelno(modelnos, generator_id_)))
+    memo.conditioned = (key, queries)
+    return queries
 
 ### BayesDB row functions
 
 # Row function:  SIMILARITY TO <target_row> [WITH RESPECT TO <columns>]
 def bql_row_similarity(
         bdb, population_id, generator_id, rowid, target_rowid, *colnos):
+    return bql_row_similarity_using_models(
+        bdb, population_id, generator_id, None, rowid, target_rowid, *colnos)
+
+def bql_row_similarity_using_models(
+        bdb, population_id, generator_id, modelnos, rowid, target_rowid,
+        *colnos):
+    modelnos = _json_modelnos(modelnos)
     if target_rowid is None:
         raise BQLError(bdb, 'No such target row for SIMILARITY')
     if len(colnos) == 0:
@@ -416,14 +570,26 @@ def bql_row_similarity(
     def generator_similarity(generator_id):
         metamodel = core.bayesdb_generator_metamodel(bdb, generator_id)
         return metamodel.row_similarity(
-            bdb, generator_id, None, rowid, target_rowid, colnos)
+            bdb, generator_id, _modelno(modelnos, generator_id),
+            rowid, target_rowid, colnos)
     generator_ids = _retrieve_generator_ids(bdb, population_id, generator_id)
-    similarities = map(generator_similarity, generator_ids)
+    similarities = executor.bayesdb_map_generators(bdb,
+        generator_similarity, generator_ids)
     return stats.arithmetic_mean(similarities)
 
 # Row function:  PREDICTIVE PROBABILITY OF <column>
 def bql_row_column_predictive_probability(
-        bdb, population_id, generator_id, rowid, colno):
+        bdb, population_id, generator_id, rowid, colno, colnos=None):
+    return bql_row_column_predictive_probability_using_models(
+        bdb, population_id, generator_id, None, rowid, colno, colnos)
+
+def bql_row_column_predictive_probability_using_models(
+        bdb, population_id, generator_id, modelnos, rowid, colno,
+        colnos=None):
+    if colnos is not None:
+        probabilities = _predictive_probabilities(bdb, population_id,
+            generator_id, modelnos, rowid, colnos)
+        return probabilities.get(colno)
     value = core.bayesdb_population_cell_value(bdb, population_id, rowid, colno)
     if value is None:
         return None
@@ -438,31 +604,105 @@ def bql_row_column_predictive_probability(
         for (col, value) in zip(variable_numbers, row_values)
         if (value is not None) and (col != colno)
     ]
+    modelnos = _json_modelnos(modelnos)
     def generator_predprob(generator_id):
         metamodel = core.bayesdb_generator_metamodel(bdb, generator_id)
         return metamodel.logpdf_joint(
-            bdb, generator_id, fresh_rowid, query, constraints, None)
+            bdb, generator_id, fresh_rowid, query, constraints,
+            _modelno(modelnos, generator_id))
     generator_ids = _retrieve_generator_ids(bdb, population_id, generator_id)
-    predprobs = map(generator_predprob, generator_ids)
+    predprobs = executor.bayesdb_map_generators(bdb, generator_predprob,
+        generator_ids)
     r = logmeanexp(predprobs)
     return ieee_exp(r)
 
+def _predictive_probabilities(bdb, population_id, generator_id, modelnos,
+        rowid, colnos):
+    # An ESTIMATE query of the predictive probabilities of the columns
+    # `colnos` (a JSON list) evaluates each column of a row in turn.
+    # The first computes them all at once, each given the rest of the
+    # row, and the rest read them back.
+    key = (population_id, generator_id, modelnos, rowid, colnos)
+    memo = bdb._query_memo
+    entry = getattr(memo, 'predictive_probabilities', None)
+    if entry is not None and entry[0] == key:
+        return entry[1]
+    row_values = core.bayesdb_population_row_values(bdb, population_id, rowid)
+    variable_numbers = core.bayesdb_variable_numbers(bdb, population_id, None)
+    wanted = set(json.loads(colnos))
+    targets = []
+    constraints = []
+    for col, value in zip(variable_numbers, row_values):
+        if value is None:
+            continue
+        if col in wanted:
+            targets.append((col, value))
+        else:
+            constraints.append((col, value))
+    # Build the queries from rowid, using a fresh rowid.
+    fresh_rowid = core.bayesdb_population_fresh_row_id(bdb, population_id)
+    modelnos_ = _json_modelnos(modelnos)
+    def generator_predprobs(generator_id):
+        metamodel = core.bayesdb_generator_metamodel(bdb, generator_id)
+        return metamodel.logpdf_leave_one_out(
+            bdb, generator_id, fresh_rowid, targets, constraints,
+            _modelno(modelnos_, generator_id))
+    probabilities = {}
+    if targets:
+        generator_ids = _retrieve_generator_ids(bdb, population_id,
+            generator_id)
+        predprobs = executor.bayesdb_map_generators(bdb, generator_predprobs,
+            generator_ids)
+        for i, (col, _value) in enumerate(targets):
+            r = logmeanexp([logps[i] for logps in predprobs])
+            probabilities[col] = ieee_exp(r)
+    memo.predictive_probabilities = (key, probabilities)
+    return probabilities
+
 ### Predict and simulate
 
 def bql_predict(
-        bdb, population_id, generator_id, rowid, colno, threshold, numsamples):
+        bdb, population_id, generator_id, rowid, colno, threshold,
+        numsamples, colnos=None):
+    return bql_predict_using_models(
+        bdb, population_id, generator_id, None, rowid, colno, threshold,
+        numsamples, colnos)
+
+def bql_predict_using_models(
+        bdb, population_id, generator_id, modelnos, rowid, colno, threshold,
+        numsamples, colnos=None):
+    if colnos is not None:
+        value, confidence = _predict_joint(bdb, population_id, generator_id,
+            modelnos, rowid, colno, numsamples, colnos)
+        if confidence < threshold:
+            return None
+        return value
     # XXX Randomly sample 1 generator from the population, until we figure out
     # how to aggregate imputations across different hypotheses.
     if generator_id is None:
         generator_ids = core.bayesdb_population_generators(bdb, population_id)
         index = bdb.np_prng.randint(0, high=len(generator_ids))
         generator_id = generator_ids[index]
+    modelno = _modelno(_json_modelnos(modelnos), generator_id)
     metamodel = core.bayesdb_generator_metamodel(bdb, generator_id)
     return metamodel.predict(
-        bdb, generator_id, None, rowid, colno, threshold, numsamples=numsamples)
+        bdb, generator_id, modelno, rowid, colno, threshold,
+        numsamples=numsamples)
 
 def bql_predict_confidence(
-        bdb, population_id, generator_id, rowid, colno, numsamples):
+        bdb, population_id, generator_id, rowid, colno, numsamples,
+        colnos=None):
+    return bql_predict_confidence_using_models(
+        bdb, population_id, generator_id, None, rowid, colno, numsamples,
+        colnos)
+
+def bql_predict_confidence_using_models(
+        bdb, population_id, generator_id, modelnos, rowid, colno, numsamples,
+        colnos=None):
+    if colnos is not None:
+        value, confidence = _predict_joint(bdb, population_id, generator_id,
+            modelnos, rowid, colno, numsamples, colnos)
+        return json.dumps({'value': value, 'confidence': confidence})
     # XXX Do real imputation here!
     # XXX Randomly sample 1 generator from the population, until we figure out
     # how to aggregate imputations across different hypotheses.
@@ -470,19 +710,79 @@ def bql_predict_confidence(
         generator_ids = core.bayesdb_population_generators(bdb, population_id)
         index = bdb.np_prng.randint(0, high=len(generator_ids))
         generator_id = generator_ids[index]
+    modelno = _modelno(_json_modelnos(modelnos), generator_id)
     metamodel = core.bayesdb_generator_metamodel(bdb, generator_id)
     value, confidence = metamodel.predict_confidence(
-        bdb, generator_id, None, rowid, colno, numsamples=numsamples)
+        bdb, generator_id, modelno, rowid, colno, numsamples=numsamples)
     # XXX Whattakludge!
     return json.dumps({'value': value, 'confidence': confidence})
 
+def _predict_joint(bdb, population_id, generator_id, modelnos, rowid, colno,
+        numsamples, colnos):
+    # An INFER query predicting the columns `colnos` (a JSON list)
+    # evaluates the prediction of each column of a row in turn.  The
+    # first predicts every column missing from the row at once, and
+    # the rest take their predictions from it, each once -- or twice
+    # in a row, for the value and the confidence of one prediction.
+    # A column asked for again, or in another row, starts afresh.
+    key = (population_id, generator_id, modelnos, rowid, numsamples, colnos)
+    memo = bdb._query_memo
+    entry = getattr(memo, 'prediction', None)
+    if entry is None or entry[0] != key:
+        entry = (key, {}, None)
+    _key, remaining, last = entry
+    if last is not None and last[0] == colno:
+        return last[1]
+    if colno in remaining:
+        prediction = remaining.pop(colno)
+    else:
+        variable_numbers = core.bayesdb_variable_numbers(bdb, population_id,
+            None)
+        row_values = core.bayesdb_population_row_values(bdb, population_id,
+            rowid)
+        observed = set(varno
+            for varno, value in zip(variable_numbers, row_values)
+            if value is not None)
+        targets = [c for c in json.loads(colnos) if c not in observed]
+        # XXX Randomly sample 1 generator, as above, for the whole row.
+        if generator_id is None:
+            generator_ids = core.bayesdb_population_generators(bdb,
+                population_id)
+            index = bdb.np_prng.randint(0, high=len(generator_ids))
+            generator_id = generator_ids[index]
+        modelno = _modelno(_json_modelnos(modelnos), generator_id)
+        metamodel = core.bayesdb_generator_metamodel(bdb, generator_id)
+        if colno in targets:
+            predictions = metamodel.predict_confidence_joint(bdb,
+                generator_id, modelno, rowid, targets, numsamples=numsamples)
+            remaining = dict(zip(targets, predictions))
+            prediction = remaining.pop(colno)
+        else:
+            # Predict an observed column given all the others, as usual.
+            prediction = metamodel.predict_confidence(bdb, generator_id,
+                modelno, rowid, colno, numsamples=numsamples)
+    memo.prediction = (key, remaining, (colno, prediction))
+    return prediction
+
+def bayesdb_clear_query_memo(bdb):
+    """Forget what the last BQL query remembered from row to row.
+
+    Called before each query, when a query's rows are exhausted, and
+    when a transaction ends, so that a query never sees another's
+    predictions, predictive probabilities, or conditioned models, nor
+    models that have since changed.
+    """
+    bdb._query_memo.prediction = None
+    bdb._query_memo.conditioned = None
+    bdb._query_memo.predictive_probabilities = None
+
 # XXX Whattakludge!
 def bql_json_get(bdb, blob, key):
     return json.loads(blob)[key]
 
 def bayesdb_simulate(
         bdb, population_id, constraints, colnos, generator_id=None,
-        numpredictions=1, accuracy=None):
+        numpredictions=1, accuracy=None, modelnos=None):
     """Simulate rows from a generative model, subject to constraints.
 
     Returns a list of `numpredictions` tuples, with a value for each
@@ -490,27 +790,31 @@ def bayesdb_simulate(
     constraints in the list `constraints` of tuples ``(colno,
     value)``.
 
+    If `modelnos` is given, it maps each generator id to the list of
+    model numbers to simulate from; otherwise all models are used.
+
     The results are simulated from the predictive distribution on
     fresh rows.
     """
     rowid, constraints = _retrieve_rowid_constraints(
         bdb, population_id, constraints)
-    def loglikelihood(generator_id, metamodel):
+    def loglikelihood(generator_id):
         if not constraints:
             return 0
+        metamodel = core.bayesdb_generator_metamodel(bdb, generator_id)
         return metamodel.logpdf_joint(
-            bdb, generator_id, rowid, constraints, [], None)
-    def simulate(generator_id, metamodel, n):
+            bdb, generator_id, rowid, constraints, [],
+            _modelno(modelnos, generator_id))
+    def simulate((generator_id, n)):
+        metamodel = core.bayesdb_generator_metamodel(bdb, generator_id)
         return metamodel.simulate_joint(
-            bdb, generator_id, rowid, colnos, constraints, None,
+            bdb, generator_id, rowid, colnos, constraints,
+            _modelno(modelnos, generator_id),
             num_samples=n, accuracy=accuracy)
     generator_ids = _retrieve_generator_ids(bdb, population_id, generator_id)
-    metamodels = [
-        core.bayesdb_generator_metamodel(bdb, generator_id)
-        for generator_id in generator_ids
-    ]
     if len(generator_ids) > 1:
-        loglikelihoods = map(loglikelihood, generator_ids, metamodels)
+        loglikelihoods = executor.bayesdb_map_generators(bdb, loglikelihood,
+            generator_ids)
         likelihoods = map(math.exp, loglikelihoods)
         total_likelihood = sum(likelihoods)
         if total_likelihood == 0:
@@ -525,7 +829,8 @@ def bayesdb_simulate(
         counts = countses[0]
     else:
         counts = [numpredictions]
-    rowses = map(simulate, generator_ids, metamodels, counts)
+    rowses = executor.bayesdb_map_generators(bdb, simulate,
+        zip(generator_ids, counts))
     all_rows = [row for rows in rowses for row in rows]
     assert all(isinstance(row, (tuple, list)) for row in all_rows)
     return all_rows
@@ -549,6 +854,55 @@ def _retrieve_rowid_constraints(bdb, population_id, constraints):
         ]
     return rowid, constraints
 
+def _check_anytime_limits(bdb, seconds, error):
+    if seconds is not None and not 0 < seconds:
+        raise BQLError(bdb, 'Time limit must be positive: %r' % (seconds,))
+    if error is not None and not 0 < error:
+        raise BQLError(bdb, 'Maximum error must be positive: %r' % (error,))
+
+def _anytime_models(bdb, population_id, generator_id, selection):
+    # Every selected model of every generator, weighted so that each
+    # generator counts equally and each model equally within its
+    # generator, in random order.  A generator whose metamodel cannot
+    # answer for single models is one unit, with all of its models.
+    generator_ids = _retrieve_generator_ids(bdb, population_id, generator_id)
+    units = []
+    for generator_id in generator_ids:
+        modelnos = _modelno(selection, generator_id)
+        metamodel = core.bayesdb_generator_metamodel(bdb, generator_id)
+        if not getattr(metamodel, 'selects_models', True):
+            units.append((generator_id, modelnos,
+                -math.log(len(generator_ids))))
+            continue
+        if modelnos is None:
+            modelnos = core.bayesdb_generator_modelnos(bdb, generator_id)
+        if not modelnos:
+            continue
+        logweight = -math.log(len(generator_ids) * len(modelnos))
+        units.extend((generator_id, modelno, logweight)
+            for modelno in modelnos)
+    bdb.py_prng.shuffle(units)
+    return units
+
+def _anytime_report(bdb, name, result):
+    if bdb.profiler is not None:
+        bdb.profiler.estimate(name, result)
+
+def _json_modelnos(modelnos):
+    # USING MODELS arrives as JSON text mapping each generator id to
+    # a list of model numbers; NULL means all models.
+    if modelnos is None:
+        return None
+    return dict((int(generator_id), generator_modelnos)
+        for generator_id, generator_modelnos in json.loads(modelnos).items())
+
+def _modelno(modelnos, generator_id):
+    # The modelno argument to pass to a metamodel: the list of models
+    # selected from the generator, or None for all of them.
+    if modelnos is None:
+        return None
+    return modelnos[generator_id]
+
 def _retrieve_generator_ids(bdb, population_id, generator_id):
     if generator_id is None:
         return core.bayesdb_population_generators(bdb, population_id)
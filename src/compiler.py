@@ -346,7 +346,12 @@ def compile_infer_explicit(bdb, infer, named, out):
             raise BQLError(bdb, 'No such generator: %s' % (infer.generator,))
         generator_id = core.bayesdb_get_generator(
             bdb, population_id, infer.generator)
-    bql_compiler = BQLCompiler_1Row_Infer(population_id, generator_id)
+    modelnos = compile_modelnos(bdb, population_id, generator_id,
+        infer.modelnos)
+    joint = infer_joint_predictions(bdb, population_id, generator_id,
+        infer.columns)
+    bql_compiler = BQLCompiler_1Row_Infer(population_id, generator_id,
+        modelnos, joint)
     compile_select_columns(bdb, infer.columns, named, bql_compiler, out)
     table_name = core.bayesdb_population_table(bdb, population_id)
     qt = sqlite3_quote_name(table_name)
@@ -391,6 +396,40 @@ def compile_infer_explicit(bdb, infer, named, out):
             out.write(' OFFSET ')
             compile_expression(bdb, infer.limit.offset, bql_compiler, out)
 
+def infer_joint_predictions(bdb, population_id, generator_id, columns):
+    """Group the columns predicted in `columns` for joint prediction.
+
+    Return a list of ``(nsamples, colnos)`` pairs, one for each
+    expression for the number of samples shared by predictions of
+    more than one column, with the numbers of those columns.  Each
+    row's predictions of the columns in a group are then drawn from
+    one set of joint samples.
+    """
+    groups = []
+    def visit(node):
+        if ast.is_query(node):
+            return
+        if isinstance(node, (ast.ExpBQLPredict, ast.ExpBQLPredictConf,
+                ast.PredCol)) and \
+           node.column is not None and \
+           core.bayesdb_has_variable(bdb, population_id, generator_id,
+                node.column):
+            colno = core.bayesdb_variable_number(bdb, population_id,
+                generator_id, node.column)
+            for nsamples, colnos in groups:
+                if nsamples == node.nsamples:
+                    if colno not in colnos:
+                        colnos.append(colno)
+                    break
+            else:
+                groups.append((node.nsamples, [colno]))
+        if isinstance(node, (tuple, list)):
+            for child in node:
+                visit(child)
+    visit(columns)
+    return [(nsamples, colnos) for nsamples, colnos in groups
+        if 1 < len(colnos)]
+
 def compile_infer_auto(bdb, infer, out):
     assert isinstance(infer, ast.InferAuto)
     if not core.bayesdb_has_population(bdb, infer.population):
@@ -422,7 +461,8 @@ def compile_infer_auto(bdb, infer, out):
             assert False, 'Invalid INFER column: %s' % (repr(col),)
     columns = [mcol for col in infer.columns for mcol in map_columns(col)]
     infer_exp = ast.InferExplicit(columns, infer.population, infer.generator,
-        infer.condition, infer.grouping, infer.order, infer.limit)
+        infer.modelnos, infer.condition, infer.grouping, infer.order,
+        infer.limit)
     named = True
     return compile_infer_explicit(bdb, infer_exp, named, out)
 
@@ -444,9 +484,16 @@ def compile_estimate(bdb, estimate, out):
                 (estimate.generator,))
         generator_id = core.bayesdb_get_generator(
             bdb, population_id, estimate.generator)
-    bql_compiler = BQLCompiler_1Row(population_id, generator_id)
+    modelnos = compile_modelnos(bdb, population_id, generator_id,
+        estimate.modelnos)
+    columns = expand_predictive_probabilities(bdb, population_id,
+        estimate.columns)
+    predprobs = estimate_predictive_probabilities(bdb, population_id,
+        generator_id, columns)
+    bql_compiler = BQLCompiler_1Row(population_id, generator_id, modelnos,
+        predprobs)
     named = True
-    compile_select_columns(bdb, estimate.columns, named, bql_compiler, out)
+    compile_select_columns(bdb, columns, named, bql_compiler, out)
     table_name = core.bayesdb_population_table(bdb, population_id)
     qt = sqlite3_quote_name(table_name)
     out.write(' FROM %s' % (qt,))
@@ -490,6 +537,56 @@ def compile_estimate(bdb, estimate, out):
             out.write(' OFFSET ')
             compile_expression(bdb, estimate.limit.offset, bql_compiler, out)
 
+def expand_predictive_probabilities(bdb, population_id, columns):
+    """Expand ``PREDICTIVE PROBABILITY OF *`` among the `columns`.
+
+    Each such column becomes the predictive probability of each
+    variable of the population in turn, named after the variable.
+    """
+    expanded = []
+    for col in columns:
+        if isinstance(col, ast.SelColExp) and \
+           isinstance(col.expression, ast.ExpBQLPredProb) and \
+           col.expression.column is None:
+            if col.name is not None:
+                raise BQLError(bdb, 'Predictive probability of *'
+                    ' cannot be named: %s' % (col.name,))
+            for name in core.bayesdb_variable_names(bdb, population_id,
+                    None):
+                expanded.append(
+                    ast.SelColExp(ast.ExpBQLPredProb(name), name))
+        else:
+            expanded.append(col)
+    return expanded
+
+def estimate_predictive_probabilities(bdb, population_id, generator_id,
+        columns):
+    """Find the columns whose predictive probabilities `columns` estimate.
+
+    Return a list of their numbers if there are more than one, or
+    None.  Each row's predictive probabilities of the columns in the
+    list are then computed together, sharing the work of conditioning
+    on the rest of the row.
+    """
+    colnos = []
+    def visit(node):
+        if ast.is_query(node):
+            return
+        if isinstance(node, ast.ExpBQLPredProb) and \
+           node.column is not None and \
+           core.bayesdb_has_variable(bdb, population_id, generator_id,
+                node.column):
+            colno = core.bayesdb_variable_number(bdb, population_id,
+                generator_id, node.column)
+            # Latent variables have no cells.
+            if 0 <= colno and colno not in colnos:
+                colnos.append(colno)
+        if isinstance(node, (tuple, list)):
+            for child in node:
+                visit(child)
+    visit(columns)
+    return colnos if 1 < len(colnos) else None
+
 def compile_estimate_by(bdb, estby, out):
     assert isinstance(estby, ast.EstBy)
     out.write('SELECT ')
@@ -507,7 +604,9 @@ def compile_estimate_by(bdb, estby, out):
                 (estby.generator,))
         generator_id = core.bayesdb_get_generator(
             bdb, population_id, estby.generator)
-    bql_compiler = BQLCompiler_Const(population_id, generator_id)
+    modelnos = compile_modelnos(bdb, population_id, generator_id,
+        estby.modelnos)
+    bql_compiler = BQLCompiler_Const(population_id, generator_id, modelnos)
     named = True
     compile_select_columns(bdb, estby.columns, named, bql_compiler, out)
 
@@ -608,6 +707,8 @@ def compile_simulate(bdb, simulate, out):
                     'No such generator: %r' %(simulate.generator,))
             generator_id = core.bayesdb_get_generator(
                 bdb, population_id, simulate.generator)
+        modelnos = compile_modelnos(bdb, population_id, generator_id,
+            simulate.modelnos)
         table = core.bayesdb_population_table(bdb, population_id)
         qtt = sqlite3_quote_name(temptable)
         qt = sqlite3_quote_name(table)
@@ -681,8 +782,8 @@ def compile_simulate(bdb, simulate, out):
         ''' % (qtt, ','.join(qcns), ','.join('?' for qcn in qcns))
         for row in bqlfn.bayesdb_simulate(
                 bdb, population_id, constraints,
-                colnos, generator_id=generator_id, numpredictions=nsamples,
-                accuracy=simulate.accuracy):
+                colnos, generator_id=generator_id, modelnos=modelnos,
+                numpredictions=nsamples, accuracy=simulate.accuracy):
             out.winder(insert_sql, row)
         out.unwinder('DROP TABLE %s' % (qtt,), ())
         out.write('SELECT * FROM %s' % (qtt,))
@@ -707,8 +808,11 @@ def compile_estcols(bdb, estcols, out):
             raise BQLError(bdb, 'No such generator: %r' % (estcols.generator,))
         generator_id = core.bayesdb_get_generator(
             bdb, population_id, estcols.generator)
+    modelnos = compile_modelnos(bdb, population_id, generator_id,
+        estcols.modelnos)
     colno_exp = 'c.colno'       # XXX
-    bql_compiler = BQLCompiler_1Col(population_id, generator_id, colno_exp)
+    bql_compiler = BQLCompiler_1Col(population_id, generator_id, modelnos,
+        colno_exp)
     out.write('SELECT')
     first = True
     for col in estcols.columns:
@@ -789,7 +893,9 @@ def compile_estpaircols(bdb, estpaircols, out):
                 (estpaircols.generator,))
         generator_id = core.bayesdb_get_generator(
             bdb, population_id, estpaircols.generator)
-    bql_compiler = BQLCompiler_2Col(population_id, generator_id,
+    modelnos = compile_modelnos(bdb, population_id, generator_id,
+        estpaircols.modelnos)
+    bql_compiler = BQLCompiler_2Col(population_id, generator_id, modelnos,
         colno0_exp, colno1_exp)
     out.write('SELECT'
         ' %d AS population_id, v0.name AS name0, v1.name AS name1' %
@@ -874,7 +980,9 @@ def compile_estpairrow(bdb, estpairrow, out):
             bdb, population_id, estpairrow.generator)
     rowid0_exp = 'r0._rowid_'
     rowid1_exp = 'r1._rowid_'
-    bql_compiler = BQLCompiler_2Row(population_id, generator_id,
+    modelnos = compile_modelnos(bdb, population_id, generator_id,
+        estpairrow.modelnos)
+    bql_compiler = BQLCompiler_2Row(population_id, generator_id, modelnos,
         rowid0_exp, rowid1_exp)
     out.write('SELECT %s AS rowid0, %s AS rowid1,' % (rowid0_exp, rowid1_exp))
     named = True
@@ -909,17 +1017,80 @@ def compile_estpairrow(bdb, estpairrow, out):
             out.write(' OFFSET ')
             compile_expression(bdb, estpairrow.limit.offset, bql_compiler, out)
 
+def compile_modelnos(bdb, population_id, generator_id, modelnos):
+    """Resolve a USING MODELS clause to the models it selects.
+
+    Return None, meaning all models, if there is no such clause, or
+    else a dict mapping the id of each generator in question to the
+    sorted list of model numbers selected from it.
+    """
+    if modelnos is None:
+        return None
+    if generator_id is None:
+        generator_ids = core.bayesdb_population_generators(bdb, population_id)
+    else:
+        generator_ids = [generator_id]
+    selection = {}
+    for generator_id in generator_ids:
+        if isinstance(modelnos, ast.TopModels):
+            selected = top_modelnos(bdb, generator_id, modelnos.count)
+        else:
+            existing = core.bayesdb_generator_modelnos(bdb, generator_id)
+            missing = sorted(set(modelnos) - set(existing))
+            if missing:
+                generator = core.bayesdb_generator_name(bdb, generator_id)
+                raise BQLError(bdb, 'No such models in generator %s: %r' %
+                    (generator, missing))
+            selected = list(modelnos)
+        selection[generator_id] = selected
+    return selection
+
+def top_modelnos(bdb, generator_id, count):
+    """Return the `count` models of a generator with the best logscores.
+
+    The score of a model is the logscore at its latest checkpoint in
+    bayesdb_crosscat_diagnostics.  Models never analyzed have no score
+    and come last.
+    """
+    if not 0 < count:
+        raise BQLError(bdb, 'Need a positive number of top models: %d' %
+            (count,))
+    metamodel = core.bayesdb_generator_metamodel(bdb, generator_id)
+    if metamodel.name() != 'crosscat':
+        generator = core.bayesdb_generator_name(bdb, generator_id)
+        raise BQLError(bdb, 'Generator %s has no model scores to rank by:'
+            ' metamodel %s' % (generator, metamodel.name()))
+    sql = '''
+        SELECT m.modelno FROM bayesdb_generator_model AS m
+            LEFT OUTER JOIN bayesdb_crosscat_diagnostics AS d
+                ON d.generator_id = m.generator_id
+                    AND d.modelno = m.modelno
+                    AND d.checkpoint = (
+                        SELECT MAX(checkpoint)
+                            FROM bayesdb_crosscat_diagnostics
+                            WHERE generator_id = m.generator_id
+                                AND modelno = m.modelno
+                    )
+            WHERE m.generator_id = ?
+            ORDER BY d.logscore IS NULL ASC, d.logscore DESC, m.modelno ASC
+            LIMIT ?
+    '''
+    cursor = bdb.sql_execute(sql, (generator_id, count))
+    return sorted(modelno for (modelno,) in cursor)
+
 class BQLCompiler_None(object):
     def compile_bql(self, bdb, bql, out):
         # XXX Report source location.
         raise BQLError(bdb, 'Invalid context for BQL!')
 
 class BQLCompiler_Const(object):
-    def __init__(self, population_id, generator_id):
+    def __init__(self, population_id, generator_id, modelnos):
         assert isinstance(population_id, int)
         assert generator_id is None or isinstance(generator_id, int)
+        assert modelnos is None or isinstance(modelnos, dict)
         self.population_id = population_id
         self.generator_id = generator_id
+        self.modelnos = modelnos
 
     def compile_bql(self, bdb, bql, out):
         assert ast.is_bql(bql)
@@ -930,7 +1101,7 @@ class BQLCompiler_Const(object):
                 ' not a constant.')
         elif isinstance(bql, ast.ExpBQLProb):
             compile_pdf_joint(bdb, population_id, generator_id, bql.targets,
-                bql.constraints, self, out)
+                bql.constraints, bql.budget, self, out)
         elif isinstance(bql, ast.ExpBQLProbFn):
             raise BQLError(bdb, 'Probability of value at row is 1-column'
                 ' function, not a constant.')
@@ -958,6 +1129,12 @@ class BQLCompiler_Const(object):
             assert False, 'Invalid BQL function: %s' % (repr(bql),)
 
 class BQLCompiler_1Row(BQLCompiler_Const):
+    def __init__(self, population_id, generator_id, modelnos,
+            predprobs=None):
+        super(BQLCompiler_1Row, self).__init__(population_id, generator_id,
+            modelnos)
+        self.predprobs = predprobs
+
     def compile_bql(self, bdb, bql, out):
         assert ast.is_bql(bql)
         population_id = self.population_id
@@ -965,8 +1142,8 @@ class BQLCompiler_1Row(BQLCompiler_Const):
         rowid_col = '_rowid_'   # XXX Don't hard-code this.
         if isinstance(bql, ast.ExpBQLPredProb):
             if bql.column is None:
-                raise BQLError(bdb, 'Predictive probability at row'
-                    ' needs column.')
+                raise BQLError(bdb, 'Predictive probability of *'
+                    ' makes sense only as a column of ESTIMATE.')
             if not core.bayesdb_has_variable(bdb, population_id, generator_id,
                     bql.column):
                 population = core.bayesdb_population_name(bdb, population_id)
@@ -974,15 +1151,19 @@ class BQLCompiler_1Row(BQLCompiler_Const):
                     (population, bql.column))
             colno = core.bayesdb_variable_number(bdb, population_id,
                 generator_id, bql.column)
-            out.write('bql_row_column_predictive_probability(%d, %s' %
-                (population_id, nullor(generator_id)))
-            out.write(', %s, %s)' % (rowid_col, colno))
+            compile_bql_call('bql_row_column_predictive_probability',
+                population_id, generator_id, self.modelnos, out)
+            out.write(', %s, %s' % (rowid_col, colno))
+            if self.predprobs is not None and colno in self.predprobs:
+                # Name the columns computed together with this one.
+                out.write(', %s' % (nullor_json(self.predprobs),))
+            out.write(')')
         elif isinstance(bql, ast.ExpBQLSim) and bql.ofcondition is None:
             if bql.ofcondition is not None:
                 raise BQLError(bdb, 'Similarity as 1-row function needs one '
                     'row not two rows.')
-            out.write('bql_row_similarity(%d, %s' %
-                (population_id, nullor(generator_id)))
+            compile_bql_call('bql_row_similarity',
+                population_id, generator_id, self.modelnos, out)
             out.write(', _rowid_, ')
             with compiling_paren(bdb, out, '(', ')'):
                 table_name = core.bayesdb_population_table(bdb, population_id)
@@ -1004,6 +1185,18 @@ class BQLCompiler_1Row(BQLCompiler_Const):
             super(BQLCompiler_1Row, self).compile_bql(bdb, bql, out)
 
 class BQLCompiler_1Row_Infer(BQLCompiler_1Row):
+    def __init__(self, population_id, generator_id, modelnos, joint=None):
+        super(BQLCompiler_1Row_Infer, self).__init__(population_id,
+            generator_id, modelnos)
+        self.joint = [] if joint is None else joint
+
+    def compile_joint(self, colno, bql, out):
+        # Name the columns predicted jointly with this one, if any.
+        for nsamples, colnos in self.joint:
+            if nsamples == bql.nsamples and colno in colnos:
+                out.write(', %s' % (nullor_json(colnos),))
+                break
+
     def compile_bql(self, bdb, bql, out):
         assert ast.is_bql(bql)
         population_id = self.population_id
@@ -1018,8 +1211,8 @@ class BQLCompiler_1Row_Infer(BQLCompiler_1Row):
                     (population, bql.column))
             colno = core.bayesdb_variable_number(bdb, population_id,
                 generator_id, bql.column)
-            out.write('bql_predict(%d, %s' %
-                (population_id, nullor(generator_id)))
+            compile_bql_call('bql_predict',
+                population_id, generator_id, self.modelnos, out)
             out.write(', %s, %d, ' % (rowid_col, colno))
             compile_expression(bdb, bql.confidence, self, out)
             out.write(', ')
@@ -1027,6 +1220,7 @@ class BQLCompiler_1Row_Infer(BQLCompiler_1Row):
                 out.write('NULL')
             else:
                 compile_nobql_expression(bdb, bql.nsamples, out)
+            self.compile_joint(colno, bql, out)
             out.write(')')
         elif isinstance(bql, ast.ExpBQLPredictConf):
             assert bql.column is not None
@@ -1037,25 +1231,29 @@ class BQLCompiler_1Row_Infer(BQLCompiler_1Row):
                     (population, bql.column))
             colno = core.bayesdb_variable_number(bdb, population_id,
                 generator_id, bql.column)
-            out.write('bql_predict_confidence(%d, %s' %
-                (population_id, nullor(generator_id)))
+            compile_bql_call('bql_predict_confidence',
+                population_id, generator_id, self.modelnos, out)
             out.write(', %s, %d, ' % (rowid_col, colno))
             if bql.nsamples is None:
                 out.write('NULL')
             else:
                 compile_nobql_expression(bdb, bql.nsamples, out)
+            self.compile_joint(colno, bql, out)
             out.write(')')
         else:
             super(BQLCompiler_1Row_Infer, self).compile_bql(bdb, bql, out)
 
 class BQLCompiler_2Row(object):
-    def __init__(self, population_id, generator_id, rowid0_exp, rowid1_exp):
+    def __init__(self, population_id, generator_id, modelnos, rowid0_exp,
+            rowid1_exp):
         assert isinstance(population_id, int)
         assert generator_id is None or isinstance(generator_id, int)
+        assert modelnos is None or isinstance(modelnos, dict)
         assert isinstance(rowid0_exp, str)
         assert isinstance(rowid1_exp, str)
         self.population_id = population_id
         self.generator_id = generator_id
+        self.modelnos = modelnos
         self.rowid0_exp = rowid0_exp
         self.rowid1_exp = rowid1_exp
 
@@ -1065,7 +1263,7 @@ class BQLCompiler_2Row(object):
         generator_id = self.generator_id
         if isinstance(bql, ast.ExpBQLProb):
             compile_pdf_joint(bdb, population_id, generator_id, bql.targets,
-                bql.constraints, self, out)
+                bql.constraints, bql.budget, self, out)
         elif isinstance(bql, ast.ExpBQLProbFn):
             raise BQLError(bdb, 'Probability of value is 1-column function,'
                 ' not 2-row function.')
@@ -1076,8 +1274,8 @@ class BQLCompiler_2Row(object):
             if bql.ofcondition is not None or bql.tocondition is not None:
                 raise BQLError(bdb, 'Similarity needs no row'
                     ' in 2-row context.')
-            out.write('bql_row_similarity(%d, %s' %
-                (population_id, nullor(generator_id)))
+            compile_bql_call('bql_row_similarity',
+                population_id, generator_id, self.modelnos, out)
             out.write(', %s, %s' % (self.rowid0_exp, self.rowid1_exp))
             if len(bql.column_lists) == 1 and \
                isinstance(bql.column_lists[0], ast.ColListAll):
@@ -1106,12 +1304,14 @@ class BQLCompiler_2Row(object):
             assert False, 'Invalid BQL function: %s' % (repr(bql),)
 
 class BQLCompiler_1Col(object):
-    def __init__(self, population_id, generator_id, colno_exp):
+    def __init__(self, population_id, generator_id, modelnos, colno_exp):
         assert isinstance(population_id, int)
         assert generator_id is None or isinstance(generator_id, int)
+        assert modelnos is None or isinstance(modelnos, dict)
         assert isinstance(colno_exp, str)
         self.population_id = population_id
         self.generator_id = generator_id
+        self.modelnos = modelnos
         self.colno_exp = colno_exp
 
     def compile_bql(self, bdb, bql, out):
@@ -1120,10 +1320,10 @@ class BQLCompiler_1Col(object):
         generator_id = self.generator_id
         if isinstance(bql, ast.ExpBQLProb):
             compile_pdf_joint(bdb, population_id, generator_id, bql.targets,
-                bql.constraints, self, out)
+                bql.constraints, bql.budget, self, out)
         elif isinstance(bql, ast.ExpBQLProbFn):
-            out.write('bql_column_value_probability(%d, %s' %
-                (population_id, nullor(generator_id)))
+            compile_bql_call('bql_column_value_probability',
+                population_id, generator_id, self.modelnos, out)
             out.write(', %s, ' % (self.colno_exp,))
             compile_expression(bdb, bql.value, self, out)
             compile_constraints(bdb, population_id, generator_id,
@@ -1158,13 +1358,16 @@ class BQLCompiler_1Col(object):
             assert False, 'Invalid BQL function: %s' % (repr(bql),)
 
 class BQLCompiler_2Col(object):
-    def __init__(self, population_id, generator_id, colno0_exp, colno1_exp):
+    def __init__(self, population_id, generator_id, modelnos, colno0_exp,
+            colno1_exp):
         assert isinstance(population_id, int)
         assert generator_id is None or isinstance(generator_id, int)
+        assert modelnos is None or isinstance(modelnos, dict)
         assert isinstance(colno0_exp, str)
         assert isinstance(colno1_exp, str)
         self.population_id = population_id
         self.generator_id = generator_id
+        self.modelnos = modelnos
         self.colno0_exp = colno0_exp
         self.colno1_exp = colno1_exp
 
@@ -1174,7 +1377,7 @@ class BQLCompiler_2Col(object):
         generator_id = self.generator_id
         if isinstance(bql, ast.ExpBQLProb):
             compile_pdf_joint(bdb, population_id, generator_id, bql.targets,
-                bql.constraints, self, out)
+                bql.constraints, bql.budget, self, out)
         elif isinstance(bql, ast.ExpBQLProbFn):
             raise BQLError(bdb, 'Probability of value is 1-column function.')
         elif isinstance(bql, ast.ExpBQLPredProb):
@@ -1212,8 +1415,15 @@ class BQLCompiler_2Col(object):
             assert False, 'Invalid BQL function: %s' % (repr(bql),)
 
 def compile_pdf_joint(bdb, population_id, generator_id, targets, constraints,
-        bql_compiler, out):
-    out.write('bql_pdf_joint(%d, %s' % (population_id, nullor(generator_id)))
+        budget, bql_compiler, out):
+    if budget is None:
+        compile_bql_call('bql_pdf_joint', population_id, generator_id,
+            bql_compiler.modelnos, out)
+    else:
+        compile_bql_call('bql_pdf_joint_anytime', population_id,
+            generator_id, bql_compiler.modelnos, out)
+        out.write(', ')
+        compile_budget(bdb, budget, bql_compiler, out)
     for t_col, t_exp in targets:
         if not core.bayesdb_has_variable(
                 bdb, population_id, generator_id, t_col):
@@ -1248,9 +1458,9 @@ def compile_mutinf_2col_2(
         for c in bql.columns0]
     colnos1 = [core.bayesdb_variable_number(bdb, population_id, generator_id, c)
         for c in bql.columns1]
-    out.write('bql_column_mutual_information(%d, %s, ' %
-        (population_id, nullor(generator_id)))
-    out.write('\'%s\', \'%s\'' %
+    compile_bql_call(mutinf_function(bql), population_id, generator_id,
+        bql_compiler.modelnos, out)
+    out.write(', \'%s\', \'%s\'' %
         (json.dumps(colnos0), json.dumps(colnos1)))
     compile_mutinf_extra(
         bdb, population_id, generator_id, bql, bql_compiler, out)
@@ -1264,9 +1474,9 @@ def compile_mutinf_2col_1(
         raise BQLError(bdb, 'Mutual information needs at most one column.')
     colnos0 = [core.bayesdb_variable_number(bdb, population_id, generator_id, c)
         for c in bql.columns0]
-    out.write('bql_column_mutual_information(%d, %s, '
-        % (population_id, nullor(generator_id)))
-    out.write('\'%s\', %s'
+    compile_bql_call(mutinf_function(bql), population_id, generator_id,
+        bql_compiler.modelnos, out)
+    out.write(', \'%s\', %s'
         % (json.dumps(colnos0), sql_json_singleton(colno1_exp)))
     compile_mutinf_extra(
         bdb, population_id, generator_id, bql, bql_compiler, out)
@@ -1279,9 +1489,9 @@ def compile_mutinf_2col_0(
         raise BQLError(bdb, 'Mutual information needs no columns.')
     if bql.columns1 is not None:
         raise BQLError(bdb, 'Mutual information needs no columns.')
-    out.write('bql_column_mutual_information(%d, %s, '
-        % (population_id, nullor(generator_id)))
-    out.write('%s, %s'
+    compile_bql_call(mutinf_function(bql), population_id, generator_id,
+        bql_compiler.modelnos, out)
+    out.write(', %s, %s'
         % (sql_json_singleton(colno0_exp), sql_json_singleton(colno1_exp)))
     compile_mutinf_extra(
         bdb, population_id, generator_id, bql, bql_compiler, out)
@@ -1294,17 +1504,37 @@ def compile_mutinf_extra(
         compile_expression(bdb, bql.nsamples, bql_compiler, out)
     else:
         out.write('NULL')
+    if bql.budget is not None:
+        out.write(', ')
+        compile_budget(bdb, bql.budget, bql_compiler, out)
     if bql.constraints:
         compile_constraints(
             bdb, population_id, generator_id, bql.constraints,
             bql_compiler, out)
 
+def mutinf_function(bql):
+    if bql.budget is None:
+        return 'bql_column_mutual_information'
+    return 'bql_column_mutual_information_anytime'
+
+def compile_budget(bdb, budget, bql_compiler, out):
+    if budget.seconds is None:
+        out.write('NULL')
+    else:
+        compile_expression(bdb, budget.seconds, bql_compiler, out)
+    out.write(', ')
+    if budget.error is None:
+        out.write('NULL')
+    else:
+        compile_expression(bdb, budget.error, bql_compiler, out)
+
 def compile_similarity(bdb, population_id, generator_id, ofcondition,
         tocondition, column_lists, bql_compiler, out):
     if ofcondition is None or tocondition is None:
         raise BQLError(bdb, 'Similarity as constant needs exactly 2 rows.')
-    out.write(
-        'bql_row_similarity(%d, %s, ' % (population_id, nullor(generator_id)))
+    compile_bql_call('bql_row_similarity', population_id, generator_id,
+        bql_compiler.modelnos, out)
+    out.write(', ')
     table_name = core.bayesdb_population_table(bdb, population_id)
     qt = sqlite3_quote_name(table_name)
     with compiling_paren(bdb, out, '(', ')'):
@@ -1412,8 +1642,9 @@ def compile_bql_2col_2(bdb, population_id, generator_id, bqlfn, desc, extra,
         bql.column0)
     colno1 = core.bayesdb_variable_number(bdb, population_id, generator_id,
         bql.column1)
-    out.write('%s(%d, %s, ' % (bqlfn, population_id, nullor(generator_id)))
-    out.write('%s, %s' % (colno0, colno1))
+    compile_bql_call(bqlfn, population_id, generator_id,
+        bql_compiler.modelnos, out)
+    out.write(', %s, %s' % (colno0, colno1))
     if extra:
         extra(bdb, population_id, generator_id, bql, bql_compiler, out)
     out.write(')')
@@ -1426,8 +1657,9 @@ def compile_bql_2col_1(bdb, population_id, generator_id, bqlfn, desc, extra,
         raise BQLError(bdb, desc + ' needs at most one column.')
     colno0 = core.bayesdb_variable_number(bdb, population_id, generator_id,
         bql.column0)
-    out.write('%s(%d, %s, ' % (bqlfn, population_id, nullor(generator_id)))
-    out.write('%s, %s' % (colno0, colno1_exp))
+    compile_bql_call(bqlfn, population_id, generator_id,
+        bql_compiler.modelnos, out)
+    out.write(', %s, %s' % (colno0, colno1_exp))
     if extra:
         extra(bdb, population_id, generator_id, bql, bql_compiler, out)
     out.write(')')
@@ -1438,12 +1670,25 @@ def compile_bql_2col_0(bdb, population_id, generator_id, bqlfn, desc, extra,
         raise BQLError(bdb, desc + ' needs no columns.')
     if bql.column1 is not None:
         raise BQLError(bdb, desc + ' needs no columns.')
-    out.write('%s(%d, %s, ' % (bqlfn, population_id, nullor(generator_id)))
-    out.write('%s, %s' % (colno0_exp, colno1_exp))
+    compile_bql_call(bqlfn, population_id, generator_id,
+        bql_compiler.modelnos, out)
+    out.write(', %s, %s' % (colno0_exp, colno1_exp))
     if extra:
         extra(bdb, population_id, generator_id, bql, bql_compiler, out)
     out.write(')')
 
+# BQL functions that consult no models, and so ignore USING MODELS.
+MODEL_FREE_BQLFNS = ('bql_column_correlation', 'bql_column_correlation_pvalue')
+
+def compile_bql_call(bqlfn, population_id, generator_id, modelnos, out):
+    # Name the models only if USING MODELS selects some, so that a
+    # query of every model compiles just as it would without them.
+    if modelnos is None or bqlfn in MODEL_FREE_BQLFNS:
+        out.write('%s(%d, %s' % (bqlfn, population_id, nullor(generator_id)))
+    else:
+        out.write('%s_using_models(%d, %s, %s' % (bqlfn, population_id,
+            nullor(generator_id), nullor_json(modelnos)))
+
 def compile_nobql_expression(bdb, exp, out):
     bql_compiler = BQLCompiler_None()
     compile_expression(bdb, exp, bql_compiler, out)
@@ -1650,5 +1895,10 @@ def compiling_paren(bdb, out, start, end):
 def nullor(x):
     return 'NULL' if x is None else str(x)
 
+def nullor_json(x):
+    if x is None:
+        return 'NULL'
+    return '\'%s\'' % (json.dumps(x, sort_keys=True),)
+
 def sql_json_singleton(x):
     return '\'[\' || %s || \']\'' % (x,)
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+
+#   Copyright (c) 2010-2016, MIT Probabilistic Computing Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""Executors for evaluating the generators of a population concurrently.
+
+A model estimator over a population asks each of its generators in
+turn and then combines their answers.  The generators are independent
+of one another, so a :class:`ThreadExecutor` may ask them at once,
+which pays off when the metamodels spend their time outside the
+Python interpreter -- in numerical libraries, in subprocesses, or
+waiting on a remote engine.
+
+The executor of a BayesDB is set with :func:`bayesdb_open` or by
+assigning to :attr:`~bayeslite.BayesDB.executor`.  Concurrent
+executors require a :class:`~bayeslite.bayesdb.ThreadedBayesDB`,
+since each worker thread needs its own connection to the database: a
+thread cannot use the connection of a query in progress in another.
+
+Results do not depend on the executor.  Before the generators are
+asked, each is given its own pseudorandom number generators, seeded
+in order from the caller's, which the metamodel sees as
+:attr:`~bayeslite.BayesDB.py_prng` and
+:attr:`~bayeslite.BayesDB.np_prng` while it works.
+"""
+
+import threading
+
+class BayesDBExecutor(object):
+    """Strategy for applying a function to independent work items."""
+
+    #: True if the executor may run several items at once.
+    concurrent = False
+
+    def map(self, fn, items):
+        """Return ``[fn(item) for item in items]``, in order."""
+        raise NotImplementedError
+
+    def close(self):
+        """Release any resources held by the executor."""
+        pass
+
+class SerialExecutor(BayesDBExecutor):
+    """Executor that runs each item in turn in the calling thread."""
+
+    def map(self, fn, items):
+        return [fn(item) for item in items]
+
+class ThreadExecutor(BayesDBExecutor):
+    """Executor that runs items in a pool of `nthreads` threads.
+
+    The pool is created on first use.  Each worker thread leases its
+    own connection from the
+    :class:`~bayeslite.bayesdb.ThreadedBayesDB`.
+    """
+
+    concurrent = True
+
+    def __init__(self, nthreads=None):
+        if nthreads is None:
+            import multiprocessing
+            nthreads = multiprocessing.cpu_count()
+        if not 0 < nthreads:
+            raise ValueError('Need a positive number of threads: %r' %
+                (nthreads,))
+        self.nthreads = nthreads
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def map(self, fn, items):
+        with self._lock:
+            if self._pool is None:
+                # Imported here so that only users of threads pay for it.
+                import multiprocessing.pool
+                self._pool = multiprocessing.pool.ThreadPool(self.nthreads)
+            pool = self._pool
+        return pool.map(fn, items, chunksize=1)
+
+    def close(self):
+        with self._lock:
+            pool = self._pool
+            self._pool = None
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+def bayesdb_map_generators(bdb, fn, items):
+    """Apply `fn` to `items`, one per generator, with `bdb`'s executor.
+
+    Each call gets its own pseudorandom number generators, split from
+    `bdb`'s in order beforehand, so the results are the same whether
+    the calls run one at a time or concurrently.  A single item is
+    simply applied in the caller's context.
+
+    The calls run one at a time if the caller has a transaction in
+    progress, whose uncommitted changes the connections of other
+    threads could not see.
+    """
+    items = list(items)
+    if len(items) < 2:
+        return [fn(item) for item in items]
+    seeds = [bdb.np_prng.bytes(32) for _item in items]
+    executor = bdb.executor
+    # Not bdb._txn_depth, which counts mere caching while stepping
+    # through a query's rows as well as SQL transactions.
+    if executor.concurrent and not bdb._sqlite3.getautocommit():
+        executor = SerialExecutor()
+    udf_depth = bdb._udf_depth
+    profiler = bdb.profiler
+    query = None if profiler is None else profiler.current_query()
+    def call((seed, item)):
+        # Worker threads count their nesting in query functions
+        # separately; carry the caller's over for the tracers, and its
+        # query for the profiler.
+        saved_depth = bdb._udf_depth
+        bdb._udf_depth = udf_depth
+        try:
+            with bdb._split_prngs(seed):
+                if profiler is None:
+                    return fn(item)
+                with profiler.querying(query):
+                    return fn(item)
+        finally:
+            bdb._udf_depth = saved_depth
+    return executor.map(call, zip(seeds, items))
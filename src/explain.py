@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+
+#   Copyright (c) 2010-2016, MIT Probabilistic Computing Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""Static cost estimates for BQL queries, for EXPLAIN.
+
+The cost of a query is estimated as the number of model evaluations
+it will make: for each BQL function in it, the number of times it is
+evaluated -- once per row, per pair of variables, per pair of rows,
+or once -- times the number of models it consults, times the number
+of samples each evaluation draws.  It is an upper bound in that
+conditions and limits are not taken into account.
+"""
+
+import bayeslite.ast as ast
+import bayeslite.core as core
+
+from bayeslite.exception import BQLError
+from bayeslite.sqlite3_util import sqlite3_quote_name
+
+# Number of samples assumed for a BQL function with no USING n SAMPLES
+# clause, as in the Crosscat metamodel.
+DEFAULT_NSAMPLES = 100
+
+def bayesdb_explain_cost(bdb, query):
+    """Estimate the cost of the BQL `query` in model evaluations.
+
+    Return a list of ``(description, count)`` pairs, one for each BQL
+    function in `query`, and a final ``('total', count)`` pair.
+    """
+    functions = list(query_bql_functions(query))
+    population = getattr(query, 'population', None)
+    if population is None:
+        if functions:
+            raise BQLError(bdb, 'BQL function without population: %r' %
+                (functions[0],))
+        return [('total', 0)]
+    if not core.bayesdb_has_population(bdb, population):
+        raise BQLError(bdb, 'No such population: %r' % (population,))
+    population_id = core.bayesdb_get_population(bdb, population)
+    nmodels = population_nmodels(bdb, population_id, query.generator,
+        getattr(query, 'modelnos', None))
+    nrows = population_nrows(bdb, population_id)
+    nvars = len(core.bayesdb_variable_numbers(bdb, population_id, None))
+    if isinstance(query, (ast.Estimate, ast.InferAuto, ast.InferExplicit)):
+        unit, nunits = 'rows', nrows
+    elif isinstance(query, ast.EstCols):
+        unit, nunits = 'variables', nvars
+    elif isinstance(query, ast.EstPairCols):
+        if isinstance(query.subcolumns, ast.ColListLit):
+            nvars = len(query.subcolumns.columns)
+        unit, nunits = 'pairs of variables', nvars**2
+    elif isinstance(query, ast.EstPairRow):
+        unit, nunits = 'pairs of rows', nrows**2
+    elif isinstance(query, ast.Simulate):
+        nsamples = literal_nsamples(query.nsamples)
+        return [('SIMULATE: %d samples' % (nsamples,), nsamples),
+            ('total', nsamples)]
+    elif isinstance(query, ast.SimulateModels):
+        return [('SIMULATE MODELS: %d models' % (nmodels,), nmodels),
+            ('total', nmodels)]
+    else:
+        unit, nunits = 'once', 1
+    costs = []
+    for function in functions:
+        name, uses_models, nsamples = function_cost(function, query)
+        if not uses_models:
+            costs.append(('%s: no model evaluations' % (name,), 0))
+            continue
+        count = nunits * nmodels * nsamples
+        costs.append(('%s: %d %s x %d models x %d samples' %
+            (name, nunits, unit, nmodels, nsamples), count))
+    costs.append(('total', sum(count for _description, count in costs)))
+    return costs
+
+def query_bql_functions(query):
+    """Yield the BQL function applications in `query`.
+
+    Subqueries, which may concern other populations, are not searched.
+    """
+    if isinstance(query, ast.InferAuto):
+        for column in query.columns:
+            if isinstance(column, ast.InfColAll):
+                yield ast.ExpBQLPredict(None, query.confidence,
+                    query.nsamples)
+            elif isinstance(column, ast.InfColOne):
+                yield ast.ExpBQLPredict(column.column, query.confidence,
+                    query.nsamples)
+    for child in ast_children(query):
+        for function in node_bql_functions(child):
+            yield function
+
+def node_bql_functions(node):
+    if ast.is_query(node):
+        return
+    if ast.is_bql(node) or isinstance(node, ast.PredCol):
+        yield node
+    for child in ast_children(node):
+        for function in node_bql_functions(child):
+            yield function
+
+def ast_children(node):
+    if isinstance(node, (tuple, list)):
+        for child in node:
+            if isinstance(child, (tuple, list)):
+                yield child
+
+def function_cost(function, query):
+    """Return (name, uses models?, samples per evaluation)."""
+    if isinstance(function, ast.ExpBQLPredProb):
+        return ('PREDICTIVE PROBABILITY', True, 1)
+    if isinstance(function, (ast.ExpBQLProb, ast.ExpBQLProbFn)):
+        return ('PROBABILITY DENSITY', True, 1)
+    if isinstance(function, ast.ExpBQLSim):
+        return ('SIMILARITY', True, 1)
+    if isinstance(function, ast.ExpBQLDepProb):
+        return ('DEPENDENCE PROBABILITY', True, 1)
+    if isinstance(function, ast.ExpBQLMutInf):
+        return ('MUTUAL INFORMATION', True,
+            literal_nsamples(function.nsamples))
+    if isinstance(function, (ast.ExpBQLCorrel, ast.ExpBQLCorrelPval)):
+        return ('CORRELATION', False, 0)
+    if isinstance(function, (ast.ExpBQLPredict, ast.ExpBQLPredictConf,
+            ast.PredCol)):
+        return ('PREDICT', True, literal_nsamples(function.nsamples))
+    return (type(function).__name__, True, 1)
+
+def literal_nsamples(nsamples):
+    if nsamples is None:
+        return DEFAULT_NSAMPLES
+    if isinstance(nsamples, ast.ExpLit) and \
+            isinstance(nsamples.value, ast.LitInt):
+        return nsamples.value.value
+    # Parameters and expressions are not known until execution.
+    return DEFAULT_NSAMPLES
+
+def population_nmodels(bdb, population_id, generator, modelnos=None):
+    if generator is None:
+        generator_ids = core.bayesdb_population_generators(bdb,
+            population_id)
+    else:
+        if not core.bayesdb_has_generator(bdb, population_id, generator):
+            raise BQLError(bdb, 'No such generator: %r' % (generator,))
+        generator_ids = [
+            core.bayesdb_get_generator(bdb, population_id, generator),
+        ]
+    nmodels = 0
+    for generator_id in generator_ids:
+        count = bdb.sql_execute('''
+            SELECT COUNT(*) FROM bayesdb_generator_model
+                WHERE generator_id = ?
+        ''', (generator_id,)).fetchvalue()
+        # USING MODELS consults only the models it selects.
+        if isinstance(modelnos, ast.TopModels):
+            count = min(count, modelnos.count)
+        elif modelnos is not None:
+            count = min(count, len(modelnos))
+        nmodels += count
+    return nmodels
+
+def population_nrows(bdb, population_id):
+    table_name = core.bayesdb_population_table(bdb, population_id)
+    qt = sqlite3_quote_name(table_name)
+    return bdb.sql_execute('SELECT COUNT(*) FROM %s' % (qt,)).fetchvalue()
@@ -22,6 +22,8 @@ phrase_opt(none)        ::= .
 phrase_opt(some)        ::= phrase(phrase).
 phrase(command)         ::= command(c).
 phrase(query)           ::= query(q).
+phrase(explain)         ::= K_EXPLAIN query(q).
+phrase(explain_plan)    ::= K_EXPLAIN K_QUERY K_PLAN query(q).
 
 /*
  * Transactions
@@ -160,6 +162,7 @@ command(init_models)    ::= K_INITIALIZE L_INTEGER(n) K_MODEL|K_MODELS
                                 K_FOR generator_name(generator).
 command(analyze_models) ::= K_ANALYZE generator_name(generator)
                                 anmodelset_opt(models) anlimit(anlimit)
+                                anconverge_opt(converge)
                                 anckpt_opt(anckpt)
                                 wait_opt(wait)
                                 analysis_program_opt(program).
@@ -204,6 +207,15 @@ modelrange(multi)       ::= L_INTEGER(minno) T_MINUS L_INTEGER(maxno).
 anlimit(one)      ::= K_FOR anduration(duration).
 anlimit(two)      ::= K_FOR anduration(duration0) K_OR anduration(duration1).
 
+anconverge_opt(none)    ::= .
+anconverge_opt(some)    ::= K_UNTIL K_CONVERGED anwindow_opt(window)
+                                antolerance_opt(tolerance).
+anwindow_opt(none)      ::= .
+anwindow_opt(some)      ::= K_WINDOW L_INTEGER(n).
+antolerance_opt(none)   ::= .
+antolerance_opt(integer) ::= K_TOLERANCE L_INTEGER(n).
+antolerance_opt(float)  ::= K_TOLERANCE L_FLOAT(x).
+
 anckpt_opt(none)        ::= .
 anckpt_opt(some)        ::= K_CHECKPOINT anduration(duration).
 
@@ -224,12 +236,14 @@ analysis_token(primitive)       ::= ANY(t).
 simulate(s)             ::= K_SIMULATE simulate_columns(cols)
                                 K_FROM population_name(population)
                                 modelledby_opt(generator)
+                                usingmodels_opt(modelnos)
                                 given_opt(constraints)
                                 limit(lim)
                                 accuracy_opt(acc).
 simulate(nolimit)       ::= K_SIMULATE simulate_columns(cols)
                                 K_FROM population_name(population)
                                 modelledby_opt(generator)
+                                usingmodels_opt(modelnos)
                                 given_opt(constraints).
 
 simulate_columns(one)   ::= simulate_column(col).
@@ -280,6 +294,7 @@ select(s)               ::= K_SELECT select_quant(quant) select_columns(cols)
 estimate(e)             ::= K_ESTIMATE select_quant(quant) select_columns(cols)
                                 from_est(tabs)
                                 modelledby_opt(generator)
+                                usingmodels_opt(modelnos)
                                 where(cond)
                                 group_by(grouping)
                                 order_by(ord)
@@ -291,18 +306,21 @@ estpaircol(e)           ::= K_ESTIMATE K_PAIRWISE error T_SEMI.
 
 estby(e)                ::= K_ESTIMATE select_quant(quant) select_columns(cols)
                                 K_BY|K_WITHIN population_name(population)
-                                modelledby_opt(generator).
+                                modelledby_opt(generator)
+                                usingmodels_opt(modelnos).
 
 infer(auto)             ::= K_INFER infer_auto_columns(cols)
                                 withconf_opt(conf)
                                 nsamples_opt(nsamp)
                                 K_FROM population_name(population)
                                 modelledby_opt(generator)
+                                usingmodels_opt(modelnos)
                                 where(cond) group_by(grouping) order_by(ord)
                                 limit_opt(lim).
 infer(explicit)         ::= K_INFER K_EXPLICIT infer_exp_columns(cols)
                                 K_FROM population_name(population)
                                 modelledby_opt(generator)
+                                usingmodels_opt(modelnos)
                                 where(cond) group_by(grouping) order_by(ord)
                                 limit_opt(lim).
 
@@ -358,6 +376,10 @@ from_est(paircol)       ::= K_FROM K_PAIRWISE K_COLUMNS|K_VARIABLES K_OF
 modelledby_opt(none)    ::= .
 modelledby_opt(some)    ::= K_MODELED|K_MODELLED K_BY generator_name(gen).
 
+usingmodels_opt(none)   ::= .
+usingmodels_opt(some)   ::= K_USING K_MODEL|K_MODELS modelset(m).
+usingmodels_opt(top)    ::= K_USING K_TOP L_INTEGER(k) K_MODEL|K_MODELS.
+
 /* XXX Allow all kinds of joins.  */
 select_tables(one)      ::= select_table(t).
 select_tables(many)     ::= select_tables(ts) T_COMMA select_table(t).
@@ -559,18 +581,24 @@ unary(bql)              ::= bqlfn(b).
  * operators.
  */
 bqlfn(predprob_row)     ::= K_PREDICTIVE K_PROBABILITY K_OF column_name(col).
+bqlfn(predprob_row_all) ::= K_PREDICTIVE K_PROBABILITY K_OF T_STAR.
 bqlfn(prob_const)       ::= K_PROBABILITY K_OF column_name(col)
                                 T_EQ unary(e).
+bqlfn(prob_const_budget) ::= K_PROBABILITY K_OF column_name(col)
+                                T_EQ primary(e) budget(budget).
 bqlfn(jprob_const)      ::= K_PROBABILITY K_OF
-                                T_LROUND constraints_opt(targets) T_RROUND.
+                                T_LROUND constraints_opt(targets) T_RROUND
+                                budget_opt(budget).
 bqlfn(condprob_const)   ::= K_PROBABILITY K_OF column_name(col)
                                 T_EQ primary(e)
                                 K_GIVEN T_LROUND constraints_opt(constraints)
-                                        T_RROUND.
+                                        T_RROUND
+                                budget_opt(budget).
 bqlfn(condjprob_const)  ::= K_PROBABILITY K_OF
                                 T_LROUND constraints_opt(targets) T_RROUND
                                 K_GIVEN T_LROUND constraints_opt(constraints)
-                                        T_RROUND.
+                                        T_RROUND
+                                budget_opt(budget).
 /* XXX Givens for PROBABILITY OF VALUE function of columns?      */
 bqlfn(prob_1col)        ::= K_PROBABILITY K_OF K_VALUE unary(e).
 bqlfn(condprob_1col)    ::= K_PROBABILITY K_OF K_VALUE primary(e)
@@ -587,7 +615,8 @@ bqlfn(sim_2row)         ::= K_SIMILARITY wrt(cols).
 bqlfn(depprob)          ::= K_DEPENDENCE K_PROBABILITY ofwith(cols).
 
 bqlfn(mutinf)           ::= K_MUTUAL K_INFORMATION ofwithmulti(cols)
-                                mi_given_opt(constraints) nsamples_opt(nsamp).
+                                mi_given_opt(constraints) nsamples_opt(nsamp)
+                                budget_opt(budget).
 
 ofwithmulti(bql_2col)   ::= .
 ofwithmulti(bql_1col)   ::= K_WITH mi_columns(cols).
@@ -631,6 +660,25 @@ ofwith(bql_const)       ::= K_OF column_name(col1) K_WITH column_name(col2).
 nsamples_opt(none)      ::= .
 nsamples_opt(some)      ::= K_USING primary(nsamples) K_SAMPLES.
 
+/*
+ * Anytime estimation: stop sampling after a time limit, or once the
+ * standard error of the estimate is small enough, whichever is first.
+ *
+ * XXX WITHIN <n> SECONDS would read better, but conflicts with
+ * ESTIMATE ... WITHIN <population>; FOR <n> SECONDS follows ANALYZE.
+ */
+budget_opt(none)        ::= .
+budget_opt(some)        ::= budget(budget).
+
+budget(time)            ::= K_FOR primary(seconds) K_SECOND|K_SECONDS
+                                maxerror_opt(error).
+budget(error)           ::= maxerror(error).
+
+maxerror_opt(none)      ::= .
+maxerror_opt(some)      ::= maxerror(error).
+
+maxerror(e)             ::= K_MAX K_ERROR primary(error).
+
 column_lists(one)       ::= column_list(collist).
 column_lists(many)      ::= column_lists(collists)
                                 T_COMMA|K_AND column_list(collist).
@@ -719,6 +767,7 @@ typearg(negative)       ::= T_MINUS L_INTEGER(i).
         K_COMMIT
         K_CONF
         K_CONFIDENCE
+        K_CONVERGED
         K_CORRELATION
         K_CREATE
         K_DEFAULT
@@ -726,11 +775,13 @@ typearg(negative)       ::= T_MINUS L_INTEGER(i).
         K_DESC
         K_DISTINCT
         K_DROP
+        K_ERROR
         K_ELSE
         K_END
         K_ESCAPE
         K_ESTIMATE
         K_EXISTS
+        K_EXPLAIN
         K_EXPLICIT
         K_FOR
         K_FROM
@@ -754,6 +805,7 @@ typearg(negative)       ::= T_MINUS L_INTEGER(i).
         K_LIKE
         K_LIMIT
         K_MATCH
+        K_MAX
         K_METAMODEL
         K_MINUTE
         K_MINUTES
@@ -770,11 +822,13 @@ typearg(negative)       ::= T_MINUS L_INTEGER(i).
         K_OR
         K_ORDER
         K_PAIRWISE
+        K_PLAN
         K_POPULATION
         K_PREDICT
         K_PREDICTIVE
         K_PROBABILITY
         K_PVALUE
+        K_QUERY
         K_REGEXP
         K_RENAME
         K_RESPECT
@@ -795,7 +849,10 @@ typearg(negative)       ::= T_MINUS L_INTEGER(i).
         K_TEMPORARY
         K_THEN
         K_TO
+        K_TOLERANCE
+        K_TOP
         K_UNSET
+        K_UNTIL
         K_USING
         K_VALUE
         K_VARIABLE
@@ -803,6 +860,7 @@ typearg(negative)       ::= T_MINUS L_INTEGER(i).
         K_WAIT
         /* K_WHEN */
         K_WHERE
+        K_WINDOW
         K_WITH
         K_WITHIN
         .
@@ -21,21 +21,26 @@ sort of Bayesian model selection.  They are based on crude attempts to
 parse data as numbers, and on fixed parameters for distinguishing
 nominal and numerical data.  No columns are ever guessed to be
 cyclic.
+
+The data are read in a single pass.  Each column's values are counted
+exactly until the column has too many distinct values, after which
+they are summarized in bounded memory by approximate sketches: heavy
+hitters, estimates of the number of distinct values, and a few
+witnesses of values that fail to parse as numbers.
 """
 
-import collections
+import heapq
+import itertools
 import math
-import os
 
 import bayeslite.core as core
 
-from bayeslite.exception import BQLError
 from bayeslite.sqlite3_util import sqlite3_quote_name
 from bayeslite.util import casefold
-from bayeslite.util import unique
+from bayeslite.util import cursor_value
 
 def bayesdb_guess_population(bdb, population, table,
-        ifnotexists=None, **kwargs):
+        ifnotexists=None, sample=None, **kwargs):
     """Heuristically guess a population schema for `table`.
 
     Based on the data in `table`, create a population named
@@ -43,6 +48,9 @@ def bayesdb_guess_population(bdb, population, table,
 
     :param bool ifnotexists: if true or ``None`` and `population`
         already exists, do nothing.
+    :param int sample: if not ``None``, guess based on a pseudorandom
+        sample of about `sample` rows of `table` rather than on all of
+        its rows.
     :param dict kwargs: options to pass through to bayesdb_guess_stattypes.
 
     In addition to statistical types, the overrides may specify
@@ -62,11 +70,18 @@ def bayesdb_guess_population(bdb, population, table,
             else:
                 raise ValueError('Population exists: %r' % (population,))
         qt = sqlite3_quote_name(table)
+        if sample is not None:
+            nrows = cursor_value(
+                bdb.sql_execute('SELECT COUNT(*) FROM %s' % (qt,)))
         cursor = bdb.sql_execute('SELECT * FROM %s' % (qt,))
         column_names = [d[0] for d in cursor.description]
-        rows = cursor.fetchall()
+        rows = cursor
+        sampled = sample is not None and sample < nrows
+        if sampled:
+            rows = sample_rows(bdb, cursor, float(sample) / nrows)
         stattypes = [st[0] for st in
-            bayesdb_guess_stattypes(column_names, rows, **kwargs)]
+            bayesdb_guess_stattypes(column_names, rows, sampled=sampled,
+                all_distinct=table_all_distinct(bdb, table), **kwargs)]
         # Convert the `key` column to an `ignore`.
         replace = lambda s: 'ignore' if s == 'key' else s
         column_names, stattypes = unzip([
@@ -83,6 +98,29 @@ def bayesdb_guess_population(bdb, population, table,
         qs = ';'.join(qcn + ' ' + qst for qcn, qst in zip(qcns, qsts))
         bdb.execute('CREATE POPULATION %s FOR %s(%s)' % (qp, qt, qs))
 
+def table_all_distinct(bdb, table):
+    """Return a function checking exactly for keys of `table`.
+
+    The function takes a column name and whether to compare its values
+    as numbers, and returns true if and only if the column's values
+    are all non-null and distinct.  It is suitable as the
+    `all_distinct` argument of :func:`bayesdb_guess_stattypes`.
+    """
+    qt = sqlite3_quote_name(table)
+    def all_distinct(column_name, numeric):
+        qc = sqlite3_quote_name(column_name)
+        if numeric:
+            qc = 'CAST(%s AS REAL)' % (qc,)
+        cursor = bdb.sql_execute('SELECT COUNT(DISTINCT %s) = COUNT(*) FROM %s'
+            % (qc, qt))
+        return bool(cursor_value(cursor))
+    return all_distinct
+
+def sample_rows(bdb, rows, p):
+    # Bernoulli sample, reproducible from the BayesDB's seed.
+    prng = bdb.py_prng
+    return (row for row in rows if prng.random() < p)
+
 def unzip(l):                   # ???
     xs = []
     ys = []
@@ -93,12 +131,16 @@ def unzip(l):                   # ???
 
 def bayesdb_guess_stattypes(column_names, rows, null_values=None,
         numcat_count=None, numcat_ratio=None, distinct_ratio=None,
-        nullify_ratio=None, overrides=None):
+        nullify_ratio=None, overrides=None, distinct_limit=None,
+        all_distinct=None, sampled=None):
     """Heuristically guess statistical types for the data in `rows`.
 
     Return a list of (statistical type, reason) corresponding to the columns
     named in the list `column_names`.
 
+    `rows` may be any iterable of rows, such as a cursor.  It is
+    consumed in a single pass.
+
     :param set null_values: values to nullify.
     :param int numcat_count: number of distinct values below which
         columns whose values can all be parsed as numbers will be
@@ -114,6 +156,17 @@ def bayesdb_guess_stattypes(column_names, rows, null_values=None,
         nullified (set to 1 to turn off).
     :param list overrides: list of ``(name, stattype)``, overriding
         any guessed statistical type for columns by those names
+    :param int distinct_limit: number of distinct values in a column
+        above which its values are summarized by approximate sketches
+        rather than counted exactly
+    :param function all_distinct: function of a column name and
+        whether to compare its values as numbers, returning true if
+        and only if the column's values are all non-null and distinct.
+        A column summarized by sketches is guessed or accepted as a key
+        only if this confirms it, and never if it is ``None``.
+    :param bool sampled: if true, `rows` are only a sample of the rows
+        that `all_distinct` checks, so that, as with sketches, no
+        column is a key unless `all_distinct` confirms it.
 
     In addition to statistical types, the overrides may specify
     ``key`` or ``ignore``.
@@ -132,6 +185,10 @@ def bayesdb_guess_stattypes(column_names, rows, null_values=None,
         nullify_ratio = 0.9
     if overrides is None:
         overrides = []
+    if distinct_limit is None:
+        distinct_limit = 32768
+    if sampled is None:
+        sampled = False
 
     # Build a set of the column names.
     column_name_set = set()
@@ -169,57 +226,92 @@ def bayesdb_guess_stattypes(column_names, rows, null_values=None,
             'Duplicate columns overridden: %s'
             % (repr(list(duplicates)),))
 
-    # Sanity-check the inputs.
-    ncols = len(column_names)
-    assert ncols == len(unique(map(casefold, column_names)))
-    for ri, row in enumerate(rows):
-        if len(row) < ncols:
-            raise ValueError(
-                'Row %d: Too few columns: %d < %d'
-                % (ri, len(row), ncols))
-        if len(row) > ncols:
-            raise ValueError(
-                'Row %d: Too many columns: %d > %d'
-                % (ri, len(row), ncols))
-
     # Find a key first, if it has been specified as an override.
     key = None
     duplicate_keys = set()
-    for ci, column_name in enumerate(column_names):
-        if casefold(column_name) in override_map:
-            if override_map[casefold(column_name)] == 'key':
-                if key is not None:
-                    duplicate_keys.add(column_name)
-                    continue
-                column = [row[ci] for row in rows]
-                ints = integerify(column)
-                if ints:
-                   column = ints
-                if not keyable_p(column):
-                    raise ValueError(
-                        'Column non-unique but specified as key: %s'
-                        % (repr(column_name),))
-                key = column_name
+    for column_name in column_names:
+        if override_map.get(casefold(column_name)) == 'key':
+            if key is not None:
+                duplicate_keys.add(column_name)
+                continue
+            key = column_name
     if 0 < len(duplicate_keys):
         raise ValueError(
             'Multiple columns overridden as keys: %s'
             % (repr(list(duplicate_keys)),))
 
+    # Summarize the columns in a single pass over the rows.  Columns
+    # whose stattype is overridden need no summary, except for the
+    # key, which must be checked for uniqueness -- of its raw values,
+    # without nullifying any.
+    ncols = len(column_names)
+    summaries = []
+    nullses = []
+    for column_name in column_names:
+        stattype = override_map.get(casefold(column_name))
+        if stattype is None or stattype == 'key':
+            summaries.append(ColumnSummary(distinct_limit))
+        else:
+            summaries.append(None)
+        nullses.append(frozenset() if stattype == 'key' else null_values)
+    columns = [(summary, nulls)
+        for summary, nulls in zip(summaries, nullses)
+        if summary is not None]
+    indices = [ci for ci, summary in enumerate(summaries)
+        if summary is not None]
+    rows = iter(rows)
+    ri = 0
+    while True:
+        chunk = list(itertools.islice(rows, GUESS_CHUNK_ROWS))
+        if not chunk:
+            break
+        for row in chunk:
+            if len(row) < ncols:
+                raise ValueError(
+                    'Row %d: Too few columns: %d < %d'
+                    % (ri, len(row), ncols))
+            if len(row) > ncols:
+                raise ValueError(
+                    'Row %d: Too many columns: %d > %d'
+                    % (ri, len(row), ncols))
+            ri += 1
+        for (summary, nulls), ci in zip(columns, indices):
+            summary.update([None if row[ci] in nulls else row[ci]
+                for row in chunk])
+
+    def confirmer(column_name):
+        if all_distinct is None:
+            return None
+        return lambda numeric: all_distinct(column_name, numeric)
+
+    if key is not None:
+        view = summaries[column_names.index(key)].view()
+        if (view.approximate or sampled) and all_distinct is None:
+            raise ValueError(
+                'Column has too many values, or only a sample, to check'
+                ' as key: %s'
+                % (repr(key),))
+        if not keyable_p(view, confirmer(key), sampled):
+            raise ValueError(
+                'Column non-unique but specified as key: %s'
+                % (repr(key),))
+
     # Now go through and guess the other column stattypes or use the override.
     stattypes = []
-    for ci, column_name in enumerate(column_names):
+    for column_name, summary in zip(column_names, summaries):
         if casefold(column_name) in override_map:
             stattype = override_map[casefold(column_name)]
             reason = 'User override.'
         else:
-            column = nullify(null_values, rows, ci)
             [stattype, reason] = guess_column_stattype(
-                column,
+                summary.view(),
                 distinct_ratio=distinct_ratio,
                 nullify_ratio=nullify_ratio,
                 numcat_count=numcat_count,
                 numcat_ratio=numcat_ratio,
-                have_key=(key is not None)
+                have_key=(key is not None),
+                confirm_key=confirmer(column_name),
+                sampled=sampled
             )
             if stattype == 'key':
                 key = column_name
@@ -227,36 +319,23 @@ def bayesdb_guess_stattypes(column_names, rows, null_values=None,
     return stattypes
 
 def guess_column_stattype(column, reason='', **kwargs):
-    counts = count_values(column)
-    if None in counts:
-        del counts[None]
-    if len(counts) < 2:
+    if column.distinct() < 2:
         return [
             'ignore',
             '%s There is only one unique value.' % (reason,)
         ]
-    (most_numerous_key, most_numerous_count) = sorted(
-        counts.items(), key=lambda item: item[1], reverse=True)[0]
-    if most_numerous_count / float(len(column)) > kwargs['nullify_ratio']:
-        column = [None if v == most_numerous_key else v for v in column]
+    (most_numerous_key, most_numerous_count) = column.most_common()
+    if most_numerous_count / float(column.count) > kwargs['nullify_ratio']:
         return guess_column_stattype(
-            column,
+            column.nullify(most_numerous_key),
             '%s More than %d percent of the values are the same, so the '
                 'statistical type was guessed based on the remainder of the '
                 'values.' % (reason, int(100 * kwargs['nullify_ratio']),),
             **kwargs
         )
-    numericable = True
-    ints = integerify(column)
-    if ints:
-        column = ints
-    else:
-        floats = floatify(column)
-        if floats:
-            column = floats
-        else:
-            numericable = False
-    if not kwargs['have_key'] and keyable_p(column):
+    numericable = column.float_parsable()
+    if not kwargs['have_key'] and \
+       keyable_p(column, kwargs['confirm_key'], kwargs['sampled']):
         return [
             'key',
             '%s This was the first column in the table with all distinct '
@@ -272,8 +351,8 @@ def guess_column_stattype(column, reason='', **kwargs):
                 % (reason, kwargs['numcat_count'],
                     int(100 * kwargs['numcat_ratio']))
         ]
-    elif (len(counts) > kwargs['numcat_count'] and
-        len(counts) / float(len(column)) > kwargs['distinct_ratio']):
+    elif (column.distinct() > kwargs['numcat_count'] and
+        column.distinct() / float(column.count) > kwargs['distinct_ratio']):
         return [
             'ignore',
             '%s There are more than %d distinct values and they account '
@@ -298,51 +377,321 @@ def guess_column_stattype(column, reason='', **kwargs):
                 '%s The values are nonnumerical.' % (reason,)
             ]
 
-
-def nullify(null_values, rows, ci):
-    return [row[ci] if row[ci] not in null_values else None for row in rows]
-
-def integerify(column):
-    result = []
-    if float in [v.__class__ for v in column ]:
-        return None
-    try:
-        result = [int(v) for v in column]
-    except (ValueError, TypeError):
-        return None
-    return result
-
-def floatify(column):
-    result = []
-    try:
-        result = [float(v) if v is not None else float('NaN') for v in column]
-    except (ValueError, TypeError):
-        return None
-    return result
-
-def keyable_p(column):
-    # `unique' can't cope with NaNs, so reject them early.
-    if any(v is None or (isinstance(v, float) and math.isnan(v))
-           for v in column):
+def keyable_p(column, confirm=None, sampled=False):
+    # The column is taken as numbers if they all parse, in which case
+    # they must be integers and not NaN.  Nulls disqualify it outright.
+    # If the rows are `sampled`, the summary can only rule a key out,
+    # as if it were a sketch.
+    if column.nulls > 0:
         return False
-    try:
-        column_floats = [float(v) for v in column]
-        if not all(v.is_integer() for v in column_floats):
+    numeric = column.float_parsable()
+    if numeric:
+        if column.has_nan() or not column.all_integral():
             return False
-        return len(column) == len(unique(column))
-    except ValueError:
-        return len(column) == len(unique(column))
+        ndistinct = column.distinct_numeric()
+    else:
+        ndistinct = column.distinct()
+    if not (column.approximate or sampled):
+        return ndistinct == column.count
+    # A sketch can only rule a key out: duplicates may hide within its
+    # error, or outside the sample, so confirm the rest exactly with
+    # `confirm`, if we can.
+    if ndistinct < column.count * (1 - KEY_TOLERANCE) or confirm is None:
+        return False
+    return confirm(numeric)
 
 def numerical_p(column, count_cutoff, ratio_cutoff):
-    nu = len(unique([v for v in column if not math.isnan(v)]))
+    nu = column.distinct_numeric()
     if nu <= count_cutoff:
         return False
-    if float(nu) / float(len(column)) <= ratio_cutoff:
+    if float(nu) / float(column.count) <= ratio_cutoff:
         return False
     return True
 
-def count_values(column):
-    counts = collections.defaultdict(int)
-    for v in column:
-        counts[v] += 1
-    return counts
+# Number of rows read at a time while guessing.
+GUESS_CHUNK_ROWS = 4096
+
+# Values of a column are classified by which of the following tests
+# they fail.
+NONFLOAT = 'nonfloat'           # does not parse as a number
+NONINT = 'nonint'               # does not parse as an integer
+NAN = 'nan'                     # parses as NaN
+NONINTEGRAL = 'nonintegral'     # parses as a non-integral number
+PREDICATES = (NONFLOAT, NONINT, NAN, NONINTEGRAL)
+
+def parse_number(value):
+    """Return the number that non-null `value` parses as, or None.
+
+    Integers are returned as ints, to keep large ones exact, and all
+    else as floats.  Values of type float never count as integers.
+    """
+    if not isinstance(value, float):
+        try:
+            return int(value)
+        except (ValueError, TypeError):
+            pass
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return None
+
+def classify_value(value, number):
+    failures = []
+    if number is None:
+        failures.append(NONFLOAT)
+    if number is None or isinstance(number, float):
+        failures.append(NONINT)
+    if isinstance(number, float):
+        if math.isnan(number):
+            failures.append(NAN)
+        elif not number.is_integer():
+            failures.append(NONINTEGRAL)
+    return failures
+
+class ColumnSummary(object):
+    """Single-pass summary of the values in one column.
+
+    Values are counted exactly in a histogram until there are more
+    than `distinct_limit` distinct ones, at which point they are fed
+    to a bounded-memory :class:`ColumnSketch` instead.  Values arrive
+    in chunks of at most GUESS_CHUNK_ROWS.
+    """
+
+    def __init__(self, distinct_limit):
+        self._distinct_limit = distinct_limit
+        self._histogram = {}
+        self._sketch = None
+
+    def update(self, values):
+        if self._sketch is not None:
+            self._sketch.update(values)
+            return
+        histogram = self._histogram
+        get = histogram.get
+        for value in values:
+            histogram[value] = get(value, 0) + 1
+        if len(histogram) > self._distinct_limit:
+            self._sketch = ColumnSketch()
+            for v, count in histogram.iteritems():
+                self._sketch.add(v, count)
+            self._histogram = None
+
+    def view(self):
+        if self._sketch is not None:
+            return SketchView(self._sketch)
+        return HistogramView(self._histogram)
+
+class HistogramView(object):
+    """Exact view of a column's values, from a histogram."""
+
+    approximate = False
+
+    def __init__(self, histogram):
+        self._histogram = histogram
+        self._numbers = None
+        self._failures = None
+        self.count = sum(histogram.itervalues())
+        self.nulls = histogram.get(None, 0)
+
+    def distinct(self):
+        return len(self._histogram) - (1 if None in self._histogram else 0)
+
+    def most_common(self):
+        return max(((v, c) for v, c in self._histogram.iteritems()
+                if v is not None),
+            key=lambda item: item[1])
+
+    def nullify(self, value):
+        histogram = dict(self._histogram)
+        histogram[None] = histogram.get(None, 0) + histogram.pop(value)
+        return HistogramView(histogram)
+
+    def _classify(self):
+        if self._failures is not None:
+            return
+        self._numbers = set()
+        self._failures = dict((predicate, False) for predicate in PREDICATES)
+        for value in self._histogram:
+            if value is None:
+                continue
+            number = parse_number(value)
+            for predicate in classify_value(value, number):
+                self._failures[predicate] = True
+            if number is not None and not (isinstance(number, float) and
+                    math.isnan(number)):
+                self._numbers.add(number)
+
+    def _fails(self, predicate):
+        self._classify()
+        return self._failures[predicate]
+
+    def int_parsable(self):
+        return self.nulls == 0 and not self._fails(NONINT)
+
+    def float_parsable(self):
+        return not self._fails(NONFLOAT)
+
+    def has_nan(self):
+        return self.nulls > 0 or self._fails(NAN)
+
+    def all_integral(self):
+        return not self._fails(NONINTEGRAL)
+
+    def distinct_numeric(self):
+        self._classify()
+        return len(self._numbers)
+
+# Parameters of the sketches for columns with many distinct values.
+# Misra-Gries with HEAVY_HITTERS counters finds every value holding
+# more than 1/(HEAVY_HITTERS + 1) of the column, undercounting each by
+# at most that fraction.  The K-minimum-values estimate of the number
+# of distinct values has relative standard error about
+# 1/sqrt(DISTINCT_SKETCH); a column may be a key only if the estimate
+# is within KEY_TOLERANCE of the number of rows, and is then checked
+# exactly.
+HEAVY_HITTERS = 64
+DISTINCT_SKETCH = 2048
+KEY_TOLERANCE = 3 / math.sqrt(DISTINCT_SKETCH)
+WITNESSES = 8
+
+class ColumnSketch(object):
+    """Bounded-memory sketch of the values in one column."""
+
+    def __init__(self):
+        self.count = 0
+        self.nulls = 0
+        self.heavy = {}
+        self.raw = DistinctSketch(DISTINCT_SKETCH)
+        self.numeric = DistinctSketch(DISTINCT_SKETCH)
+        # For each predicate, up to WITNESSES distinct values failing
+        # it, or None if there are more than that.
+        self.witnesses = dict((predicate, set()) for predicate in PREDICATES)
+
+    def update(self, values):
+        # Feed each distinct value of the chunk once, with its count.
+        counts = {}
+        get = counts.get
+        for value in values:
+            counts[value] = get(value, 0) + 1
+        add = self.add
+        for value, count in counts.iteritems():
+            add(value, count)
+
+    def add(self, value, count):
+        self.count += count
+        if value is None:
+            self.nulls += count
+            return
+        self._add_heavy(value, count)
+        self.raw.add(value)
+        number = parse_number(value)
+        if number is not None and not (isinstance(number, float) and
+                math.isnan(number)):
+            self.numeric.add(number)
+        for predicate in classify_value(value, number):
+            witnesses = self.witnesses[predicate]
+            if witnesses is None or value in witnesses:
+                continue
+            if len(witnesses) < WITNESSES:
+                witnesses.add(value)
+            else:
+                self.witnesses[predicate] = None
+
+    def _add_heavy(self, value, count):
+        # Misra-Gries, weighted: if there is no room for the value,
+        # decrement all counters and the value's count together until
+        # either there is room or the value's count is exhausted.
+        heavy = self.heavy
+        if value in heavy:
+            heavy[value] += count
+            return
+        while count > 0 and len(heavy) >= HEAVY_HITTERS:
+            decrement = min(count, min(heavy.itervalues()))
+            count -= decrement
+            for v in heavy.keys():
+                heavy[v] -= decrement
+                if heavy[v] == 0:
+                    del heavy[v]
+        if count > 0:
+            heavy[value] = count
+
+class SketchView(object):
+    """Approximate view of a column's values, from a sketch."""
+
+    approximate = True
+
+    def __init__(self, sketch, nullified=frozenset(), nulls=None):
+        self._sketch = sketch
+        self._nullified = nullified
+        self.count = sketch.count
+        self.nulls = sketch.nulls if nulls is None else nulls
+
+    def distinct(self):
+        return max(0, self._sketch.raw.estimate() - len(self._nullified))
+
+    def most_common(self):
+        counts = [(v, c) for v, c in self._sketch.heavy.iteritems()
+            if v not in self._nullified]
+        if not counts:
+            return (None, 0)
+        return max(counts, key=lambda item: item[1])
+
+    def nullify(self, value):
+        return SketchView(self._sketch, self._nullified | frozenset([value]),
+            self.nulls + self._sketch.heavy[value])
+
+    def _fails(self, predicate):
+        witnesses = self._sketch.witnesses[predicate]
+        return witnesses is None or bool(witnesses - self._nullified)
+
+    def int_parsable(self):
+        return self.nulls == 0 and not self._fails(NONINT)
+
+    def float_parsable(self):
+        return not self._fails(NONFLOAT)
+
+    def has_nan(self):
+        return self.nulls > 0 or self._fails(NAN)
+
+    def all_integral(self):
+        return not self._fails(NONINTEGRAL)
+
+    def distinct_numeric(self):
+        nullified = len([v for v in self._nullified
+            if NONFLOAT not in classify_value(v, parse_number(v))])
+        return max(0, self._sketch.numeric.estimate() - nullified)
+
+class DistinctSketch(object):
+    """K-minimum-values estimator of the number of distinct values."""
+
+    def __init__(self, k):
+        self._k = k
+        self._heap = []         # negated hashes, so the max is on top
+        self._hashes = set()
+
+    def add(self, value):
+        h = unit_hash(value)
+        heap = self._heap
+        if len(heap) < self._k:
+            if h not in self._hashes:
+                heapq.heappush(heap, -h)
+                self._hashes.add(h)
+        elif h < -heap[0] and h not in self._hashes:
+            self._hashes.remove(-heapq.heapreplace(heap, -h))
+            self._hashes.add(h)
+
+    def estimate(self):
+        if len(self._heap) < self._k:
+            return len(self._heap)
+        return int(round((self._k - 1) / -self._heap[0]))
+
+def unit_hash(value):
+    # Python's hash is the identity on small integers, so scramble it
+    # with the splitmix64 finalizer into a uniform number in (0, 1).
+    # Equal numbers hash equally, whether ints or floats.
+    mask = 0xffffffffffffffff
+    z = hash(value) & mask
+    z = ((z ^ (z >> 30)) * 0xbf58476d1ce4e5b9) & mask
+    z = ((z ^ (z >> 27)) * 0x94d049bb133111eb) & mask
+    z ^= z >> 31
+    return (z + 0.5) / 2.0**64
@@ -40,21 +40,104 @@ implications of the data in the table::
        print x
 """
 
+import threading
+import weakref
+
 from bayeslite.util import cursor_value
 
 builtin_metamodels = []
 builtin_metamodel_names = set()
 
 def bayesdb_builtin_metamodel(metamodel):
-    name = metamodel.name()
+    """Register `metamodel` in every BayesDB opened with builtins."""
+    bayesdb_builtin_metamodel_factory(metamodel.name(), lambda: metamodel)
+
+def bayesdb_builtin_metamodel_factory(name, factory):
+    """Register a lazily created builtin metamodel named `name`.
+
+    `factory` is called with no arguments, at most once per process,
+    the first time a BayesDB looks up a metamodel named `name`, e.g.
+    for ``CREATE GENERATOR ... USING name`` or to load an existing
+    generator.  It must return a metamodel instance named `name`.
+    This lets ``import bayeslite`` avoid importing the metamodels'
+    dependencies until they are needed.
+    """
     assert name not in builtin_metamodel_names
-    builtin_metamodels.append(metamodel)
+    builtin_metamodels.append(BuiltinMetamodel(name, factory))
     builtin_metamodel_names.add(name)
 
 def bayesdb_register_builtin_metamodels(bdb):
-    """Register all builtin metamodels in `bdb`."""
-    for metamodel in builtin_metamodels:
-        bayesdb_register_metamodel(bdb, metamodel)
+    """Register all builtin metamodels in `bdb`.
+
+    Each is created and registered only when first looked up in
+    `bdb.metamodels`.
+    """
+    for builtin in builtin_metamodels:
+        bdb.metamodels.defer(builtin)
+
+class BuiltinMetamodel(object):
+    """Builtin metamodel, created on demand from a factory."""
+
+    def __init__(self, name, factory):
+        self.name = name
+        self._factory = factory
+        self._metamodel = None
+        self._lock = threading.Lock()
+
+    def metamodel(self):
+        with self._lock:
+            if self._metamodel is None:
+                metamodel = self._factory()
+                if metamodel.name() != self.name:
+                    raise ValueError('Builtin metamodel %r named %r' %
+                        (self.name, metamodel.name()))
+                self._metamodel = metamodel
+            return self._metamodel
+
+class BayesDBMetamodels(dict):
+    """Mapping from name to metamodel registered in a BayesDB.
+
+    Builtin metamodels are deferred: looking one up by name creates
+    and registers it in the BayesDB on the first lookup.
+    """
+
+    def __init__(self, bdb):
+        super(BayesDBMetamodels, self).__init__()
+        self._bdb = weakref.ref(bdb)
+        self._deferred = {}
+        self._lock = threading.RLock()
+
+    def defer(self, builtin):
+        self._deferred[builtin.name] = builtin
+
+    def deferred(self):
+        """Return the names of builtin metamodels not yet registered."""
+        return sorted(self._deferred)
+
+    def _materialize(self, name):
+        if name not in self._deferred:
+            return
+        with self._lock:
+            builtin = self._deferred.pop(name, None)
+            if builtin is None:
+                return
+            try:
+                bayesdb_register_metamodel(self._bdb(), builtin.metamodel())
+            except Exception:
+                self._deferred[name] = builtin
+                raise
+
+    def __contains__(self, name):
+        self._materialize(name)
+        return super(BayesDBMetamodels, self).__contains__(name)
+
+    def __getitem__(self, name):
+        self._materialize(name)
+        return super(BayesDBMetamodels, self).__getitem__(name)
+
+    def get(self, name, default=None):
+        self._materialize(name)
+        return super(BayesDBMetamodels, self).get(name, default)
 
 def bayesdb_register_metamodel(bdb, metamodel):
     """Register `metamodel` in `bdb`, creating any necessary tables.
@@ -93,6 +176,11 @@ class IBayesDBMetamodel(object):
     the metamodel in the database.
     """
 
+    # Whether queries may name single models by `modelno`.  If not,
+    # the metamodel answers only for all of a generator's models, and
+    # is always given modelno ``None``.
+    selects_models = True
+
     def name(self):
         """Return the name of the metamodel as a str."""
         raise NotImplementedError
@@ -174,11 +262,17 @@ class IBayesDBMetamodel(object):
 
     def analyze_models(self, bdb, generator_id, modelnos=None, iterations=1,
             max_seconds=None, ckpt_iterations=None, ckpt_seconds=None,
-            program=None):
+            program=None, converge=None):
         """Analyze the specified model numbers of a generator.
 
         If none are specified, analyze all of them.
 
+        If `converge` is not None, it is a pair ``(window, tolerance)``,
+        either of which may be None for the metamodel's default, and
+        each model stops early once its analysis has converged by the
+        metamodel's criterion over the last `window` checkpoints.
+        Return the list of model numbers that converged.
+
         :param int iterations: maximum number of iterations of analysis for
             each model
         :param int max_seconds: requested maximum number of seconds to analyze
@@ -187,6 +281,7 @@ class IBayesDBMetamodel(object):
         :param int ckpt_seconds: number of seconds before committing results of
             anlaysis to the database
         :param object program: None, or list of tokens of analysis program
+        :param tuple converge: None, or ``(window, tolerance)``
         """
         raise NotImplementedError
 
@@ -219,6 +314,24 @@ class IBayesDBMetamodel(object):
         """Predict a value for a column and return confidence."""
         raise NotImplementedError
 
+    def predict_confidence_joint(self, bdb, generator_id, modelno, rowid,
+            colnos, numsamples=None):
+        """Predict values for several columns of a row, with confidences.
+
+        Returns a list of ``(value, confidence)`` pairs, one for each
+        column in `colnos`, all of which are missing from the row.
+
+        The default predicts each column separately with
+        :meth:`predict_confidence`.  Metamodels that can should
+        instead condition on the row once and derive every column's
+        prediction from one set of joint samples.
+        """
+        return [
+            self.predict_confidence(bdb, generator_id, modelno, rowid,
+                colno, numsamples=numsamples)
+            for colno in colnos
+        ]
+
     def simulate_joint(self, bdb, generator_id, rowid, targets, constraints,
             modelno, num_samples=1, accuracy=None):
         """Simulate `targets` from a generator, subject to `constraints`.
@@ -227,7 +340,8 @@ class IBayesDBMetamodel(object):
 
         `rowid` is an integer.
 
-        `modelno` may be `None`, meaning "all models"
+        `modelno` may be a model number, a list of model numbers, or
+        `None`, meaning "all models"
 
         `targets` is a list of ``(colno)``.
 
@@ -257,6 +371,75 @@ class IBayesDBMetamodel(object):
 
         `constraints` is a list of ``(colno, value)`` pairs.
 
-        `modelno` is a model number or `None`, meaning all models.
+        `modelno` is a model number, a list of model numbers, or
+        `None`, meaning all models.
         """
         raise NotImplementedError
+
+    def logpdf_leave_one_out(self, bdb, generator_id, rowid, targets,
+            constraints, modelno=None):
+        """Evaluate each of `targets` given the others and `constraints`.
+
+        Returns a list with, for each target in turn, its log density
+        subject to `constraints` and to all the other targets, as
+        ``PREDICTIVE PROBABILITY OF`` scores each cell of a row given
+        the rest of the row.
+
+        The default calls :meth:`logpdf_joint` once for each target.
+        Metamodels should instead share the work of conditioning on the
+        row among the targets.
+        """
+        return [self.logpdf_joint(bdb, generator_id, rowid, [target],
+                [other for j, other in enumerate(targets) if j != i] +
+                    constraints,
+                modelno)
+            for i, target in enumerate(targets)]
+
+    def condition(self, bdb, generator_id, rowid, constraints, modelno=None):
+        """Condition on `constraints` for evaluating many targets.
+
+        Returns a :class:`ConditionedQuery` whose ``logpdf(targets)``
+        is ``logpdf_joint(bdb, generator_id, rowid, targets,
+        constraints, modelno)``, and whose ``loglikelihood()`` is the
+        log density of the constraints themselves.
+
+        The default computes the likelihood once and evaluates each
+        target with :meth:`logpdf_joint`.  Metamodels should instead
+        do once whatever work depends only on the constraints.
+        """
+        return ConditionedQuery(self, bdb, generator_id, rowid, constraints,
+            modelno)
+
+class ConditionedQuery(object):
+    """A generator conditioned on constraints on a row.
+
+    Returned by :meth:`IBayesDBMetamodel.condition`, and valid only
+    for as long as the generator's models do not change.
+    """
+
+    def __init__(self, metamodel, bdb, generator_id, rowid, constraints,
+            modelno):
+        self.metamodel = metamodel
+        self.bdb = bdb
+        self.generator_id = generator_id
+        self.rowid = rowid
+        self.constraints = constraints
+        self.modelno = modelno
+        self._loglikelihood = None
+
+    def loglikelihood(self):
+        """Return the log density of the constraints."""
+        if self._loglikelihood is None:
+            self._loglikelihood = self._compute_loglikelihood()
+        return self._loglikelihood
+
+    def _compute_loglikelihood(self):
+        if not self.constraints:
+            return 0
+        return self.metamodel.logpdf_joint(self.bdb, self.generator_id,
+            self.rowid, self.constraints, [], self.modelno)
+
+    def logpdf(self, targets):
+        """Return the log density of `targets` given the constraints."""
+        return self.metamodel.logpdf_joint(self.bdb, self.generator_id,
+            self.rowid, targets, self.constraints, self.modelno)
@@ -26,8 +26,10 @@ from cgpm.crosscat.engine import Engine
 import bayeslite.core as core
 
 from bayeslite.exception import BQLError
+from bayeslite.metamodel import ConditionedQuery
 from bayeslite.metamodel import IBayesDBMetamodel
 from bayeslite.metamodel import bayesdb_metamodel_version
+from bayeslite.profiler import bayesdb_cache_lookup
 from bayeslite.sqlite3_util import sqlite3_quote_name
 from bayeslite.stats import arithmetic_mean
 from bayeslite.util import casefold
@@ -66,6 +68,8 @@ CREATE TABLE bayesdb_cgpm_category (
 '''
 
 class CGPM_Metamodel(IBayesDBMetamodel):
+    selects_models = False
+
     def __init__(self, cgpm_registry, multiprocess=None):
         self._cgpm_registry = cgpm_registry
         self._multiprocess = multiprocess
@@ -284,12 +288,15 @@ class CGPM_Metamodel(IBayesDBMetamodel):
     def analyze_models(
             self, bdb, generator_id, modelnos=None, iterations=None,
             max_seconds=None, ckpt_iterations=None, ckpt_seconds=None,
-            program=None):
+            program=None, converge=None):
 
         # Not sure why model-based analysis is useful.
         if modelnos:
             raise NotImplementedError('CGpm analysis by models not supported.')
 
+        if converge is not None:
+            raise NotImplementedError('CGpm analysis until converged.')
+
         # Checkpoint by seconds disabled.
         if ckpt_seconds:
             raise NotImplementedError('Checkpoint by seconds in CGPM analyze.')
@@ -381,6 +388,7 @@ class CGPM_Metamodel(IBayesDBMetamodel):
 
     def column_dependence_probability(
             self, bdb, generator_id, modelno, colno0, colno1):
+        self._check_modelno(bdb, generator_id, modelno)
         # Optimize special-case vacuous case of self-dependence.
         # XXX Caller should avoid this.
         if colno0 == colno1:
@@ -399,6 +407,7 @@ class CGPM_Metamodel(IBayesDBMetamodel):
     def column_mutual_information(
             self, bdb, generator_id, modelno, colnos0, colnos1,
             constraints=None, numsamples=None):
+        self._check_modelno(bdb, generator_id, modelno)
         # XXX Default number of samples drawn from my arse.
         if numsamples is None:
             numsamples = 1000
@@ -424,6 +433,7 @@ class CGPM_Metamodel(IBayesDBMetamodel):
 
     def row_similarity(
             self, bdb, generator_id, modelno, rowid, target_rowid, colnos):
+        self._check_modelno(bdb, generator_id, modelno)
         # Map the variable and individual indexing.
         cgpm_rowid = self._cgpm_rowid(bdb, generator_id, rowid)
         cgpm_target_rowid = self._cgpm_rowid(bdb, generator_id,
@@ -442,38 +452,52 @@ class CGPM_Metamodel(IBayesDBMetamodel):
 
     def predict_confidence(
             self, bdb, generator_id, modelno, rowid, colno, numsamples=None):
+        [(value, confidence)] = self.predict_confidence_joint(
+            bdb, generator_id, modelno, rowid, [colno], numsamples=numsamples)
+        return value, confidence
+
+    def predict_confidence_joint(
+            self, bdb, generator_id, modelno, rowid, colnos, numsamples=None):
         if not numsamples:
             numsamples = 2
         assert numsamples > 0
 
         def _impute_categorical(sample):
-            counts = Counter(s[0] for s in sample)
+            counts = Counter(sample)
             mode_count = max(counts[v] for v in counts)
             pred = iter(v for v in counts if counts[v] == mode_count).next()
             conf = float(mode_count) / numsamples
             return pred, conf
 
         def _impute_numerical(sample):
-            pred = sum(s[0] for s in sample) / float(len(sample))
+            pred = sum(sample) / float(len(sample))
             conf = 0 # XXX Punt confidence for now
             return pred, conf
 
-        # Retrieve the samples. Specifying `rowid` ensures that relevant
-        # constraints are retrieved by `simulate`, so provide empty constraints.
-        sample = self.simulate_joint(
-            bdb, generator_id, rowid, [colno], [], modelno, numsamples)
+        # Retrieve the samples of all columns at once, so the row is
+        # conditioned on only once.  Specifying `rowid` ensures that
+        # relevant constraints are retrieved by `simulate`, so provide
+        # empty constraints.
+        samples = self.simulate_joint(
+            bdb, generator_id, rowid, colnos, [], modelno, numsamples)
 
-        # Determine the imputation strategy (mode or mean).
-        stattype = core.bayesdb_variable_stattype(
-            bdb, core.bayesdb_generator_population(bdb, generator_id), colno)
-        if _is_categorical(stattype):
-            return _impute_categorical(sample)
-        else:
-            return _impute_numerical(sample)
+        # Determine each column's imputation strategy (mode or mean).
+        population_id = core.bayesdb_generator_population(bdb, generator_id)
+        predictions = []
+        for i, colno in enumerate(colnos):
+            sample = [s[i] for s in samples]
+            stattype = core.bayesdb_variable_stattype(
+                bdb, population_id, colno)
+            if _is_categorical(stattype):
+                predictions.append(_impute_categorical(sample))
+            else:
+                predictions.append(_impute_numerical(sample))
+        return predictions
 
     def simulate_joint(
             self, bdb, generator_id, rowid, targets, constraints, modelno,
             num_samples=None, accuracy=None):
+        self._check_modelno(bdb, generator_id, modelno)
         if num_samples is None:
             num_samples = 1
         full_constraints = self._merge_user_table_constraints(
@@ -502,20 +526,21 @@ class CGPM_Metamodel(IBayesDBMetamodel):
 
     def logpdf_joint(
             self, bdb, generator_id, rowid, targets, constraints, modelno):
-        cgpm_rowid = self._cgpm_rowid(bdb, generator_id, rowid)
+        return self.condition(
+            bdb, generator_id, rowid, constraints, modelno).logpdf(targets)
+
+    def condition(self, bdb, generator_id, rowid, constraints, modelno=None):
+        self._check_modelno(bdb, generator_id, modelno)
+        return CGPM_ConditionedQuery(
+            self, bdb, generator_id, rowid, constraints, modelno)
+
+    def _logpdf_conditioned(self, bdb, generator_id, cgpm_rowid,
+            cgpm_evidence, engine, targets):
         # TODO: Handle nan values in the logpdf query.
         cgpm_query = {
             colno: self._to_numeric(bdb, generator_id, colno, value)
             for colno, value in targets
         }
-        # Build the evidence, ignoring nan values.
-        cgpm_evidence = {}
-        for colno, value in constraints:
-            value_numeric = self._to_numeric(bdb, generator_id, colno, value)
-            if not math.isnan(value_numeric):
-                cgpm_evidence.update({colno: value_numeric})
-        # Retrieve the engine.
-        engine = self._engine(bdb, generator_id)
         logpdfs = engine.logpdf(
             cgpm_rowid, cgpm_query, cgpm_evidence, accuracy=None,
             multiprocess=self._multiprocess)
@@ -696,8 +721,11 @@ class CGPM_Metamodel(IBayesDBMetamodel):
     def _engine(self, bdb, generator_id):
         # Probe the cache.
         cache = self._cache(bdb)
-        if cache is not None and generator_id in cache.engine:
-            return cache.engine[generator_id]
+        if cache is not None:
+            hit = generator_id in cache.engine
+            bayesdb_cache_lookup(bdb, self.name(), hit)
+            if hit:
+                return cache.engine[generator_id]
 
         # Not cached.  Load the engine from the database.
         cursor = bdb.sql_execute('''
@@ -720,6 +748,14 @@ class CGPM_Metamodel(IBayesDBMetamodel):
             cache.engine[generator_id] = engine
         return engine
 
+    def _check_modelno(self, bdb, generator_id, modelno):
+        # The engine answers every query with all of its states, so it
+        # cannot honour a request for particular models.
+        if modelno is not None:
+            generator = core.bayesdb_generator_name(bdb, generator_id)
+            raise BQLError(bdb, 'CGPM generator %r cannot query a subset'
+                ' of its models: %r' % (generator, modelno))
+
     def _cgpm_rowid(self, bdb, generator_id, table_rowid):
         cursor = bdb.sql_execute('''
             SELECT cgpm_rowid FROM bayesdb_cgpm_individual
@@ -850,6 +886,40 @@ class CGPM_Metamodel(IBayesDBMetamodel):
             ]
         return table_constraints
 
+class CGPM_ConditionedQuery(ConditionedQuery):
+    """CGPM engine and evidence for evaluating many targets.
+
+    The row's cgpm rowid, the engine, and the numeric evidence are
+    found once, on first use, rather than for every target.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(CGPM_ConditionedQuery, self).__init__(*args, **kwargs)
+        self._state = None
+
+    def _prepare(self):
+        if self._state is None:
+            bdb = self.bdb
+            generator_id = self.generator_id
+            metamodel = self.metamodel
+            cgpm_rowid = metamodel._cgpm_rowid(bdb, generator_id, self.rowid)
+            # Build the evidence, ignoring nan values.
+            cgpm_evidence = {}
+            for colno, value in self.constraints:
+                value_numeric = metamodel._to_numeric(
+                    bdb, generator_id, colno, value)
+                if not math.isnan(value_numeric):
+                    cgpm_evidence.update({colno: value_numeric})
+            engine = metamodel._engine(bdb, generator_id)
+            self._state = (cgpm_rowid, cgpm_evidence, engine)
+        return self._state
+
+    def logpdf(self, targets):
+        cgpm_rowid, cgpm_evidence, engine = self._prepare()
+        return self.metamodel._logpdf_conditioned(
+            self.bdb, self.generator_id, cgpm_rowid, cgpm_evidence, engine,
+            targets)
+
 class CGPM_Cache(object):
     def __init__(self):
         self.schema = {}
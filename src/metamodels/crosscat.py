@@ -23,20 +23,26 @@ interface for Crosscat.
 """
 
 import apsw
+import importlib
 import itertools
 import json
 import math
+import numpy
 import struct
 import time
 
 import bayeslite.core as core
 import bayeslite.guess as guess
 import bayeslite.metamodel as metamodel
-import bayeslite.weakprng as weakprng
+import bayeslite.reservoir as reservoir
+import bayeslite.txn as txn
 import crosscat_generator_schema
 import crosscat_theta_validator
 
 from bayeslite.exception import BQLError
+from bayeslite.math_util import logmeanexp
+from bayeslite.math_util import logsumexp
+from bayeslite.profiler import bayesdb_cache_lookup
 from bayeslite.sqlite3_util import sqlite3_quote_name
 from bayeslite.stats import arithmetic_mean
 from bayeslite.util import casefold
@@ -296,42 +302,60 @@ class CrosscatMetamodel(metamodel.IBayesDBMetamodel):
             for row in cursor]
 
     def _crosscat_thetas(self, bdb, generator_id, modelno):
-        if modelno is not None:
+        if isinstance(modelno, list):
+            modelnos = modelno
+        elif modelno is not None:
             return {modelno: self._crosscat_theta(bdb, generator_id, modelno)}
-        sql = '''
-            SELECT modelno FROM bayesdb_crosscat_theta
-                WHERE generator_id = ?
-        '''
-        modelnos = (row[0] for row in bdb.sql_execute(sql, (generator_id,)))
+        else:
+            sql = '''
+                SELECT modelno FROM bayesdb_crosscat_theta
+                    WHERE generator_id = ?
+            '''
+            modelnos = (row[0]
+                for row in bdb.sql_execute(sql, (generator_id,)))
         return dict((modelno, self._crosscat_theta(bdb, generator_id, modelno))
             for modelno in modelnos)
 
     def _crosscat_theta(self, bdb, generator_id, modelno):
         cc_cache = self._crosscat_cache(bdb)
-        if cc_cache is not None and \
-           generator_id in cc_cache.thetas and \
-           modelno in cc_cache.thetas[generator_id]:
-            return cc_cache.thetas[generator_id][modelno]
-        sql = '''
-            SELECT theta_json FROM bayesdb_crosscat_theta
-                WHERE generator_id = ? AND modelno = ?
-        '''
-        cursor = bdb.sql_execute(sql, (generator_id, modelno))
-        try:
-            row = cursor.next()
-        except StopIteration:
-            generator = core.bayesdb_generator_name(bdb, generator_id)
-            raise BQLError(bdb, 'No such crosscat model for generator %s: %d' %
-                (repr(generator), modelno))
-        else:
+        if cc_cache is not None:
+            hit = generator_id in cc_cache.thetas and \
+                modelno in cc_cache.thetas[generator_id]
+            bayesdb_cache_lookup(bdb, self.name(), hit)
+            if hit:
+                return cc_cache.thetas[generator_id][modelno]
+        theta = txn.bayesdb_shared_model(bdb, generator_id, modelno)
+        if theta is None:
+            sql = '''
+                SELECT theta_json FROM bayesdb_crosscat_theta
+                    WHERE generator_id = ? AND modelno = ?
+            '''
+            cursor = bdb.sql_execute(sql, (generator_id, modelno))
+            try:
+                row = cursor.next()
+            except StopIteration:
+                generator = core.bayesdb_generator_name(bdb, generator_id)
+                raise BQLError(bdb,
+                    'No such crosscat model for generator %s: %d' %
+                    (repr(generator), modelno))
             theta = json.loads(row[0])
-            if cc_cache is not None:
-                if generator_id in cc_cache.thetas:
-                    assert modelno not in cc_cache.thetas[generator_id]
-                    cc_cache.thetas[generator_id][modelno] = theta
-                else:
-                    cc_cache.thetas[generator_id] = {modelno: theta}
-            return theta
+            txn.bayesdb_share_model(bdb, generator_id, modelno, theta)
+        if cc_cache is not None:
+            if generator_id in cc_cache.thetas:
+                assert modelno not in cc_cache.thetas[generator_id]
+                cc_cache.thetas[generator_id][modelno] = theta
+            else:
+                cc_cache.thetas[generator_id] = {modelno: theta}
+        return theta
+
+    def _crosscat_write_thetas(self, bdb, generator_id):
+        # Models that may be shared with other transactions must not
+        # be modified: forget any this transaction has cached, and
+        # load private copies from now on.
+        if txn.bayesdb_write_models(bdb, generator_id):
+            cc_cache = self._crosscat_cache_nocreate(bdb)
+            if cc_cache is not None and generator_id in cc_cache.thetas:
+                del cc_cache.thetas[generator_id]
 
     def _crosscat_latent_stata(self, bdb, generator_id, modelno):
         thetas = self._crosscat_thetas(bdb, generator_id, modelno)
@@ -607,27 +631,39 @@ class CrosscatMetamodel(metamodel.IBayesDBMetamodel):
                 (generator_id, cc_colno, code, value)
                 VALUES (:generator_id, :cc_colno, :code, :value)
         '''
+        column_rows = []
+        codemap_rows = []
         for cc_colno, (colno, name, _stattype) in enumerate(column_list):
             column_metadata = M_c['column_metadata'][cc_colno]
-            disttype = column_metadata['modeltype']
-            bdb.sql_execute(insert_column_sql, {
+            column_rows.append({
                 'generator_id': generator_id,
                 'colno': colno,
                 'cc_colno': cc_colno,
-                'disttype': disttype,
+                'disttype': column_metadata['modeltype'],
             })
             codemap = column_metadata['value_to_code']
             for code in codemap:
-                bdb.sql_execute(insert_codemap_sql, {
+                codemap_rows.append({
                     'generator_id': generator_id,
                     'cc_colno': cc_colno,
                     'code': code,
                     'value': codemap[code],
                 })
+        bdb.sql_executemany(insert_column_sql, column_rows)
+        bdb.sql_executemany(insert_codemap_sql, codemap_rows)
 
         # Choose a subsample (possibly the whole thing).
         qt = sqlite3_quote_name(table)
-        cursor = None
+        sql = 'SELECT COUNT(*), MIN(_rowid_), MAX(_rowid_) FROM %s' % (qt,)
+        n, min_rowid, max_rowid = bdb.sql_execute(sql).fetchone()
+        # If the rowids are consecutive, the ith row in order of rowid
+        # is just min_rowid + i, and we needn't read them at all.
+        dense = n == 0 or max_rowid - min_rowid + 1 == n
+        insert_subsample_sql = '''
+            INSERT INTO bayesdb_crosscat_subsample
+                (generator_id, sql_rowid, cc_row_id)
+                VALUES (?, ?, ?)
+        '''
         if parsed_schema.subsample:
             # Sample k of the n rowids without replacement,
             # choosing from all the k-of-n combinations uniformly
@@ -635,36 +671,31 @@ class CrosscatMetamodel(metamodel.IBayesDBMetamodel):
             #
             # XXX Let the user pass in a seed.
             k = parsed_schema.subsample
-            sql = 'SELECT COUNT(*) FROM %s' % (qt,)
-            n = cursor_value(bdb.sql_execute(sql))
-            sql = 'SELECT _rowid_ FROM %s ORDER BY _rowid_ ASC' % (qt,)
-            cursor = bdb.sql_execute(sql)
             seed = struct.pack('<QQQQ', 0, 0, k, n)
-            uniform = weakprng.weakprng(seed).weakrandom_uniform
-            # https://en.wikipedia.org/wiki/Reservoir_sampling
-            samples = []
-            for i, row in enumerate(cursor):
-                if i < k:
-                    samples.append(row)
-                else:
-                    r = uniform(i + 1)
-                    if r < k:
-                        samples[r] = row
-            cursor = samples
+            samples = reservoir.weakprng_reservoir(seed, k, n)
+            if dense:
+                sql_rowids = samples + (min_rowid or 0)
+            else:
+                sql = 'SELECT _rowid_ FROM %s ORDER BY _rowid_ ASC' % (qt,)
+                cursor = bdb.sql_execute(sql)
+                sql_rowids = numpy.fromiter((row[0] for row in cursor),
+                    dtype=numpy.int64, count=n)[samples]
+            bdb.sql_executemany(insert_subsample_sql,
+                ((generator_id, int(sql_rowid), cc_row_id)
+                    for cc_row_id, sql_rowid in enumerate(sql_rowids)))
+        elif dense:
+            bdb.sql_execute('''
+                INSERT INTO bayesdb_crosscat_subsample
+                    (generator_id, sql_rowid, cc_row_id)
+                    SELECT ?, _rowid_, _rowid_ - ? FROM %s
+            ''' % (qt,), (generator_id, min_rowid))
         else:
             cursor = bdb.sql_execute('''
                  SELECT _rowid_ FROM %s ORDER BY _rowid_ ASC
             ''' % (qt,))
-        insert_subsample_sql = '''
-            INSERT INTO bayesdb_crosscat_subsample
-                (generator_id, sql_rowid, cc_row_id)
-                VALUES (?, ?, ?)
-        '''
-        for i, row in enumerate(cursor):
-            sql_rowid = row[0]
-            cc_row_id = i
-            bdb.sql_execute(insert_subsample_sql,
-                (generator_id, sql_rowid, cc_row_id))
+            bdb.sql_executemany(insert_subsample_sql,
+                ((generator_id, sql_rowid, cc_row_id)
+                    for cc_row_id, (sql_rowid,) in enumerate(cursor)))
 
         # Store dependence constraints, if necessary.
         insert_dep_constraint_sql = '''
@@ -690,6 +721,8 @@ class CrosscatMetamodel(metamodel.IBayesDBMetamodel):
                     raise BQLError(bdb, 'Invalid dependency constraints!')
 
     def drop_generator(self, bdb, generator_id):
+        self._crosscat_write_thetas(bdb, generator_id)
+
         # Remove the metadata from the cache.
         cc_cache = self._crosscat_cache_nocreate(bdb)
         if cc_cache is not None:
@@ -768,6 +801,7 @@ class CrosscatMetamodel(metamodel.IBayesDBMetamodel):
             cc_cache.metadata[generator_id] = M_c
 
     def initialize_models(self, bdb, generator_id, modelnos):
+        self._crosscat_write_thetas(bdb, generator_id)
         cc_cache = self._crosscat_cache(bdb)
         if cc_cache is not None and generator_id in cc_cache.thetas:
             assert not any(modelno in cc_cache.thetas[generator_id]
@@ -831,6 +865,7 @@ class CrosscatMetamodel(metamodel.IBayesDBMetamodel):
                     cc_cache.thetas[generator_id] = {modelno: theta}
 
     def drop_models(self, bdb, generator_id, modelnos=None):
+        self._crosscat_write_thetas(bdb, generator_id)
         cc_cache = self._crosscat_cache_nocreate(bdb)
         if modelnos is None:
             if cc_cache is not None:
@@ -865,7 +900,7 @@ class CrosscatMetamodel(metamodel.IBayesDBMetamodel):
 
     def analyze_models(self, bdb, generator_id, modelnos=None, iterations=1,
             max_seconds=None, ckpt_iterations=None, ckpt_seconds=None,
-            program=None):
+            program=None, converge=None):
         if program is not None:
             # XXX
             raise NotImplementedError('crosscat analysis programs')
@@ -896,6 +931,16 @@ class CrosscatMetamodel(metamodel.IBayesDBMetamodel):
             ckpt_deadline = time.time() + ckpt_seconds
             if max_seconds is not None:
                 ckpt_deadline = min(ckpt_deadline, deadline)
+        # Diagnostics of each model at each iteration of this analysis,
+        # and the models that have converged, which we stop analyzing.
+        history = {}
+        converged = []
+        if converge is not None:
+            window, tolerance = converge
+            if window is None:
+                window = CROSSCAT_CONVERGE_WINDOW
+            if tolerance is None:
+                tolerance = CROSSCAT_CONVERGE_TOLERANCE
         if ckpt_iterations is not None and iterations is not None:
             ckpt_iterations = min(ckpt_iterations, iterations)
         while (iterations is None or 0 < iterations) and \
@@ -911,6 +956,7 @@ class CrosscatMetamodel(metamodel.IBayesDBMetamodel):
             elif iterations is not None and max_seconds is None:
                 n_steps = iterations
             with bdb.savepoint():
+                self._crosscat_write_thetas(bdb, generator_id)
                 if modelnos is None:
                     numbered_thetas = self._crosscat_thetas(bdb, generator_id,
                         None)
@@ -925,6 +971,15 @@ class CrosscatMetamodel(metamodel.IBayesDBMetamodel):
                     raise BQLError(bdb, 'No models to analyze'
                         ' for generator: %s' %
                         (core.bayesdb_generator_name(bdb, generator_id),))
+                if converged:
+                    thetas = [theta
+                        for modelno, theta in zip(update_modelnos, thetas)
+                        if modelno not in converged]
+                    update_modelnos = [modelno
+                        for modelno in update_modelnos
+                        if modelno not in converged]
+                    if len(thetas) == 0:
+                        break
                 X_L_list = [theta['X_L'] for theta in thetas]
                 X_D_list = [theta['X_D'] for theta in thetas]
                 # XXX It would be nice to take advantage of Crosscat's
@@ -934,6 +989,15 @@ class CrosscatMetamodel(metamodel.IBayesDBMetamodel):
                 # actually performed.
                 iterations_in_ckpt = 0
                 while True:
+                    steps = n_steps
+                    if converge is not None:
+                        # Judge convergence at least once a window.
+                        steps = min(steps, window)
+                        if ckpt_iterations is not None:
+                            steps = min(steps,
+                                ckpt_iterations - iterations_in_ckpt)
+                        if iterations is not None:
+                            steps = min(steps, iterations)
                     X_L_list_0 = X_L_list
                     X_L_list, X_D_list, diagnostics = self._crosscat.analyze(
                         seed=crosscat_seed(bdb),
@@ -944,20 +1008,42 @@ class CrosscatMetamodel(metamodel.IBayesDBMetamodel):
                         kernel_list=thetas[0]['model_config']['kernel_list'],
                         X_L=X_L_list,
                         X_D=X_D_list,
-                        n_steps=n_steps,
+                        n_steps=steps,
                     )
-                    iterations_in_ckpt += n_steps
+                    iterations_in_ckpt += steps
+                    stopped = False
+                    if converge is not None:
+                        # Judge from the diagnostics of every step, in
+                        # memory, and save a model only once it stops.
+                        for i, modelno in enumerate(update_modelnos):
+                            diagnostics_i = history.setdefault(modelno, [])
+                            diagnostics_i.extend(
+                                (diagnostics['logscore'][step][i],
+                                    diagnostics['num_views'][step][i],
+                                    diagnostics['column_crp_alpha'][step][i])
+                                for step in xrange(
+                                    len(diagnostics['logscore'])))
+                            if crosscat_converged(diagnostics_i, window,
+                                    tolerance):
+                                converged.append(modelno)
+                                stopped = True
                     if iterations is not None:
-                        assert n_steps <= iterations
-                        iterations -= n_steps
+                        assert steps <= iterations
+                        iterations -= steps
                         if iterations == 0:
                             break
+                    if stopped:
+                        break
                     if ckpt_iterations is not None:
                         if ckpt_iterations <= iterations_in_ckpt:
                             break
                     elif ckpt_seconds is not None:
                         if ckpt_deadline < time.time():
                             break
+                    elif converge is not None:
+                        if max_seconds is not None and \
+                                deadline <= time.time():
+                            break
                     else:
                         break
                 cc_cache = self._crosscat_cache(bdb)
@@ -1019,6 +1105,7 @@ class CrosscatMetamodel(metamodel.IBayesDBMetamodel):
                             cc_cache.thetas[generator_id] = {modelno: theta}
                 if ckpt_seconds is not None:
                     ckpt_deadline = time.time() + ckpt_seconds
+        return converged
 
     def column_dependence_probability(self, bdb, generator_id, modelno,
             colno0, colno1):
@@ -1048,24 +1135,42 @@ class CrosscatMetamodel(metamodel.IBayesDBMetamodel):
                 'mutual information: %s, %s' % (colnos0, colnos1))
         colno0 = colnos0[0]
         colno1 = colnos1[0]
-        X_L_list = self._crosscat_latent_state(bdb, generator_id, modelno)
-        X_D_list = self._crosscat_latent_data(bdb, generator_id, modelno)
+        M_c = self._crosscat_metadata(bdb, generator_id)
         cc_colno0 = crosscat_cc_colno(bdb, generator_id, colno0)
         cc_colno1 = crosscat_cc_colno(bdb, generator_id, colno1)
-        r = self._crosscat.mutual_information(
-            seed=crosscat_seed(bdb),
-            M_c=self._crosscat_metadata(bdb, generator_id),
-            X_L_list=X_L_list,
-            X_D_list=X_D_list,
-            Q=[(cc_colno0, cc_colno1)],
-            n_samples=int(math.ceil(float(numsamples) / len(X_L_list)))
-        )
-        # r has one answer per element of Q, so take the first one.
-        r0 = r[0]
-        # r0 is (mi, linfoot), and we want mi.
-        mi = r0[0]
-         # Pass through the distribution of MI to BayesDB without aggregation.
-        return mi
+        # Inspect each model's structure first.  Columns in different
+        # views are independent, so their mutual information is zero;
+        # for a pair of categorical columns with small supports we can
+        # enumerate the joint distribution exactly.  Only the remaining
+        # models need Monte Carlo samples from the engine, and they get
+        # the whole sample budget between them.
+        stata = list(self._crosscat_latent_stata(bdb, generator_id, modelno))
+        mis = [None] * len(stata)
+        sampled = []
+        for i, (X_L, _X_D) in enumerate(stata):
+            assignments = X_L['column_partition']['assignments']
+            if assignments[cc_colno0] != assignments[cc_colno1]:
+                mis[i] = 0.
+            else:
+                mis[i] = crosscat_mutual_information_exact(M_c, X_L,
+                    cc_colno0, cc_colno1)
+                if mis[i] is None:
+                    sampled.append(i)
+        if sampled:
+            r = self._crosscat.mutual_information(
+                seed=crosscat_seed(bdb),
+                M_c=M_c,
+                X_L_list=[stata[i][0] for i in sampled],
+                X_D_list=[stata[i][1] for i in sampled],
+                Q=[(cc_colno0, cc_colno1)],
+                n_samples=int(math.ceil(float(numsamples) / len(sampled)))
+            )
+            # r is (mi, linfoot), each with one list per element of Q,
+            # which in turn has one answer per model.
+            for i, mi in zip(sampled, r[0][0]):
+                mis[i] = mi
+        # Pass through the distribution of MI to BayesDB without aggregation.
+        return mis
 
     def row_similarity(self, bdb, generator_id, modelno, rowid, target_rowid,
             colnos):
@@ -1114,6 +1219,58 @@ class CrosscatMetamodel(metamodel.IBayesDBMetamodel):
         value = crosscat_code_to_value(bdb, generator_id, M_c, colno, code)
         return value, confidence
 
+    def predict_confidence_joint(self, bdb, generator_id, modelno, rowid,
+            colnos, numsamples=None):
+        if len(colnos) < 2:
+            return super(CrosscatMetamodel, self).predict_confidence_joint(
+                bdb, generator_id, modelno, rowid, colnos,
+                numsamples=numsamples)
+        # Crosscat's imputation takes one column at a time, so draw
+        # the joint samples here and impute each column from them as
+        # it would.  (Not `import crosscat...', which is this module.)
+        su = importlib.import_module('crosscat.utils.sample_utils')
+        if numsamples is None:
+            numsamples = 100    # XXXWARGHWTF
+        M_c = self._crosscat_metadata(bdb, generator_id)
+        row = core.bayesdb_generator_row_values(bdb, generator_id, rowid)
+        X_L_list = self._crosscat_latent_state(bdb, generator_id, modelno)
+        X_D_list = self._crosscat_latent_data(bdb, generator_id, modelno)
+        row_id, X_L_list, X_D_list = \
+            self._crosscat_get_row(bdb, generator_id, rowid, X_L_list,
+                X_D_list)
+        cc_colnos = [crosscat_cc_colno(bdb, generator_id, colno)
+            for colno in colnos]
+        samples = self._crosscat.simple_predictive_sample(
+            seed=crosscat_seed(bdb),
+            M_c=M_c,
+            X_L=X_L_list,
+            X_D=X_D_list,
+            Y=[(row_id,
+                cc_colno_,
+                crosscat_value_to_code(bdb, generator_id, M_c,
+                    crosscat_gen_colno(bdb, generator_id, cc_colno_), value))
+               for cc_colno_, value in enumerate(row)
+               if value is not None
+               if cc_colno_ not in cc_colnos],
+            Q=[(row_id, cc_colno) for cc_colno in cc_colnos],
+            n=numsamples,
+        )
+        X_L = X_L_list[0] if isinstance(X_L_list, list) else X_L_list
+        get_next_seed = lambda: crosscat_seed(bdb)
+        predictions = []
+        for i, (colno, cc_colno) in enumerate(zip(colnos, cc_colnos)):
+            modeltype = M_c['column_metadata'][cc_colno]['modeltype']
+            impute = su.modeltype_to_imputation_function[modeltype]
+            impute_confidence = \
+                su.modeltype_to_imputation_confidence_function[modeltype]
+            column_samples = [sample[i] for sample in samples]
+            code = impute(column_samples, get_next_seed)
+            confidence = impute_confidence(column_samples, code,
+                su.get_column_component_suffstats_i(M_c, X_L, cc_colno))
+            value = crosscat_code_to_value(bdb, generator_id, M_c, colno, code)
+            predictions.append((value, confidence))
+        return predictions
+
     def simulate_joint(self, bdb, generator_id, rowid, targets, constraints,
             modelno, num_samples=1, accuracy=None):
         M_c = self._crosscat_metadata(bdb, generator_id)
@@ -1179,6 +1336,187 @@ class CrosscatMetamodel(metamodel.IBayesDBMetamodel):
         )
         return r
 
+    def logpdf_leave_one_out(self, bdb, generator_id, rowid, targets,
+            constraints, modelno=None):
+        M_c = self._crosscat_metadata(bdb, generator_id)
+        table_name = core.bayesdb_generator_table(bdb, generator_id)
+        qt = sqlite3_quote_name(table_name)
+        cursor = bdb.sql_execute('SELECT COUNT(*) FROM %s WHERE _rowid_ = ?'
+            % (qt,), (rowid,))
+        try:
+            if cursor_value(cursor) != 0:
+                # The row is in the table and has clusters of its own.
+                raise KeyError(rowid)
+            cells = [(crosscat_cc_colno(bdb, generator_id, colno),
+                    crosscat_value_to_code(bdb, generator_id, M_c, colno,
+                        value))
+                for colno, value in targets + constraints]
+        except KeyError:
+            # Observed row, or value that has no code: one at a time.
+            return super(CrosscatMetamodel, self).logpdf_leave_one_out(bdb,
+                generator_id, rowid, targets, constraints, modelno)
+        X_L_list = self._crosscat_latent_state(bdb, generator_id, modelno)
+        logps = [crosscat_logpdf_leave_one_out(M_c, X_L, cells, len(targets))
+            for X_L in X_L_list]
+        return [logmeanexp([logp[i] for logp in logps])
+            for i in xrange(len(targets))]
+
+    def condition(self, bdb, generator_id, rowid, constraints, modelno=None):
+        return CrosscatConditionedQuery(self, bdb, generator_id, rowid,
+            constraints, modelno)
+
+class CrosscatConditionedQuery(metamodel.ConditionedQuery):
+    """Crosscat models conditioned on constraints on a row.
+
+    The metadata, the latent states, the row's place in them, and the
+    codes of the constraints are found once, on first use.  So is, for
+    each model and each view, the posterior on the row's cluster in
+    the view given the constraints.  Each target's density is then a
+    mixture of its densities under the clusters, weighted by that
+    posterior, rather than conditioning the row afresh for every
+    target as :meth:`CrosscatMetamodel.logpdf_joint` would.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(CrosscatConditionedQuery, self).__init__(*args, **kwargs)
+        self._state = None
+        # (model index, view) -> (cluster log-weights, their logsumexp)
+        self._view_weights = {}
+        # (model index, cc_colno) -> component model of each cluster
+        self._components = {}
+
+    def _prepare(self):
+        if self._state is None:
+            bdb = self.bdb
+            generator_id = self.generator_id
+            crosscat = self.metamodel
+            M_c = crosscat._crosscat_metadata(bdb, generator_id)
+            X_L_list = crosscat._crosscat_latent_state(bdb, generator_id,
+                self.modelno)
+            X_D_list = crosscat._crosscat_latent_data(bdb, generator_id,
+                self.modelno)
+            row_id, X_L_list, X_D_list = crosscat._crosscat_get_row(bdb,
+                generator_id, self.rowid, X_L_list, X_D_list)
+            try:
+                Y = self._remap(M_c, row_id, self.constraints)
+            except KeyError:
+                # Constraint that has no code
+                Y = None
+            self._state = (M_c, X_L_list, X_D_list, row_id, Y)
+        return self._state
+
+    def _remap(self, M_c, row_id, items):
+        bdb = self.bdb
+        generator_id = self.generator_id
+        return [(row_id, crosscat_cc_colno(bdb, generator_id, colno),
+                crosscat_value_to_code(bdb, generator_id, M_c, colno, value))
+            for colno, value in items]
+
+    def _predictive_probability(self, Y, Q):
+        M_c, X_L_list, X_D_list, _row_id, _Y = self._prepare()
+        return self.metamodel._crosscat.predictive_probability_multistate(
+            M_c=M_c,
+            X_L_list=X_L_list,
+            X_D_list=X_D_list,
+            Y=Y,
+            Q=Q,
+        )
+
+    def _compute_loglikelihood(self):
+        if not self.constraints:
+            return 0
+        _M_c, _X_L_list, _X_D_list, _row_id, Y = self._prepare()
+        if Y is None:
+            return float('-inf')
+        return self._predictive_probability([], Y)
+
+    def _element_logps(self, m, cc_colno, code):
+        # Log density of `code` in column `cc_colno` under each cluster
+        # of its view in model `m`, including a new one last.
+        key = (m, cc_colno)
+        if key not in self._components:
+            M_c, X_L_list, _X_D_list, _row_id, _Y = self._prepare()
+            X_L = X_L_list[m]
+            view_idx = X_L['column_partition']['assignments'][cc_colno]
+            sample_utils = importlib.import_module(
+                'crosscat.utils.sample_utils')
+            cluster_models = sample_utils.create_cluster_models(M_c, X_L,
+                view_idx, [cc_colno])
+            self._components[key] = [cluster_model[cc_colno]
+                for cluster_model in cluster_models]
+        return [component.calc_element_predictive_logp_constrained(code, [])
+            for component in self._components[key]]
+
+    def _cluster_logweights(self, m, view_idx):
+        # Log posterior weights, up to their logsumexp, of the row's
+        # cluster in the view of model `m` given the constraints in it.
+        key = (m, view_idx)
+        if key not in self._view_weights:
+            _M_c, X_L_list, _X_D_list, _row_id, Y = self._prepare()
+            X_L = X_L_list[m]
+            sample_utils = importlib.import_module(
+                'crosscat.utils.sample_utils')
+            weights = list(sample_utils.determine_cluster_crp_logps(
+                X_L['view_state'][view_idx]))
+            assignments = X_L['column_partition']['assignments']
+            for _row_id, cc_colno, code in Y:
+                if assignments[cc_colno] == view_idx:
+                    logps = self._element_logps(m, cc_colno, code)
+                    weights = [w + logp for w, logp in zip(weights, logps)]
+            self._view_weights[key] = (weights, logsumexp(weights))
+        return self._view_weights[key]
+
+    def _logpdf_model(self, m, cells):
+        # Log density of the (cc_colno, code) `cells` given the
+        # constraints in model `m`.  Views are independent given the
+        # row, so it is a sum over the views of the cells.
+        _M_c, X_L_list, X_D_list, row_id, _Y = self._prepare()
+        assignments = X_L_list[m]['column_partition']['assignments']
+        views = {}
+        for cc_colno, code in cells:
+            views.setdefault(assignments[cc_colno], []) \
+                .append((cc_colno, code))
+        logp = 0
+        for view_idx, view_cells in sorted(views.iteritems()):
+            if row_id < len(X_D_list[m][view_idx]):
+                # An observed row has a known cluster in each view.
+                cluster_idx = X_D_list[m][view_idx][row_id]
+                for cc_colno, code in view_cells:
+                    logp += self._element_logps(m, cc_colno,
+                        code)[cluster_idx]
+                continue
+            weights, total = self._cluster_logweights(m, view_idx)
+            for cc_colno, code in view_cells:
+                weights = [w + logp_cell for w, logp_cell
+                    in zip(weights, self._element_logps(m, cc_colno, code))]
+            logp += logsumexp(weights) - total
+        return logp
+
+    def logpdf(self, targets):
+        M_c, X_L_list, _X_D_list, row_id, Y = self._prepare()
+        if Y is None:
+            return float('nan')
+        try:
+            Q = self._remap(M_c, row_id, targets)
+        except KeyError:
+            # Probability of value that has no code
+            return float('-inf')
+        constrained = dict((cc_colno, code) for _row_id, cc_colno, code in Y)
+        if len(constrained) < len(Y) or \
+           len(set(cc_colno for _row_id, cc_colno, _code in Q)) < len(Q):
+            # Let Crosscat complain about the repeated cells.
+            return self._predictive_probability(Y, Q)
+        # A target that is also a constraint is certain if it agrees
+        # with it and impossible if not, as Crosscat has it.
+        cells = []
+        for _row_id, cc_colno, code in Q:
+            if cc_colno not in constrained:
+                cells.append((cc_colno, code))
+            elif constrained[cc_colno] != code:
+                return float('-inf')
+        return logmeanexp([self._logpdf_model(m, cells)
+            for m in xrange(len(X_L_list))])
+
 class CrosscatCache(object):
     def __init__(self):
         self.metadata = {}
@@ -1320,6 +1658,128 @@ def crosscat_gen_colno(bdb, generator_id, cc_colno):
         assert isinstance(row[0], int)
         return row[0]
 
+# Largest number of terms, over values of both columns and clusters of
+# their view, for which we compute the mutual information of two
+# categorical columns exactly rather than by sampling.
+CROSSCAT_MI_EXACT_MAX_TERMS = 100000
+
+def crosscat_mutual_information_exact(M_c, X_L, cc_colno0, cc_colno1):
+    """Mutual information of two columns in one view, or None.
+
+    Enumerate the joint distribution of the two columns under the
+    view's mixture of clusters, including a fresh cluster drawn from
+    the prior, as Crosscat's own sampler does.  Return None unless
+    both columns are categorical and the enumeration is small.
+    """
+    metadata = M_c['column_metadata']
+    for cc_colno in (cc_colno0, cc_colno1):
+        if metadata[cc_colno]['modeltype'] != 'symmetric_dirichlet_discrete':
+            return None
+    view = X_L['view_state'][X_L['column_partition']['assignments'][cc_colno0]]
+    counts = view['row_partition_model']['counts']
+    crp_alpha = view['row_partition_model']['hypers']['alpha']
+    K0 = int(X_L['column_hypers'][cc_colno0]['K'])
+    K1 = int(X_L['column_hypers'][cc_colno1]['K'])
+    if CROSSCAT_MI_EXACT_MAX_TERMS < K0 * K1 * (len(counts) + 1):
+        return None
+    total = float(sum(counts) + crp_alpha)
+    weights = [count/total for count in counts] + [crp_alpha/total]
+    def predictive(cc_colno, K):
+        # Dirichlet-multinomial posterior predictive in each cluster,
+        # then the prior predictive, which is uniform, for a new one.
+        name = M_c['idx_to_name'][unicode(cc_colno)]
+        suffstats = view['column_component_suffstats'][
+            view['column_names'].index(name)]
+        alpha = X_L['column_hypers'][cc_colno]['dirichlet_alpha']
+        ps = []
+        for stats in suffstats:
+            norm = stats.get('N', 0.) + K*alpha
+            ps.append([(stats.get(unicode(code), 0.) + alpha)/norm
+                for code in xrange(K)])
+        ps.append([1./K] * K)
+        return ps
+    p0 = predictive(cc_colno0, K0)
+    p1 = predictive(cc_colno1, K1)
+    clusters = range(len(weights))
+    marginal0 = [sum(weights[c]*p0[c][x] for c in clusters)
+        for x in xrange(K0)]
+    marginal1 = [sum(weights[c]*p1[c][y] for c in clusters)
+        for y in xrange(K1)]
+    mi = 0.
+    for x in xrange(K0):
+        wp0 = [weights[c]*p0[c][x] for c in clusters]
+        for y in xrange(K1):
+            joint = sum(wp0[c]*p1[c][y] for c in clusters)
+            mi += joint * math.log(joint / (marginal0[x]*marginal1[y]))
+    return max(mi, 0.)
+
+# Defaults for ANALYZE ... UNTIL CONVERGED: the number of iterations
+# in each window, and the largest relative change between the means of
+# the diagnostics over the last two windows.
+CROSSCAT_CONVERGE_WINDOW = 10
+CROSSCAT_CONVERGE_TOLERANCE = 0.01
+
+def crosscat_converged(diagnostics, window, tolerance):
+    """True if a model's analysis has converged.
+
+    `diagnostics` is the list of ``(logscore, num_views,
+    column_crp_alpha)`` of the model at each iteration, in order.
+    The model has converged once the means of each diagnostic over the
+    last `window` iterations and over the `window` iterations before
+    them differ by at most `tolerance`, relative to the larger.
+    Comparing means rather than single checkpoints ignores the jitter
+    of the Markov chain about its plateau.
+    """
+    if len(diagnostics) < 2*window:
+        return False
+    recent = diagnostics[-window:]
+    previous = diagnostics[-2*window:-window]
+    for i in xrange(3):
+        mean0 = sum(d[i] for d in previous) / float(window)
+        mean1 = sum(d[i] for d in recent) / float(window)
+        if tolerance*max(abs(mean0), abs(mean1)) < abs(mean1 - mean0):
+            return False
+    return True
+
+def crosscat_logpdf_leave_one_out(M_c, X_L, cells, ntargets):
+    """Log density of each of the first `ntargets` of `cells` given the rest.
+
+    `cells` is a list of ``(cc_colno, code)`` in one fresh row.  Each
+    cell depends on the others only through the posterior on the row's
+    cluster in its view.  So compute, for each view, the density of
+    each of its cells under each cluster -- including a new one -- once,
+    and find each cell's density given the rest from the totals over
+    its view, rather than conditioning on the row afresh for each cell
+    as Crosscat's predictive_probability would.
+    """
+    sample_utils = importlib.import_module('crosscat.utils.sample_utils')
+    assignments = X_L['column_partition']['assignments']
+    views = {}
+    for i, (cc_colno, _code) in enumerate(cells):
+        views.setdefault(assignments[cc_colno], []).append(i)
+    results = [None] * ntargets
+    for view_idx, indices in sorted(views.iteritems()):
+        if ntargets <= min(indices):
+            continue
+        cluster_models = sample_utils.create_cluster_models(M_c, X_L,
+            view_idx, [cells[i][0] for i in indices])
+        crp_logps = sample_utils.determine_cluster_crp_logps(
+            X_L['view_state'][view_idx])
+        # data_logps[k][j]: log density of cell indices[j] in cluster k.
+        data_logps = [
+            [cluster_model[cells[i][0]]
+                    .calc_element_predictive_logp_constrained(cells[i][1], [])
+                for i in indices]
+            for cluster_model in cluster_models]
+        totals = [crp_logp + sum(logps)
+            for crp_logp, logps in zip(crp_logps, data_logps)]
+        logp_view = logsumexp(totals)
+        for j, i in enumerate(indices):
+            if i < ntargets:
+                results[i] = logp_view - logsumexp([total - logps[j]
+                    for total, logps in zip(totals, data_logps)])
+    return results
+
 def crosscat_gen_column_dependencies(bdb, generator_id):
     sql = '''
         SELECT colno0, colno1, dependent
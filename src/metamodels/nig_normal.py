@@ -25,6 +25,7 @@ interface for the NIG-Normal model.
 """
 
 import math
+import numpy
 import random
 
 import bayeslite.core as core
@@ -33,8 +34,8 @@ import bayeslite.metamodel as metamodel
 from bayeslite.exception import BQLError
 from bayeslite.math_util import logmeanexp
 from bayeslite.metamodel import bayesdb_metamodel_version
+from bayeslite.profiler import bayesdb_cache_lookup
 from bayeslite.sqlite3_util import sqlite3_quote_name
-from bayeslite.util import cursor_value
 
 nig_normal_schema_1 = '''
 INSERT INTO bayesdb_metamodel (name, version) VALUES ('nig_normal', 1);
@@ -95,6 +96,7 @@ class NIGNormalMetamodel(metamodel.IBayesDBMetamodel):
     def __init__(self, hypers=(0, 1, 1, 1), seed=0):
         self.hypers = hypers
         self.prng = random.Random(seed)
+        self.np_prng = numpy.random.RandomState(seed)
 
     def name(self): return 'nig_normal'
 
@@ -116,11 +118,13 @@ class NIGNormalMetamodel(metamodel.IBayesDBMetamodel):
         insert_column_sql = '''
             INSERT INTO bayesdb_nig_normal_column
                 (generator_id, colno, count, sum, sumsq)
-                VALUES (:generator_id, :colno, :count, :sum, :sumsq)
+                VALUES (?, ?, ?, ?, ?)
         '''
         population_id = core.bayesdb_generator_population(bdb, generator_id)
         table = core.bayesdb_population_table(bdb, population_id)
-        for colno in core.bayesdb_variable_numbers(bdb, population_id, None):
+        colnos = core.bayesdb_variable_numbers(bdb, population_id, None)
+        column_names = []
+        for colno in colnos:
             column_name = core.bayesdb_variable_name(bdb, population_id, colno)
             stattype = core.bayesdb_variable_stattype(
                 bdb, population_id, colno)
@@ -128,14 +132,15 @@ class NIGNormalMetamodel(metamodel.IBayesDBMetamodel):
                 raise BQLError(bdb, 'NIG-Normal only supports'
                     ' numerical columns, but %s is %s'
                     % (repr(column_name), repr(stattype)))
-            (count, xsum, sumsq) = data_suff_stats(bdb, table, column_name)
-            bdb.sql_execute(insert_column_sql, {
-                'generator_id': generator_id,
-                'colno': colno,
-                'count': count,
-                'sum': xsum,
-                'sumsq': sumsq,
-            })
+            column_names.append(column_name)
+        # Gather the statistics for all columns in as few table scans
+        # as SQLite allows.
+        stats = data_suff_stats_columns(bdb, table, column_names)
+        if colnos:
+            bdb.sql_executemany(insert_column_sql, [
+                (generator_id, colno, count, xsum, sumsq)
+                for colno, (count, xsum, sumsq) in zip(colnos, stats)
+            ])
 
         # XXX Make the schema a little more flexible.
         if schema == [[]]:
@@ -178,6 +183,7 @@ class NIGNormalMetamodel(metamodel.IBayesDBMetamodel):
                     WHERE generator_id = ?
             '''
             bdb.sql_execute(delete_deviations_sql, (generator_id,))
+            self._flush_params(bdb, generator_id)
 
     def initialize_models(self, bdb, generator_id, modelnos):
         insert_sample_sql = '''
@@ -202,10 +208,11 @@ class NIGNormalMetamodel(metamodel.IBayesDBMetamodel):
                 '''
                 for modelno in modelnos:
                     bdb.sql_execute(delete_models_sql, (generator_id, modelno))
+            self._flush_params(bdb, generator_id)
 
     def analyze_models(self, bdb, generator_id, modelnos=None, iterations=1,
             max_seconds=None, ckpt_iterations=None, ckpt_seconds=None,
-            program=None):
+            program=None, converge=None):
         if program is not None:
             # XXX
             raise NotImplementedError('nig_normal analysis programs')
@@ -227,7 +234,10 @@ class NIGNormalMetamodel(metamodel.IBayesDBMetamodel):
             # This assumes that models x columns forms a dense
             # rectangle in the database, which it should.
             modelnos = self._modelnos(bdb, generator_id)
+        modelnos = list(modelnos)
         self._set_models(bdb, generator_id, modelnos, update_sample_sql)
+        # Every model has reached the posterior, so has converged.
+        return modelnos
 
     def _set_models(self, bdb, generator_id, modelnos, sql):
         collect_stats_sql = '''
@@ -236,17 +246,27 @@ class NIGNormalMetamodel(metamodel.IBayesDBMetamodel):
         '''
         with bdb.savepoint():
             cursor = bdb.sql_execute(collect_stats_sql, (generator_id,))
-            for (colno, count, xsum, sumsq) in cursor:
-                stats = (count, xsum, sumsq)
-                for modelno in modelnos:
-                    (mu, sig) = self._gibbs_step_params(self.hypers, stats)
-                    bdb.sql_execute(sql, {
+            columns = cursor.fetchall()
+            modelnos = list(modelnos)
+            if columns and modelnos:
+                colnos = [colno for (colno, _, _, _) in columns]
+                stats = numpy.array([[count, xsum, sumsq]
+                        for (_, count, xsum, sumsq) in columns],
+                    dtype=float).T
+                # Draw every (model, column) parameter pair at once.
+                (mus, sigmas) = self._gibbs_step_params(self.hypers, stats,
+                    len(modelnos))
+                bdb.sql_executemany(sql, [{
                         'generator_id': generator_id,
                         'colno': colno,
                         'modelno': modelno,
-                        'mu': mu,
-                        'sigma': sig,
-                    })
+                        'mu': mus[i, j],
+                        'sigma': sigmas[i, j],
+                    }
+                    for i, modelno in enumerate(modelnos)
+                    for j, colno in enumerate(colnos)
+                ])
+            self._flush_params(bdb, generator_id)
 
     def _modelnos(self, bdb, generator_id):
         modelnos_sql = '''
@@ -268,88 +288,125 @@ class NIGNormalMetamodel(metamodel.IBayesDBMetamodel):
         # dependence induced by approximating the true distribution
         # with a finite number of full-table models.
         with bdb.savepoint():
+            params = self._params(bdb, generator_id)
             if modelno is None:
-                modelnos = self._modelnos(bdb, generator_id)
-                modelno = self.prng.choice(modelnos)
-            (mus, sigmas) = self._model_mus_sigmas(bdb, generator_id, modelno)
-            return [[self._simulate_1(bdb, generator_id, mus, sigmas, colno)
-                     for colno in targets]
-                    for _ in range(num_samples)]
-
-    def _simulate_1(self, bdb, generator_id, mus, sigmas, colno):
-        if colno < 0:
-            dev_colno = colno
-            cursor = bdb.sql_execute('''
-                SELECT observed_colno FROM bayesdb_nig_normal_deviation
-                    WHERE generator_id = ? AND deviation_colno = ?
-            ''', (generator_id, dev_colno))
-            obs_colno = cursor_value(cursor)
-            return self.prng.gauss(0, sigmas[obs_colno])
-        else:
-            return self.prng.gauss(mus[colno], sigmas[colno])
-
-    def _model_mus_sigmas(self, bdb, generator_id, modelno):
-        # TODO Filter in the database by the columns I will actually use?
-        # TODO Cache the results using bdb.cache?
-        params_sql = '''
-            SELECT colno, mu, sigma FROM bayesdb_nig_normal_model
-                WHERE generator_id = ? AND modelno = ?
-        '''
-        cursor = bdb.sql_execute(params_sql, (generator_id, modelno))
-        mus = {}
-        sigmas = {}
-        for (colno, mu, sigma) in cursor:
-            assert colno not in mus
-            mus[colno] = mu
-            assert colno not in sigmas
-            sigmas[colno] = sigma
-        return (mus, sigmas)
+                modelno = self.prng.choice(params.modelnos)
+            elif isinstance(modelno, list):
+                modelno = self.prng.choice(modelno)
+            (mus, sigmas) = self._target_mus_sigmas(bdb, params, targets)
+        m = params.modelindex[modelno]
+        samples = self.np_prng.normal(loc=mus[m], scale=sigmas[m],
+            size=(num_samples, len(targets)))
+        return samples.tolist()
 
     def logpdf_joint(self, bdb, generator_id, rowid, targets, _constraints,
             modelno=None):
         # Note: The constraints are irrelevant for the same reason as
         # in simulate_joint.
-        (all_mus, all_sigmas) = self._all_mus_sigmas(bdb, generator_id)
-        def model_log_pdf(modelno):
-            mus = all_mus[modelno]
-            sigmas = all_sigmas[modelno]
-            def logpdf_1((colno, x)):
-                return self._logpdf_1(bdb, generator_id, mus, sigmas, colno, x)
-            return sum(map(logpdf_1, targets))
-        modelwise = [model_log_pdf(m) for m in sorted(all_mus.keys())]
-        return logmeanexp(modelwise)
-
-    def _logpdf_1(self, bdb, generator_id, mus, sigmas, colno, x):
-        if colno < 0:
-            dev_colno = colno
-            cursor = bdb.sql_execute('''
-                SELECT observed_colno FROM bayesdb_nig_normal_deviation
-                    WHERE generator_id = ? AND deviation_colno = ?
-            ''', (generator_id, dev_colno))
-            obs_colno = cursor_value(cursor)
-            return logpdf_gaussian(x, 0, sigmas[obs_colno])
-        else:
-            return logpdf_gaussian(x, mus[colno], sigmas[colno])
+        with bdb.savepoint():
+            params = self._params(bdb, generator_id)
+            colnos = [colno for (colno, _x) in targets]
+            (mus, sigmas) = self._target_mus_sigmas(bdb, params, colnos)
+        if isinstance(modelno, list):
+            ms = [params.modelindex[m] for m in modelno]
+            mus = mus[ms]
+            sigmas = sigmas[ms]
+        elif modelno is not None:
+            m = params.modelindex[modelno]
+            mus = mus[m:m + 1]
+            sigmas = sigmas[m:m + 1]
+        xs = numpy.array([x for (_colno, x) in targets], dtype=float)
+        modelwise = numpy.sum(logpdf_gaussian(xs, mus, sigmas), axis=1)
+        return logmeanexp(modelwise.tolist())
+
+    def _target_mus_sigmas(self, bdb, params, colnos):
+        # Gather (models x targets) arrays of the parameters for the
+        # target columns.  A deviation column has mean zero and the
+        # scale of the column it is a deviation of.
+        indices = []
+        centred = []
+        for colno in colnos:
+            if colno < 0:
+                if colno not in params.deviations:
+                    raise BQLError(bdb, 'No such deviation column: %r' %
+                        (colno,))
+                indices.append(params.colindex[params.deviations[colno]])
+                centred.append(True)
+            else:
+                indices.append(params.colindex[colno])
+                centred.append(False)
+        mus = params.mus[:, indices]
+        mus[:, numpy.array(centred, dtype=bool)] = 0
+        sigmas = params.sigmas[:, indices]
+        return (mus, sigmas)
 
-    def _all_mus_sigmas(self, bdb, generator_id):
+    def _nig_normal_cache_nocreate(self, bdb):
+        if bdb.cache is None:
+            return None
+        if 'nig_normal' not in bdb.cache:
+            return None
+        return self._nig_normal_cache(bdb)
+
+    def _nig_normal_cache(self, bdb):
+        if bdb.cache is None:
+            return None
+        if 'nig_normal' in bdb.cache:
+            return bdb.cache['nig_normal']
+        else:
+            cache = NIGNormalCache()
+            bdb.cache['nig_normal'] = cache
+            return cache
+
+    def _flush_params(self, bdb, generator_id):
+        cache = self._nig_normal_cache_nocreate(bdb)
+        if cache is not None and generator_id in cache.params:
+            del cache.params[generator_id]
+
+    def _params(self, bdb, generator_id):
+        cache = self._nig_normal_cache(bdb)
+        if cache is not None:
+            hit = generator_id in cache.params
+            bayesdb_cache_lookup(bdb, self.name(), hit)
+            if hit:
+                return cache.params[generator_id]
+        params = self._load_params(bdb, generator_id)
+        if cache is not None:
+            cache.params[generator_id] = params
+        return params
+
+    def _load_params(self, bdb, generator_id):
+        columns_sql = '''
+            SELECT colno FROM bayesdb_nig_normal_column
+                WHERE generator_id = ?
+                ORDER BY colno ASC
+        '''
         params_sql = '''
             SELECT colno, modelno, mu, sigma FROM bayesdb_nig_normal_model
-                WHERE generator_id = :generator_id
-        ''' # TODO Filter in the database by the columns I will actually use?
+                WHERE generator_id = ?
+        '''
+        deviations_sql = '''
+            SELECT deviation_colno, observed_colno
+                FROM bayesdb_nig_normal_deviation
+                WHERE generator_id = ?
+        '''
         with bdb.savepoint():
-            cursor = bdb.sql_execute(params_sql, (generator_id,))
-            all_mus = {}
-            all_sigmas = {}
-            for (colno, modelno, mu, sigma) in cursor:
-                if modelno not in all_mus:
-                    all_mus[modelno] = {}
-                if modelno not in all_sigmas:
-                    all_sigmas[modelno] = {}
-                assert colno not in all_mus[modelno]
-                all_mus[modelno][colno] = mu
-                assert colno not in all_sigmas[modelno]
-                all_sigmas[modelno][colno] = sigma
-            return (all_mus, all_sigmas)
+            colnos = [colno for (colno,) in
+                bdb.sql_execute(columns_sql, (generator_id,))]
+            rows = bdb.sql_execute(params_sql, (generator_id,)).fetchall()
+            deviations = dict(
+                bdb.sql_execute(deviations_sql, (generator_id,)).fetchall())
+        # This assumes that models x columns forms a dense rectangle
+        # in the database, which it should.
+        modelnos = sorted(set(modelno for (_colno, modelno, _, _) in rows))
+        modelindex = dict((modelno, i) for (i, modelno) in enumerate(modelnos))
+        colindex = dict((colno, j) for (j, colno) in enumerate(colnos))
+        mus = numpy.zeros((len(modelnos), len(colnos)))
+        sigmas = numpy.ones((len(modelnos), len(colnos)))
+        for (colno, modelno, mu, sigma) in rows:
+            mus[modelindex[modelno], colindex[colno]] = mu
+            sigmas[modelindex[modelno], colindex[colno]] = sigma
+        return NIGNormalParams(modelnos, modelindex, colindex, deviations,
+            mus, sigmas)
 
     def column_dependence_probability(self, bdb, generator_id, modelno, colno0,
             colno1):
@@ -370,11 +427,14 @@ class NIGNormalMetamodel(metamodel.IBayesDBMetamodel):
             numsamples=None):
         if colno < 0:
             return (0, 1)       # deviation of mode from mean is zero
+        with bdb.savepoint():
+            params = self._params(bdb, generator_id)
         if modelno is None:
-            modelnos = self._modelnos(bdb, generator_id)
-            modelno = self.prng.choice(modelnos)
-        mus, _sigmas = self._model_mus_sigmas(bdb, generator_id, modelno)
-        return (mus[colno], 1.)
+            modelno = self.prng.choice(params.modelnos)
+        elif isinstance(modelno, list):
+            modelno = self.prng.choice(modelno)
+        mu = params.mus[params.modelindex[modelno], params.colindex[colno]]
+        return (float(mu), 1.)
 
     def insert(self, bdb, generator_id, item):
         (_, colno, value) = item
@@ -416,42 +476,76 @@ class NIGNormalMetamodel(metamodel.IBayesDBMetamodel):
 
     def infer(self, *args): return self.analyze_models(*args)
 
-    def _gibbs_step_params(self, hypers, stats):
-        # This is Venture's UNigNormalAAALKernel.simulate packaged differently.
+    def _gibbs_step_params(self, hypers, stats, nmodels):
+        # This is Venture's UNigNormalAAALKernel.simulate packaged
+        # differently, drawing (nmodels x columns) parameters at once
+        # for the columns whose sufficient statistics are given as
+        # arrays in `stats'.
         (mn, Vn, an, bn) = posterior_hypers(hypers, stats)
-        new_var = self._inv_gamma(an, bn)
-        new_mu = self.prng.gauss(mn, math.sqrt(new_var*Vn))
-        ans = (new_mu, math.sqrt(new_var))
+        shape = (nmodels, len(mn))
+        new_var = self._inv_gamma(an, bn, shape)
+        new_mu = self.np_prng.normal(mn, numpy.sqrt(new_var*Vn), shape)
+        ans = (new_mu, numpy.sqrt(new_var))
         return ans
 
-    def _inv_gamma(self, shape, scale):
-        return float(scale) / self.prng.gammavariate(shape, 1.0)
+    def _inv_gamma(self, shape, scale, size):
+        return scale / self.np_prng.gamma(shape, 1.0, size)
+
+class NIGNormalCache(object):
+    def __init__(self):
+        self.params = {}
+
+class NIGNormalParams(object):
+    """Posterior parameters of all models of a NIG-Normal generator.
+
+    `mus` and `sigmas` are (models x columns) arrays whose rows follow
+    `modelnos` and whose columns follow `colindex`.  `deviations` maps
+    each deviation column to the column it is a deviation of.
+    """
+
+    def __init__(self, modelnos, modelindex, colindex, deviations, mus,
+            sigmas):
+        self.modelnos = modelnos
+        self.modelindex = modelindex
+        self.colindex = colindex
+        self.deviations = deviations
+        self.mus = mus
+        self.sigmas = sigmas
 
 HALF_LOG2PI = 0.5 * math.log(2 * math.pi)
 
 def logpdf_gaussian(x, mu, sigma):
+    # Works elementwise on NumPy arrays as well as on scalars.
     deviation = x - mu
-    ans = - math.log(sigma) - HALF_LOG2PI \
+    ans = - numpy.log(sigma) - HALF_LOG2PI \
         - (0.5 * deviation * deviation / (sigma * sigma))
     return ans
 
 def data_suff_stats(bdb, table, column_name):
+    [stats] = data_suff_stats_columns(bdb, table, [column_name])
+    return stats
+
+# Columns to gather statistics for in one query.  Each takes three
+# result columns, and SQLite allows at most 2000 by default.
+SUFF_STATS_COLUMNS = 2000 // 3
+
+def data_suff_stats_columns(bdb, table, column_names):
     # This is incorporate/remove in bulk, reading from the database.
+    # Compute the statistics of the columns inside the database, in a
+    # single pass over the table for each batch of columns.
     qt = sqlite3_quote_name(table)
-    qcn = sqlite3_quote_name(column_name)
-    # TODO Do this computation inside the database?
-    gather_data_sql = '''
-        SELECT %s FROM %s
-    ''' % (qcn, qt)
-    cursor = bdb.sql_execute(gather_data_sql)
-    count = 0
-    xsum = 0
-    sumsq = 0
-    for (item,) in cursor:
-        count += 1
-        xsum += item
-        sumsq += item * item
-    return (count, xsum, sumsq)
+    stats = []
+    for start in xrange(0, len(column_names), SUFF_STATS_COLUMNS):
+        qcns = map(sqlite3_quote_name,
+            column_names[start:start + SUFF_STATS_COLUMNS])
+        gather_data_sql = '''
+            SELECT %s FROM %s
+        ''' % (','.join('COUNT(%s), TOTAL(%s), TOTAL(%s * %s)' %
+                (qcn, qcn, qcn, qcn)
+                for qcn in qcns), qt)
+        row = bdb.sql_execute(gather_data_sql).fetchone()
+        stats += [tuple(row[3*i:3*i + 3]) for i in xrange(len(qcns))]
+    return stats
 
 def posterior_hypers(hypers, stats):
     # This is Venture's CNigNormalOutputPSP.posteriorHypersNumeric
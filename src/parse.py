@@ -150,6 +150,8 @@ class BQLSemantics(object):
 
     def p_phrase_command(self, c):              return c
     def p_phrase_query(self, q):                return q
+    def p_phrase_explain(self, q):              return ast.Explain(q, False)
+    def p_phrase_explain_plan(self, q):         return ast.Explain(q, True)
 
     # Transactions
     def p_command_begin(self):                  return ast.Begin()
@@ -256,8 +258,8 @@ class BQLSemantics(object):
     # BQL Model Analysis Language
     def p_command_init_models(self, n, ifnotexists, generator):
         return ast.InitModels(ifnotexists, generator, n)
-    def p_command_analyze_models(
-            self, generator, models, anlimit, anckpt, wait, program):
+    def p_command_analyze_models(self, generator, models, anlimit, converge,
+            anckpt, wait, program):
         self._ensure_wizard_mode(generator)
         iters = [lim[1] for lim in anlimit if lim and lim[0] == 'iterations']
         secs = [lim[1] for lim in anlimit if lim and lim[0] == 'seconds']
@@ -269,7 +271,7 @@ class BQLSemantics(object):
             ckpt_iterations = anckpt[1] if anckpt[0] == 'iterations' else None
             ckpt_seconds = anckpt[1] if anckpt[0] == 'seconds' else None
         return ast.AnalyzeModels(generator, models, iterations, seconds,
-            ckpt_iterations, ckpt_seconds, wait, program)
+            ckpt_iterations, ckpt_seconds, converge, wait, program)
     def p_command_drop_models(self, models, generator):
         return ast.DropModels(generator, models)
 
@@ -309,6 +311,14 @@ class BQLSemantics(object):
 
     def p_anlimit_one(self, duration):             return (duration, None)
     def p_anlimit_two(self, duration0, duration1): return (duration0, duration1)
+    def p_anconverge_opt_none(self):            return None
+    def p_anconverge_opt_some(self, window, tolerance):
+        return ast.Converge(window, tolerance)
+    def p_anwindow_opt_none(self):              return None
+    def p_anwindow_opt_some(self, n):           return n
+    def p_antolerance_opt_none(self):           return None
+    def p_antolerance_opt_integer(self, n):     return float(n)
+    def p_antolerance_opt_float(self, x):       return x
     def p_anckpt_opt_none(self):                return None
     def p_anckpt_opt_some(self, duration):      return duration
 
@@ -326,21 +336,23 @@ class BQLSemantics(object):
     def p_analysis_token_compound(self, p):     return ['('] + p + [')']
     def p_analysis_token_primitive(self, t):    return [t]
 
-    def p_simulate_s(self, cols, population, generator, constraints, lim, acc):
+    def p_simulate_s(self, cols, population, generator, modelnos,
+            constraints, lim, acc):
         if any(not isinstance(c.col, ast.ExpCol) for c in cols):
             self.errors.append('simulate only accepts population variables.')
             return None
         return ast.Simulate(
-            [c.col.column for c in cols], population, generator,
+            [c.col.column for c in cols], population, generator, modelnos,
             constraints, lim.limit, acc)
-    def p_simulate_nolimit(self, cols, population, generator, constraints):
+    def p_simulate_nolimit(self, cols, population, generator, modelnos,
+            constraints):
         # XXX Report source location.
         self.errors.append('simulate missing limit')
         if any(not isinstance(c.col, ast.ExpCol) for c in cols):
             self.errors.append('simulate only accepts population variables.')
             return None
         return ast.Simulate(
-            [c.col.column for c in cols], population, generator,
+            [c.col.column for c in cols], population, generator, modelnos,
             constraints, 0, None)
     def p_simulate_models(self, cols, population, generator):
         if any(isinstance(c.col, ast.ExpCol) for c in cols):
@@ -381,10 +393,11 @@ class BQLSemantics(object):
     def p_select_s(self, quant, cols, tabs, cond, grouping, ord, lim):
         return ast.Select(quant, cols, tabs, cond, grouping, ord, lim)
 
-    def p_estimate_e(self, quant, cols, tabs, generator, cond, grouping,
-            ord, lim):
+    def p_estimate_e(self, quant, cols, tabs, generator, modelnos, cond,
+            grouping, ord, lim):
         constructor = tabs
-        return constructor(quant, cols, generator, cond, grouping, ord, lim)
+        return constructor(quant, cols, generator, modelnos, cond, grouping,
+            ord, lim)
 
     def p_estcol_e(self):
         self.errors.append("deprecated `ESTIMATE COLUMNS'"
@@ -396,17 +409,17 @@ class BQLSemantics(object):
         self.errors.append("deprecated `ESTIMATE PAIRWISE'"
             ": use `ESTIMATE ... FROM PAIRWISE COLUMNS OF'")
 
-    def p_estby_e(self, quant, cols, population, generator):
-        return ast.EstBy(quant, cols, population, generator)
+    def p_estby_e(self, quant, cols, population, generator, modelnos):
+        return ast.EstBy(quant, cols, population, generator, modelnos)
 
-    def p_infer_auto(self, cols, conf, nsamp, population, generator, cond,
+    def p_infer_auto(self, cols, conf, nsamp, population, generator,
+            modelnos, cond, grouping, ord, lim):
+        return ast.InferAuto(cols, conf, nsamp, population, generator,
+            modelnos, cond, grouping, ord, lim)
+    def p_infer_explicit(self, cols, population, generator, modelnos, cond,
             grouping, ord, lim):
-        return ast.InferAuto(cols, conf, nsamp, population, generator, cond,
+        return ast.InferExplicit(cols, population, generator, modelnos, cond,
             grouping, ord, lim)
-    def p_infer_explicit(self, cols, population, generator, cond, grouping,
-            ord, lim):
-        return ast.InferExplicit(cols, population, generator, cond, grouping,
-            ord, lim)
 
     def p_infer_auto_columns_one(self, c):      return [c]
     def p_infer_auto_columns_many(self, cs, c): cs.append(c); return cs
@@ -449,27 +462,33 @@ class BQLSemantics(object):
     def p_from_sel_opt_nonempty(self, tables):  return tables
 
     def p_from_est_row(self, name):
-        def c(quant, cols, generator, cond, grouping, ord, lim):
-            return ast.Estimate(quant, cols, name, generator, cond, grouping,
-                ord, lim)
+        def c(quant, cols, generator, modelnos, cond, grouping, ord, lim):
+            return ast.Estimate(quant, cols, name, generator, modelnos, cond,
+                grouping, ord, lim)
         return c
     def p_from_est_pairrow(self, name):
-        def c(quant, cols, generator, cond, grouping, ord, lim):
-            return ast.EstPairRow(cols, name, generator, cond, ord, lim)
+        def c(quant, cols, generator, modelnos, cond, grouping, ord, lim):
+            return ast.EstPairRow(cols, name, generator, modelnos, cond, ord,
+                lim)
         return c
     def p_from_est_col(self, name):
-        def c(quant, cols, generator, cond, grouping, ord, lim):
-            return ast.EstCols(cols, name, generator, cond, ord, lim)
+        def c(quant, cols, generator, modelnos, cond, grouping, ord, lim):
+            return ast.EstCols(cols, name, generator, modelnos, cond, ord,
+                lim)
         return c
     def p_from_est_paircol(self, name, subcols):
-        def c(quant, cols, generator, cond, grouping, ord, lim):
-            return ast.EstPairCols(cols, name, subcols, generator, cond, ord,
-                lim)
+        def c(quant, cols, generator, modelnos, cond, grouping, ord, lim):
+            return ast.EstPairCols(cols, name, subcols, generator, modelnos,
+                cond, ord, lim)
         return c
 
     def p_modelledby_opt_none(self):            return None
     def p_modelledby_opt_some(self, gen):       return gen
 
+    def p_usingmodels_opt_none(self):           return None
+    def p_usingmodels_opt_some(self, m):        return sorted(set(m))
+    def p_usingmodels_opt_top(self, k):         return ast.TopModels(k)
+
     def p_select_tables_one(self, t):           return [t]
     def p_select_tables_many(self, ts, t):      ts.append(t); return ts
     def p_select_table_named(self, table, name): return ast.SelTab(table, name)
@@ -604,16 +623,22 @@ class BQLSemantics(object):
     def p_unary_bql(self, b):           return b
 
     def p_bqlfn_predprob_row(self, col):        return ast.ExpBQLPredProb(col)
+    def p_bqlfn_predprob_row_all(self):         return ast.ExpBQLPredProb(None)
     def p_bqlfn_prob_const(self, col, e):       return ast.ExpBQLProb(
-                                                    [(col, e)], [])
-    def p_bqlfn_jprob_const(self, targets):     return ast.ExpBQLProb(targets,
-                                                    [])
-    def p_bqlfn_condprob_const(self, col, e, constraints):
+                                                    [(col, e)], [], None)
+    def p_bqlfn_prob_const_budget(self, col, e, budget):
                                                 return ast.ExpBQLProb(
-                                                    [(col, e)], constraints)
-    def p_bqlfn_condjprob_const(self, targets, constraints):
+                                                    [(col, e)], [], budget)
+    def p_bqlfn_jprob_const(self, targets, budget):
                                                 return ast.ExpBQLProb(targets,
-                                                    constraints)
+                                                    [], budget)
+    def p_bqlfn_condprob_const(self, col, e, constraints, budget):
+                                                return ast.ExpBQLProb(
+                                                    [(col, e)], constraints,
+                                                    budget)
+    def p_bqlfn_condjprob_const(self, targets, constraints, budget):
+                                                return ast.ExpBQLProb(targets,
+                                                    constraints, budget)
     def p_bqlfn_prob_1col(self, e):             return ast.ExpBQLProbFn(e, [])
     def p_bqlfn_condprob_1col(self, e, constraints):
                                                 return ast.ExpBQLProbFn(e,
@@ -626,8 +651,8 @@ class BQLSemantics(object):
         return ast.ExpBQLSim(None, None, cols)
     def p_bqlfn_depprob(self, cols):            return ast.ExpBQLDepProb(*cols)
 
-    def p_bqlfn_mutinf(self, cols, constraints, nsamp):
-        return ast.ExpBQLMutInf(cols[0], cols[1], constraints, nsamp)
+    def p_bqlfn_mutinf(self, cols, constraints, nsamp, budget):
+        return ast.ExpBQLMutInf(cols[0], cols[1], constraints, nsamp, budget)
 
     def p_ofwithmulti_bql_2col(self):                   return (None, None)
     def p_ofwithmulti_bql_1col(self, cols):             return (cols, None)
@@ -671,6 +696,14 @@ class BQLSemantics(object):
     def p_nsamples_opt_none(self):              return None
     def p_nsamples_opt_some(self, nsamples):    return nsamples
 
+    def p_budget_opt_none(self):                return None
+    def p_budget_opt_some(self, budget):        return budget
+    def p_budget_time(self, seconds, error):    return ast.Budget(seconds, error)
+    def p_budget_error(self, error):            return ast.Budget(None, error)
+    def p_maxerror_opt_none(self):              return None
+    def p_maxerror_opt_some(self, error):       return error
+    def p_maxerror_e(self, error):              return error
+
     def p_column_lists_one(self, collist):
         return [collist]
     def p_column_lists_many(self, collists, collist):
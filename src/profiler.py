@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+
+#   Copyright (c) 2010-2016, MIT Probabilistic Computing Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""Per-query profiling of BayesDB execution.
+
+Within ``with bdb.profile() as profile:``, every BQL query on `bdb`
+is recorded, along with the calls and cumulative time of the
+``bql_*`` SQL functions, the metamodel methods, and the SQL
+statements it issues, and the lookups of models in the metamodels'
+caches -- for each query, and in total.  :meth:`BayesDBProfile.as_dict` gives it
+all as JSON-serializable data for monitoring.
+"""
+
+import contextlib
+import re
+import threading
+import time
+
+from bayeslite.util import cursor_value
+
+class BayesDBProfile(object):
+    """Profile of the queries executed on a BayesDB.
+
+    :ivar list queries: one dict per BQL query, with its text, time
+        spent preparing and stepping it, number of rows produced, and
+        its own ``udfs``, ``metamodels``, ``sql``, and ``cache``
+        statistics as below
+    :ivar dict udfs: :class:`ProfileStat` per ``bql_*`` SQL function
+    :ivar dict metamodels: :class:`ProfileStat` per metamodel method,
+        as ``<metamodel>.<method>``
+    :ivar dict sql: :class:`ProfileStat` per SQL statement, with
+        whitespace collapsed, counting the time to execute it and to
+        step through its rows, including any ``bql_*`` functions it
+        calls
+    :ivar dict cache: hits and misses of model lookups per cache: each
+        metamodel's cache in the transaction, and ``shared_models``
+        for models shared among threads
+    :ivar list estimates: one dict per anytime estimate, ``PROBABILITY
+        OF`` or ``MUTUAL INFORMATION`` with a time or error limit, with
+        its value, standard error, samples drawn, models visited,
+        elapsed seconds, and which limit stopped it
+
+    Work done while a query is prepared or stepped, in whichever
+    thread, counts toward that query as well as toward the totals.
+    """
+
+    def __init__(self):
+        self.queries = []
+        self.udfs = {}
+        self.metamodels = {}
+        self.sql = {}
+        self.cache = {}
+        self.estimates = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def current_query(self):
+        """Return the query in progress in this thread, or None."""
+        return getattr(self._local, 'query', None)
+
+    @contextlib.contextmanager
+    def querying(self, query):
+        """Count what this thread does in the context toward `query`."""
+        saved = self.current_query()
+        self._local.query = query
+        try:
+            yield
+        finally:
+            self._local.query = saved
+
+    def _stats(self, kind):
+        # The totals, and those of the query in progress, if any.
+        query = self.current_query()
+        if query is None:
+            return [getattr(self, kind)]
+        return [getattr(self, kind), query[kind]]
+
+    @contextlib.contextmanager
+    def timing(self, kind, key):
+        """Time the context as a call of `key` among the `kind` stats."""
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.record(kind, key, time.time() - start)
+
+    def record(self, kind, key, seconds, calls=1):
+        for stats in self._stats(kind):
+            with self._lock:
+                stat = stats.get(key)
+                if stat is None:
+                    stat = stats[key] = ProfileStat()
+                stat.calls += calls
+                stat.seconds += seconds
+
+    def execute_sql(self, execute, string, bindings):
+        key = sql_template(string)
+        with self.timing('sql', key):
+            cursor = execute(string, bindings)
+        return ProfiledSQLCursor(self, key, cursor)
+
+    def execute(self, execute, string, bindings):
+        query = {
+            'query': string, 'prepare': 0., 'step': 0., 'rows': 0,
+            'udfs': {}, 'metamodels': {}, 'sql': {}, 'cache': {},
+        }
+        with self._lock:
+            self.queries.append(query)
+        start = time.time()
+        try:
+            with self.querying(query):
+                cursor = execute(string, bindings)
+        finally:
+            query['prepare'] = time.time() - start
+        return ProfiledCursor(self, query, cursor)
+
+    def metamodel(self, metamodel):
+        return ProfiledMetamodel(self, metamodel)
+
+    def cache_lookup(self, key, hit):
+        for caches in self._stats('cache'):
+            with self._lock:
+                counts = caches.get(key)
+                if counts is None:
+                    counts = caches[key] = {'hits': 0, 'misses': 0}
+                counts['hits' if hit else 'misses'] += 1
+
+    def estimate(self, function, result):
+        with self._lock:
+            self.estimates.append(dict(result, function=function))
+
+    def as_dict(self):
+        """Return the profile as JSON-serializable data."""
+        def stats(d):
+            return dict((key, stat.as_dict()) for key, stat in d.iteritems())
+        def caches(d):
+            return dict((key, dict(counts)) for key, counts in d.iteritems())
+        def query_dict(query):
+            return dict(query,
+                udfs=stats(query['udfs']),
+                metamodels=stats(query['metamodels']),
+                sql=stats(query['sql']),
+                cache=caches(query['cache']))
+        with self._lock:
+            return {
+                'queries': [query_dict(query) for query in self.queries],
+                'udfs': stats(self.udfs),
+                'metamodels': stats(self.metamodels),
+                'sql': stats(self.sql),
+                'cache': caches(self.cache),
+                'estimates': [dict(e) for e in self.estimates],
+            }
+
+class ProfileStat(object):
+    """Number of calls and cumulative time in seconds of one thing."""
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.
+
+    def as_dict(self):
+        return {'calls': self.calls, 'seconds': self.seconds}
+
+def sql_template(string):
+    return re.sub(r'\s+', ' ', string).strip()
+
+class ProfiledCursor(object):
+    """Cursor wrapper counting the rows and stepping time of a query."""
+
+    def __init__(self, profile, query, cursor):
+        self._profile = profile
+        self._query = query
+        self._cursor = cursor
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        start = time.time()
+        try:
+            with self._profile.querying(self._query):
+                row = self._cursor.next()
+        finally:
+            self._query['step'] += time.time() - start
+        self._query['rows'] += 1
+        return row
+
+    def fetchone(self):
+        try:
+            return self.next()
+        except StopIteration:
+            return None
+
+    def fetchvalue(self):
+        return cursor_value(self)
+
+    def fetchmany(self, size=1):
+        return self._fetch(self._cursor.fetchmany, size=size)
+
+    def fetchall(self):
+        return self._fetch(self._cursor.fetchall)
+
+    def fetch_columns(self):
+        return self._fetch(self._cursor.fetch_columns, nrows=_ncolumnrows)
+
+    def fetch_numpy(self, dtype_map=None):
+        return self._fetch(self._cursor.fetch_numpy, nrows=_ncolumnrows,
+            dtype_map=dtype_map)
+
+    def fetch_numpy_chunks(self, size=None, dtype_map=None):
+        chunks = self._cursor.fetch_numpy_chunks(size=size,
+            dtype_map=dtype_map)
+        while True:
+            try:
+                chunk = self._fetch(chunks.next, nrows=_ncolumnrows)
+            except StopIteration:
+                return
+            yield chunk
+
+    def fetch_dataframe(self, dtype_map=None):
+        return self._fetch(self._cursor.fetch_dataframe, dtype_map=dtype_map)
+
+    def _fetch(self, fetch, nrows=len, **kwargs):
+        start = time.time()
+        try:
+            with self._profile.querying(self._query):
+                rows = fetch(**kwargs)
+        finally:
+            self._query['step'] += time.time() - start
+        self._query['rows'] += nrows(rows)
+        return rows
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+def _ncolumnrows(columns):
+    return len(columns[0]) if columns else 0
+
+class ProfiledSQLCursor(object):
+    """SQL cursor wrapper adding its stepping time to its statement's."""
+
+    def __init__(self, profile, key, cursor):
+        self._profile = profile
+        self._key = key
+        self._cursor = cursor
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        return self._step(self._cursor.next)
+
+    def fetchone(self):
+        return self._step(self._cursor.fetchone)
+
+    def fetchall(self):
+        return self._step(self._cursor.fetchall)
+
+    def _step(self, step):
+        start = time.time()
+        try:
+            return step()
+        finally:
+            self._profile.record('sql', self._key, time.time() - start,
+                calls=0)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+class ProfiledMetamodel(object):
+    """Metamodel wrapper timing calls to its methods."""
+
+    def __init__(self, profile, metamodel):
+        self._profile = profile
+        self._metamodel = metamodel
+
+    def __getattr__(self, name):
+        attr = getattr(self._metamodel, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+        key = '%s.%s' % (self._metamodel.name(), name)
+        profile = self._profile
+        def method(*args, **kwargs):
+            with profile.timing('metamodels', key):
+                return attr(*args, **kwargs)
+        return method
+
+def bayesdb_cache_lookup(bdb, cache, hit):
+    """Count a lookup of a model in `cache`, a hit if `hit` is true.
+
+    Does nothing unless `bdb` is being profiled.
+    """
+    if bdb.profiler is not None:
+        bdb.profiler.cache_lookup(cache, hit)
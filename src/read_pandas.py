@@ -16,12 +16,20 @@
 
 """Reading data from pandas dataframes."""
 
+import itertools
+
+import numpy
+import pandas
+
 import bayeslite.core as core
 
 from bayeslite.sqlite3_util import sqlite3_quote_name
 
+# Number of rows converted and inserted at a time.
+READ_CHUNK_ROWS = 10000
+
 def bayesdb_read_pandas_df(bdb, table, df, create=False, ifnotexists=False,
-        index=None):
+        index=None, chunksize=None, progress=None):
     """Read data from a pandas dataframe into a table.
 
     :param bayeslite.BayesDB bdb: BayesDB instance
@@ -31,12 +39,22 @@ def bayesdb_read_pandas_df(bdb, table, df, create=False, ifnotexists=False,
     :param bool ifnotexists: if true, and `create` is true` and `table`
         exists, read data into it anyway
     :param str index: name of column for index
+    :param int chunksize: number of rows to insert at a time
+    :param progress: if not `None`, called as ``progress(n, total)``
+        after each chunk, with the number of rows inserted so far
 
     If `index` is `None`, then the dataframe's index dtype must be
     convertible to int64, and it is mapped to the table's rowids.  If
     the dataframe's index dtype is not convertible to int64, you must
     specify `index` to give a primary key for the table.
+
+    Columns are converted to SQLite values a chunk at a time, whole
+    columns at once, and NaN and other missing values become NULL.
     """
+    if chunksize is None:
+        chunksize = READ_CHUNK_ROWS
+    if chunksize < 1:
+        raise ValueError('Chunk size must be positive: %r' % (chunksize,))
     if not create:
         if ifnotexists:
             raise ValueError('Not creating table whether or not exists!')
@@ -82,5 +100,30 @@ def bayesdb_read_pandas_df(bdb, table, df, create=False, ifnotexists=False,
         qicns = map(sqlite3_quote_name, insert_column_names)
         sql = 'INSERT INTO %s (%s) VALUES (%s)' % \
             (qt, ','.join(qicns), ','.join('?' for _qicn in qicns))
-        for key, i in zip(key_index, df.index):
-            bdb.sql_execute(sql, (key,) + tuple(df.ix[i]))
+        nrows = len(df.index)
+        for start in xrange(0, nrows, chunksize):
+            stop = min(start + chunksize, nrows)
+            columns = [sqlite3_column_values(key_index[start:stop])]
+            columns += [sqlite3_column_values(df.iloc[start:stop, j])
+                for j in xrange(len(df.columns))]
+            bdb.sql_executemany(sql, itertools.izip(*columns))
+            if progress is not None:
+                progress(stop, nrows)
+
+def sqlite3_column_values(column):
+    """Return a list of SQLite values for a pandas or numpy column.
+
+    Numbers become Python ints and floats, and NaN and other missing
+    values become None.
+    """
+    array = numpy.asarray(column)
+    if array.dtype.kind in 'biu':
+        return array.tolist()
+    values = array.tolist()
+    if array.dtype.kind == 'f':
+        missing = numpy.isnan(array)
+    else:
+        missing = pandas.isnull(array)
+    for i in numpy.flatnonzero(missing):
+        values[i] = None
+    return values
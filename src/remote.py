@@ -14,13 +14,7 @@
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
 
-try:
-    from pkg_resources import parse_version
-except ImportError:
-    # XXX Consider requiring setuptools
-    def parse_version(v):
-        return 1
-import requests
+import threading
 import warnings
 
 from bayeslite.version import __version__
@@ -44,7 +38,15 @@ def version_check(warn_only=True):
     }
 
     try:
-        # TODO: It would be nice to be async about this. Set 1 second timeout.
+        # Import these here: requests and pkg_resources are slow to
+        # import, and most processes never check.
+        import requests
+        try:
+            from pkg_resources import parse_version
+        except ImportError:
+            # XXX Consider requiring setuptools
+            def parse_version(v):
+                return 1
         r = requests.get(SERVICE, params=payload, timeout=1, headers=headers)
         if r.status_code != 200:
             return
@@ -64,3 +66,17 @@ def version_check(warn_only=True):
             pass
         else:
             raise
+
+def version_check_async():
+    """Check bayeslite version against remote server in the background.
+
+    Like :func:`version_check` with `warn_only` true, but return
+    immediately and run the check in a daemon thread, so that it
+    neither delays the caller nor keeps the process alive.  Return
+    the thread.
+    """
+    thread = threading.Thread(target=version_check,
+        name='bayeslite version check')
+    thread.daemon = True
+    thread.start()
+    return thread
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+
+#   Copyright (c) 2010-2016, MIT Probabilistic Computing Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""Reservoir sampling driven by weakprng, in bulk.
+
+A reservoir sample of `k` of `n` items keeps the first `k` and then,
+for each later item ``i``, draws ``r = weakrandom_uniform(i + 1)`` and
+puts item ``i`` in slot ``r`` if ``r < k``.  Done one item at a time
+with the pure-Python weakprng, this dominates the cost of subsampling
+large tables.
+
+:func:`weakprng_reservoir` computes the same sample with numpy: it
+generates the ChaCha8 keystream of weakprng many blocks at a time,
+replays the rejection sampling of
+:meth:`~bayeslite.weakprng.weakprng.WeakPRNG.weakrandom_uniform` over
+whole windows of draws, and resolves which item ends up in each slot,
+so the result is identical, item for item, to the sequential loop.
+"""
+
+import numpy
+import struct
+
+import bayeslite.weakprng.chacha as chacha
+import bayeslite.weakprng as weakprng
+
+# Number of draws to process at a time, bounding the memory used.
+CHUNK_DRAWS = 1 << 20
+
+# Draws to check for rejection at once after a rejection.  Rejections
+# are rare, so the window doubles after each clean window, up to the
+# whole chunk.
+REJECTION_WINDOW = 1 << 10
+
+def weakprng_reservoir(seed, k, n):
+    """Reservoir sample of `k` of ``range(n)`` drawn with weakprng `seed`.
+
+    Return a numpy array of ``min(k, n)`` items, in slot order, equal
+    to the result of the sequential reservoir loop with
+    ``weakprng.weakprng(seed).weakrandom_uniform``.
+    """
+    if n <= k:
+        return numpy.arange(n, dtype=numpy.int64)
+    if (1 << 32) <= n:
+        # Later draws take two words each; not worth vectorizing.
+        uniform = weakprng.weakprng(seed).weakrandom_uniform
+        samples = numpy.arange(k, dtype=numpy.int64)
+        for i in xrange(k, n):
+            r = uniform(i + 1)
+            if r < k:
+                samples[r] = i
+        return samples
+    key = struct.unpack('<IIIIIIII', seed)
+    samples = numpy.arange(k, dtype=numpy.int64)
+    position = 0                # next word of the keystream
+    for start in xrange(k, n, CHUNK_DRAWS):
+        end = min(n, start + CHUNK_DRAWS)
+        draws, position = _uniform_draws(key, position,
+            numpy.arange(start + 1, end + 1, dtype=numpy.uint64))
+        # Later items overwrite earlier ones in the same slot, so the
+        # last item drawn for each slot wins.
+        hits = numpy.flatnonzero(draws < k)
+        slots = draws[hits][::-1]
+        items = (hits + start)[::-1]
+        slots, first = numpy.unique(slots, return_index=True)
+        samples[slots.astype(numpy.int64)] = items[first]
+    return samples
+
+def _uniform_draws(key, position, m):
+    # Replay weakrandom_uniform(m[t]) for each t in turn, for m < 2^32,
+    # starting at word `position` of the keystream.  Each draw takes
+    # one word w and yields w % m[t], unless w is below the rejection
+    # threshold, in which case the draw is retried with the next word.
+    # Return the draws and the position of the next unused word.
+    nbits = numpy.frexp(m.astype(numpy.float64))[1].astype(numpy.uint64)
+    threshold = ((numpy.uint64(1) << nbits) - m) % m
+    draws = numpy.empty(len(m), dtype=numpy.uint64)
+    # Each retry shifts the rest of the draws by one word, so leave
+    # room for a few.
+    words = weakprng_words(key, position, len(m) + 64)
+    offset = position           # keystream position of words[0]
+    t = 0
+    window = REJECTION_WINDOW
+    while t < len(m):
+        count = min(window, len(m) - t)
+        i = position - offset
+        if len(words) < i + count:
+            words = weakprng_words(key, position, len(m) - t + 64)
+            offset = position
+            i = 0
+        w = words[i:i + count]
+        rejected = numpy.flatnonzero(w < threshold[t:t + count])
+        good = rejected[0] if len(rejected) else count
+        draws[t:t + good] = w[:good] % m[t:t + good]
+        t += good
+        position += good
+        if good < count:
+            position += 1
+            window = REJECTION_WINDOW
+        else:
+            window *= 2
+    return draws, position
+
+def weakprng_words(key, start, count):
+    """Words `start` to ``start + count`` of weakprng's stream for `key`.
+
+    The words are those :meth:`weakrandom32` would return in turn from
+    a fresh generator seeded with the 32-bit words of `key`, as a numpy
+    array of uint32.
+    """
+    first = start // 16
+    end = (start + count + 15) // 16
+    counter = numpy.arange(first, end, dtype=numpy.uint64)
+    nblocks = len(counter)
+    x = [numpy.full(nblocks, c, dtype=numpy.uint32) for c in chacha.const32]
+    x += [numpy.full(nblocks, k, dtype=numpy.uint32) for k in key]
+    x += [
+        (counter & numpy.uint64(0xffffffff)).astype(numpy.uint32),
+        (counter >> numpy.uint64(32)).astype(numpy.uint32),
+        numpy.zeros(nblocks, dtype=numpy.uint32),
+        numpy.zeros(nblocks, dtype=numpy.uint32),
+    ]
+    y = [a.copy() for a in x]
+    for _r in xrange(8 // 2):
+        _quarterround(y, 0, 4, 8, 12)
+        _quarterround(y, 1, 5, 9, 13)
+        _quarterround(y, 2, 6, 10, 14)
+        _quarterround(y, 3, 7, 11, 15)
+        _quarterround(y, 0, 5, 10, 15)
+        _quarterround(y, 1, 6, 11, 12)
+        _quarterround(y, 2, 7, 8, 13)
+        _quarterround(y, 3, 4, 9, 14)
+    # weakrandom32 yields the words of each block from last to first.
+    blocks = numpy.array([a + b for a, b in reversed(zip(x, y))])
+    words = blocks.T.ravel()
+    return words[start - 16*first:start - 16*first + count]
+
+def _quarterround(x, a, b, c, d):
+    x[a] += x[b]; x[d] ^= x[a]; x[d] = _rotate(x[d], 16)
+    x[c] += x[d]; x[b] ^= x[c]; x[b] = _rotate(x[b], 12)
+    x[a] += x[b]; x[d] ^= x[a]; x[d] = _rotate(x[d], 8)
+    x[c] += x[d]; x[b] ^= x[c]; x[b] = _rotate(x[b], 7)
+
+def _rotate(v, n):
+    return (v << numpy.uint32(n)) | (v >> numpy.uint32(32 - n))
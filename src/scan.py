@@ -14,6 +14,16 @@
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
 
+"""BQL scanner.
+
+:class:`BQLScanner` tokenizes a BQL string with a single compiled
+regular expression.  :class:`BQLPlexScanner` is the original Plex
+specification of the same lexical grammar, kept as the reference
+definition against which the tests check :class:`BQLScanner`; its
+lexicon is built on first use only.
+"""
+
+import re
 import StringIO
 
 import bayeslite.grammar as grammar
@@ -52,6 +62,7 @@ keywords = {
     "commit": grammar.K_COMMIT,
     "conf": grammar.K_CONF,
     "confidence": grammar.K_CONFIDENCE,
+    "converged": grammar.K_CONVERGED,
     "correlation": grammar.K_CORRELATION,
     "create": grammar.K_CREATE,
     "default": grammar.K_DEFAULT,
@@ -61,9 +72,11 @@ keywords = {
     "drop": grammar.K_DROP,
     "else": grammar.K_ELSE,
     "end": grammar.K_END,
+    "error": grammar.K_ERROR,
     "escape": grammar.K_ESCAPE,
     "estimate": grammar.K_ESTIMATE,
     "exists": grammar.K_EXISTS,
+    "explain": grammar.K_EXPLAIN,
     "explicit": grammar.K_EXPLICIT,
     "for": grammar.K_FOR,
     "from": grammar.K_FROM,
@@ -87,6 +100,7 @@ keywords = {
     "like": grammar.K_LIKE,
     "limit": grammar.K_LIMIT,
     "match": grammar.K_MATCH,
+    "max": grammar.K_MAX,
     "metamodel": grammar.K_METAMODEL,
     "minute": grammar.K_MINUTE,
     "minutes": grammar.K_MINUTES,
@@ -103,11 +117,13 @@ keywords = {
     "or": grammar.K_OR,
     "order": grammar.K_ORDER,
     "pairwise": grammar.K_PAIRWISE,
+    "plan": grammar.K_PLAN,
     "population": grammar.K_POPULATION,
     "predict": grammar.K_PREDICT,
     "predictive": grammar.K_PREDICTIVE,
     "probability": grammar.K_PROBABILITY,
     "pvalue": grammar.K_PVALUE,
+    "query": grammar.K_QUERY,
     "regexp": grammar.K_REGEXP,
     "rename": grammar.K_RENAME,
     "respect": grammar.K_RESPECT,
@@ -128,7 +144,10 @@ keywords = {
     "temporary": grammar.K_TEMPORARY,
     "then": grammar.K_THEN,
     "to": grammar.K_TO,
+    "tolerance": grammar.K_TOLERANCE,
+    "top": grammar.K_TOP,
     "unset": grammar.K_UNSET,
+    "until": grammar.K_UNTIL,
     "using": grammar.K_USING,
     "value": grammar.K_VALUE,
     "variable": grammar.K_VARIABLE,
@@ -136,6 +155,7 @@ keywords = {
     "wait": grammar.K_WAIT,
     "when": grammar.K_WHEN,
     "where": grammar.K_WHERE,
+    "window": grammar.K_WINDOW,
     "with": grammar.K_WITH,
     "within": grammar.K_WITHIN,
 }
@@ -224,90 +244,234 @@ def scan_quoted_end(scanner, text, token):
     scanner.produce(token, string)
     scanner.begin("")
 
-class BQLScanner(Plex.Scanner):
-    line_comment = Plex.Str("--") + Plex.Rep(Plex.AnyBut("\n"))
-    whitespace = Plex.Any("\f\n\r\t ")
-    # XXX Support non-US-ASCII Unicode text.
-    letter = Plex.Range("azAZ")
-    digit = Plex.Range("09")
-    digits = Plex.Rep(digit)
-    digits1 = Plex.Rep1(digit)
-    hexit = digit | Plex.Range("afAF")
-    hexits1 = Plex.Rep1(hexit)
-    integer_dec = digits1
-    integer_hex = Plex.Str("0x", "0X") + hexits1
-    dot = Plex.Str('.')
-    intfrac = digits1 + dot + digits
-    fraconly = dot + digits1
-    optsign = Plex.Opt(Plex.Any('+-'))
-    expmark = Plex.Any('eE')
-    exponent = expmark + optsign + digits1
-    optexp = Plex.Opt(exponent)
-    float_dec = ((intfrac | fraconly) + optexp) | (digits1 + exponent)
-    name_special = Plex.Any("_$")
-    name = (letter | name_special) + Plex.Rep(letter | digit | name_special)
-
-    lexicon = Plex.Lexicon([
-        (whitespace,            Plex.IGNORE),
-        (line_comment,          Plex.IGNORE),
-        (Plex.Str(";"),         grammar.T_SEMI),
-        (Plex.Str("{"),         grammar.T_LCURLY),
-        (Plex.Str("}"),         grammar.T_RCURLY),
-        (Plex.Str("["),         grammar.T_LSQUARE),
-        (Plex.Str("]"),         grammar.T_RSQUARE),
-        (Plex.Str("("),         grammar.T_LROUND),
-        (Plex.Str(")"),         grammar.T_RROUND),
-        (Plex.Str("+"),         grammar.T_PLUS),
-        (Plex.Str("-"),         grammar.T_MINUS),
-        (Plex.Str("*"),         grammar.T_STAR),
-        (Plex.Str("/"),         grammar.T_SLASH),
-        (Plex.Str("%"),         grammar.T_PERCENT),
-        (Plex.Str("="),         grammar.T_EQ),
-        (Plex.Str("=="),        grammar.T_EQ),
-        (Plex.Str("<"),         grammar.T_LT),
-        (Plex.Str("<>"),        grammar.T_NEQ),
-        (Plex.Str("<="),        grammar.T_LEQ),
-        (Plex.Str(">"),         grammar.T_GT),
-        (Plex.Str(">="),        grammar.T_GEQ),
-        (Plex.Str("<<"),        grammar.T_LSHIFT),
-        (Plex.Str(">>"),        grammar.T_RSHIFT),
-        (Plex.Str("!="),        grammar.T_NEQ),
-        (Plex.Str("|"),         grammar.T_BITIOR),
-        (Plex.Str("||"),        grammar.T_CONCAT),
-        (Plex.Str(","),         grammar.T_COMMA),
-        (Plex.Str("&"),         grammar.T_BITAND),
-        (Plex.Str("~"),         grammar.T_BITNOT),
-        (Plex.Str("."),         grammar.T_DOT),
-        (Plex.Str("?"),         scan_numpar_next),
-        (Plex.Str("?") + integer_dec,
-                                scan_numpar),
-        (Plex.Str(":") + name,  scan_nampar),
-        (Plex.Str("@") + name,  scan_nampar),
-        (Plex.Str("$") + name,  scan_nampar),
-        (Plex.Str("'"),         scan_string_start),
-        (Plex.Str('"'),         scan_qname_start),
-        (name,                  scan_name),
-        (integer_dec,           scan_integer),
-        (integer_hex,           scan_integer),
-        (float_dec,             scan_float),
-        (integer_dec + name,    scan_bad),
-        (integer_hex + name,    scan_bad),
-        (float_dec + name,      scan_bad),
-        (Plex.AnyChar,          scan_bad),
-        Plex.State("STRING", [
-            (Plex.Str("'"),                     scan_string_end),
-            (Plex.Str("''"),                    scan_quoted_quote),
-            (Plex.Rep1(Plex.AnyBut("'")),       scan_quoted_text),
-        ]),
-        Plex.State("QNAME", [
-            (Plex.Str('"'),                     scan_qname_end),
-            (Plex.Str('""'),                    scan_quoted_quote),
-            (Plex.Rep1(Plex.AnyBut('"')),       scan_quoted_text),
-        ]),
-    ])
+# Tokens that are always the same fixed string, longest first so that
+# the regular expression alternation below prefers them.
+punctuation = {
+    "==": grammar.T_EQ,
+    "<>": grammar.T_NEQ,
+    "<=": grammar.T_LEQ,
+    ">=": grammar.T_GEQ,
+    "<<": grammar.T_LSHIFT,
+    ">>": grammar.T_RSHIFT,
+    "!=": grammar.T_NEQ,
+    "||": grammar.T_CONCAT,
+    ";": grammar.T_SEMI,
+    "{": grammar.T_LCURLY,
+    "}": grammar.T_RCURLY,
+    "[": grammar.T_LSQUARE,
+    "]": grammar.T_RSQUARE,
+    "(": grammar.T_LROUND,
+    ")": grammar.T_RROUND,
+    "+": grammar.T_PLUS,
+    "-": grammar.T_MINUS,
+    "*": grammar.T_STAR,
+    "/": grammar.T_SLASH,
+    "%": grammar.T_PERCENT,
+    "=": grammar.T_EQ,
+    "<": grammar.T_LT,
+    ">": grammar.T_GT,
+    "|": grammar.T_BITIOR,
+    ",": grammar.T_COMMA,
+    "&": grammar.T_BITAND,
+    "~": grammar.T_BITNOT,
+    ".": grammar.T_DOT,
+}
+
+# Python's alternation takes the first alternative that matches, not
+# the longest, so the alternatives are ordered to agree with Plex's
+# longest match, first rule breaking ties.  A number immediately
+# followed by name characters is a single bad token.
+token_re = re.compile(r'''
+    (?P<ignore>[\f\n\r\t ]+|--[^\n]*)
+  | (?P<number>
+        (?P<digits>
+            0[xX][0-9a-fA-F]+
+          | [0-9]+(?:\.[0-9]*)?(?:[eE][+-]?[0-9]+)?
+          | \.[0-9]+(?:[eE][+-]?[0-9]+)?
+        )
+        (?P<suffix>[a-zA-Z0-9_$]*)
+    )
+  | (?P<string>'(?P<string_text>[^']*(?:''[^']*)*)'(?!'))
+  | (?P<qname>"(?P<qname_text>[^"]*(?:""[^"]*)*)"(?!"))
+  | (?P<unterminated>['"])
+  | (?P<numpar>\?[0-9]+)
+  | (?P<nampar>[:@$][a-zA-Z_$][a-zA-Z0-9_$]*)
+  | (?P<name>[a-zA-Z_$][a-zA-Z0-9_$]*)
+  | (?P<punctuation>%s)
+  | (?P<numpar_next>\?)
+  | (?P<bad>.)
+''' % ('|'.join(re.escape(p) for p in
+        sorted(punctuation, key=len, reverse=True)),),
+    re.VERBOSE | re.DOTALL)
+
+class BQLScanner(object):
+    """Scanner for BQL tokens in the text of the file-like object `f`.
+
+    Yields the same tokens as :class:`BQLPlexScanner` from
+    :meth:`read`, as ``(token, value)`` pairs with token 0 at end of
+    input, and tracks the same :attr:`cur_pos`, the offset in the text
+    just past the last token read.
+    """
+
+    def __init__(self, f, context):
+        self.string = f.read()
+        self.context = context
+        self.queue = []
+        self.text = None
+        self.cur_pos = 0
+        self.n_numpar = 0
+        self.nampar_map = {}
+
+    def read(self):
+        queue = self.queue
+        while not queue:
+            self._scan_a_token()
+        return queue.pop(0)
+
+    def produce(self, token, value=None):
+        if token is None:       # EOF
+            token = 0
+        if value is None:
+            value = self.text
+        self.queue.append((token, value))
+
+    def _scan_a_token(self):
+        string = self.string
+        if len(string) <= self.cur_pos:
+            self.text = ''
+            self.produce(None)
+            return
+        match = token_re.match(string, self.cur_pos)
+        self.text = text = match.group()
+        kind = match.lastgroup
+        if kind == 'unterminated':
+            # Plex swallows the rest of the input looking for the
+            # closing quote and then reports end of input.
+            self.cur_pos = len(string)
+            return
+        self.cur_pos = match.end()
+        if kind == 'ignore':
+            pass
+        elif kind == 'name':
+            self.produce(scan_name(self, text))
+        elif kind == 'punctuation':
+            self.produce(punctuation[text])
+        elif kind == 'number':
+            if match.group('suffix'):
+                scan_bad(self, text)
+            elif text[:2] in ('0x', '0X'):
+                scan_integer(self, text)
+            elif '.' in text or 'e' in text or 'E' in text:
+                scan_float(self, text)
+            else:
+                scan_integer(self, text)
+        elif kind == 'string':
+            self.produce(grammar.L_STRING,
+                match.group('string_text').replace("''", "'"))
+        elif kind == 'qname':
+            self.produce(grammar.L_NAME,
+                match.group('qname_text').replace('""', '"'))
+        elif kind == 'numpar':
+            scan_numpar(self, text)
+        elif kind == 'numpar_next':
+            scan_numpar_next(self, text)
+        elif kind == 'nampar':
+            scan_nampar(self, text)
+        else:
+            assert kind == 'bad'
+            scan_bad(self, text)
+
+class BQLPlexScanner(Plex.Scanner):
+    lexicon = None
+
+    @classmethod
+    def _lexicon(cls):
+        if cls.lexicon is None:
+            line_comment = Plex.Str("--") + Plex.Rep(Plex.AnyBut("\n"))
+            whitespace = Plex.Any("\f\n\r\t ")
+            # XXX Support non-US-ASCII Unicode text.
+            letter = Plex.Range("azAZ")
+            digit = Plex.Range("09")
+            digits = Plex.Rep(digit)
+            digits1 = Plex.Rep1(digit)
+            hexit = digit | Plex.Range("afAF")
+            hexits1 = Plex.Rep1(hexit)
+            integer_dec = digits1
+            integer_hex = Plex.Str("0x", "0X") + hexits1
+            dot = Plex.Str('.')
+            intfrac = digits1 + dot + digits
+            fraconly = dot + digits1
+            optsign = Plex.Opt(Plex.Any('+-'))
+            expmark = Plex.Any('eE')
+            exponent = expmark + optsign + digits1
+            optexp = Plex.Opt(exponent)
+            float_dec = ((intfrac | fraconly) + optexp) | (digits1 + exponent)
+            name_special = Plex.Any("_$")
+            name = (letter | name_special) + \
+                Plex.Rep(letter | digit | name_special)
+
+            cls.lexicon = Plex.Lexicon([
+                (whitespace,            Plex.IGNORE),
+                (line_comment,          Plex.IGNORE),
+                (Plex.Str(";"),         grammar.T_SEMI),
+                (Plex.Str("{"),         grammar.T_LCURLY),
+                (Plex.Str("}"),         grammar.T_RCURLY),
+                (Plex.Str("["),         grammar.T_LSQUARE),
+                (Plex.Str("]"),         grammar.T_RSQUARE),
+                (Plex.Str("("),         grammar.T_LROUND),
+                (Plex.Str(")"),         grammar.T_RROUND),
+                (Plex.Str("+"),         grammar.T_PLUS),
+                (Plex.Str("-"),         grammar.T_MINUS),
+                (Plex.Str("*"),         grammar.T_STAR),
+                (Plex.Str("/"),         grammar.T_SLASH),
+                (Plex.Str("%"),         grammar.T_PERCENT),
+                (Plex.Str("="),         grammar.T_EQ),
+                (Plex.Str("=="),        grammar.T_EQ),
+                (Plex.Str("<"),         grammar.T_LT),
+                (Plex.Str("<>"),        grammar.T_NEQ),
+                (Plex.Str("<="),        grammar.T_LEQ),
+                (Plex.Str(">"),         grammar.T_GT),
+                (Plex.Str(">="),        grammar.T_GEQ),
+                (Plex.Str("<<"),        grammar.T_LSHIFT),
+                (Plex.Str(">>"),        grammar.T_RSHIFT),
+                (Plex.Str("!="),        grammar.T_NEQ),
+                (Plex.Str("|"),         grammar.T_BITIOR),
+                (Plex.Str("||"),        grammar.T_CONCAT),
+                (Plex.Str(","),         grammar.T_COMMA),
+                (Plex.Str("&"),         grammar.T_BITAND),
+                (Plex.Str("~"),         grammar.T_BITNOT),
+                (Plex.Str("."),         grammar.T_DOT),
+                (Plex.Str("?"),         scan_numpar_next),
+                (Plex.Str("?") + integer_dec,
+                                        scan_numpar),
+                (Plex.Str(":") + name,  scan_nampar),
+                (Plex.Str("@") + name,  scan_nampar),
+                (Plex.Str("$") + name,  scan_nampar),
+                (Plex.Str("'"),         scan_string_start),
+                (Plex.Str('"'),         scan_qname_start),
+                (name,                  scan_name),
+                (integer_dec,           scan_integer),
+                (integer_hex,           scan_integer),
+                (float_dec,             scan_float),
+                (integer_dec + name,    scan_bad),
+                (integer_hex + name,    scan_bad),
+                (float_dec + name,      scan_bad),
+                (Plex.AnyChar,          scan_bad),
+                Plex.State("STRING", [
+                    (Plex.Str("'"),                     scan_string_end),
+                    (Plex.Str("''"),                    scan_quoted_quote),
+                    (Plex.Rep1(Plex.AnyBut("'")),       scan_quoted_text),
+                ]),
+                Plex.State("QNAME", [
+                    (Plex.Str('"'),                     scan_qname_end),
+                    (Plex.Str('""'),                    scan_quoted_quote),
+                    (Plex.Rep1(Plex.AnyBut('"')),       scan_quoted_text),
+                ]),
+            ])
+        return cls.lexicon
 
     def __init__(self, f, context):
-        Plex.Scanner.__init__(self, self.lexicon, f, context)
+        Plex.Scanner.__init__(self, self._lexicon(), f, context)
         self.stringio = None
         self.stringquote = None
         self.n_numpar = 0
@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+
+#   Copyright (c) 2010-2016, MIT Probabilistic Computing Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""Serving BQL queries to local clients over a socket.
+
+A :class:`BQLServer` holds one BayesDB, with its metamodels and their
+models, on behalf of any number of client processes.  The models are
+deserialized once and kept in a cache shared by all clients' queries
+until they are analyzed or dropped; see
+:func:`~bayeslite.txn.bayesdb_share_models`.  Clients connect
+with :func:`bayesdb_connect` and get a handle whose ``execute`` and
+``sql_execute`` methods return cursors like those of a BayesDB.
+
+The protocol is JSON lines.  Each request is one object::
+
+    {"bql": "ESTIMATE ...", "bindings": [...]}
+    {"sql": "SELECT ...", "bindings": {...}}
+
+and the response is a ``{"description": [...]}`` line, zero or more
+``{"rows": [[...], ...]}`` lines, and a final ``{"done": true}`` line,
+or an ``{"error": {"type": ..., "message": ...}}`` line at any point.
+"""
+
+import collections
+import contextlib
+import json
+import os
+import socket
+import SocketServer
+import threading
+
+from bayeslite.bayesdb import ThreadedBayesDB
+from bayeslite.txn import bayesdb_share_models
+from bayeslite.exception import BayesLiteException
+from bayeslite.util import cursor_value
+
+# Number of rows in each batch of results sent to a client.
+SERVER_BATCH_ROWS = 1024
+
+def bayesdb_serve(bdb, address, batch_size=None):
+    """Return a :class:`BQLServer` for `bdb` listening on `address`.
+
+    `address` is either a filesystem path, for a Unix-domain socket,
+    or a ``(host, port)`` pair, for TCP.  Call ``serve_forever()`` on
+    the result to serve clients, and ``shutdown()`` from another
+    thread to stop.
+    """
+    if isinstance(address, basestring):
+        server_class = BQLUnixServer
+    else:
+        server_class = BQLTCPServer
+    return server_class(bdb, address, batch_size=batch_size)
+
+def bayesdb_connect(address):
+    """Connect to the :class:`BQLServer` at `address`."""
+    if isinstance(address, basestring):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    else:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        sock.connect(address)
+    except Exception:
+        sock.close()
+        raise
+    return BQLClient(sock)
+
+def parse_address(string):
+    """Parse ``host:port``, or a path, into a server address."""
+    if os.sep in string or ':' not in string:
+        return string
+    host, port = string.rsplit(':', 1)
+    return (host or 'localhost', int(port))
+
+class BQLServer(object):
+    """Server state shared by the Unix-domain and TCP servers."""
+
+    daemon_threads = True
+
+    def _setup_bayesdb(self, bdb, batch_size):
+        if batch_size is None:
+            batch_size = SERVER_BATCH_ROWS
+        self.bdb = bdb
+        self.batch_size = batch_size
+        bayesdb_share_models(bdb)
+        # Only a threaded BayesDB can serve several clients at once.
+        if isinstance(bdb, ThreadedBayesDB):
+            self.bdb_lock = None
+        else:
+            self.bdb_lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def locked(self):
+        if self.bdb_lock is None:
+            yield
+        else:
+            with self.bdb_lock:
+                yield
+
+class BQLUnixServer(BQLServer, SocketServer.ThreadingMixIn,
+        SocketServer.UnixStreamServer):
+    def __init__(self, bdb, path, batch_size=None):
+        self._setup_bayesdb(bdb, batch_size)
+        SocketServer.UnixStreamServer.__init__(self, path, BQLRequestHandler)
+
+    def server_close(self):
+        SocketServer.UnixStreamServer.server_close(self)
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+class BQLTCPServer(BQLServer, SocketServer.ThreadingMixIn,
+        SocketServer.TCPServer):
+    allow_reuse_address = True
+
+    def __init__(self, bdb, address, batch_size=None):
+        self._setup_bayesdb(bdb, batch_size)
+        SocketServer.TCPServer.__init__(self, address, BQLRequestHandler)
+
+class BQLRequestHandler(SocketServer.StreamRequestHandler):
+    """Handler for the requests of one client connection."""
+
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            try:
+                request = json.loads(line)
+                with self.server.locked():
+                    self._execute(request)
+            except socket.error:
+                return
+            except Exception as e:
+                self._send({'error': {
+                    'type': type(e).__name__,
+                    'message': str(e),
+                }})
+
+    def _execute(self, request):
+        bdb = self.server.bdb
+        bindings = request.get('bindings')
+        if isinstance(bindings, list):
+            bindings = tuple(bindings)
+        # The BQL parser wants byte strings, not the unicode that
+        # json gives.
+        if 'bql' in request:
+            cursor = bdb.execute(request['bql'].encode('utf-8'), bindings)
+        elif 'sql' in request:
+            cursor = bdb.sql_execute(request['sql'].encode('utf-8'),
+                bindings)
+        else:
+            raise ValueError('Request has neither bql nor sql: %r' %
+                (request,))
+        description = [list(d) for d in cursor.description]
+        self._send({'description': description})
+        while True:
+            rows = cursor.fetchmany(self.server.batch_size)
+            if not rows:
+                break
+            self._send({'rows': rows})
+        self._send({'done': True})
+
+    def _send(self, message):
+        self.wfile.write(json.dumps(message))
+        self.wfile.write('\n')
+        self.wfile.flush()
+
+class BQLClient(object):
+    """Client handle for a BayesDB served by a :class:`BQLServer`.
+
+    Queries on one handle run one at a time: starting a query
+    discards any rows the previous one has not yet delivered.
+    """
+
+    def __init__(self, sock):
+        self._sock = sock
+        self._rfile = sock.makefile('rb')
+        self._wfile = sock.makefile('wb')
+        self._cursor = None
+
+    def __enter__(self):
+        return self
+    def __exit__(self, *_exc_info):
+        self.close()
+
+    def close(self):
+        """Close the connection to the server."""
+        if self._sock is None:
+            return
+        self._rfile.close()
+        self._wfile.close()
+        self._sock.close()
+        self._sock = None
+
+    def execute(self, string, bindings=None):
+        """Execute a BQL query on the server and return a cursor."""
+        return self._request({'bql': string, 'bindings': bindings})
+
+    def sql_execute(self, string, bindings=None):
+        """Execute a SQL query on the server and return a cursor."""
+        return self._request({'sql': string, 'bindings': bindings})
+
+    def _request(self, request):
+        if self._cursor is not None:
+            self._cursor._drain()
+        self._wfile.write(json.dumps(request))
+        self._wfile.write('\n')
+        self._wfile.flush()
+        message = self._receive()
+        self._cursor = BQLClientCursor(self, message['description'])
+        return self._cursor
+
+    def _receive(self):
+        line = self._rfile.readline()
+        if not line:
+            raise BQLServerError('ConnectionError',
+                'Connection closed by server')
+        message = json.loads(line)
+        if 'error' in message:
+            raise BQLServerError(message['error']['type'],
+                message['error']['message'])
+        return message
+
+class BQLClientCursor(object):
+    """Cursor over the results of a query on a :class:`BQLServer`."""
+
+    def __init__(self, client, description):
+        self._client = client
+        self._description = [tuple(d) for d in description]
+        self._rows = collections.deque()
+        self._done = False
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        while not self._rows:
+            if self._done:
+                raise StopIteration
+            self._receive()
+        return self._rows.popleft()
+
+    def _receive(self):
+        try:
+            message = self._client._receive()
+        except BQLServerError:
+            self._done = True
+            raise
+        if message.get('done'):
+            self._done = True
+        else:
+            self._rows.extend(tuple(row) for row in message['rows'])
+
+    def _drain(self):
+        while not self._done:
+            try:
+                self._receive()
+            except BQLServerError:
+                pass
+        self._rows.clear()
+
+    def fetchone(self):
+        try:
+            return self.next()
+        except StopIteration:
+            return None
+
+    def fetchvalue(self):
+        return cursor_value(self)
+
+    def fetchmany(self, size=1):
+        rows = []
+        for row in self:
+            rows.append(row)
+            if len(rows) >= size:
+                break
+        return rows
+
+    def fetchall(self):
+        return list(self)
+
+    @property
+    def description(self):
+        return self._description
+
+class BQLServerError(BayesLiteException):
+    """Error executing a query on a :class:`BQLServer`.
+
+    :ivar str type: name of the exception type raised by the server
+    :ivar str message: message of the exception
+    """
+
+    def __init__(self, type_name, message):
+        self.type = type_name
+        self.message = message
+        super(BQLServerError, self).__init__('%s: %s' % (type_name, message))
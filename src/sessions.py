@@ -71,22 +71,84 @@ PLEASE DO NOT SEND SESSIONS WHEN THEY MAY CONTAIN SECRET OR SENSITIVE INFO!
 
 import apsw
 import json
+import threading
 import time
 import traceback
 
 from bayeslite import IBayesDBTracer
+from bayeslite.bayesdb import ThreadedBayesDB
 from bayeslite.loggers import BqlLogger, CallHomeStatusLogger
 from bayeslite.schema import bayesdb_schema_required
 from bayeslite.util import cursor_value
 from bayeslite import __version__
 
+_session_schema = '''
+CREATE TABLE IF NOT EXISTS %(db)s.bayesdb_session (
+	id		INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT
+				CHECK (0 < id),
+	sent	BOOLEAN DEFAULT 0,
+	version	TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS %(db)s.bayesdb_session_entries (
+	id		INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT
+				CHECK (0 < id),
+	session_id	INTEGER NOT NULL REFERENCES bayesdb_session(id),
+	type		TEXT CHECK (type IN ('bql','sql')) NOT NULL,
+	data		TEXT NOT NULL,
+	-- Timing is by the local POSIX clock.
+	start_time	INTEGER NOT NULL,
+	end_time	INTEGER,
+	error		TEXT
+)
+'''
+
 _error_previous_session_msg = 'WARNING: Current or previous session contains queries that resulted in errors or exceptions. Consider uploading the session with send_session_data() if your data are freely shareable (free of secret or personally identifiable info). Contact probcomp-community@csail.mit.edu for help or with questions.'
 
 class SessionOrchestrator(object):
-
-    def __init__(self, bdb, meta_logger=None, session_logger=None):
-        bayesdb_schema_required(bdb, 7, 'sessions')
+    """Record queries submitted to `bdb` in sessions.
+
+    Entries are buffered in memory and written to the database in
+    batches: when the caller submits or finishes a query outside any
+    transaction, at most once every `flush_interval` seconds if that
+    is given, and regardless of transactions once `max_buffered`
+    entries are waiting.  :meth:`flush` writes them immediately.
+
+    If `internal_sql` is false, SQL queries and BQL queries that
+    BayesDB issues itself while executing a BQL query, or while
+    computing a BQL function for a row of results, are not recorded,
+    so that the cost of logging is proportional to the number of
+    queries submitted by the caller.
+
+    If `pathname` is given, sessions are recorded in the database
+    file at `pathname`, attached to `bdb`, rather than in `bdb`
+    itself.
+    """
+
+    def __init__(self, bdb, meta_logger=None, session_logger=None,
+            internal_sql=None, flush_interval=None, max_buffered=None,
+            pathname=None):
+        if internal_sql is None:
+            internal_sql = True
+        if max_buffered is None:
+            max_buffered = 10000
         self.bdb = bdb
+        self._internal_sql = internal_sql
+        self._flush_interval = flush_interval
+        self._max_buffered = max_buffered
+
+        if pathname is None:
+            bayesdb_schema_required(bdb, 7, 'sessions')
+            self._db = 'main'
+        else:
+            if isinstance(bdb, ThreadedBayesDB):
+                raise ValueError('Cannot attach a sessions database'
+                    ' to a threaded BayesDB')
+            self._db = 'bayesdb_sessions'
+            self._sql('ATTACH DATABASE ? AS %s' % (self._db,), (pathname,))
+            with bdb._sqlite3:
+                for stmt in _session_schema.split(';'):
+                    self._sql(stmt % {'db': self._db})
 
         if meta_logger is None:
             meta_logger = BqlLogger()
@@ -95,7 +157,13 @@ class SessionOrchestrator(object):
             session_logger = CallHomeStatusLogger()
         self._session_logger = session_logger
 
-        self._qid_to_entry_id = {}
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._buffer = []
+        self._updates = []
+        self._last_flush = time.time()
+        self._qid_to_entry = {}
+        self._session_errors = False
         self._sql_tracer = _SessionTracer("sql", self)
         self._bql_tracer = _SessionTracer("bql", self)
         self.start_saving_sessions()
@@ -109,10 +177,21 @@ class SessionOrchestrator(object):
             bindings = ()
         return self.bdb._sqlite3.cursor().execute(query, bindings)
 
+    def _executing(self):
+        # qids of BQL queries this thread is executing, not counting
+        # reading their results.
+        executing = getattr(self._local, 'executing', None)
+        if executing is None:
+            executing = self._local.executing = set()
+        return executing
+
+    def _internal(self):
+        return 0 < len(self._executing()) or 0 < self.bdb._udf_depth
+
     def _add_entry(self, qid, type, query, bindings):
-        '''Save a session entry into the database. The entry is initially in
-        the not-completed state. Return the new entry's id so that it can be
-        set to completed when appropriate.
+        '''Save a session entry. The entry is initially in the
+        not-completed state, and is buffered in memory until the next
+        flush.
 
         qid: str, num, or anything that can be used as a hash key.
           Any identifier unique to this query.
@@ -123,46 +202,112 @@ class SessionOrchestrator(object):
         bindings: iterable(str)
           Fillers for unbound references in query, if any.
         '''
-        # check for errors on this session and suggest if we haven't already
-        if not self._suggested_send:
-            self._check_error_entries(self.session_id)
+        internal = self._internal()
+        if type == 'bql':
+            self._executing().add(qid)
+        if internal and not self._internal_sql:
+            return
+        if not internal:
+            # Check for errors on this session and suggest if we
+            # haven't already.
+            if self._session_errors and not self._suggested_send:
+                self._logger.warn(_error_previous_session_msg)
+                self._suggested_send = True
         data = query + json.dumps(bindings)
-        self._sql('''
-            INSERT INTO bayesdb_session_entries
-                (session_id, type, data, start_time)
-                VALUES (?,?,?,?)
-        ''', (self.session_id, type, data, time.time()))
-        entry_id = cursor_value(self._sql('SELECT last_insert_rowid()'))
-        self._qid_to_entry_id[qid] = entry_id
+        entry = _SessionEntry(self.session_id, type, data, time.time(),
+            internal)
+        with self._lock:
+            self._buffer.append(entry)
+            self._qid_to_entry[qid] = entry
+        if self._max_buffered <= len(self._buffer):
+            self.flush()
+        elif not internal:
+            # A query from the caller: a good time to write what we
+            # have, including this entry, if not in a transaction.
+            self._maybe_flush()
+
+    def _query_ready(self, qid):
+        self._executing().discard(qid)
 
     def _mark_entry_completed(self, qid):
-        entry_id = self._qid_to_entry_id[qid]
-        self._sql('''
-            UPDATE bayesdb_session_entries SET end_time = ? WHERE id = ?
-        ''', (time.time(), entry_id))
+        self._finish_entry(qid, None)
 
     def _mark_entry_error(self, qid):
-        entry_id = self._qid_to_entry_id[qid]
-        self._sql('''
-            UPDATE bayesdb_session_entries
-                SET error = ?, end_time = ?
-                WHERE id = ?
-        ''', (traceback.format_exc(), time.time(), entry_id))
+        self._executing().discard(qid)
+        self._finish_entry(qid, traceback.format_exc())
+
+    def _finish_entry(self, qid, error):
+        with self._lock:
+            entry = self._qid_to_entry.pop(qid, None)
+            if entry is None:
+                return
+            entry.end_time = time.time()
+            entry.error = error
+            if error is not None:
+                self._session_errors = True
+            if entry.id is not None:
+                self._updates.append((entry.end_time, entry.error, entry.id))
+        if not entry.internal and self._buffer:
+            # Write the entries for queries issued on behalf of this
+            # one; its own completion can wait for the next flush.
+            self._maybe_flush()
+
+    def _maybe_flush(self):
+        if self.bdb._txn_depth != 0:
+            return
+        if self._flush_interval is not None and \
+           time.time() < self._last_flush + self._flush_interval:
+            return
+        self.flush()
+
+    def flush(self):
+        """Write all buffered session entries to the database."""
+        with self._lock:
+            entries = self._buffer
+            updates = self._updates
+            self._buffer = []
+            self._updates = []
+            self._last_flush = time.time()
+            if not entries and not updates:
+                return
+            with self.bdb._sqlite3:
+                if entries:
+                    self.bdb._sqlite3.cursor().executemany('''
+                        INSERT INTO %s.bayesdb_session_entries
+                            (session_id, type, data, start_time, end_time,
+                                error)
+                            VALUES (?,?,?,?,?,?)
+                    ''' % (self._db,), [(e.session_id, e.type, e.data,
+                            e.start_time, e.end_time, e.error)
+                        for e in entries])
+                    # Ids are assigned consecutively within a batch.
+                    last_id = self.bdb._sqlite3.last_insert_rowid()
+                    for i, entry in enumerate(entries):
+                        entry.id = last_id - len(entries) + 1 + i
+                if updates:
+                    self.bdb._sqlite3.cursor().executemany('''
+                        UPDATE %s.bayesdb_session_entries
+                            SET end_time = ?, error = ?
+                            WHERE id = ?
+                    ''' % (self._db,), updates)
 
     def _start_new_session(self):
-        self._sql('INSERT INTO bayesdb_session (version) VALUES (?)',
-                  (__version__,))
+        self.flush()
+        self._sql('INSERT INTO %s.bayesdb_session (version) VALUES (?)' %
+            (self._db,), (__version__,))
         self.session_id = cursor_value(self._sql('SELECT last_insert_rowid()'))
+        self._session_errors = False
         # check for errors on the previous session
         self._check_error_entries(self.session_id - 1)
 
     def _check_error_entries(self, session_id):
         '''Check if the previous session contains queries that resulted in
         errors and suggest sending the session'''
+        self.flush()
         error_entries = cursor_value(self._sql('''
-            SELECT COUNT(*) FROM bayesdb_session_entries
+            SELECT COUNT(*) FROM %s.bayesdb_session_entries
                 WHERE error IS NOT NULL AND session_id = ?
-        ''', (session_id,)))
+        ''' % (self._db,), (session_id,)))
         # suggest sending sessions but don't suggest more than once
         if (error_entries > 0 and not self._suggested_send):
             self._logger.warn(_error_previous_session_msg)
@@ -170,19 +315,21 @@ class SessionOrchestrator(object):
         return error_entries
 
     def clear_all_sessions(self):
-        self._sql('DELETE FROM bayesdb_session_entries')
-        self._sql('DELETE FROM bayesdb_session')
+        self.flush()
+        self._sql('DELETE FROM %s.bayesdb_session_entries' % (self._db,))
+        self._sql('DELETE FROM %s.bayesdb_session' % (self._db,))
         self._sql('''
-            DELETE FROM sqlite_sequence
+            DELETE FROM %s.sqlite_sequence
                 WHERE name = 'bayesdb_session'
                 OR name = 'bayesdb_session_entries'
-        ''')
+        ''' % (self._db,))
         self._start_new_session()
 
     def list_sessions(self):
         """Lists all saved sessions with the number of entries in each, and
         whether they were sent or not."""
-        return self._sql('SELECT * FROM bayesdb_session')
+        self.flush()
+        return self._sql('SELECT * FROM %s.bayesdb_session' % (self._db,))
 
     def current_session_id(self):
         """Returns the current integer session id."""
@@ -193,15 +340,16 @@ class SessionOrchestrator(object):
         (e.g.  queries) executed within session `session_id`."""
         if session_id > self.session_id or session_id < 1:
             raise ValueError('No such session (%d)' % session_id)
+        self.flush()
         version = cursor_value(self._sql('''
-            SELECT version FROM bayesdb_session
+            SELECT version FROM %s.bayesdb_session
                 WHERE id = ?
-        ''', (session_id,)))
+        ''' % (self._db,), (session_id,)))
         cursor = self._sql('''
-            SELECT * FROM bayesdb_session_entries
+            SELECT * FROM %s.bayesdb_session_entries
                 WHERE session_id = ?
                 ORDER BY start_time DESC
-        ''', (session_id,))
+        ''' % (self._db,), (session_id,))
         # XXX Get the description first because apsw cursors, for
         # whatever reason, don't let you get the description after
         # you've gotten all the results.
@@ -241,6 +389,21 @@ class SessionOrchestrator(object):
     def stop_saving_sessions(self):
         self.bdb.untrace(self._bql_tracer)
         self.bdb.sql_untrace(self._sql_tracer)
+        self.flush()
+
+class _SessionEntry(object):
+    __slots__ = ('id', 'session_id', 'type', 'data', 'start_time',
+        'end_time', 'error', 'internal')
+
+    def __init__(self, session_id, type, data, start_time, internal):
+        self.id = None          # assigned when written
+        self.session_id = session_id
+        self.type = type
+        self.data = data
+        self.start_time = start_time
+        self.end_time = None
+        self.error = None
+        self.internal = internal
 
 class _SessionTracer(IBayesDBTracer):
 
@@ -251,6 +414,9 @@ class _SessionTracer(IBayesDBTracer):
     def start(self, qid, query, bindings):
         self._orchestrator._add_entry(qid, self._type, query, bindings)
 
+    def ready(self, qid, _cursor):
+        self._orchestrator._query_ready(qid)
+
     def finished(self, qid):
         # TODO: currently appears unreliable, error is being used instead
         self._orchestrator._mark_entry_completed(qid)
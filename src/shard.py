@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+
+#   Copyright (c) 2010-2016, MIT Probabilistic Computing Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""Evaluate queries over a population in shards of rows.
+
+SQLite evaluates the model estimators and predictions of a query one
+row at a time, in one thread.  When a BayesDB is opened with
+``shards`` greater than one, ``CREATE TABLE ... AS`` an ``ESTIMATE``,
+``INFER``, or ``INFER EXPLICIT`` query over a population instead
+splits the population's table into that many ranges of rowids of
+about equal size, and evaluates the query on each range in a worker
+process forked from this one.  Each worker has its own read-only
+connection to the database file and keeps the models it loads cached
+for its whole range.  The rows are merged back in order of rowid and
+inserted into the new table.
+
+Each shard is given its own pseudorandom number generators, seeded in
+order from the BayesDB's, so the results are deterministic for a
+given number of shards.
+
+Only queries that yield at most one result row per table row are
+sharded: queries with ``DISTINCT``, ``GROUP BY``, ``ORDER BY``,
+``LIMIT``, or aggregate functions are evaluated as usual, as are
+queries in an in-memory database or inside a transaction, whose
+uncommitted changes the workers could not see.
+"""
+
+import bayeslite.ast as ast
+import bayeslite.compiler as compiler
+import bayeslite.core as core
+
+from bayeslite.exception import BQLError
+from bayeslite.sqlite3_util import sqlite3_quote_name
+from bayeslite.util import casefold
+from bayeslite.util import cursor_value
+
+# SQLite's aggregate functions, which combine rows across shards.
+AGGREGATES = ('avg', 'count', 'group_concat', 'max', 'min', 'sum', 'total')
+
+def bayesdb_shardable(bdb, query):
+    """True if `bdb` would evaluate `query` in shards of rows."""
+    if bdb.shards <= 1 or bdb.pathname == ':memory:':
+        return False
+    if 0 < bdb._txn_depth:
+        return False
+    if isinstance(query, ast.Estimate):
+        if query.quantifier != ast.SELQUANT_ALL:
+            return False
+    elif not isinstance(query, (ast.InferAuto, ast.InferExplicit)):
+        return False
+    if query.grouping is not None or query.order is not None or \
+       query.limit is not None:
+        return False
+    return not _aggregates(query.columns)
+
+def _aggregates(node):
+    # Conservatively, look everywhere, including subqueries.
+    if isinstance(node, ast.ExpAppStar):
+        return True
+    if isinstance(node, ast.ExpApp) and \
+       casefold(node.operator) in AGGREGATES and \
+       not (casefold(node.operator) in ('max', 'min') and
+            1 < len(node.operands)):
+        return True
+    if isinstance(node, (tuple, list)):
+        return any(_aggregates(child) for child in node)
+    return False
+
+def bayesdb_create_table_sharded(bdb, phrase, n_numpar, nampar_map,
+        bindings):
+    """Create the table of a ``CREATE TABLE ... AS`` `phrase` in shards.
+
+    The caller must have checked that the table does not exist and
+    that the query is :func:`bayesdb_shardable`.
+    """
+    population_id = core.bayesdb_get_population(bdb, phrase.query.population)
+    table = core.bayesdb_population_table(bdb, population_id)
+    bounds = _shard_bounds(bdb, table, bdb.shards)
+
+    # Evaluate the shards before writing anything, so that the
+    # workers do not contend with us for the database.
+    shards = []
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        out = compiler.Output(n_numpar, nampar_map, bindings)
+        compiler.compile_query(bdb, _restrict(phrase.query, lo, hi), out)
+        winders, unwinders = out.getwindings()
+        seed = bdb.np_prng.bytes(32)
+        shards.append((out.getvalue(), out.getbindings(), winders, unwinders,
+            seed))
+    results = _map_forked(bdb, _shard_rows, shards) if shards else []
+    for status, value in results:
+        if status == 'bqlerror':
+            raise BQLError(bdb, *value)
+
+    # Create the table, with the query's columns but no rows, and
+    # insert the shards' rows in order.
+    qn = sqlite3_quote_name(phrase.name)
+    temp = 'TEMP ' if phrase.temp else ''
+    out = compiler.Output(n_numpar, nampar_map, bindings)
+    out.write('CREATE %sTABLE %s AS SELECT * FROM (' % (temp, qn))
+    compiler.compile_query(bdb, phrase.query, out)
+    out.write(') LIMIT 0')
+    winders, unwinders = out.getwindings()
+    with compiler.bayesdb_wind(bdb, winders, unwinders):
+        bdb.sql_execute(out.getvalue(), out.getbindings())
+    ncols = len(bdb.sql_execute('PRAGMA table_info(%s)' % (qn,)).fetchall())
+    insert_sql = 'INSERT INTO %s VALUES (%s)' % \
+        (qn, ','.join('?' for _ in xrange(ncols)))
+    for _status, rows in results:
+        bdb.sql_executemany(insert_sql,
+            [tuple(_unpickleable(v) for v in row) for row in rows])
+
+def _shard_bounds(bdb, table, nshards):
+    # Rowids splitting the table into at most `nshards` ranges of
+    # about equal numbers of rows, with None for no bound at either
+    # end.  Empty if the table is empty.
+    qt = sqlite3_quote_name(table)
+    count = cursor_value(bdb.sql_execute('SELECT COUNT(*) FROM %s' % (qt,)))
+    if count == 0:
+        return []
+    nshards = min(nshards, count)
+    sql = 'SELECT _rowid_ FROM %s ORDER BY _rowid_ LIMIT 1 OFFSET ?' % (qt,)
+    return [None] + \
+        [cursor_value(bdb.sql_execute(sql, (i*count//nshards,)))
+            for i in xrange(1, nshards)] + \
+        [None]
+
+def _restrict(query, lo, hi):
+    # Restrict `query` to the rows with rowids in [lo, hi).
+    rowid = ast.ExpCol(None, '_rowid_')
+    conditions = [] if query.condition is None else [query.condition]
+    if lo is not None:
+        conditions.append(
+            ast.op(ast.OP_GEQ, rowid, ast.ExpLit(ast.LitInt(lo))))
+    if hi is not None:
+        conditions.append(
+            ast.op(ast.OP_LT, rowid, ast.ExpLit(ast.LitInt(hi))))
+    condition = reduce(lambda a, b: ast.op(ast.OP_BOOLAND, a, b), conditions)
+    return query._replace(condition=condition)
+
+# The BayesDB of the forked worker processes, and the connection state
+# they inherited from the parent, which must stay open but unused.
+_worker_bdb = None
+_worker_inherited = None
+
+def _map_forked(bdb, fn, items):
+    global _worker_bdb
+    import multiprocessing
+    _worker_bdb = bdb
+    try:
+        pool = multiprocessing.Pool(len(items), initializer=_worker_init)
+        try:
+            return pool.map(fn, items, chunksize=1)
+        finally:
+            pool.terminate()
+            pool.join()
+    finally:
+        _worker_bdb = None
+
+def _worker_init():
+    global _worker_inherited
+    _worker_inherited = _worker_bdb._reopen_readonly()
+
+def _shard_rows((sql, bindings, winders, unwinders, seed)):
+    bdb = _worker_bdb
+    try:
+        with bdb._split_prngs(seed):
+            # Keep the models cached for the whole shard.
+            with bdb.savepoint():
+                with compiler.bayesdb_wind(bdb, winders, unwinders):
+                    cursor = bdb.sql_execute(sql, bindings)
+                    return 'rows', [tuple(_pickleable(v) for v in row)
+                        for row in cursor]
+    except BQLError as e:
+        # The BayesDB in the error does not pickle; the parent puts
+        # its own back.
+        return 'bqlerror', e.args
+
+def _pickleable(value):
+    # Blobs come back from SQLite as buffers, which do not pickle;
+    # send them as 1-tuples of strings, which SQLite never returns.
+    return (str(value),) if isinstance(value, buffer) else value
+
+def _unpickleable(value):
+    return buffer(value[0]) if isinstance(value, tuple) else value
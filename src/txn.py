@@ -15,8 +15,12 @@
 #   limitations under the License.
 
 import contextlib
+import threading
+
+import bayeslite.bqlfn as bqlfn
 
 from bayeslite.exception import BayesDBException
+from bayeslite.profiler import bayesdb_cache_lookup
 from bayeslite.sqlite3_util import sqlite3_savepoint
 from bayeslite.sqlite3_util import sqlite3_savepoint_rollback
 from bayeslite.sqlite3_util import sqlite3_transaction
@@ -109,11 +113,146 @@ def bayesdb_txn_init(bdb):
     assert bdb._txn_depth == 0
     assert bdb._cache is None
     bdb._cache = {}
+    if bdb._shared_models is not None:
+        bdb._cache['shared_models'] = SharedModelLease(
+            bdb._shared_models.epoch())
 
 def bayesdb_txn_fini(bdb):
     assert bdb._txn_depth == 0
     assert bdb._cache is not None
+    lease = bdb._cache.get('shared_models')
+    if lease is not None and lease.written:
+        bdb._shared_models.written(lease.written)
     bdb._cache = None
+    # What a query remembered from row to row describes the models as
+    # they were in this transaction, unless it ended within the query.
+    if bdb._udf_depth == 0:
+        bqlfn.bayesdb_clear_query_memo(bdb)
+
+def bayesdb_share_models(bdb):
+    """Share the models metamodels load in `bdb` among all transactions.
+
+    Normally a metamodel deserializes each model it consults once per
+    transaction, and in a threaded BayesDB once per thread.  After
+    this, the models are kept in one :class:`SharedModelCache` for the
+    life of `bdb`, until a transaction that writes a generator's
+    models ends.  Only writes made through `bdb` are noticed, so use
+    this only where nothing else writes the database file.
+    """
+    assert bdb._txn_depth == 0, "pending BayesDB transactions"
+    if bdb._shared_models is None:
+        bdb._shared_models = SharedModelCache()
+
+def bayesdb_shared_model(bdb, generator_id, modelno):
+    """Return the shared model `modelno` of `generator_id`, or None."""
+    lease = _shared_model_lease(bdb)
+    if lease is None:
+        return None
+    model = bdb._shared_models.get(lease.epoch, generator_id, modelno)
+    bayesdb_cache_lookup(bdb, 'shared_models', model is not None)
+    return model
+
+def bayesdb_share_model(bdb, generator_id, modelno, model):
+    """Share `model`, just loaded from the database, with all threads.
+
+    The model must not be modified afterward.
+    """
+    lease = _shared_model_lease(bdb)
+    if lease is not None:
+        bdb._shared_models.put(lease.epoch, generator_id, modelno, model)
+
+def bayesdb_write_models(bdb, generator_id):
+    """Note that the models of `generator_id` are about to be written.
+
+    Call this before reading any model to be modified, or modifying
+    any.  Until the transaction ends, no transaction gets its models
+    from the shared cache, and when it ends, the shared cache forgets
+    them.  Return true if the models were not already being written in
+    this transaction, in which case any models of `generator_id` the
+    transaction has cached may be shared, and must be reloaded before
+    they are modified.
+    """
+    shared = bdb._shared_models
+    if shared is None:
+        return False
+    lease = _shared_model_lease(bdb)
+    if lease is None:
+        # Outside a transaction, each write commits on its own: the
+        # best we can do is forget the models now.
+        shared.write(generator_id)
+        shared.written([generator_id])
+        return True
+    if generator_id in lease.written:
+        return False
+    shared.write(generator_id)
+    lease.written.add(generator_id)
+    return True
+
+def _shared_model_lease(bdb):
+    if bdb._shared_models is None or bdb._cache is None:
+        return None
+    return bdb._cache.get('shared_models')
+
+class SharedModelLease(object):
+    """A transaction's view of the :class:`SharedModelCache`."""
+
+    def __init__(self, epoch):
+        self.epoch = epoch
+        self.written = set()
+
+class SharedModelCache(object):
+    """Deserialized models shared by all transactions of a BayesDB.
+
+    Models are keyed by ``(generator_id, modelno)``.  Each time the
+    transactions writing a generator's models end, the epoch advances
+    and the generator's models are forgotten.  A transaction that
+    began in an earlier epoch may still see the old models in the
+    database, so it may neither get nor put models of that generator;
+    neither may any transaction while the models are being written.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models = {}
+        self._epoch = 0
+        self._invalidated = {}  # generator_id -> epoch it was last written
+        self._writers = {}      # generator_id -> transactions writing it
+
+    def epoch(self):
+        with self._lock:
+            return self._epoch
+
+    def _usable(self, epoch, generator_id):
+        return generator_id not in self._writers and \
+            self._invalidated.get(generator_id, 0) <= epoch
+
+    def get(self, epoch, generator_id, modelno):
+        with self._lock:
+            if not self._usable(epoch, generator_id):
+                return None
+            return self._models.get((generator_id, modelno))
+
+    def put(self, epoch, generator_id, modelno, model):
+        with self._lock:
+            if self._usable(epoch, generator_id):
+                self._models[generator_id, modelno] = model
+
+    def write(self, generator_id):
+        with self._lock:
+            self._writers[generator_id] = \
+                self._writers.get(generator_id, 0) + 1
+
+    def written(self, generator_ids):
+        with self._lock:
+            self._epoch += 1
+            for generator_id in generator_ids:
+                self._writers[generator_id] -= 1
+                if self._writers[generator_id] == 0:
+                    del self._writers[generator_id]
+                self._invalidated[generator_id] = self._epoch
+            for key in [key for key in self._models
+                    if key[0] in generator_ids]:
+                del self._models[key]
 
 class BayesDBTxnError(BayesDBException):
     """Transaction errors in a BayesDB."""
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+
+#   Copyright (c) 2010-2016, MIT Probabilistic Computing Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+
+import os
+import tempfile
+
+import pytest
+
+import test_core
+
+@pytest.yield_fixture
+def pathname():
+    """Pathname for a database file, removed after the test."""
+    fd, path = tempfile.mkstemp(prefix='bayeslite', suffix='.bdb')
+    os.close(fd)
+    os.unlink(path)
+    try:
+        yield path
+    finally:
+        test_core.remove_database(path)
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+#   Copyright (c) 2010-2016, MIT Probabilistic Computing Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import math
+import random
+
+import pytest
+
+from bayeslite.anytime import AnytimeMean
+from bayeslite.anytime import anytime_estimate
+
+def test_anytime_mean_exact():
+    mean = AnytimeMean(3)
+    assert mean.value() is None
+    assert mean.stderr() is None
+    mean.add('a', math.log(1), 1., exact=True)
+    assert mean.value() == 1.
+    # One model of three tells us nothing about the spread.
+    assert mean.stderr() is None
+    mean.add('b', math.log(3), 5., exact=True)
+    assert mean.value() == pytest.approx(4.)
+    assert 0 < mean.stderr()
+    mean.add('c', math.log(4), 0., exact=True)
+    assert mean.value() == pytest.approx(2.)
+    assert mean.stderr() == 0
+
+def test_anytime_mean_batches():
+    mean = AnytimeMean(1)
+    mean.add('a', 0., 1., 10)
+    assert mean.value() == 1.
+    # Monte Carlo error is unknown until there are two batches.
+    assert mean.stderr() is None
+    mean.add('a', 0., 3., 30)
+    assert mean.value() == pytest.approx(2.5)
+    # Per-sample variance from the batches: (10*1.5^2 + 30*0.5^2)/1 =
+    # 30, so the variance of the mean of 40 samples is 30/40.
+    assert mean.stderr() == pytest.approx(math.sqrt(30./40))
+
+def test_anytime_estimate_complete():
+    values = {'a': 1., 'b': 2., 'c': 6.}
+    def sample(unit, n):
+        assert n == 1
+        return 0., values[unit]
+    result = anytime_estimate(['a', 'b', 'c'], sample, exact=True)
+    assert result['value'] == pytest.approx(3.)
+    assert result['stderr'] == 0
+    assert result['samples'] == 3
+    assert result['models'] == 3
+    assert result['stopped'] == 'complete'
+
+def test_anytime_estimate_samples():
+    prng = random.Random(0)
+    def sample(unit, n):
+        return 0., sum(prng.gauss(unit, 1) for _ in xrange(n)) / n
+    result = anytime_estimate([0, 10], sample, max_samples=1000)
+    assert result['samples'] == 1000
+    assert result['models'] == 2
+    assert result['stopped'] == 'samples'
+    assert result['value'] == pytest.approx(5., abs=6*result['stderr'])
+
+def test_anytime_estimate_batch_samples():
+    calls = []
+    def sample(unit, n):
+        calls.append(n)
+        return 0., float(unit)
+    result = anytime_estimate([0, 10], sample, max_samples=35,
+        batch_samples=7)
+    assert calls == [7, 7, 7, 7, 7]
+    assert result['samples'] == 35
+    assert result['stopped'] == 'samples'
+
+def test_anytime_estimate_error():
+    prng = random.Random(0)
+    def sample(unit, n):
+        return 0., sum(prng.gauss(unit, 1) for _ in xrange(n)) / n
+    result = anytime_estimate([0, 10], sample, error=0.1)
+    assert result['stopped'] == 'error'
+    assert result['stderr'] <= 0.1
+    # Standard error 1/sqrt(n) per model; both models halve it.
+    assert 50 <= result['samples']
+
+def test_anytime_estimate_time():
+    def sample(unit, n):
+        return 0., 1.
+    result = anytime_estimate([0], sample, seconds=0.01)
+    assert result['stopped'] == 'time'
+    assert 0.01 <= result['seconds']
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+#   Copyright (c) 2010-2016, MIT Probabilistic Computing Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import threading
+import time
+
+import pytest
+
+from bayeslite import bayesdb_open
+from bayeslite.asyncdb import AsyncBayesDB
+from bayeslite.asyncdb import BayesDBQueryCancelled
+from bayeslite.asyncdb import BayesDBQueryTimeout
+
+# Takes forever on the table from big_table, so only stops when
+# interrupted.
+FOREVER = 'SELECT COUNT(*) FROM t AS a, t AS b, t AS c, t AS d'
+
+def big_table(bdb):
+    bdb.sql_execute('CREATE TABLE t(x)')
+    bdb.sql_executemany('INSERT INTO t VALUES (?)',
+        [(i,) for i in range(1000)])
+
+def test_async_batches():
+    with bayesdb_open() as bdb:
+        bdb.sql_execute('CREATE TABLE t(x)')
+        bdb.sql_executemany('INSERT INTO t VALUES (?)',
+            [(i,) for i in range(10)])
+        with AsyncBayesDB(bdb) as adb:
+            query = adb.execute('SELECT x FROM t WHERE x >= ? ORDER BY x',
+                (2,), batch_size=3)
+            batches = list(query.batches())
+            assert [len(batch) for batch in batches] == [3, 3, 2]
+            assert query.done()
+            assert query.description[0][0] == 'x'
+            assert adb.execute('SELECT COUNT(*) FROM t').result() == [(10,)]
+            done = threading.Event()
+            query = adb.execute('SELECT * FROM nonexistent')
+            query.add_done_callback(lambda q: done.set())
+            with pytest.raises(Exception):
+                query.result()
+            assert done.is_set()
+        with pytest.raises(ValueError):
+            AsyncBayesDB(bdb, nworkers=2)
+
+def test_async_cancel_timeout(pathname):
+    with bayesdb_open(pathname, threaded=True) as bdb:
+        big_table(bdb)
+        with AsyncBayesDB(bdb, nworkers=2) as adb:
+            query = adb.execute(FOREVER)
+            time.sleep(0.1)
+            assert not query.done()
+            assert query.cancel()
+            with pytest.raises(BayesDBQueryCancelled):
+                query.result()
+            assert not query.cancel()
+            start = time.time()
+            query = adb.execute(FOREVER, timeout=0.2)
+            with pytest.raises(BayesDBQueryTimeout):
+                query.result()
+            assert time.time() - start < 5
+            # The workers are still usable afterward.
+            assert adb.execute('SELECT 42').result() == [(42,)]
@@ -16,6 +16,7 @@
 
 import StringIO
 import apsw
+import numpy
 import pytest
 
 import bayeslite
@@ -215,6 +216,106 @@ def test_joint_probability(seed):
             " given (label = 'mumble') by p1"
         assert bdb.execute(q1).fetchvalue() < bdb.execute(q2).fetchvalue()
 
+def test_anytime_probability():
+    with test_core.t1() as (bdb, _population_id, _generator_id):
+        bdb.execute('initialize 4 models for p1_cc')
+        bdb.execute('analyze p1_cc for 1 iteration wait')
+        exact = bdb.execute('estimate probability of age = 8 by p1')
+        exact = exact.fetchvalue()
+        with bdb.profile() as profile:
+            # With time to spare, every model is visited exactly once
+            # and the estimate is exact.
+            anytime = bdb.execute('estimate probability of age = 8'
+                ' for 100 seconds by p1').fetchvalue()
+        assert anytime == pytest.approx(exact)
+        [estimate] = profile.estimates
+        assert estimate['function'] == 'PROBABILITY DENSITY'
+        assert estimate['stopped'] == 'complete'
+        assert estimate['models'] == 4
+        assert estimate['samples'] == 4
+        assert estimate['stderr'] == 0
+        assert estimate['value'] == anytime
+        with pytest.raises(BQLError):
+            bdb.execute('estimate probability of age = 8'
+                ' for (0 - 1) seconds by p1').fetchvalue()
+        with pytest.raises(BQLError):
+            bdb.execute('estimate probability of age = 8'
+                ' max error 0 by p1').fetchvalue()
+
+def test_anytime_mutinf():
+    with test_core.t1() as (bdb, _population_id, _generator_id):
+        bdb.execute('initialize 4 models for p1_cc')
+        bdb.execute('analyze p1_cc for 1 iteration wait')
+        with bdb.profile() as profile:
+            bdb.execute('estimate mutual information of age with weight'
+                ' using 7 samples max error 1000 by p1').fetchvalue()
+            bdb.execute('estimate mutual information of age with weight'
+                ' max error 1000 by p1').fetchvalue()
+        [batched, accurate] = profile.estimates
+        assert batched['function'] == 'MUTUAL INFORMATION'
+        assert batched['stopped'] == 'error'
+        # USING n SAMPLES still means n samples per call into a model.
+        assert batched['samples'] % 7 == 0
+        assert accurate['stopped'] == 'error'
+        assert accurate['stderr'] <= 1000
+        with pytest.raises(BQLError):
+            bdb.execute('simulate mutual information of age with weight'
+                ' for 1 second from models of p1').fetchall()
+
+def test_using_models():
+    with test_core.t1() as (bdb, population_id, generator_id):
+        bdb.execute('initialize 4 models for p1_cc')
+        bdb.execute('analyze p1_cc for 2 iterations wait')
+        metamodel = core.bayesdb_generator_metamodel(bdb, generator_id)
+        age = core.bayesdb_variable_number(bdb, population_id, None, 'age')
+        weight = core.bayesdb_variable_number(bdb, population_id, None,
+            'weight')
+        for modelno in range(4):
+            depprob = bdb.execute('estimate dependence probability'
+                ' of age with weight by p1 using model %d' % (modelno,))
+            assert depprob.fetchvalue() == \
+                metamodel.column_dependence_probability(bdb, generator_id,
+                    modelno, age, weight)
+        # The top models are those with the best latest logscore.
+        top = [modelno for (modelno,) in bdb.sql_execute('''
+            SELECT modelno FROM bayesdb_crosscat_diagnostics AS d
+                WHERE generator_id = ?
+                    AND checkpoint = (SELECT MAX(checkpoint)
+                        FROM bayesdb_crosscat_diagnostics
+                        WHERE generator_id = d.generator_id
+                            AND modelno = d.modelno)
+                ORDER BY logscore DESC LIMIT 2
+        ''', (generator_id,))]
+        assert bdb.execute('estimate probability of age = 8'
+                ' by p1 using top 2 models').fetchvalue() == \
+            bdb.execute('estimate probability of age = 8'
+                ' by p1 using models %d, %d' % tuple(top)).fetchvalue()
+        assert len(bdb.execute('simulate age from p1 using models 1-2'
+            ' limit 3').fetchall()) == 3
+        assert len(bdb.execute('infer explicit predict age confidence c'
+            ' from p1 using model 3 limit 2').fetchall()) == 2
+        explanation = bdb.execute('explain estimate dependence probability'
+            ' of age with weight by p1 using models 0-1').fetchall()
+        assert any('2 models' in str(row) for row in explanation)
+        with pytest.raises(BQLError):
+            bdb.execute('estimate dependence probability of age with weight'
+                ' by p1 using models 3-5').fetchvalue()
+        with pytest.raises(BQLError):
+            bdb.execute('estimate dependence probability of age with weight'
+                ' by p1 using top 0 models').fetchvalue()
+
+def test_using_models_sql():
+    def setup(bdb):
+        bdb.execute('create generator p1_cc for p1 using crosscat()')
+        bdb.execute('initialize 2 models for p1_cc')
+    assert bql2sql('estimate probability of weight = 20 from p1'
+            ' using model 1;', setup) == \
+        'SELECT bql_pdf_joint_using_models(1, NULL, \'{"1": [1]}\', 3, 20)' \
+            ' FROM "t1";'
+    assert bql2sql('estimate correlation of age with weight from p1'
+            ' using models 0-1;', setup) == \
+        'SELECT bql_column_correlation(1, NULL, 2, 3) FROM "t1";'
+
 def test_badbql():
     with test_core.t1() as (bdb, _population_id, _generator_id):
         with pytest.raises(ValueError):
@@ -364,6 +465,26 @@ def test_estimate_bql():
         'SELECT (bql_row_column_predictive_probability(1, NULL, _rowid_, 3)' \
             ' + 1)' \
             ' FROM "t1";'
+    assert bql2sql('estimate predictive probability of * from p1;') == \
+        'SELECT bql_row_column_predictive_probability(1, NULL,' \
+            ' _rowid_, 1, \'[1, 2, 3]\') AS "label",' \
+            ' bql_row_column_predictive_probability(1, NULL,' \
+            ' _rowid_, 2, \'[1, 2, 3]\') AS "age",' \
+            ' bql_row_column_predictive_probability(1, NULL,' \
+            ' _rowid_, 3, \'[1, 2, 3]\') AS "weight"' \
+            ' FROM "t1";'
+    assert bql2sql('estimate predictive probability of age,'
+            ' predictive probability of weight from p1;') == \
+        'SELECT bql_row_column_predictive_probability(1, NULL,' \
+            ' _rowid_, 2, \'[2, 3]\'),' \
+            ' bql_row_column_predictive_probability(1, NULL,' \
+            ' _rowid_, 3, \'[2, 3]\')' \
+            ' FROM "t1";'
+    with pytest.raises(BQLError):
+        # Expands to many columns, not one value.
+        bql2sql('estimate predictive probability of * + 1 from p1;')
+    with pytest.raises(BQLError):
+        bql2sql('estimate predictive probability of * as p from p1;')
     with pytest.raises(parse.BQLParseError):
         # Need a table.
         bql2sql('estimate predictive probability of weight;')
@@ -388,6 +509,13 @@ def test_estimate_bql():
             " given (label = 'mumble') from p1;") == \
         "SELECT bql_pdf_joint(1, NULL, 3, 20, 2, 8, NULL, 1, 'mumble')" \
             ' FROM "t1";'
+    assert bql2sql('estimate probability of weight = 20 for 2 seconds'
+            ' from p1;') == \
+        'SELECT bql_pdf_joint_anytime(1, NULL, 2, NULL, 3, 20) FROM "t1";'
+    assert bql2sql('estimate probability of weight = 20 given (age = 8)'
+            ' max error 0.01 from p1;') == \
+        'SELECT bql_pdf_joint_anytime(1, NULL, NULL, 0.01, 3, 20, NULL, 2, 8)' \
+            ' FROM "t1";'
     assert bql2sql('estimate probability of weight = (c + 1) from p1;') == \
         'SELECT bql_pdf_joint(1, NULL, 3, ("c" + 1)) FROM "t1";'
     assert bql2sql('estimate probability of weight = f(c) from p1;') == \
@@ -446,6 +574,10 @@ def test_estimate_bql():
         ' using 42 samples from p1;') == \
         'SELECT bql_column_mutual_information(1, NULL, \'[2]\', \'[3]\', 42) '\
         'FROM "t1";'
+    assert bql2sql('estimate mutual information of age with weight' +
+        ' for 2 seconds max error 0.01 from p1;') == \
+        'SELECT bql_column_mutual_information_anytime(1, NULL,' \
+        ' \'[2]\', \'[3]\', NULL, 2, 0.01) FROM "t1";'
     with pytest.raises(bayeslite.BQLError):
         # Need both columns fixed.
         bql2sql('estimate mutual information with age from p1;')
@@ -567,19 +699,31 @@ def test_infer_auto():
     assert bql2sql('infer rowid, age, weight from p1') \
         == \
         'SELECT "rowid" AS "rowid",' \
-        ' "IFNULL"("age", bql_predict(1, NULL, _rowid_, 2, 0, NULL))' \
+        ' "IFNULL"("age", bql_predict(1, NULL,' \
+            ' _rowid_, 2, 0, NULL, \'[2, 3]\'))' \
             ' AS "age",' \
-        ' "IFNULL"("weight", bql_predict(1, NULL, _rowid_, 3, 0, NULL))' \
+        ' "IFNULL"("weight", bql_predict(1, NULL,' \
+            ' _rowid_, 3, 0, NULL, \'[2, 3]\'))' \
             ' AS "weight"' \
         ' FROM "t1";'
 
+def test_infer_auto_one():
+    assert bql2sql('infer rowid, age from p1') \
+        == \
+        'SELECT "rowid" AS "rowid",' \
+        ' "IFNULL"("age", bql_predict(1, NULL, _rowid_, 2, 0, NULL))' \
+            ' AS "age"' \
+        ' FROM "t1";'
+
 def test_infer_auto_nsamples():
     assert bql2sql('infer rowid, age, weight using (1+2) samples from p1') \
         == \
         'SELECT "rowid" AS "rowid",' \
-        ' "IFNULL"("age", bql_predict(1, NULL, _rowid_, 2, 0, (1 + 2)))' \
+        ' "IFNULL"("age", bql_predict(1, NULL,' \
+            ' _rowid_, 2, 0, (1 + 2), \'[2, 3]\'))' \
             ' AS "age",' \
-        ' "IFNULL"("weight", bql_predict(1, NULL, _rowid_, 3, 0, (1 + 2)))' \
+        ' "IFNULL"("weight", bql_predict(1, NULL,' \
+            ' _rowid_, 3, 0, (1 + 2), \'[2, 3]\'))' \
             ' AS "weight"' \
         ' FROM "t1";'
 
@@ -587,9 +731,11 @@ def test_infer_auto_with_confidence():
     assert bql2sql('infer rowid, age, weight with confidence 0.9 from p1') \
         == \
         'SELECT "rowid" AS "rowid",' \
-        ' "IFNULL"("age", bql_predict(1, NULL, _rowid_, 2, 0.9, NULL))' \
+        ' "IFNULL"("age", bql_predict(1, NULL,' \
+            ' _rowid_, 2, 0.9, NULL, \'[2, 3]\'))' \
             ' AS "age",' \
-        ' "IFNULL"("weight", bql_predict(1, NULL, _rowid_, 3, 0.9, NULL))' \
+        ' "IFNULL"("weight", bql_predict(1, NULL,' \
+            ' _rowid_, 3, 0.9, NULL, \'[2, 3]\'))' \
             ' AS "weight"' \
         ' FROM "t1";'
 
@@ -599,10 +745,11 @@ def test_infer_auto_with_confidence_nsamples():
             ' from p1') \
         == \
         'SELECT "rowid" AS "rowid",' \
-        ' "IFNULL"("age", bql_predict(1, NULL, _rowid_, 2, 0.9, "sqrt"(2)))' \
+        ' "IFNULL"("age", bql_predict(1, NULL,' \
+            ' _rowid_, 2, 0.9, "sqrt"(2), \'[2, 3]\'))' \
             ' AS "age",' \
         ' "IFNULL"("weight", bql_predict(1, NULL, _rowid_, 3, 0.9,' \
-                ' "sqrt"(2)))' \
+                ' "sqrt"(2), \'[2, 3]\'))' \
             ' AS "weight"' \
         ' FROM "t1";'
 
@@ -611,9 +758,11 @@ def test_infer_auto_with_confidence_where():
             ' where label = \'foo\'') \
         == \
         'SELECT "rowid" AS "rowid",' \
-        ' "IFNULL"("age", bql_predict(1, NULL, _rowid_, 2, 0.9, NULL))' \
+        ' "IFNULL"("age", bql_predict(1, NULL,' \
+            ' _rowid_, 2, 0.9, NULL, \'[2, 3]\'))' \
             ' AS "age",' \
-        ' "IFNULL"("weight", bql_predict(1, NULL, _rowid_, 3, 0.9, NULL))' \
+        ' "IFNULL"("weight", bql_predict(1, NULL,' \
+            ' _rowid_, 3, 0.9, NULL, \'[2, 3]\'))' \
             ' AS "weight"' \
         ' FROM "t1"' \
         ' WHERE ("label" = \'foo\');'
@@ -625,9 +774,11 @@ def test_infer_auto_with_confidence_nsamples_where():
             ' where label = \'foo\'') \
         == \
         'SELECT "rowid" AS "rowid",' \
-        ' "IFNULL"("age", bql_predict(1, NULL, _rowid_, 2, 0.9, 42))' \
+        ' "IFNULL"("age", bql_predict(1, NULL,' \
+            ' _rowid_, 2, 0.9, 42, \'[2, 3]\'))' \
             ' AS "age",' \
-        ' "IFNULL"("weight", bql_predict(1, NULL, _rowid_, 3, 0.9, 42))' \
+        ' "IFNULL"("weight", bql_predict(1, NULL,' \
+            ' _rowid_, 3, 0.9, 42, \'[2, 3]\'))' \
             ' AS "weight"' \
         ' FROM "t1"' \
         ' WHERE ("label" = \'foo\');'
@@ -638,9 +789,11 @@ def test_infer_auto_with_confidence_nsamples_where_predict():
                 ' = \'foo\'') \
         == \
         'SELECT "rowid" AS "rowid",' \
-        ' "IFNULL"("age", bql_predict(1, NULL, _rowid_, 2, 0.9, NULL))' \
+        ' "IFNULL"("age", bql_predict(1, NULL,' \
+            ' _rowid_, 2, 0.9, NULL, \'[2, 3]\'))' \
             ' AS "age",' \
-        ' "IFNULL"("weight", bql_predict(1, NULL, _rowid_, 3, 0.9, NULL))' \
+        ' "IFNULL"("weight", bql_predict(1, NULL,' \
+            ' _rowid_, 3, 0.9, NULL, \'[2, 3]\'))' \
             ' AS "weight"' \
         ' FROM "t1"' \
         ' WHERE ("ifnull"("label",' \
@@ -656,9 +809,11 @@ def test_infer_auto_with_confidence_nsamples_where_predict_nsamples():
                 ' = \'foo\'') \
         == \
         'SELECT "rowid" AS "rowid",' \
-        ' "IFNULL"("age", bql_predict(1, NULL, _rowid_, 2, 0.9, 42))' \
+        ' "IFNULL"("age", bql_predict(1, NULL,' \
+            ' _rowid_, 2, 0.9, 42, \'[2, 3]\'))' \
             ' AS "age",' \
-        ' "IFNULL"("weight", bql_predict(1, NULL, _rowid_, 3, 0.9, 42))' \
+        ' "IFNULL"("weight", bql_predict(1, NULL,' \
+            ' _rowid_, 3, 0.9, 42, \'[2, 3]\'))' \
             ' AS "weight"' \
         ' FROM "t1"' \
         ' WHERE ("ifnull"("label",' \
@@ -668,25 +823,48 @@ def test_infer_auto_with_confidence_nsamples_where_predict_nsamples():
 def test_infer_auto_star():
     assert bql2sql('infer rowid, * from p1') == \
         'SELECT "rowid" AS "rowid", "id" AS "id",' \
-        ' "IFNULL"("label", bql_predict(1, NULL, _rowid_, 1, 0, NULL))' \
+        ' "IFNULL"("label", bql_predict(1, NULL,' \
+            ' _rowid_, 1, 0, NULL, \'[1, 2, 3]\'))' \
             ' AS "label",' \
-        ' "IFNULL"("age", bql_predict(1, NULL, _rowid_, 2, 0, NULL))' \
+        ' "IFNULL"("age", bql_predict(1, NULL,' \
+            ' _rowid_, 2, 0, NULL, \'[1, 2, 3]\'))' \
             ' AS "age",' \
-        ' "IFNULL"("weight", bql_predict(1, NULL, _rowid_, 3, 0, NULL))' \
+        ' "IFNULL"("weight", bql_predict(1, NULL,' \
+            ' _rowid_, 3, 0, NULL, \'[1, 2, 3]\'))' \
             ' AS "weight"' \
         ' FROM "t1";'
 
 def test_infer_auto_star_nsamples():
     assert bql2sql('infer rowid, * using 1 samples from p1') == \
         'SELECT "rowid" AS "rowid", "id" AS "id",' \
-        ' "IFNULL"("label", bql_predict(1, NULL, _rowid_, 1, 0, 1))' \
+        ' "IFNULL"("label", bql_predict(1, NULL,' \
+            ' _rowid_, 1, 0, 1, \'[1, 2, 3]\'))' \
             ' AS "label",' \
-        ' "IFNULL"("age", bql_predict(1, NULL, _rowid_, 2, 0, 1))' \
+        ' "IFNULL"("age", bql_predict(1, NULL,' \
+            ' _rowid_, 2, 0, 1, \'[1, 2, 3]\'))' \
             ' AS "age",' \
-        ' "IFNULL"("weight", bql_predict(1, NULL, _rowid_, 3, 0, 1))' \
+        ' "IFNULL"("weight", bql_predict(1, NULL,' \
+            ' _rowid_, 3, 0, 1, \'[1, 2, 3]\'))' \
             ' AS "weight"' \
         ' FROM "t1";'
 
+def test_infer_explicit_predict_joint():
+    assert bql2sql('infer explicit rowid, predict age confidence age_conf,'
+            ' predict weight, predict label using 5 samples from p1') == \
+        'SELECT c0 AS "rowid",' \
+            ' bql_json_get(c1, \'value\') AS "age",' \
+            ' bql_json_get(c1, \'confidence\') AS "age_conf",' \
+            ' bql_json_get(c2, \'value\') AS "weight",' \
+            ' bql_json_get(c3, \'value\') AS "label"' \
+            ' FROM (SELECT "rowid" AS c0,' \
+                ' bql_predict_confidence(1, NULL,' \
+                ' _rowid_, 2, NULL, \'[2, 3]\') AS c1,' \
+                ' bql_predict_confidence(1, NULL,' \
+                ' _rowid_, 3, NULL, \'[2, 3]\') AS c2,' \
+                ' bql_predict_confidence(1, NULL,' \
+                ' _rowid_, 1, 5) AS c3' \
+                ' FROM "t1");'
+
 def test_estimate_columns_trivial():
     prefix0 = 'SELECT c.name AS name'
     prefix1 = ' FROM bayesdb_population AS p,' \
@@ -2170,6 +2348,42 @@ def test_checkpoint__ci_slow():
         assert bdb.execute(sql, (generator_id,)).fetchvalue() == 1
         bdb.execute('analyze p1_cc for 1 iteration checkpoint 0 seconds wait')
 
+def test_analyze_until_converged():
+    with test_core.t1() as (bdb, _population_id, _generator_id):
+        bdb.execute('initialize 2 models for p1_cc')
+        # Too few checkpoints to judge: run the whole budget.
+        cursor = bdb.execute('analyze p1_cc for 3 iterations'
+            ' until converged window 2 tolerance 0 wait')
+        assert [d[0] for d in cursor.description] == \
+            ['modelno', 'iterations', 'converged']
+        assert cursor.fetchall() == [(0, 3, 0), (1, 3, 0)]
+        # Anything is within tolerance: stop after two windows of
+        # iterations, whatever the checkpoints.
+        cursor = bdb.execute('analyze p1_cc model 1 for 100 iterations'
+            ' until converged window 2 tolerance 1000 wait')
+        assert cursor.fetchall() == [(1, 7, 1)]
+        cursor = bdb.execute('analyze p1_cc for 100 iterations'
+            ' until converged window 1 tolerance 1000'
+            ' checkpoint 2 iterations wait')
+        assert cursor.fetchall() == [(0, 5, 1), (1, 9, 1)]
+        # Plain ANALYZE still returns nothing.
+        assert bdb.execute('analyze p1_cc for 1 iteration wait')\
+            .fetchall() == []
+        with pytest.raises(BQLError):
+            bdb.execute('analyze p1_cc for 1 iteration'
+                ' until converged window 0 wait')
+
+def test_crosscat_converged():
+    from bayeslite.metamodels.crosscat import crosscat_converged
+    plateau = [(-100., 2, 1.), (-101., 2, 1.), (-100.5, 2, 1.)]
+    assert not crosscat_converged(plateau[:1], 1, 0.01)
+    assert crosscat_converged(plateau[:2], 1, 0.01)
+    assert not crosscat_converged(plateau[:2], 1, 0.001)
+    assert crosscat_converged(plateau, 1, 0.01)
+    # A change in the number of views is not convergence.
+    assert not crosscat_converged(plateau + [(-100.5, 3, 1.)], 1, 0.01)
+    assert not crosscat_converged([(-200., 1, 1.)] + plateau, 2, 0.01)
+
 def test_infer_confidence__ci_slow():
     with test_core.t1() as (bdb, _population_id, _generator_id):
         bdb.execute('initialize 1 model for p1_cc')
@@ -2259,6 +2473,73 @@ def test_create_generator_ifnotexists():
             except bayeslite.BQLError:
                 pass
 
+def test_explain():
+    with test_core.t1() as (bdb, _population_id, _generator_id):
+        bdb.execute('INITIALIZE 3 MODELS FOR p1_cc')
+        nrows = len(test_core.t1_rows)
+        cursor = bdb.execute(
+            'EXPLAIN ESTIMATE PREDICTIVE PROBABILITY OF age FROM p1')
+        assert [d[0] for d in cursor.description] == \
+            ['step', 'detail', 'cost']
+        assert cursor.fetchall() == [
+            ('query', 'SELECT bql_row_column_predictive_probability'
+                '(1, NULL, _rowid_, 2) FROM "t1"', None),
+            ('cost', 'PREDICTIVE PROBABILITY: %d rows x 3 models'
+                ' x 1 samples' % (nrows,), nrows*3),
+            ('cost', 'total', nrows*3),
+        ]
+        cursor = bdb.execute('EXPLAIN ESTIMATE MUTUAL INFORMATION'
+            ' USING 10 SAMPLES FROM PAIRWISE VARIABLES OF p1')
+        assert cursor.fetchall()[-1] == ('cost', 'total', 3*3 * 3 * 10)
+        cursor = bdb.execute('EXPLAIN SIMULATE age FROM p1 LIMIT 5')
+        assert cursor.fetchall()[-1] == ('cost', 'total', 5)
+        assert bdb.execute('SELECT COUNT(*) FROM sqlite_temp_master'
+            ).fetchvalue() == 0
+        assert bdb.execute('EXPLAIN SELECT * FROM t1').fetchall()[-1] == \
+            ('cost', 'total', 0)
+        plan = bdb.execute('EXPLAIN QUERY PLAN SELECT * FROM t1').fetchall()
+        assert 'SCAN TABLE t1' in [row[-1] for row in plan]
+        with pytest.raises(BQLError):
+            bdb.execute('EXPLAIN ESTIMATE PREDICTIVE PROBABILITY OF age'
+                ' FROM nonexistent')
+
+def test_fetch_columnar():
+    with bayesdb_open(':memory:') as bdb:
+        bdb.sql_execute('CREATE TABLE t(x, y, z)')
+        rows = [(i, i/2., 'v%d' % (i % 3,)) for i in xrange(10)]
+        rows[4] = (4, None, None)
+        bdb.sql_executemany('INSERT INTO t VALUES (?, ?, ?)', rows)
+        q = 'SELECT x, y AS w, z FROM t ORDER BY x'
+        columns = bdb.execute(q).fetch_columns()
+        assert columns == [list(column) for column in zip(*rows)]
+        x, w, z = bdb.execute(q).fetch_numpy(dtype_map={'W': float})
+        assert x.dtype == numpy.int64
+        assert x.tolist() == range(10)
+        assert w.dtype == numpy.float64
+        assert numpy.isnan(w[4])
+        assert w[5] == 2.5
+        assert z.dtype == object
+        assert z[4] is None
+        assert z[5] == 'v2'
+        x, w, z = bdb.execute(q).fetch_numpy()
+        assert w.dtype == object
+        chunks = list(bdb.execute(q).fetch_numpy_chunks(size=4))
+        assert [len(chunk[0]) for chunk in chunks] == [4, 4, 2]
+        assert numpy.concatenate([c[0] for c in chunks]).tolist() == \
+            range(10)
+        df = bdb.execute(q).fetch_dataframe(dtype_map={'w': float})
+        assert list(df.columns) == ['x', 'w', 'z']
+        assert df['w'].sum() == sum(i/2. for i in xrange(10) if i != 4)
+        empty = bdb.execute('SELECT x, z FROM t WHERE x < 0')
+        assert list(empty.fetch_numpy_chunks()) == []
+        with pytest.raises(ValueError):
+            list(bdb.execute(q).fetch_numpy_chunks(size=0))
+        tracer = MockTracerOneQuery(q, 1)
+        bdb.trace(tracer)
+        assert bdb.execute(q).fetch_numpy()[0].tolist() == range(10)
+        assert tracer.finished_calls == 1
+        bdb.untrace(tracer)
+
 class MockTracerOneQuery(bayeslite.IBayesDBTracer):
     def __init__(self, q, qid):
         self.q = q
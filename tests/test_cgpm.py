@@ -137,6 +137,35 @@ def test_cgpm_no_empty_categories():
             seen[colno].append(value)
         assert all(set(expected[c])==set(seen[c]) for c in expected)
 
+def test_cgpm_using_models():
+    with cgpm_smoke_bdb() as bdb:
+        bdb.execute('CREATE METAMODEL g FOR p USING cgpm')
+        bdb.execute('INITIALIZE 2 MODELS FOR g')
+        bdb.execute('ESTIMATE PROBABILITY OF output = 1 WITHIN p').fetchall()
+        with pytest.raises(BQLError):
+            bdb.execute('ESTIMATE PROBABILITY OF output = 1 WITHIN p'
+                ' USING MODEL 1').fetchall()
+        with pytest.raises(BQLError):
+            bdb.execute('SIMULATE output FROM p USING MODEL 0'
+                ' LIMIT 1').fetchall()
+
+def test_cgpm_anytime():
+    # CGPM answers only for all of a generator's models at once, so
+    # anytime estimates take the whole generator as one model.
+    with cgpm_smoke_bdb() as bdb:
+        bdb.execute('CREATE METAMODEL g FOR p USING cgpm')
+        bdb.execute('INITIALIZE 2 MODELS FOR g')
+        with bdb.profile() as profile:
+            bdb.execute('ESTIMATE PROBABILITY OF output = 1 WITHIN p'
+                ' MAX ERROR 1000').fetchall()
+            bdb.execute('ESTIMATE MUTUAL INFORMATION OF output WITH input'
+                ' USING 10 SAMPLES FOR 1 SECOND BY p').fetchall()
+        [probability, mutinf] = profile.estimates
+        assert probability['models'] == 1
+        assert probability['stderr'] == 0
+        assert mutinf['models'] == 1
+        assert mutinf['samples'] % 10 == 0
+
 def cgpm_smoke_tests(bdb, gen, vars):
     modelledby = 'MODELLED BY %s' % (gen,) if gen else ''
     for var in vars:
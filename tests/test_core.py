@@ -18,6 +18,8 @@ import apsw
 import contextlib
 import itertools
 import json
+import math
+import os
 import pytest
 import tempfile
 
@@ -49,6 +51,12 @@ def local_crosscat():
 def multiprocessing_crosscat():
     return crosscat.MultiprocessingEngine.MultiprocessingEngine(seed=0)
 
+def remove_database(pathname):
+    """Remove a database file and any journals SQLite left beside it."""
+    for suffix in ('', '-wal', '-shm', '-journal'):
+        if os.path.exists(pathname + suffix):
+            os.unlink(pathname + suffix)
+
 @contextlib.contextmanager
 def bayesdb(metamodel=None, **kwargs):
     if metamodel is None:
@@ -404,6 +412,158 @@ def test_t1_predict(rowid, colno, confidence):
         if rowid == 0: rowid = bayesdb_maxrowid(bdb, pop_id)
         bqlfn.bql_predict(bdb, pop_id, None, rowid, colno, confidence, None)
 
+def test_t1_predict_joint():
+    with analyzed_bayesdb_population(t1(), 2, 1) as (bdb, pop_id, _gen_id):
+        bdb.sql_execute('UPDATE t1 SET label = NULL, age = NULL'
+            ' WHERE _rowid_ IN (1, 3)')
+        bdb.sql_execute('UPDATE t1 SET weight = NULL WHERE _rowid_ = 3')
+        metamodel = bdb.metamodels['crosscat']
+        calls = []
+        def predict_confidence_joint(bdb_, generator_id, modelno, rowid,
+                colnos, numsamples=None):
+            calls.append((rowid, colnos))
+            predictions = type(metamodel).predict_confidence_joint(metamodel,
+                bdb_, generator_id, modelno, rowid, colnos,
+                numsamples=numsamples)
+            assert len(predictions) == len(colnos)
+            for value, confidence in predictions:
+                assert value is not None
+                assert 0 <= confidence <= 1
+            return predictions
+        metamodel.predict_confidence_joint = predict_confidence_joint
+        rows = bdb.execute('INFER rowid, label, age, weight'
+            ' WITH CONFIDENCE 0 FROM p1 WHERE rowid <= 4').fetchall()
+        # One joint prediction for each row missing any column, of all
+        # its missing columns together.
+        assert sorted(calls) == [(1, [1, 2]), (3, [1, 2, 3]), (4, [2])]
+        assert all(value is not None for row in rows for value in row)
+        assert rows[1] == (2, 'bar', 14, 28)
+        del calls[:]
+        rows = bdb.execute('INFER EXPLICIT rowid,'
+            ' PREDICT label CONFIDENCE label_conf, PREDICT age,'
+            ' PREDICT weight FROM p1 WHERE rowid <= 2').fetchall()
+        # Observed columns are predicted one at a time, given the rest.
+        assert sorted(calls) == [(1, [1, 2])]
+        assert [row[0] for row in rows] == [1, 2]
+        assert all(value is not None for row in rows for value in row)
+
+def test_t1_condition():
+    with analyzed_bayesdb_population(t1(), 2, 1) as (bdb, _pop_id, gen_id):
+        metamodel = bdb.metamodels['crosscat']
+        for rowid, constraints in itertools.product([1, 1000],
+                [[], [(1, 'foo')], [(1, 'foo'), (3, 20)], [(1, 'nonesuch')]]):
+            for modelno in [None, [1]]:
+                query = metamodel.condition(bdb, gen_id, rowid, constraints,
+                    modelno)
+                if constraints:
+                    loglikelihood = metamodel.logpdf_joint(bdb, gen_id,
+                        rowid, constraints, [], modelno)
+                else:
+                    loglikelihood = 0
+                assert query.loglikelihood() == loglikelihood
+                for targets in [[(2, 10)], [(2, 12), (3, 24)],
+                        [(1, 'bar')], [(1, 'foo'), (2, 10)],
+                        [(1, 'nonesuch')]]:
+                    expected = metamodel.logpdf_joint(bdb, gen_id, rowid,
+                        targets, constraints, modelno)
+                    actual = query.logpdf(targets)
+                    # The conditioned query sums the same terms as
+                    # Crosscat in another order.
+                    if math.isnan(expected) or math.isinf(expected):
+                        assert repr(actual) == repr(expected)
+                    else:
+                        assert abs(actual - expected) <= \
+                            1e-9 * max(1, abs(expected))
+
+def test_t1_condition_engine_calls():
+    with analyzed_bayesdb_population(t1(), 2, 1) as (bdb, _pop_id, gen_id):
+        metamodel = bdb.metamodels['crosscat']
+        engine = metamodel._crosscat
+        calls = []
+        class CountingEngine(object):
+            def __getattr__(self, name):
+                calls.append(name)
+                return getattr(engine, name)
+        metamodel._crosscat = CountingEngine()
+        try:
+            query = metamodel.condition(bdb, gen_id, 1000,
+                [(1, 'foo'), (3, 20)], None)
+            for age in range(20):
+                query.logpdf([(2, age)])
+                query.logpdf([(2, age), (3, age)])
+            assert 'predictive_probability_multistate' not in calls
+            query.loglikelihood()
+            query.loglikelihood()
+            assert calls.count('predictive_probability_multistate') == 1
+        finally:
+            metamodel._crosscat = engine
+
+def test_t1_probability_conditioned_once():
+    with analyzed_bayesdb_population(t1(), 2, 1) as (bdb, _pop_id, _gen_id):
+        bdb.sql_execute('CREATE TABLE grid (v)')
+        for v in range(10):
+            bdb.sql_execute('INSERT INTO grid VALUES (?)', (v,))
+        metamodel = bdb.metamodels['crosscat']
+        conditions = []
+        def condition(*args, **kwargs):
+            query = type(metamodel).condition(metamodel, *args, **kwargs)
+            conditions.append(query)
+            return query
+        metamodel.condition = condition
+        scan = bdb.execute('SELECT v, (ESTIMATE PROBABILITY OF age = v'
+            ' GIVEN (label = \'foo\') BY p1) FROM grid').fetchall()
+        # One generator, conditioned once for the whole scan.
+        assert len(conditions) == 1
+        # The conditioned models are forgotten when the scan is done.
+        assert bdb._query_memo.conditioned is None
+        for v, p in scan:
+            assert p == bdb.execute('ESTIMATE PROBABILITY OF age = ?'
+                ' GIVEN (label = \'foo\') BY p1', (v,)).fetchvalue()
+        assert len(conditions) == 1 + len(scan)
+        # Constraints that vary from row to row are conditioned anew.
+        del conditions[:]
+        bdb.execute('ESTIMATE PROBABILITY OF age = 10 GIVEN (weight = weight)'
+            ' FROM p1 WHERE rowid <= 3').fetchall()
+        assert len(conditions) == 3
+
+def test_t1_predictive_probability_all():
+    with analyzed_bayesdb_population(t1(), 2, 1) as (bdb, pop_id, gen_id):
+        crosscat = bdb.metamodels['crosscat']
+        calls = []
+        def logpdf_leave_one_out(*args, **kwargs):
+            calls.append(args)
+            return type(crosscat).logpdf_leave_one_out(crosscat, *args,
+                **kwargs)
+        crosscat.logpdf_leave_one_out = logpdf_leave_one_out
+        cursor = bdb.execute('ESTIMATE PREDICTIVE PROBABILITY OF * FROM p1')
+        assert [d[0] for d in cursor.description] == \
+            ['label', 'age', 'weight']
+        rows = cursor.fetchall()
+        # Once for each row, not for each cell.
+        assert len(calls) == len(rows)
+        assert rows == bdb.execute('ESTIMATE'
+            ' PREDICTIVE PROBABILITY OF label,'
+            ' PREDICTIVE PROBABILITY OF age,'
+            ' PREDICTIVE PROBABILITY OF weight'
+            ' FROM p1').fetchall()
+        values = bdb.sql_execute('SELECT label, age, weight FROM t1'
+            ' ORDER BY _rowid_').fetchall()
+        for row_values, row in zip(values, rows):
+            for value, p in zip(row_values, row):
+                assert (value is None) == (p is None)
+        # Crosscat conditions on the row once for all cells, but gets
+        # the same as one cell at a time.
+        rowid = core.bayesdb_population_fresh_row_id(bdb, pop_id)
+        targets = [(2, 12.), (1, u'foo')]
+        constraints = [(3, 24.)]
+        expected = metamodel.IBayesDBMetamodel.logpdf_leave_one_out(
+            crosscat, bdb, gen_id, rowid, targets, constraints)
+        actual = type(crosscat).logpdf_leave_one_out(crosscat, bdb, gen_id,
+            rowid, targets, constraints)
+        assert len(actual) == 2
+        for e, a in zip(expected, actual):
+            assert abs(e - a) < 1e-9
+
 @pytest.mark.parametrize('colnos,constraints,numpredictions',
     [(colnos, constraints, numpred)
         for colnos in powerset(range(1,3))
@@ -565,6 +725,7 @@ def test_crosscat_constraints():
         def predictive_probability_multistate(self, M_c, X_L_list,
                 X_D_list, Y, Q):
             self._last_Y = Y
+            self._last_Q = Q
             sup = super(FakeEngine, self)
             return sup.simple_predictive_probability_multistate(M_c=M_c,
                 X_L_list=X_L_list, X_D_list=X_D_list, Y=Y, Q=Q)
@@ -609,7 +770,10 @@ def test_crosscat_constraints():
         bdb.execute('ANALYZE p1_cc FOR 1 ITERATION WAIT')
         bdb.execute('ESTIMATE PROBABILITY OF age = 8 GIVEN (weight = 16)'
             ' BY p1').next()
-        assert engine._last_Y == [(28, 2, 16)]
+        # The targets are weighed against the constraints in Python;
+        # the engine sees the constraints only for their likelihood.
+        assert engine._last_Y == []
+        assert engine._last_Q == [(28, 2, 16)]
         bdb.execute("SELECT age FROM t1 WHERE label = 'baz'").next()
         bdb.execute("INFER age FROM p1 WHERE label = 'baz'").next()
         assert engine._last_Y == [(3, 0, 1), (3, 2, 32)]
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+#   Copyright (c) 2010-2016, MIT Probabilistic Computing Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import contextlib
+import random
+
+import crosscat.LocalEngine
+import crosscat.utils.inference_utils as inference_utils
+import pytest
+
+import bayeslite
+import bayeslite.core as core
+
+from bayeslite.metamodels.crosscat import CrosscatMetamodel
+from bayeslite.metamodels.crosscat import crosscat_cc_colno
+from bayeslite.metamodels.crosscat import crosscat_mutual_information_exact
+
+class CountingEngine(crosscat.LocalEngine.LocalEngine):
+    def __init__(self, *args, **kwargs):
+        super(CountingEngine, self).__init__(*args, **kwargs)
+        self.mutinf_models = []
+
+    def mutual_information(self, M_c, X_L_list, X_D_list, *args, **kwargs):
+        self.mutinf_models.append(len(X_L_list))
+        return super(CountingEngine, self).mutual_information(M_c, X_L_list,
+            X_D_list, *args, **kwargs)
+
+@contextlib.contextmanager
+def analyzed_bdb():
+    prng = random.Random(0)
+    with bayeslite.bayesdb_open(builtin_metamodels=False) as bdb:
+        engine = CountingEngine(seed=0)
+        bayeslite.bayesdb_register_metamodel(bdb, CrosscatMetamodel(engine))
+        bdb.sql_execute('CREATE TABLE t(a, b, x, y)')
+        for _i in xrange(60):
+            z = prng.randrange(3)
+            bdb.sql_execute('INSERT INTO t VALUES (?, ?, ?, ?)',
+                ('a%d' % (z,), 'b%d' % (z if prng.random() < .95 else 3,),
+                    prng.gauss(z, 1), prng.gauss(0, 1)))
+        bdb.execute('''
+            CREATE POPULATION p FOR t WITH SCHEMA (
+                MODEL a, b AS CATEGORICAL;
+                MODEL x, y AS NUMERICAL
+            )
+        ''')
+        bdb.execute('CREATE GENERATOR p_cc FOR p USING crosscat()')
+        bdb.execute('INITIALIZE 4 MODELS FOR p_cc')
+        bdb.execute('ANALYZE p_cc FOR 10 ITERATIONS WAIT')
+        generator_id = core.bayesdb_get_generator(bdb, None, 'p_cc')
+        yield bdb, engine, generator_id
+
+def colno(bdb, name):
+    population_id = core.bayesdb_get_population(bdb, 'p')
+    return core.bayesdb_variable_number(bdb, population_id, None, name)
+
+def test_mutinf_exact_categorical():
+    with analyzed_bdb() as (bdb, engine, generator_id):
+        metamodel = core.bayesdb_generator_metamodel(bdb, generator_id)
+        M_c = metamodel._crosscat_metadata(bdb, generator_id)
+        a, b = colno(bdb, 'a'), colno(bdb, 'b')
+        cc_a = crosscat_cc_colno(bdb, generator_id, a)
+        cc_b = crosscat_cc_colno(bdb, generator_id, b)
+        stata = list(metamodel._crosscat_latent_stata(bdb, generator_id,
+            None))
+        mis = metamodel.column_mutual_information(bdb, generator_id, None,
+            [a], [b], numsamples=100)
+        assert len(mis) == len(stata) == 4
+        for mi, (X_L, X_D) in zip(mis, stata):
+            assert mi == pytest.approx(
+                inference_utils.calculate_MI_bounded_discrete(cc_a, cc_b,
+                    M_c, X_L, X_D))
+            assignments = X_L['column_partition']['assignments']
+            if assignments[cc_a] == assignments[cc_b]:
+                assert mi == pytest.approx(
+                    crosscat_mutual_information_exact(M_c, X_L, cc_a, cc_b))
+            else:
+                assert mi == 0
+        # No model needed the engine's Monte Carlo estimator.
+        assert engine.mutinf_models == []
+
+def test_mutinf_samples_only_same_view():
+    with analyzed_bdb() as (bdb, engine, generator_id):
+        metamodel = core.bayesdb_generator_metamodel(bdb, generator_id)
+        x, y = colno(bdb, 'x'), colno(bdb, 'y')
+        cc_x = crosscat_cc_colno(bdb, generator_id, x)
+        cc_y = crosscat_cc_colno(bdb, generator_id, y)
+        same_view = []
+        for X_L in metamodel._crosscat_latent_state(bdb, generator_id, None):
+            assignments = X_L['column_partition']['assignments']
+            same_view.append(assignments[cc_x] == assignments[cc_y])
+        mis = metamodel.column_mutual_information(bdb, generator_id, None,
+            [x], [y], numsamples=100)
+        assert len(mis) == 4
+        for mi, same in zip(mis, same_view):
+            if not same:
+                assert mi == 0
+        assert engine.mutinf_models == \
+            ([sum(same_view)] if any(same_view) else [])
@@ -131,6 +131,67 @@ def test_guess_stattypes():
     assert [st[0] for st in bayesdb_guess_stattypes(n, rows)] == \
         ['numerical', 'numerical']
 
+def test_guess_stattypes_sketch():
+    # Columns with more distinct values than distinct_limit are
+    # summarized by sketches, which should reach the same decisions.
+    n = ['a', 'b', 'c', 'd', 'e']
+    rows = [['r%d' % (i,), i % 7, i * 0.5, 'x' if i % 20 else i / 20.,
+            'none' if i % 3 else 'v%d' % (i,)]
+        for i in xrange(5000)]
+    def all_distinct(column_name, numeric):
+        values = [row[n.index(column_name)] for row in rows]
+        if numeric:
+            values = map(float, values)
+        return len(set(values)) == len(values)
+    exact = bayesdb_guess_stattypes(n, rows)
+    sketched = bayesdb_guess_stattypes(n, iter(rows), distinct_limit=100,
+        all_distinct=all_distinct)
+    assert [st[0] for st in exact] == \
+        ['key', 'nominal', 'numerical', 'numerical', 'nominal']
+    assert sketched == exact
+    # Without an exact check, a sketch never reports a key.
+    assert bayesdb_guess_stattypes(n, iter(rows), distinct_limit=100)[0][0] \
+        != 'key'
+    # Nor does it report one whose few duplicates hide within its error.
+    rows[1][0] = rows[0][0]
+    assert bayesdb_guess_stattypes(n, iter(rows), distinct_limit=100,
+        all_distinct=all_distinct)[0][0] != 'key'
+    with pytest.raises(ValueError):
+        bayesdb_guess_stattypes(n, iter(rows), overrides=[('a', 'key')],
+            distinct_limit=100, all_distinct=all_distinct)
+    # An override key is checked for uniqueness by sketch, too.
+    rows = [[i % 4000, i] for i in xrange(5000)]
+    with pytest.raises(ValueError):
+        bayesdb_guess_stattypes(['a', 'b'], rows, overrides=[('a', 'key')],
+            distinct_limit=100)
+
+def test_guess_population_sample():
+    bdb = bayeslite.bayesdb_open(builtin_metamodels=False)
+    bdb.sql_execute('CREATE TABLE t(x, y, z)')
+    for i in xrange(1000):
+        bdb.sql_execute('INSERT INTO t (x, y, z) VALUES (?, ?, ?)',
+            ('r%d' % (i,), i % 3, math.sqrt(i)))
+    bayesdb_guess_population(bdb, 'p', 't', sample=200)
+    assert bdb.sql_execute('SELECT * FROM bayesdb_variable').fetchall() == [
+        (1, None, 1, 'y', 'nominal'),
+        (1, None, 2, 'z', 'numerical'),
+    ]
+
+def test_guess_population_sample_key():
+    # Only the last row duplicates another, which a sample all but
+    # surely misses, so only checking the whole table rules w out.
+    bdb = bayeslite.bayesdb_open(builtin_metamodels=False)
+    bdb.sql_execute('CREATE TABLE t(w, y, z)')
+    for i in xrange(1000):
+        bdb.sql_execute('INSERT INTO t (w, y, z) VALUES (?, ?, ?)',
+            (i if i < 999 else 0, i % 3, math.sqrt(i)))
+    bayesdb_guess_population(bdb, 'p', 't', sample=200)
+    assert bdb.sql_execute('SELECT * FROM bayesdb_variable').fetchall() == [
+        (1, None, 0, 'w', 'numerical'),
+        (1, None, 1, 'y', 'nominal'),
+        (1, None, 2, 'z', 'numerical'),
+    ]
+
 def test_guess_population():
     bdb = bayeslite.bayesdb_open(builtin_metamodels=False)
     bdb.sql_execute('CREATE TABLE t(x NUMERIC, y NUMERIC, z NUMERIC)')
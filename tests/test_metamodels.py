@@ -14,7 +14,10 @@
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
 
+import os
 import pytest
+import subprocess
+import sys
 import tempfile
 
 import crosscat.LocalEngine
@@ -202,3 +205,47 @@ def _retest_example(bdb, exname):
     bdb.execute('ANALYZE %s FOR 1 ITERATION WAIT' % (qg,))
     bdb.execute('ANALYZE %s MODEL 0 FOR 1 ITERATION WAIT' % (qg,))
     bdb.execute('ANALYZE %s MODEL 1 FOR 1 ITERATION WAIT' % (qg,))
+
+def test_builtin_lazy():
+    with tempfile.NamedTemporaryFile(prefix='bayeslite') as f:
+        with bayeslite.bayesdb_open(pathname=f.name) as bdb:
+            assert 'crosscat' in bdb.metamodels.deferred()
+            assert dict.keys(bdb.metamodels) == []
+            bdb.sql_execute('CREATE TABLE t(x)')
+            bdb.sql_execute('INSERT INTO t VALUES (1), (2), (3)')
+            bdb.execute('CREATE POPULATION p FOR t(x NUMERICAL)')
+            bdb.execute('CREATE GENERATOR p_cc FOR p USING crosscat()')
+            bdb.execute('INITIALIZE 1 MODEL FOR p_cc')
+            assert 'crosscat' not in bdb.metamodels.deferred()
+            assert dict.keys(bdb.metamodels) == ['crosscat']
+        # Reopening defers crosscat again until the generator needs it.
+        with bayeslite.bayesdb_open(pathname=f.name) as bdb:
+            assert 'crosscat' in bdb.metamodels.deferred()
+            bdb.execute('ESTIMATE PREDICTIVE PROBABILITY OF x FROM p')\
+                .fetchall()
+            assert 'crosscat' not in bdb.metamodels.deferred()
+
+def test_builtin_lazy_failure():
+    def factory():
+        raise ImportError('no such metamodel')
+    bayeslite.bayesdb_builtin_metamodel_factory('test_broken', factory)
+    try:
+        with bayeslite.bayesdb_open() as bdb:
+            for _ in xrange(2):
+                with pytest.raises(ImportError):
+                    'test_broken' in bdb.metamodels
+                assert 'test_broken' in bdb.metamodels.deferred()
+    finally:
+        import bayeslite.metamodel as metamodel
+        del metamodel.builtin_metamodels[-1]
+        metamodel.builtin_metamodel_names.remove('test_broken')
+
+def test_import_lazy():
+    code = 'import sys; import bayeslite; ' \
+        'print [m for m in %r if sys.modules.get(m) is not None]' % \
+        (['cgpm', 'crosscat', 'requests'],)
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(p for p in sys.path if p)
+    env.pop('BAYESDB_VERSION_CHECK', None)
+    output = subprocess.check_output([sys.executable, '-c', code], env=env)
+    assert output.strip() == '[]'
@@ -21,7 +21,10 @@ import bayeslite.core as core
 from bayeslite import BQLError
 from bayeslite import bayesdb_open
 from bayeslite import bayesdb_register_metamodel
+from bayeslite.math_util import logmeanexp
+from bayeslite.math_util import relerr
 from bayeslite.metamodels.nig_normal import NIGNormalMetamodel
+from bayeslite.metamodels.nig_normal import logpdf_gaussian
 
 def test_nig_normal_smoke():
     with bayesdb_open(':memory:') as bdb:
@@ -544,3 +547,134 @@ def test_nig_normal_latent_2var2lat_conditional_smoke():
         bdb.execute('drop generator g1')
         bdb.execute('drop population p')
         bdb.execute('drop table t')
+
+def test_nig_normal_logpdf_simulate_vectorized():
+    with bayesdb_open(':memory:') as bdb:
+        bayesdb_register_metamodel(bdb, NIGNormalMetamodel(seed=1))
+        bdb.sql_execute('create table t(x, y)')
+        for x in xrange(100):
+            bdb.sql_execute('insert into t(x, y) values(?, ?)',
+                (x, x*x - 100))
+        bdb.execute('create population p for t(x numerical; y numerical)')
+        bdb.execute('''
+            create generator g for p using nig_normal(xe deviation(x))
+        ''')
+        bdb.execute('initialize 3 models for g')
+        pid = core.bayesdb_get_population(bdb, 'p')
+        gid = core.bayesdb_get_generator(bdb, pid, 'g')
+        metamodel = core.bayesdb_generator_metamodel(bdb, gid)
+        params = bdb.sql_execute('''
+            select modelno, colno, mu, sigma from bayesdb_nig_normal_model
+                where generator_id = ?
+        ''', (gid,)).fetchall()
+        mus = dict(((m, c), mu) for m, c, mu, _sigma in params)
+        sigmas = dict(((m, c), sigma) for m, c, _mu, sigma in params)
+        targets = [(0, 50.), (1, 49.), (-1, 3.)]
+        def logpdf_model(m):
+            return logpdf_gaussian(50., mus[m, 0], sigmas[m, 0]) \
+                + logpdf_gaussian(49., mus[m, 1], sigmas[m, 1]) \
+                + logpdf_gaussian(3., 0, sigmas[m, 0])
+        with bdb.savepoint():
+            assert relerr(
+                logmeanexp([logpdf_model(m) for m in range(3)]),
+                metamodel.logpdf_joint(bdb, gid, 1, targets, [])) < 1e-12
+            assert relerr(logpdf_model(1),
+                metamodel.logpdf_joint(bdb, gid, 1, targets, [], 1)) < 1e-12
+            samples = metamodel.simulate_joint(bdb, gid, 1, [0, -1, 1], [],
+                modelno=0, num_samples=7)
+            assert len(samples) == 7
+            assert all(len(sample) == 3 for sample in samples)
+            # Analysis replaces the parameters, and the cached copies
+            # must follow.
+            before = metamodel.logpdf_joint(bdb, gid, 1, targets, [])
+            bdb.execute('analyze g for 1 iteration wait')
+            after = metamodel.logpdf_joint(bdb, gid, 1, targets, [])
+            assert before != after
+
+def test_nig_normal_suff_stats_and_models():
+    with bayesdb_open(':memory:') as bdb:
+        bayesdb_register_metamodel(bdb, NIGNormalMetamodel(seed=1))
+        bdb.sql_execute('create table t(x, y, z)')
+        rows = [(x, x*x - 100, 0.5*x) for x in xrange(20)]
+        bdb.sql_executemany('insert into t(x, y, z) values(?, ?, ?)', rows)
+        bdb.execute('''
+            create population p for t(x numerical; y numerical; z numerical)
+        ''')
+        bdb.execute('create generator g for p using nig_normal')
+        pid = core.bayesdb_get_population(bdb, 'p')
+        gid = core.bayesdb_get_generator(bdb, pid, 'g')
+        stats = bdb.sql_execute('''
+            select colno, count, sum, sumsq from bayesdb_nig_normal_column
+                where generator_id = ? order by colno
+        ''', (gid,)).fetchall()
+        assert stats == [
+            (colno, 20, sum(r[colno] for r in rows),
+                sum(r[colno]**2 for r in rows))
+            for colno in range(3)
+        ]
+        bdb.execute('initialize 4 models for g')
+        bdb.execute('analyze g for 1 iteration wait')
+        params = bdb.sql_execute('''
+            select modelno, colno, sigma from bayesdb_nig_normal_model
+                where generator_id = ? order by modelno, colno
+        ''', (gid,)).fetchall()
+        assert [(m, c) for m, c, _sigma in params] == \
+            [(m, c) for m in range(4) for c in range(3)]
+        assert all(0 < sigma for _m, _c, sigma in params)
+
+def test_nig_normal_using_models():
+    with bayesdb_open(':memory:') as bdb:
+        bayesdb_register_metamodel(bdb, NIGNormalMetamodel(seed=1))
+        bdb.sql_execute('create table t(x, y)')
+        for x in xrange(20):
+            bdb.sql_execute('insert into t(x, y) values(?, ?)',
+                (x, None if x % 4 == 0 else x*x - 100))
+        bdb.execute('create population p for t(x numerical; y numerical)')
+        bdb.execute('create generator g for p using nig_normal')
+        bdb.execute('initialize 4 models for g')
+        bdb.execute('analyze g for 1 iteration wait')
+        pid = core.bayesdb_get_population(bdb, 'p')
+        gid = core.bayesdb_get_generator(bdb, pid, 'g')
+        mus = [mu for (mu,) in bdb.sql_execute('''
+            select mu from bayesdb_nig_normal_model
+                where generator_id = ? and colno = 1 and modelno in (0, 1)
+        ''', (gid,))]
+        inferred = bdb.execute('''
+            infer y with confidence 0 from p using models 0-1
+                where y is null
+        ''').fetchall()
+        assert len(inferred) == 5
+        assert all(y in mus for (y,) in inferred)
+        predicted = bdb.execute('''
+            infer explicit predict y confidence c from p using models 0-1
+        ''').fetchall()
+        assert len(predicted) == 20
+        assert all(y in mus and c == 1 for y, c in predicted)
+
+def test_nig_normal_wide_table():
+    # More columns than fit in one query's result of three statistics
+    # per column.
+    ncols = 700
+    with bayesdb_open(':memory:') as bdb:
+        bayesdb_register_metamodel(bdb, NIGNormalMetamodel(seed=1))
+        names = ['x%d' % (j,) for j in xrange(ncols)]
+        bdb.sql_execute('create table t(%s)' % (','.join(names),))
+        rows = [[i*j for j in xrange(ncols)] for i in xrange(5)]
+        bdb.sql_executemany('insert into t values(%s)' %
+            (','.join('?' for _name in names),), rows)
+        bdb.execute('create population p for t(%s)' %
+            (';'.join('%s numerical' % (name,) for name in names),))
+        bdb.execute('create generator g for p using nig_normal')
+        bdb.execute('initialize 2 models for g')
+        bdb.execute('analyze g for 1 iteration wait')
+        pid = core.bayesdb_get_population(bdb, 'p')
+        gid = core.bayesdb_get_generator(bdb, pid, 'g')
+        stats = bdb.sql_execute('''
+            select colno, count, sum, sumsq from bayesdb_nig_normal_column
+                where generator_id = ? order by colno
+        ''', (gid,)).fetchall()
+        assert stats == [
+            (j, 5, sum(row[j] for row in rows),
+                sum(row[j]**2 for row in rows))
+            for j in xrange(ncols)
+        ]
@@ -280,6 +280,10 @@ def test_select_bql():
                 ast.SelColAll(None),
             ],
             [ast.SelTab('t', None)], None, None, None, None)]
+    assert parse_bql_string('select predictive probability of * from t;') == \
+        [ast.Select(ast.SELQUANT_ALL,
+            [ast.SelColExp(ast.ExpBQLPredProb(None), None)],
+            [ast.SelTab('t', None)], None, None, None, None)]
     assert parse_bql_string('select c, predictive probability of d from t;') \
         == \
         [ast.Select(ast.SELQUANT_ALL,
@@ -299,7 +303,7 @@ def test_select_bql():
     assert parse_bql_string('select probability of c = 42 from t;') == \
         [ast.Select(ast.SELQUANT_ALL,
             [ast.SelColExp(ast.ExpBQLProb([('c', ast.ExpLit(ast.LitInt(42)))],
-                    []),
+                    [], None),
                 None)],
             [ast.SelTab('t', None)], None, None, None, None)]
     assert parse_bql_string('select similarity from t;') == \
@@ -394,7 +398,7 @@ def test_select_bql():
                         ast.ExpLit(ast.LitInt(8)),
                     )),
                     [ast.ColListSub(
-                        ast.EstCols([ast.SelColAll(None)], 't', None, None,
+                        ast.EstCols([ast.SelColAll(None)], 't', None, None, None,
                             [ast.Ord(ast.ExpBQLProbFn(
                                     ast.ExpLit(ast.LitInt(4)),
                                     []),
@@ -440,7 +444,7 @@ def test_select_bql():
                         ast.ExpLit(ast.LitInt(8)),
                     )),
                     [ast.ColListSub(
-                        ast.EstCols([ast.SelColAll(None)], 't', None, None,
+                        ast.EstCols([ast.SelColAll(None)], 't', None, None, None,
                             [ast.Ord(ast.ExpBQLProbFn(
                                     ast.ExpLit(ast.LitInt(4)),
                                     []),
@@ -460,16 +464,18 @@ def test_select_bql():
             [ast.SelTab('t', None)], None, None, None, None)]
     assert parse_bql_string('select mutual information with c from t;') == \
         [ast.Select(ast.SELQUANT_ALL,
-            [ast.SelColExp(ast.ExpBQLMutInf(['c'], None, None, None), None)],
+            [ast.SelColExp(ast.ExpBQLMutInf(['c'], None, None, None, None),
+                None)],
             [ast.SelTab('t', None)], None, None, None, None)]
     assert parse_bql_string('select mutual information with (c) from t;') == \
         [ast.Select(ast.SELQUANT_ALL,
-            [ast.SelColExp(ast.ExpBQLMutInf(['c'], None, None, None), None)],
+            [ast.SelColExp(ast.ExpBQLMutInf(['c'], None, None, None, None),
+                None)],
             [ast.SelTab('t', None)], None, None, None, None)]
     assert parse_bql_string(
             'select mutual information of c with (d) from t;') == \
         [ast.Select(ast.SELQUANT_ALL,
-            [ast.SelColExp(ast.ExpBQLMutInf(['c'], ['d'], None, None),
+            [ast.SelColExp(ast.ExpBQLMutInf(['c'], ['d'], None, None, None),
             None)],
             [ast.SelTab('t', None)], None, None, None, None)]
     assert parse_bql_string(
@@ -481,7 +487,7 @@ def test_select_bql():
                 [('f', ast.ExpLit(ast.LitNull(0))),
                     ('z',ast.ExpLit(ast.LitInt(2))),
                     ('w', ast.ExpLit(ast.LitNull(0)))],
-                None),
+                None, None),
             None)],
             [ast.SelTab('t', None)], None, None, None, None)]
     assert parse_bql_string('select mutual information of c with d' +
@@ -492,7 +498,7 @@ def test_select_bql():
                     ['c'], ['d'], None,
                     ast.op(
                         ast.OP_ADD, ast.ExpLit(ast.LitInt(1)),
-                        ast.ExpLit(ast.LitInt(2)))),
+                        ast.ExpLit(ast.LitInt(2))), None),
                 None)],
             [ast.SelTab('t', None)], None, None, None, None)]
     assert parse_bql_string('''
@@ -505,8 +511,8 @@ def test_select_bql():
                     ['c'], None,
                     [('d', ast.ExpLit(ast.LitNull(0))),
                         ('a',ast.ExpLit(ast.LitInt(1)))],
-                    ast.ExpLit(ast.LitInt(10))
-                ),
+                    ast.ExpLit(ast.LitInt(10)),
+                    None),
             None)],
             [ast.SelTab('t', None)], None, None, None, None)]
     assert parse_bql_string('''
@@ -520,8 +526,8 @@ def test_select_bql():
                     None,
                     [('d', ast.ExpLit(ast.LitNull(0))),
                         ('a',ast.ExpLit(ast.LitInt(1)))],
-                    ast.ExpLit(ast.LitInt(10))
-                ),
+                    ast.ExpLit(ast.LitInt(10)),
+                    None),
             None)],
             [ast.SelTab('t', None)], None, None, None, None)]
     assert parse_bql_string('''
@@ -538,10 +544,36 @@ def test_select_bql():
                         ('e', ast.ExpLit(ast.LitNull(0))),
                         ('r', ast.ExpLit(ast.LitInt(2))),
                     ],
-                    None
-                ),
+                    None,
+                    None),
             None)],
             [ast.SelTab('t', None)], None, None, None, None)]
+    assert parse_bql_string('select mutual information of c with d'
+            ' using 100 samples for 2 seconds max error 0.01 from t;') == \
+        [ast.Select(ast.SELQUANT_ALL,
+            [ast.SelColExp(
+                ast.ExpBQLMutInf(['c'], ['d'], None,
+                    ast.ExpLit(ast.LitInt(100)),
+                    ast.Budget(ast.ExpLit(ast.LitInt(2)),
+                        ast.ExpLit(ast.LitFloat(0.01)))),
+                None)],
+            [ast.SelTab('t', None)], None, None, None, None)]
+    assert parse_bql_string('select mutual information with c'
+            ' for 1 second from t;') == \
+        [ast.Select(ast.SELQUANT_ALL,
+            [ast.SelColExp(
+                ast.ExpBQLMutInf(['c'], None, None, None,
+                    ast.Budget(ast.ExpLit(ast.LitInt(1)), None)),
+                None)],
+            [ast.SelTab('t', None)], None, None, None, None)]
+    assert parse_bql_string('select mutual information'
+            ' max error 0.1 from t;') == \
+        [ast.Select(ast.SELQUANT_ALL,
+            [ast.SelColExp(
+                ast.ExpBQLMutInf(None, None, None, None,
+                    ast.Budget(None, ast.ExpLit(ast.LitFloat(0.1)))),
+                None)],
+            [ast.SelTab('t', None)], None, None, None, None)]
     assert parse_bql_string('select correlation with c from t;') == \
         [ast.Select(ast.SELQUANT_ALL,
             [ast.SelColExp(ast.ExpBQLCorrel('c', None), None)],
@@ -578,7 +610,7 @@ def test_select_bql():
         [ast.Select(ast.SELQUANT_ALL,
             [ast.SelColExp(ast.ExpBQLProb([('c1',
                         ast.ExpApp(False, 'f', [ast.ExpCol(None, 'c2')]))],
-                    []),
+                    [], None),
                 None)],
             [ast.SelTab('t', None)], None, None, None, None)]
     assert parse_bql_string('select key, t.(estimate * from columns of t'
@@ -587,7 +619,7 @@ def test_select_bql():
         [ast.Select(ast.SELQUANT_ALL, [
                 ast.SelColExp(ast.ExpCol(None, 'key'), None),
                 ast.SelColSub('t',
-                    ast.EstCols([ast.SelColAll(None)], 't', None, None,
+                    ast.EstCols([ast.SelColAll(None)], 't', None, None, None,
                         [ast.Ord(ast.ExpBQLDepProb('c', None), ast.ORD_DESC)],
                         ast.Lim(ast.ExpLit(ast.LitInt(4)), None)))
             ],
@@ -596,6 +628,69 @@ def test_select_bql():
             [ast.Ord(ast.ExpCol(None, 'key'), ast.ORD_ASC)],
             None)]
 
+def test_select_bql_budget():
+    assert parse_bql_string('select probability of c = 1'
+            ' for 0.5 seconds from t;') == \
+        [ast.Select(ast.SELQUANT_ALL,
+            [ast.SelColExp(
+                ast.ExpBQLProb([('c', ast.ExpLit(ast.LitInt(1)))], [],
+                    ast.Budget(ast.ExpLit(ast.LitFloat(0.5)), None)),
+                None)],
+            [ast.SelTab('t', None)], None, None, None, None)]
+    assert parse_bql_string('select probability of (c = 1, d = 2)'
+            ' given (e = 3) max error 0.001 from t;') == \
+        [ast.Select(ast.SELQUANT_ALL,
+            [ast.SelColExp(
+                ast.ExpBQLProb(
+                    [('c', ast.ExpLit(ast.LitInt(1))),
+                        ('d', ast.ExpLit(ast.LitInt(2)))],
+                    [('e', ast.ExpLit(ast.LitInt(3)))],
+                    ast.Budget(None, ast.ExpLit(ast.LitFloat(0.001)))),
+                None)],
+            [ast.SelTab('t', None)], None, None, None, None)]
+    # The limit binds to the innermost PROBABILITY OF.
+    assert parse_bql_string('select probability of c ='
+            ' probability of d = 1 for 1 second from t;') == \
+        [ast.Select(ast.SELQUANT_ALL,
+            [ast.SelColExp(
+                ast.ExpBQLProb(
+                    [('c', ast.ExpBQLProb([('d', ast.ExpLit(ast.LitInt(1)))],
+                        [], ast.Budget(ast.ExpLit(ast.LitInt(1)), None)))],
+                    [], None),
+                None)],
+            [ast.SelTab('t', None)], None, None, None, None)]
+    # MAX and ERROR are still usable as names.
+    assert parse_bql_string('select max(error) from t;') == \
+        [ast.Select(ast.SELQUANT_ALL,
+            [ast.SelColExp(
+                ast.ExpApp(False, 'max', [ast.ExpCol(None, 'error')]),
+                None)],
+            [ast.SelTab('t', None)], None, None, None, None)]
+
+
+def test_using_models():
+    assert parse_bql_string('estimate probability of c = 1'
+            ' by p using models 5, 0-2, 1') == \
+        [ast.EstBy(ast.SELQUANT_ALL,
+            [ast.SelColExp(
+                ast.ExpBQLProb([('c', ast.ExpLit(ast.LitInt(1)))], [], None),
+                None)],
+            'p', None, [0, 1, 2, 5])]
+    assert parse_bql_string('estimate * from p modelled by g'
+            ' using top 3 models;') == \
+        [ast.Estimate(ast.SELQUANT_ALL, [ast.SelColAll(None)], 'p', 'g',
+            ast.TopModels(3), None, None, None, None)]
+    assert parse_bql_string('estimate * from p using model 2;') == \
+        [ast.Estimate(ast.SELQUANT_ALL, [ast.SelColAll(None)], 'p', None,
+            [2], None, None, None, None)]
+    assert parse_bql_string('simulate x from t using top 1 model'
+            ' limit 10') == \
+        [ast.Simulate(['x'], 't', None, ast.TopModels(1), [],
+            ast.ExpLit(ast.LitInt(10)), None)]
+    assert parse_bql_string('infer x from p using models 0-1') == \
+        [ast.InferAuto([ast.InfColOne('x', None)], ast.ExpLit(ast.LitInt(0)),
+            None, 'p', None, [0, 1], None, None, None, None)]
+
 def test_trivial_scan_error():
     with pytest.raises(parse.BQLParseError):
         parse_bql_string('select 0c;')
@@ -607,6 +702,21 @@ def test_trivial_precedence_error():
         parse_bql_string('select similarity to similarity to 0' +
             ' with respect to c from t;')
 
+def test_explain():
+    select = ast.Select(ast.SELQUANT_ALL,
+        [ast.SelColExp(ast.ExpLit(ast.LitNull(None)), None)],
+        None, None, None, None, None)
+    assert parse_bql_string('explain select null;') == \
+        [ast.Explain(select, False)]
+    assert parse_bql_string('explain query plan select null;') == \
+        [ast.Explain(select, True)]
+    # The new keywords are still usable as names.
+    assert parse_bql_string('select explain, query, plan from t;') == \
+        [ast.Select(ast.SELQUANT_ALL,
+            [ast.SelColExp(ast.ExpCol(None, name), None)
+                for name in ['explain', 'query', 'plan']],
+            [ast.SelTab('t', None)], None, None, None, None)]
+
 def test_trivial_commands():
     assert parse_bql_string('''
         create population satellites for satellites_ucs (
@@ -694,57 +804,72 @@ def test_trivial_commands():
                     ast.SelColExp(ast.ExpCol(None, 'x'), None),
                     ast.PredCol('x', 'xi', 'xc', None),
                 ],
-                't_cc', None, None, None, None, None,
+                't_cc', None, None, None, None, None, None,
             ))]
 
 def test_analyze():
     assert parse_bql_string('analyze t for 1 iteration;') == \
-        [ast.AnalyzeModels('t', None, 1, None, None, None, False, None)]
+        [ast.AnalyzeModels('t', None, 1, None, None, None, None, False, None)]
     assert parse_bql_string('analyze t for 7 seconds or 1 iteration;') == \
-        [ast.AnalyzeModels('t', None, 1, 7, None, None, False, None)]
+        [ast.AnalyzeModels('t', None, 1, 7, None, None, None, False, None)]
     assert parse_bql_string('analyze t for 1 iteration wait;') == \
-        [ast.AnalyzeModels('t', None, 1, None, None, None, True, None)]
+        [ast.AnalyzeModels('t', None, 1, None, None, None, None, True, None)]
     assert parse_bql_string('analyze t for 1 minute;') == \
-        [ast.AnalyzeModels('t', None, None, 60, None, None, False, None)]
+        [ast.AnalyzeModels('t', None, None, 60, None, None, None, False, None)]
     assert parse_bql_string('analyze t for 1 minute wait;') == \
-        [ast.AnalyzeModels('t', None, None, 60, None, None, True, None)]
+        [ast.AnalyzeModels('t', None, None, 60, None, None, None, True, None)]
     assert parse_bql_string('analyze t for 2 minutes;') == \
-        [ast.AnalyzeModels('t', None, None, 120, None, None, False, None)]
+        [ast.AnalyzeModels('t', None, None, 120,
+            None, None, None, False, None)]
     assert parse_bql_string('analyze t for 100 iterations or 2 minutes;') == \
-        [ast.AnalyzeModels('t', None, 100, 120, None, None, False, None)]
+        [ast.AnalyzeModels('t', None, 100, 120, None, None, None, False, None)]
     assert parse_bql_string('analyze t for 2 minutes wait;') == \
-        [ast.AnalyzeModels('t', None, None, 120, None, None, True, None)]
+        [ast.AnalyzeModels('t', None, None, 120, None, None, None, True, None)]
     assert parse_bql_string('analyze t for 1 second;') == \
-        [ast.AnalyzeModels('t', None, None, 1, None, None, False, None)]
+        [ast.AnalyzeModels('t', None, None, 1, None, None, None, False, None)]
     assert parse_bql_string('analyze t for 1 second wait;') == \
-        [ast.AnalyzeModels('t', None, None, 1, None, None, True, None)]
+        [ast.AnalyzeModels('t', None, None, 1, None, None, None, True, None)]
     assert parse_bql_string('analyze t for 2 seconds;') == \
-        [ast.AnalyzeModels('t', None, None, 2, None, None, False, None)]
+        [ast.AnalyzeModels('t', None, None, 2, None, None, None, False, None)]
     assert parse_bql_string('analyze t for 2 seconds wait;') == \
-        [ast.AnalyzeModels('t', None, None, 2, None, None, True, None)]
+        [ast.AnalyzeModels('t', None, None, 2, None, None, None, True, None)]
     assert parse_bql_string('analyze t model 1 for 1 iteration;') == \
-        [ast.AnalyzeModels('t', [1], 1, None, None, None, False, None)]
+        [ast.AnalyzeModels('t', [1], 1, None, None, None, None, False, None)]
     assert parse_bql_string('analyze t models 1,2,3 for 1 iteration;') == \
-        [ast.AnalyzeModels('t', [1,2,3], 1, None, None, None, False, None)]
+        [ast.AnalyzeModels('t', [1,2,3], 1,
+            None, None, None, None, False, None)]
     assert parse_bql_string('analyze t models 1-3,5 for 1 iteration;') == \
-        [ast.AnalyzeModels('t', [1,2,3,5], 1, None, None, None, False, None)]
+        [ast.AnalyzeModels('t', [1,2,3,5], 1,
+            None, None, None, None, False, None)]
     assert parse_bql_string('analyze t for 10 iterations'
             ' checkpoint 3 iterations') == \
-        [ast.AnalyzeModels('t', None, 10, None, 3, None, False, None)]
+        [ast.AnalyzeModels('t', None, 10, None, 3, None, None, False, None)]
     assert parse_bql_string('analyze t for 10 iterations wait'
             ' (mh(default, one, 10))') == \
-        [ast.AnalyzeModels('t', None, 10, None, None, None, True, [
+        [ast.AnalyzeModels('t', None, 10, None, None, None, None, True, [
             'mh', '(', 'default', ',', 'one', ',', 10, ')'
         ])]
     assert parse_bql_string('analyze t for 10 seconds'
             ' checkpoint 3 seconds') == \
-        [ast.AnalyzeModels('t', None, None, 10, None, 3, False, None)]
+        [ast.AnalyzeModels('t', None, None, 10, None, 3, None, False, None)]
     assert parse_bql_string('analyze t for 1 minute or 10 minutes'
             ' checkpoint 3 seconds') == \
-        [ast.AnalyzeModels('t', None, None, 60, None, 3, False, None)]
+        [ast.AnalyzeModels('t', None, None, 60, None, 3, None, False, None)]
     assert parse_bql_string('analyze t for 100 iterations or 10 iterations'
             ' checkpoint 3 seconds') == \
-        [ast.AnalyzeModels('t', None, 10, None, None, 3, False, None)]
+        [ast.AnalyzeModels('t', None, 10, None, None, 3, None, False, None)]
+    assert parse_bql_string('analyze t for 100 iterations until converged'
+            ' wait') == \
+        [ast.AnalyzeModels('t', None, 100, None, None, None,
+            ast.Converge(None, None), True, None)]
+    assert parse_bql_string('analyze t for 10 minutes until converged'
+            ' window 5 tolerance 0.1 checkpoint 2 iterations wait') == \
+        [ast.AnalyzeModels('t', None, None, 600, 2, None,
+            ast.Converge(5, 0.1), True, None)]
+    assert parse_bql_string('analyze t for 1 iteration until converged'
+            ' tolerance 1') == \
+        [ast.AnalyzeModels('t', None, 1, None, None, None,
+            ast.Converge(None, 1.), False, None)]
 
 def test_create_tab_csv():
     assert parse_bql_string('create temp table if not exists f '
@@ -806,26 +931,26 @@ def test_alterpop_addvar():
 def test_infer_trivial():
     assert parse_bql_string('infer x from p') == \
         [ast.InferAuto([ast.InfColOne('x', None)], ast.ExpLit(ast.LitInt(0)),
-            None, 'p', None, None, None, None, None)]
+            None, 'p', None, None, None, None, None, None)]
 
 def test_infer_conf():
     assert parse_bql_string('infer x with confidence 0.9 from p') == \
         [ast.InferAuto([ast.InfColOne('x', None)],
             ast.ExpLit(ast.LitFloat(0.9)), None, 'p', None, None, None, None,
-            None)]
+            None, None)]
 
 def test_infer_samples():
     assert parse_bql_string('infer x using 42 samples from p') == \
         [ast.InferAuto([ast.InfColOne('x', None)],
             ast.ExpLit(ast.LitInt(0)), ast.ExpLit(ast.LitInt(42)), 'p', None,
-            None, None, None, None)]
+            None, None, None, None, None)]
 
 def test_infer_conf_samples():
     assert parse_bql_string('infer x with confidence 0.9 using 42 samples'
             ' from p') == \
         [ast.InferAuto([ast.InfColOne('x', None)],
             ast.ExpLit(ast.LitInt(.9)), ast.ExpLit(ast.LitInt(42)), 'p', None,
-            None, None, None, None)]
+            None, None, None, None, None)]
 
 def test_infer_explicit():
     assert parse_bql_string('infer explicit x, predict y with confidence 0.9,'
@@ -847,7 +972,7 @@ def test_infer_explicit():
                 ast.PredCol('a', 'b', 'c', None),
                 ast.PredCol('h', None, 'k', ast.ExpLit(ast.LitInt(42))),
             ],
-            'p', None, None, None, None, None)]
+            'p', None, None, None, None, None, None)]
 
 def test_infer_explicit_samples():
     assert parse_bql_string('infer explicit x, predict y with confidence 0.9,'
@@ -869,7 +994,7 @@ def test_infer_explicit_samples():
                 ast.PredCol('a', 'b', 'c', None),
                 ast.PredCol('h', None, 'k', ast.ExpLit(ast.LitInt(42))),
             ],
-            'p', None, None, None, None, None)]
+            'p', None, None, None, None, None, None)]
 
 def test_parametrized():
     assert parse_bql_string('select * from t where id = ?;') == \
@@ -978,7 +1103,7 @@ def test_simulate():
             ' simulate x from t limit 10') == \
         [ast.CreateTabAs(False, False, 's',
             ast.Simulate(
-                ['x'], 't', None,
+                ['x'], 't', None, None,
                 [],
                 ast.ExpLit(ast.LitInt(10)),
                 None)
@@ -987,7 +1112,7 @@ def test_simulate():
             ' simulate x, y from t given z = 0 limit 10 accuracy 2') == \
         [ast.CreateTabAs(False, True, 's',
             ast.Simulate(
-                ['x', 'y'], 't', None,
+                ['x', 'y'], 't', None, None,
                 [('z', ast.ExpLit(ast.LitInt(0)))],
                 ast.ExpLit(ast.LitInt(10)),
                 2)
@@ -996,7 +1121,7 @@ def test_simulate():
             ' simulate x, y from t given z = 0 limit 10') == \
         [ast.CreateTabAs(True, False, 's',
             ast.Simulate(
-                ['x', 'y'], 't', None,
+                ['x', 'y'], 't', None, None,
                 [('z', ast.ExpLit(ast.LitInt(0)))],
                 ast.ExpLit(ast.LitInt(10)),
                 None),
@@ -1007,7 +1132,7 @@ def test_simulate():
             ' limit 10 accuracy 19') == \
         [ast.CreateTabAs(True, True, 's',
             ast.Simulate(
-                ['x', 'y'], 't', None,
+                ['x', 'y'], 't', None, None,
                 [
                     ('z', ast.ExpLit(ast.LitInt(0))),
                     ('w', ast.ExpLit(ast.LitInt(1))),
@@ -1051,7 +1176,7 @@ def test_simulate_models():
                                 ('e', ast.ExpLit(ast.LitNull(0))),
                                 ('r', ast.ExpLit(ast.LitFloat(2.7)))
                             ],
-                            ast.ExpLit(ast.LitInt(100))),
+                            ast.ExpLit(ast.LitInt(100)), None),
                         'g'
                     ),
                 ],
@@ -1075,7 +1200,7 @@ def test_simulate_models():
                                 ('e', ast.ExpLit(ast.LitNull(0))),
                                 ('r', ast.ExpLit(ast.LitFloat(2.7)))
                             ],
-                            ast.ExpLit(ast.LitInt(100))),
+                            ast.ExpLit(ast.LitInt(100)), None),
                         'g'
                     ),
                 ],
@@ -1093,7 +1218,7 @@ def test_simulate_models():
                                 ('a', ast.ExpLit(ast.LitInt(2))),
                                 ('c', ast.ExpLit(ast.LitFloat(1.1)))
                             ],
-                            [('b', ast.ExpLit(ast.LitFloat(0.5)))]),
+                            [('b', ast.ExpLit(ast.LitFloat(0.5)))], None),
                         None
                     ),
                 ],
@@ -1126,7 +1251,7 @@ def test_simulate_models():
                                         ('e', ast.ExpLit(ast.LitNull(0))),
                                         ('r', ast.ExpLit(ast.LitFloat(2.7)))
                                     ],
-                                    ast.ExpLit(ast.LitInt(100))),
+                                    ast.ExpLit(ast.LitInt(100)), None),
                                 'g'
                             ),
                         ],
@@ -1142,11 +1267,12 @@ def test_is_bql():
     assert ast.is_bql(ast.ExpCol('t', 'c')) == False
     # ...
     assert ast.is_bql(ast.ExpBQLPredProb('c'))
-    assert ast.is_bql(ast.ExpBQLProb([('c', ast.ExpLit(ast.LitInt(0)))], []))
+    assert ast.is_bql(
+        ast.ExpBQLProb([('c', ast.ExpLit(ast.LitInt(0)))], [], None))
     assert ast.is_bql(ast.ExpBQLProbFn(ast.ExpLit(ast.LitInt(0)), []))
     assert ast.is_bql(ast.ExpBQLSim(None, ast.ExpLit(ast.LitInt(0)), []))
     assert ast.is_bql(ast.ExpBQLDepProb('c0', 'c1'))
-    assert ast.is_bql(ast.ExpBQLMutInf('c0', 'c1', None, 100))
+    assert ast.is_bql(ast.ExpBQLMutInf('c0', 'c1', None, 100, None))
     assert ast.is_bql(ast.ExpBQLCorrel('c0', 'c1'))
     assert ast.is_bql(ast.ExpBQLPredict('c', ast.ExpLit(ast.LitInt(.5)), None))
     assert ast.is_bql(ast.ExpBQLPredictConf('c', None))
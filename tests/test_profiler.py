@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+#   Copyright (c) 2010-2016, MIT Probabilistic Computing Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import json
+
+import test_core
+
+def test_profile():
+    with test_core.t1() as (bdb, _population_id, _generator_id):
+        bdb.execute('INITIALIZE 2 MODELS FOR p1_cc')
+        q = 'ESTIMATE PREDICTIVE PROBABILITY OF age FROM p1'
+        nrows = len(bdb.execute(q).fetchall())
+        with bdb.profile() as profile:
+            assert bdb.profiler is profile
+            cursor = bdb.execute(q)
+            assert cursor.fetchone() is not None
+            assert len(cursor.fetchall()) == nrows - 1
+            assert bdb.execute('SELECT 42').fetchvalue() == 42
+        assert bdb.profiler is None
+        bdb.execute(q).fetchall()
+        result = json.loads(json.dumps(profile.as_dict()))
+        assert [query['query'] for query in result['queries']] == \
+            [q, 'SELECT 42']
+        assert [query['rows'] for query in result['queries']] == [nrows, 1]
+        # Evaluating the rest of the rows in fetchall counts as stepping.
+        assert result['queries'][0]['step'] > 0
+        udf = result['udfs']['bql_row_column_predictive_probability']
+        assert udf['calls'] == nrows
+        assert udf['seconds'] >= 0
+        # Each query has its own share of the totals.
+        [estimate, select] = result['queries']
+        assert estimate['udfs'] == result['udfs']
+        assert select['udfs'] == {}
+        assert select['metamodels'] == {}
+        assert estimate['metamodels'] == result['metamodels']
+        assert select['sql']
+        assert set(select['sql']).isdisjoint(estimate['sql'])
+        assert any(key.startswith('crosscat.')
+            for key in result['metamodels'])
+        assert all(stat['calls'] > 0 for stat in result['sql'].values())
+        assert 'SELECT metamodel FROM bayesdb_generator WHERE id = ?' in \
+            result['sql']
+        # Each model is loaded and then found in the cache.
+        assert estimate['cache']['crosscat']['misses'] >= 2
+        assert estimate['cache']['crosscat']['hits'] > 0
+        assert select['cache'] == {}
+
+def test_profile_fetch_numpy():
+    with test_core.t1() as (bdb, _population_id, _generator_id):
+        q = 'SELECT age, weight FROM t1'
+        nrows = len(bdb.execute(q).fetchall())
+        with bdb.profile() as profile:
+            ages, _weights = bdb.execute(q).fetch_numpy()
+            assert len(ages) == nrows
+            chunks = list(bdb.execute(q).fetch_numpy_chunks(size=2))
+            assert sum(len(ages) for ages, _weights in chunks) == nrows
+            assert len(bdb.execute(q).fetch_dataframe()) == nrows
+        result = profile.as_dict()
+        assert [query['rows'] for query in result['queries']] == [nrows] * 3
@@ -69,3 +69,24 @@ def test_nonintegral_index():
         df = pandas.DataFrame([(1,2,'foo'),(4,5,6),(7,8,9),(10,11,12)],
             index=[42, 78, 62, 43])
         do_test(bdb, 't', df, index='eland')
+
+def test_chunked_nulls_progress():
+    with bayesdb_open() as bdb:
+        df = pandas.DataFrame({
+            'x': [1.5, float('nan'), 3., 4., 5.],
+            'n': [1, 2, 3, 4, 5],
+            'c': ['a', None, 'c', float('nan'), 'e'],
+        }, index=[10, 20, 30, 40, 50], columns=['x', 'n', 'c'])
+        calls = []
+        bayesdb_read_pandas_df(bdb, 't', df, create=True, chunksize=2,
+            progress=lambda n, total: calls.append((n, total)))
+        assert calls == [(2, 5), (4, 5), (5, 5)]
+        assert bdb.execute('SELECT _rowid_, x, n, c FROM t').fetchall() == [
+            (10, 1.5, 1, 'a'),
+            (20, None, 2, None),
+            (30, 3., 3, 'c'),
+            (40, 4., 4, None),
+            (50, 5., 5, 'e'),
+        ]
+        with pytest.raises(ValueError):
+            bayesdb_read_pandas_df(bdb, 't', df, chunksize=0)
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+#   Copyright (c) 2010-2016, MIT Probabilistic Computing Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import ast
+import os
+import random
+import StringIO
+
+import pytest
+
+import bayeslite.grammar as grammar
+import bayeslite.scan as scan
+
+def tokens(scanner_class, string):
+    scanner = scanner_class(StringIO.StringIO(string), '(string)')
+    result = []
+    while True:
+        try:
+            token = scanner.read()
+        except Exception as e:
+            result.append(('exception', type(e)))
+            break
+        result.append((token, scanner.cur_pos))
+        if token[0] == 0:
+            break
+    return result
+
+def check(string):
+    assert tokens(scan.BQLScanner, string) == \
+        tokens(scan.BQLPlexScanner, string)
+
+def test_scan_tokens():
+    assert tokens(scan.BQLScanner, "select x, 'a''b' from \"t\"\"u\";") == [
+        ((grammar.K_SELECT, 'select'), 6),
+        ((grammar.L_NAME, 'x'), 8),
+        ((grammar.T_COMMA, ','), 9),
+        ((grammar.L_STRING, "a'b"), 16),
+        ((grammar.K_FROM, 'from'), 21),
+        ((grammar.L_NAME, 't"u'), 28),
+        ((grammar.T_SEMI, ';'), 29),
+        ((0, ''), 29),
+    ]
+
+@pytest.mark.parametrize('string', [
+    '', ' ', ';', '-- comment', 'x -- comment\n;', '--', '-x', '- -',
+    '1', '12', '1.', '.5', '1.5', '1e5', '1E+5', '1.e-5', '.5e5', '1e',
+    '1.5e', '1.5e+', '12abc', '1.x', '.5x', '1e5x', '0x', '0x1f', '0X1F',
+    '0x1g', '0x1fz', '1$', '1_', '1..2', '1.5.3',
+    '?', '?1', '?0', '?12a', '?123456789012345678901', ':', ':x', '@x',
+    '$', '$x', '$$', '$1', ':x1 :X1 @x1', '? ? ?3 ?',
+    "'", "'abc", "'abc''", "''", "''''", "'a\nb'", '"', '"a""b"', '"a',
+    '== = <> <= < << >= > >> != ! | || & ~ . , ( ) [ ] { } + - * / %',
+    'SeLeCt', 'select_x', '_x', 'x$y', '\xe2\x80\x9c', '\v', '#', '^',
+    '\r\n\t\f', 'a\n\nb', 'x\n;\n',
+])
+def test_scan_agrees_with_plex(string):
+    check(string)
+
+def test_scan_agrees_with_plex_on_parse_tests():
+    # Every string literal in test_parse.py.
+    pathname = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+        'test_parse.py')
+    with open(pathname, 'rb') as f:
+        tree = ast.parse(f.read(), pathname)
+    strings = [node.s for node in ast.walk(tree) if isinstance(node, ast.Str)]
+    assert 100 < len(strings)
+    for string in strings:
+        check(string)
+
+def test_scan_agrees_with_plex_random():
+    fragments = [
+        ' ', '\n', '\t', '--', '-', 'x', 'Select', 'from', '_', '$', ':', '@',
+        '?', '0', '1', '9', '.', 'e', 'E', '+', 'x', 'X', 'f', "'", '"',
+        "''", '""', '=', '<', '>', '!', '|', ';', ',', '(', ')', '*', '\xff',
+    ]
+    prng = random.Random(0)
+    for _i in xrange(2000):
+        n = prng.randrange(1, 12)
+        check(''.join(prng.choice(fragments) for _j in xrange(n)))
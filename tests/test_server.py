@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+
+#   Copyright (c) 2010-2016, MIT Probabilistic Computing Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import contextlib
+import os
+import shutil
+import tempfile
+import threading
+
+import pytest
+
+from bayeslite import bayesdb_open
+from bayeslite.server import BQLServerError
+from bayeslite.server import bayesdb_connect
+from bayeslite.server import bayesdb_serve
+from bayeslite.server import parse_address
+from bayeslite.txn import SharedModelCache
+
+import test_core
+
+@contextlib.contextmanager
+def serving(bdb, address, **kwargs):
+    server = bayesdb_serve(bdb, address, **kwargs)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        thread.join()
+        server.server_close()
+
+@pytest.yield_fixture
+def tmpdir():
+    path = tempfile.mkdtemp(prefix='bayeslite')
+    try:
+        yield path
+    finally:
+        shutil.rmtree(path)
+
+def test_parse_address():
+    assert parse_address('/tmp/bdb.sock') == '/tmp/bdb.sock'
+    assert parse_address('bdb.sock') == 'bdb.sock'
+    assert parse_address('localhost:8080') == ('localhost', 8080)
+    assert parse_address(':8080') == ('localhost', 8080)
+
+def test_server_queries(tmpdir):
+    address = os.path.join(tmpdir, 'bdb.sock')
+    with test_core.t1(pathname=os.path.join(tmpdir, 't1.bdb'),
+            threaded=True) as (bdb, _population_id, generator_id):
+        bdb.execute('INITIALIZE 2 MODELS FOR p1_cc')
+        bdb.execute('ANALYZE p1_cc FOR 1 ITERATION WAIT')
+        q = 'ESTIMATE DEPENDENCE PROBABILITY OF age WITH weight BY p1'
+        expected = bdb.execute(q).fetchvalue()
+        with serving(bdb, address, batch_size=2):
+            with bayesdb_connect(address) as client:
+                assert client.execute(q).fetchvalue() == expected
+                cursor = client.execute('SELECT label, age FROM t1'
+                    ' WHERE age > ? ORDER BY age', (10,))
+                assert [d[0] for d in cursor.description] == \
+                    ['label', 'age']
+                rows = bdb.execute('SELECT label, age FROM t1'
+                    ' WHERE age > ? ORDER BY age', (10,)).fetchall()
+                assert cursor.fetchone() == rows[0]
+                assert cursor.fetchmany(2) == rows[1:3]
+                assert cursor.fetchall() == rows[3:]
+                # Abandoning a cursor midway leaves the client usable.
+                client.execute('SELECT * FROM t1').fetchone()
+                assert client.sql_execute('SELECT COUNT(*) FROM t1'
+                    ' WHERE age = :age', {'age': 12}).fetchvalue() == 1
+                with pytest.raises(BQLServerError):
+                    client.execute('SELECT * FROM nonexistent')
+                assert client.execute('SELECT 42').fetchvalue() == 42
+            results = []
+            def query(_i):
+                with bayesdb_connect(address) as client:
+                    results.append(client.execute(q).fetchvalue())
+            threads = [threading.Thread(target=query, args=(i,))
+                for i in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            assert results == [expected] * 4
+            # The clients shared one copy of the models, which analysis
+            # through any client replaces.
+            shared = bdb._shared_models
+            assert sorted(shared._models) == \
+                [(generator_id, 0), (generator_id, 1)]
+            with bayesdb_connect(address) as client:
+                client.execute('ANALYZE p1_cc FOR 1 ITERATION WAIT')
+                assert shared._models == {}
+                expected = bdb.execute(q).fetchvalue()
+                assert len(shared._models) == 2
+                assert client.execute(q).fetchvalue() == expected
+
+def test_shared_model_cache():
+    cache = SharedModelCache()
+    epoch = cache.epoch()
+    cache.put(epoch, 1, 0, 'theta')
+    assert cache.get(epoch, 1, 0) == 'theta'
+    # While a generator's models are written, no one shares them, and
+    # afterward only transactions that began since then do.
+    cache.write(1)
+    assert cache.get(epoch, 1, 0) is None
+    cache.put(epoch, 1, 0, 'old')
+    cache.written(set([1]))
+    assert cache.get(cache.epoch(), 1, 0) is None
+    cache.put(epoch, 1, 0, 'old')
+    assert cache.get(cache.epoch(), 1, 0) is None
+    cache.put(cache.epoch(), 1, 0, 'new')
+    assert cache.get(cache.epoch(), 1, 0) == 'new'
+    assert cache.get(epoch, 1, 0) is None
+
+def test_server_tcp_memory():
+    with bayesdb_open() as bdb:
+        with serving(bdb, ('localhost', 0)) as server:
+            with bayesdb_connect(server.server_address) as client:
+                client.sql_execute('CREATE TABLE t(x)')
+                client.sql_execute('INSERT INTO t VALUES (1.5)')
+                assert client.execute('SELECT x FROM t').fetchall() == \
+                    [(1.5,)]
@@ -17,6 +17,7 @@
 import apsw
 import json
 import pytest
+import tempfile
 
 from collections import namedtuple
 
@@ -135,8 +136,10 @@ def test_sessions_start_stop():
     num = get_num_entries(bdb.execute)
     assert num > 0
 
-    # stopping the tracer
+    # stopping the tracer writes out any buffered entries and records
+    # no more
     tr.stop_saving_sessions()
+    num = get_num_entries(bdb.execute)
     _simple_bql_query(bdb)
     assert get_num_entries(bdb.execute) == num
 
@@ -263,3 +266,70 @@ def test_error():
             SELECT COUNT(*) FROM bayesdb_session_entries
                 WHERE type = 'bql' AND end_time IS NULL
         ''').fetchvalue()
+
+def _count_entries(tr, where='1'):
+    # Count with the orchestrator's own untraced connection access.
+    return cursor_value(tr._sql('''
+        SELECT COUNT(*) FROM %s.bayesdb_session_entries WHERE %s
+    ''' % (tr._db, where)))
+
+def test_sessions_internal_sql():
+    with test_core.analyzed_bayesdb_population(test_core.t1(),
+            1, 1) as (bdb, _population_id, _generator_id):
+        tr = sescap.SessionOrchestrator(bdb, internal_sql=False)
+        bdb.execute('ESTIMATE PREDICTIVE PROBABILITY OF age FROM p1')\
+            .fetchall()
+        bdb.sql_execute('SELECT COUNT(*) FROM t1').fetchall()
+        tr.flush()
+        entries = get_entries(tr._sql)
+        assert [(e.type, e.data) for e in entries] == [
+            ('bql', 'ESTIMATE PREDICTIVE PROBABILITY OF age FROM p1[]'),
+            ('sql', 'SELECT COUNT(*) FROM t1[]'),
+        ]
+        assert all(e.end_time is not None for e in entries)
+        tr.stop_saving_sessions()
+
+        # By default, internal queries are recorded too.
+        tr = sescap.SessionOrchestrator(bdb)
+        bdb.execute('ESTIMATE PREDICTIVE PROBABILITY OF age FROM p1')\
+            .fetchall()
+        assert 1 < _count_entries(tr, 'session_id = %d' % (tr.session_id,))
+
+def test_sessions_flush_interval():
+    (bdb, tr) = make_bdb_with_sessions(flush_interval=3600)
+    _simple_bql_query(bdb)
+    bdb.sql_execute('SELECT 1').fetchall()
+    assert _count_entries(tr) == 0
+    tr.flush()
+    assert _count_entries(tr) == 3
+    assert _count_entries(tr, 'end_time IS NULL') == 0
+
+def test_sessions_transaction():
+    (bdb, tr) = make_bdb_with_sessions()
+    with bdb.transaction():
+        _simple_bql_query(bdb)
+        assert _count_entries(tr) == 0
+    bdb.sql_execute('SELECT 1').fetchall()
+    assert _count_entries(tr) == 3
+    tr.flush()
+    assert _count_entries(tr, 'end_time IS NULL') == 0
+
+def test_sessions_max_buffered():
+    (bdb, tr) = make_bdb_with_sessions(max_buffered=2)
+    with bdb.transaction():
+        _simple_bql_query(bdb)
+        assert _count_entries(tr) == 2
+
+def test_sessions_attached():
+    with tempfile.NamedTemporaryFile(prefix='bayeslite') as f:
+        (bdb, tr) = make_bdb_with_sessions(pathname=f.name)
+        _simple_bql_query(bdb)
+        tr.stop_saving_sessions()
+        assert _count_entries(tr) == 2
+        assert get_num_entries(bdb.sql_execute) == 0
+        session = json.loads(tr.dump_current_session_as_json())
+        assert len(session['entries']) == 2
+        bdb.close()
+        db = apsw.Connection(f.name)
+        assert get_num_entries(db.cursor().execute) == 2
+        db.close()
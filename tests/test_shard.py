@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+#   Copyright (c) 2010-2016, MIT Probabilistic Computing Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import bayeslite.parse as parse
+import bayeslite.shard as shard
+
+from bayeslite import bayesdb_open
+
+import test_core
+
+def parse_query(string):
+    phrases = list(parse.parse_bql_string(string))
+    assert len(phrases) == 1
+    return phrases[0]
+
+def test_shardable(pathname):
+    with bayesdb_open(pathname) as bdb:
+        def shardable(string):
+            return shard.bayesdb_shardable(bdb, parse_query(string))
+        query = 'ESTIMATE PREDICTIVE PROBABILITY OF age FROM p1'
+        assert not shardable(query)
+        bdb.shards = 4
+        assert shardable(query)
+        assert shardable('INFER age FROM p1')
+        assert shardable('INFER EXPLICIT PREDICT age FROM p1 WHERE age > 3')
+        assert shardable('ESTIMATE MAX(age, weight) FROM p1')
+        assert not shardable('ESTIMATE DISTINCT age FROM p1')
+        assert not shardable('ESTIMATE COUNT(*) FROM p1')
+        assert not shardable('ESTIMATE AVG(PREDICTIVE PROBABILITY OF age)'
+            ' FROM p1')
+        assert not shardable('ESTIMATE age FROM p1 ORDER BY age')
+        assert not shardable('ESTIMATE age FROM p1 LIMIT 3')
+        assert not shardable('ESTIMATE age, COUNT(*) FROM p1 GROUP BY age')
+        assert not shardable('ESTIMATE DEPENDENCE PROBABILITY'
+            ' FROM PAIRWISE VARIABLES OF p1')
+        assert not shardable('SELECT * FROM t')
+        with bdb.savepoint():
+            assert not shardable(query)
+    with bayesdb_open(':memory:', shards=4) as bdb:
+        assert not shard.bayesdb_shardable(bdb, parse_query(query))
+
+def test_shard_bounds(pathname):
+    with bayesdb_open(pathname) as bdb:
+        bdb.sql_execute('CREATE TABLE t(x)')
+        assert shard._shard_bounds(bdb, 't', 3) == []
+        for i in range(10):
+            bdb.sql_execute('INSERT INTO t (_rowid_, x) VALUES (?, ?)',
+                (2*i + 1, i))
+        assert shard._shard_bounds(bdb, 't', 1) == [None, None]
+        assert shard._shard_bounds(bdb, 't', 3) == [None, 7, 13, None]
+        assert shard._shard_bounds(bdb, 't', 20) == \
+            [None] + [2*i + 1 for i in range(1, 10)] + [None]
+
+def test_create_table_sharded(pathname):
+    queries = [
+        'CREATE TABLE a AS ESTIMATE rowid, label,'
+            ' PREDICTIVE PROBABILITY OF age AS pp FROM p1',
+        'CREATE TEMP TABLE b AS INFER EXPLICIT rowid, age,'
+            ' PREDICT weight AS pw CONFIDENCE c FROM p1'
+            " WHERE label <> 'zot' OR label IS NULL",
+        'CREATE TABLE c AS INFER age WITH CONFIDENCE 0.1 FROM p1',
+        'CREATE TABLE d AS ESTIMATE AVG(PREDICTIVE PROBABILITY OF age)'
+            ' FROM p1',
+    ]
+    def run(shards, threaded=False):
+        test_core.remove_database(pathname)
+        with test_core.t1(pathname=pathname, threaded=threaded) as \
+                (bdb, _population_id, _generator_id):
+            bdb.execute('INITIALIZE 2 MODELS FOR p1_cc')
+            bdb.execute('ANALYZE p1_cc FOR 1 ITERATION WAIT')
+            bdb.shards = shards
+            for query in queries:
+                bdb.execute(query)
+            return [bdb.sql_execute('SELECT * FROM %s' % (table,)).fetchall()
+                for table in 'abcd']
+    serial = run(1)
+    sharded = run(3)
+    # Same rows, in the same order, with the same deterministic values.
+    assert sharded[0] == serial[0]
+    assert sharded[3] == serial[3]
+    for table in (1, 2):
+        assert len(sharded[table]) == len(serial[table])
+    assert [row[0:2] for row in sharded[1]] == \
+        [row[0:2] for row in serial[1]]
+    # Predictions are deterministic for a given number of shards.
+    assert run(3) == sharded
+    assert run(3, threaded=True) == sharded
+
+def test_create_table_sharded_empty(pathname):
+    with test_core.t1(pathname=pathname) as \
+            (bdb, _population_id, _generator_id):
+        bdb.execute('INITIALIZE 1 MODEL FOR p1_cc')
+        bdb.shards = 2
+        bdb.execute('CREATE TABLE e AS ESTIMATE rowid, age FROM p1'
+            ' WHERE age > 1000')
+        assert bdb.execute('SELECT * FROM e').fetchall() == []
+        assert [r[1] for r in bdb.sql_execute('PRAGMA table_info(e)')] == \
+            ['rowid', 'age']
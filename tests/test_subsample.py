@@ -15,11 +15,15 @@
 #   limitations under the License.
 
 import os
+import struct
 
 import crosscat.LocalEngine
+import numpy
 
 import bayeslite
 import bayeslite.read_csv as read_csv
+import bayeslite.reservoir as reservoir
+import bayeslite.weakprng as weakprng
 
 from bayeslite.core import bayesdb_get_generator
 from bayeslite.guess import bayesdb_guess_population
@@ -91,3 +95,77 @@ def test_subsample():
         bdb.execute('DROP GENERATOR hosp_full_cc')
         bdb.execute('DROP POPULATION hospitals_sub')
         bdb.execute('DROP POPULATION hospitals_full')
+
+def test_subsample_holes():
+    with bayeslite.bayesdb_open(builtin_metamodels=False) as bdb:
+        cc = crosscat.LocalEngine.LocalEngine(seed=0)
+        metamodel = CrosscatMetamodel(cc)
+        bayeslite.bayesdb_register_metamodel(bdb, metamodel)
+        with open(dha_csv, 'rU') as f:
+            read_csv.bayesdb_read_csv(bdb, 'dha', f, header=True, create=True)
+        bdb.sql_execute('DELETE FROM dha WHERE _rowid_ % 3 = 0')
+        bayesdb_guess_population(bdb, 'hospitals', 'dha',
+            overrides=[('name', 'key')])
+        bdb.execute('''
+            CREATE GENERATOR hosp_full_cc FOR hospitals USING crosscat (
+                SUBSAMPLE(OFF)
+            )
+        ''')
+        bdb.execute('''
+            CREATE GENERATOR hosp_sub_cc FOR hospitals USING crosscat (
+                SUBSAMPLE(100)
+            )
+        ''')
+        rowids = [row[0] for row in
+            bdb.sql_execute('SELECT _rowid_ FROM dha ORDER BY _rowid_')]
+        sql = '''
+            SELECT sql_rowid FROM bayesdb_crosscat_subsample
+                WHERE generator_id = ?
+                ORDER BY cc_row_id ASC
+        '''
+        gid_full = bayesdb_get_generator(bdb, None, 'hosp_full_cc')
+        cursor = bdb.sql_execute(sql, (gid_full,))
+        assert [row[0] for row in cursor] == rowids
+        gid = bayesdb_get_generator(bdb, None, 'hosp_sub_cc')
+        cursor = bdb.sql_execute(sql, (gid,))
+        seed = struct.pack('<QQQQ', 0, 0, 100, len(rowids))
+        assert [row[0] for row in cursor] == \
+            [rowids[i] for i in reservoir_sequential(seed, 100, len(rowids))]
+
+def reservoir_sequential(seed, k, n):
+    # The reservoir loop CREATE GENERATOR used to run row by row.
+    uniform = weakprng.weakprng(seed).weakrandom_uniform
+    samples = []
+    for i in xrange(n):
+        if i < k:
+            samples.append(i)
+        else:
+            r = uniform(i + 1)
+            if r < k:
+                samples[r] = i
+    return samples
+
+def test_weakprng_words():
+    seed = struct.pack('<QQQQ', 1, 2, 3, 4)
+    prng = weakprng.weakprng(seed)
+    words = [prng.weakrandom32() for _ in xrange(100)]
+    key = struct.unpack('<IIIIIIII', seed)
+    assert list(reservoir.weakprng_words(key, 0, 100)) == words
+    assert list(reservoir.weakprng_words(key, 17, 50)) == words[17:67]
+
+def test_weakprng_reservoir():
+    for k, n in [(1, 1), (3, 2), (5, 5), (1, 2), (3, 10), (10, 1000),
+            (100, 20000), (1000, 30000)]:
+        seed = struct.pack('<QQQQ', 0, 0, k, n)
+        assert list(reservoir.weakprng_reservoir(seed, k, n)) == \
+            reservoir_sequential(seed, k, n)
+
+def test_weakprng_reservoir_rejections():
+    # Near 3*2^30, about a quarter of the words are rejected, and each
+    # rejection shifts the rest of the draws by one word.
+    seed = struct.pack('<QQQQ', 0, 0, 0, 42)
+    uniform = weakprng.weakprng(seed).weakrandom_uniform
+    m = numpy.arange(3 << 30, (3 << 30) + 5000, dtype=numpy.uint64)
+    key = struct.unpack('<IIIIIIII', seed)
+    draws, _position = reservoir._uniform_draws(key, 0, m)
+    assert list(draws) == [uniform(int(m_t)) for m_t in m]
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+
+#   Copyright (c) 2010-2016, MIT Probabilistic Computing Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import threading
+
+import apsw
+import pytest
+
+import bayeslite
+
+from bayeslite import bayesdb_open
+from bayeslite.executor import SerialExecutor
+from bayeslite.executor import ThreadExecutor
+
+import test_core
+
+def run_threads(n, target):
+    errors = []
+    def run(i):
+        try:
+            target(i)
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+
+def test_threaded_requires_file():
+    with pytest.raises(ValueError):
+        bayesdb_open(threaded=True)
+    with pytest.raises(ValueError):
+        bayesdb_open(busy_timeout=100)
+
+def test_threaded_queries(pathname):
+    with bayesdb_open(pathname, threaded=True) as bdb:
+        assert isinstance(bdb, bayeslite.BayesDB)
+        assert bdb.sql_execute('PRAGMA journal_mode').fetchvalue() == 'wal'
+        bdb.sql_execute('CREATE TABLE t(x, y)')
+        with bdb.transaction():
+            for i in range(100):
+                bdb.sql_execute('INSERT INTO t VALUES (?, ?)', (i, i % 7))
+        connections = set()
+        results = {}
+        # Hold every thread's savepoint open until all have begun, so
+        # that no two threads can take turns with one connection.
+        entered = []
+        everyone = threading.Condition()
+        def query(i):
+            with bdb.savepoint():
+                assert bdb.cache is not None
+                connections.add(id(bdb._sqlite3))
+                with everyone:
+                    entered.append(i)
+                    everyone.notify_all()
+                    while len(entered) < 8:
+                        everyone.wait()
+                results[i] = bdb.execute(
+                    'SELECT SUM(x) FROM t WHERE y = ?', (i % 7,)
+                ).fetchvalue()
+            assert bdb.cache is None
+        run_threads(8, query)
+        assert len(connections) > 1
+        assert results == dict((i, sum(x for x in range(100)
+            if x % 7 == i % 7)) for i in range(8))
+        assert bdb.cache is None
+
+def test_threaded_transactions(pathname):
+    with bayesdb_open(pathname, threaded=True, busy_timeout=0) as bdb:
+        bdb.sql_execute('CREATE TABLE t(x)')
+        started = threading.Event()
+        proceed = threading.Event()
+        def reader(_i):
+            # Independent of the main thread's transaction.
+            with bdb.transaction():
+                started.set()
+                assert bdb.execute('SELECT COUNT(*) FROM t').fetchvalue() \
+                    == 0
+                proceed.wait()
+            with pytest.raises(apsw.BusyError):
+                bdb.sql_execute('INSERT INTO t VALUES (2)')
+        with bdb.transaction():
+            bdb.sql_execute('INSERT INTO t VALUES (1)')
+            thread = threading.Thread(target=run_threads, args=(1, reader))
+            thread.start()
+            started.wait()
+            proceed.set()
+            thread.join()
+        assert bdb.execute('SELECT COUNT(*) FROM t').fetchvalue() == 1
+
+def test_threaded_models(pathname):
+    with test_core.t1(pathname=pathname, threaded=True) as \
+            (bdb, _population_id, _generator_id):
+        bdb.execute('INITIALIZE 2 MODELS FOR p1_cc')
+        bdb.execute('ANALYZE p1_cc FOR 1 ITERATION WAIT')
+        q = 'ESTIMATE DEPENDENCE PROBABILITY OF age WITH weight BY p1'
+        expected = bdb.execute(q).fetchvalue()
+        results = []
+        run_threads(4, lambda _i: results.append(bdb.execute(q).fetchvalue()))
+        assert results == [expected] * 4
+
+def test_threaded_share_models(pathname):
+    with test_core.t1(pathname=pathname, threaded=True, share_models=True) \
+            as (bdb, _population_id, _generator_id):
+        bdb.execute('INITIALIZE 2 MODELS FOR p1_cc')
+        bdb.execute('ANALYZE p1_cc FOR 1 ITERATION WAIT')
+        q = 'ESTIMATE DEPENDENCE PROBABILITY OF age WITH weight BY p1'
+        expected = bdb.execute(q).fetchvalue()
+        results = []
+        with bdb.profile() as profile:
+            run_threads(4,
+                lambda _i: results.append(bdb.execute(q).fetchvalue()))
+        assert results == [expected] * 4
+        # Every thread found the models the first query loaded.
+        shared = profile.as_dict()['cache']['shared_models']
+        assert shared['misses'] == 0
+        assert shared['hits'] >= 4*2
+
+def test_executor_requires_threaded():
+    with bayesdb_open() as bdb:
+        assert not bdb.executor.concurrent
+        with pytest.raises(ValueError):
+            bdb.executor = ThreadExecutor(2)
+    with pytest.raises(ValueError):
+        bayesdb_open(executor=ThreadExecutor(2))
+    with pytest.raises(ValueError):
+        ThreadExecutor(0)
+
+class CountingExecutor(ThreadExecutor):
+    def __init__(self, nthreads):
+        super(CountingExecutor, self).__init__(nthreads)
+        self.threads = []
+
+    def map(self, fn, items):
+        def call(item):
+            self.threads.append(threading.current_thread())
+            return fn(item)
+        return super(CountingExecutor, self).map(call, items)
+
+def test_executor_rows(pathname):
+    # Every row of a query, not just the first, asks the generators
+    # concurrently -- unless the caller has a transaction in progress.
+    with test_core.t1(pathname=pathname, threaded=True) as \
+            (bdb, _population_id, _generator_id):
+        executor = CountingExecutor(2)
+        bdb.executor = executor
+        bdb.execute('CREATE GENERATOR p1_cc2 FOR p1 USING crosscat()')
+        bdb.execute('INITIALIZE 2 MODELS FOR p1_cc')
+        bdb.execute('INITIALIZE 2 MODELS FOR p1_cc2')
+        q = 'ESTIMATE SIMILARITY TO (rowid = 1) WITH RESPECT TO (age)' \
+            ' FROM p1'
+        rows = bdb.execute(q).fetchall()
+        assert 1 < len(rows)
+        assert len(executor.threads) == 2*len(rows)
+        assert threading.current_thread() not in executor.threads
+        del executor.threads[:]
+        with bdb.transaction():
+            assert bdb.execute(q).fetchall() == rows
+        assert executor.threads == []
+
+def test_executor_generators(pathname):
+    queries = [
+        'ESTIMATE DEPENDENCE PROBABILITY OF age WITH weight BY p1',
+        'ESTIMATE MUTUAL INFORMATION OF age WITH weight'
+            ' USING 10 SAMPLES BY p1',
+        'ESTIMATE PROBABILITY OF age = 30 GIVEN (weight = 60) BY p1',
+        'ESTIMATE PREDICTIVE PROBABILITY OF age FROM p1',
+        'ESTIMATE SIMILARITY TO (rowid = 1) WITH RESPECT TO (age) FROM p1',
+        'SIMULATE age, weight FROM p1 GIVEN label = \'foo\' LIMIT 10',
+    ]
+    def run(executor, path):
+        with test_core.t1(pathname=path, threaded=True) as \
+                (bdb, _population_id, _generator_id):
+            bdb.executor = executor
+            bdb.execute('CREATE GENERATOR p1_cc2 FOR p1 USING crosscat()')
+            bdb.execute('INITIALIZE 2 MODELS FOR p1_cc')
+            bdb.execute('INITIALIZE 3 MODELS FOR p1_cc2')
+            bdb.execute('ANALYZE p1_cc FOR 1 ITERATION WAIT')
+            bdb.execute('ANALYZE p1_cc2 FOR 1 ITERATION WAIT')
+            return [bdb.execute(q).fetchall() for q in queries]
+    threads = ThreadExecutor(4)
+    concurrent = run(threads, pathname)
+    assert threads._pool is None    # closed with the database
+    test_core.remove_database(pathname)
+    serial = run(SerialExecutor(), pathname)
+    # The generators see the same pseudorandom numbers either way.
+    assert concurrent == serial